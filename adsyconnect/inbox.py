@@ -0,0 +1,127 @@
+"""Versioned chat inbox — what lets the chat list poll for changes only.
+
+The app polls the chat list every few seconds, and every poll used to rebuild
+every conversation the user has (archive/clear filters, a message EXISTS per
+room, unread and last-message maps) even when nothing had changed. For a user
+with a thousand conversations that is a thousand rows serialised to say
+"same as before".
+
+Instead each user has a ChatInbox counter, and a ChatInboxEntry per
+conversation recording the counter value at which it last changed for them.
+Anything the list shows — a new or edited message, a read, archive, mute,
+clear, block, a group rename or membership change — calls touch() for the
+users concerned. The `changes` actions then answer "since version N" with
+just the conversations whose entry is newer, or 304 when N is current.
+
+Versions are bumped under a row lock on the user's counter, taken in user-id
+order, so for any one user they are handed out in commit order and a client
+that has seen N can never miss a change numbered below N.
+
+Not covered: the other user's online dot and follow state, which the app
+already refreshes from presence and the follow endpoints.
+"""
+import logging
+import uuid
+
+from django.db import connection, transaction
+
+from .models import ChatGroupMembership, ChatInbox, ChatInboxEntry
+
+logger = logging.getLogger(__name__)
+
+ROOM = ChatInboxEntry.KIND_ROOM
+GROUP = ChatInboxEntry.KIND_GROUP
+
+_BUMP_SQL = """
+    UPDATE {table} SET version = version + 1
+    WHERE user_id IN (
+        SELECT user_id FROM {table} WHERE user_id = ANY(%s)
+        ORDER BY user_id FOR UPDATE
+    )
+    RETURNING user_id, version
+"""
+
+
+def _bump(user_ids):
+    """{user_id: new version} for [user_ids], creating missing counters."""
+    sql = _BUMP_SQL.format(table=ChatInbox._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(user_ids)])
+        versions = dict(cursor.fetchall())
+        missing = [uid for uid in user_ids if uid not in versions]
+        if missing:
+            ChatInbox.objects.bulk_create(
+                [ChatInbox(user_id=uid) for uid in missing],
+                ignore_conflicts=True,
+            )
+            cursor.execute(sql, [missing])
+            versions.update(cursor.fetchall())
+    return versions
+
+
+def touch(user_ids, kind, object_id):
+    """Record that conversation [object_id] changed for each of [user_ids].
+
+    Never raises: a failed bump must not fail the message or the action that
+    caused it. It runs in its own savepoint, so it can't poison the caller's
+    transaction either; the worst case is a client that picks the change up
+    on its next full sync instead of the next delta.
+    """
+    if object_id is None:
+        return
+    try:
+        # UUIDs, not strings: they are matched against what the UPDATE returns.
+        user_ids = sorted({uuid.UUID(str(uid)) for uid in user_ids if uid})
+        if not user_ids:
+            return
+        with transaction.atomic():
+            versions = _bump(user_ids)
+            ChatInboxEntry.objects.bulk_create(
+                [
+                    ChatInboxEntry(user_id=uid, kind=kind,
+                                   object_id=object_id, version=version)
+                    for uid, version in versions.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'kind', 'object_id'],
+                update_fields=['version'],
+            )
+    except Exception:
+        logger.exception('chat inbox touch failed (%s %s)', kind, object_id)
+
+
+def touch_room(room, user_ids=None):
+    """A 1:1 room changed — for both participants unless [user_ids] says."""
+    if user_ids is None:
+        user_ids = (room.user1_id, room.user2_id)
+    touch(user_ids, ROOM, room.pk)
+
+
+def touch_group(group_id, user_ids=None):
+    """A group changed — for every current member unless [user_ids] says."""
+    if user_ids is None:
+        user_ids = ChatGroupMembership.objects.filter(
+            group_id=group_id
+        ).values_list('user_id', flat=True)
+    touch(list(user_ids), GROUP, group_id)
+
+
+def current_version(user):
+    return (
+        ChatInbox.objects.filter(user=user)
+        .values_list('version', flat=True)
+        .first()
+    ) or 0
+
+
+def changed_since(user, kind, since):
+    """Ids of the user's [kind] conversations that changed after [since].
+
+    Read AFTER the version the client is handed: an entry committed in between
+    is then sent twice (harmless), never skipped.
+    """
+    return set(
+        ChatInboxEntry.objects.filter(
+            user=user, kind=kind, version__gt=since
+        ).values_list('object_id', flat=True)
+    )
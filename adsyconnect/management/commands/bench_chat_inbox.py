@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Cost of one chat-list poll for a user with many conversations.
+
+Seeds one user with ``--rooms`` 1:1 conversations and ``--groups`` groups
+(a few messages each), then times a poll of each list three ways:
+
+  * full list (old) — GET chatrooms/ and groups/, what the app polled
+  * delta, idle — GET .../changes/?since=<current version>: the 304
+  * delta, one change — after a new message in one conversation
+
+Reports p50/p99 latency and statements per poll. Everything is rolled back.
+
+    manage.py bench_chat_inbox
+    manage.py bench_chat_inbox --rooms 3000 --groups 200 --iterations 10
+"""
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from adsyconnect.models import (
+    ChatGroup,
+    ChatGroupMembership,
+    ChatRoom,
+    GroupMessage,
+    Message,
+)
+from base.benchmarking import count_queries, format_stats, measure, rolled_back, synthetic_users
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = 'Chat-list poll cost, full list vs delta sync, for a heavy user (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rolled_back(), override_settings(ALLOWED_HOSTS=['testserver']):
+            me, rooms, groups = self._seed(options)
+            client = APIClient()
+            client.force_authenticate(user=me)
+            self.stdout.write('%d rooms, %d groups' % (len(rooms), len(groups)))
+
+            for label, list_url, room, new_message in (
+                ('rooms', '/api/adsyconnect/chatrooms/', rooms[0], self._room_message),
+                ('groups', '/api/adsyconnect/groups/', groups[0], self._group_message),
+            ):
+                changes_url = list_url + 'changes/'
+                self._line('%s, full list (old)' % label,
+                           lambda: client.get(list_url), options['iterations'])
+                version = client.get(changes_url).json()['version']
+                self._line('%s, delta idle' % label,
+                           lambda: client.get(changes_url, {'since': version}),
+                           options['iterations'])
+                new_message(room)
+                self._line('%s, delta 1 change' % label,
+                           lambda: client.get(changes_url, {'since': version}),
+                           options['iterations'])
+        self.stdout.write(self.style.SUCCESS('Done — synthetic chats rolled back.'))
+
+    def _seed(self, options):
+        # Bulk inserts skip the inbox signals: the user starts with a full
+        # sync, exactly like a fresh install.
+        users = synthetic_users(options['rooms'] + 1, prefix='benchinbox')
+        me, others = users[0], users[1:]
+        now = timezone.now()
+        rooms = ChatRoom.objects.bulk_create(
+            [ChatRoom(user1=me, user2=o, last_message_at=now, last_message_preview='hi')
+             for o in others], batch_size=BATCH)
+        Message.objects.bulk_create(
+            [Message(chatroom=r, sender=r.user2, receiver=me, content=text,
+                     message_type='text', is_read=(text == 'old'))
+             for r in rooms for text in ('old', 'hi')], batch_size=BATCH)
+
+        groups = ChatGroup.objects.bulk_create(
+            [ChatGroup(name='Bench %d' % i, creator=me, last_message_at=now)
+             for i in range(options['groups'])], batch_size=BATCH)
+        ChatGroupMembership.objects.bulk_create(
+            [ChatGroupMembership(group=g, user=u, role='admin' if u == me else 'member')
+             for i, g in enumerate(groups) for u in (me, others[i % len(others)])],
+            batch_size=BATCH)
+        GroupMessage.objects.bulk_create(
+            [GroupMessage(group=g, sender=others[i % len(others)], content='hi')
+             for i, g in enumerate(groups)], batch_size=BATCH)
+        return me, rooms, groups
+
+    @staticmethod
+    def _room_message(room):
+        Message.objects.create(chatroom=room, sender=room.user2, receiver=room.user1,
+                               content='new', message_type='text')
+
+    @staticmethod
+    def _group_message(group):
+        sender = group.memberships.exclude(user=group.creator).first().user
+        message = GroupMessage.objects.create(group=group, sender=sender, content='new')
+        group.last_message_at = message.created_at
+        group.save(update_fields=['last_message_at'])
+
+    def _line(self, label, fn, iterations):
+        with count_queries() as ctx:
+            fn()
+        self.stdout.write('  %-24s %s  %5d statements' % (
+            label, format_stats(measure(fn, iterations)), len(ctx)))
@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsyconnect', '0020_onlinestatus_connection_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatInbox',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='chat_inbox', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'adsyconnect_chat_inbox',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChatInboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('room', 'Chat room'), ('group', 'Group')], max_length=5)),
+                ('object_id', models.UUIDField()),
+                ('version', models.BigIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_inbox_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'adsyconnect_chat_inbox_entries',
+                'indexes': [models.Index(fields=['user', 'kind', 'version'], name='adsy_inbox_user_kind_ver_idx')],
+                'unique_together': {('user', 'kind', 'object_id')},
+            },
+        ),
+    ]
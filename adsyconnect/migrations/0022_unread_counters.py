@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+# Seed the new counters from the messages, with the definitions in
+# adsyconnect/unread.py. Set-based, one statement per table.
+BACKFILL = """
+UPDATE adsyconnect_chatrooms r SET
+    unread_user1 = (
+        SELECT COUNT(*) FROM adsyconnect_messages m
+        WHERE m.chatroom_id = r.id AND m.sender_id = r.user2_id
+          AND NOT m.is_read AND NOT m.is_deleted
+          AND m.created_at > COALESCE(r.cleared_at_user1, '-infinity')
+    ),
+    unread_user2 = (
+        SELECT COUNT(*) FROM adsyconnect_messages m
+        WHERE m.chatroom_id = r.id AND m.sender_id = r.user1_id
+          AND NOT m.is_read AND NOT m.is_deleted
+          AND m.created_at > COALESCE(r.cleared_at_user2, '-infinity')
+    );
+UPDATE adsyconnect_chat_group_memberships gm SET
+    unread_count = (
+        SELECT COUNT(*) FROM adsyconnect_group_messages g
+        WHERE g.group_id = gm.group_id AND g.sender_id <> gm.user_id
+          AND NOT g.is_deleted AND g.message_type <> 'system'
+          AND g.created_at > COALESCE(gm.last_read_at, gm.cleared_at, gm.joined_at)
+    );
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adsyconnect', '0021_chatinbox_chatinboxentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='unread_user1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='unread_user2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatgroupmembership',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
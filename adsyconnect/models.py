@@ -71,6 +71,11 @@ class ChatRoom(models.Model):
     muted_by_user1 = models.BooleanField(default=False)
     muted_by_user2 = models.BooleanField(default=False)
 
+    # Unread badge per participant, kept current by adsyconnect.unread (never
+    # written from an in-memory instance — a full save() re-derives them).
+    unread_user1 = models.PositiveIntegerField(default=0)
+    unread_user2 = models.PositiveIntegerField(default=0)
+
     # Block status
     is_blocked = models.BooleanField(default=False)
     blocked_by = models.ForeignKey(
@@ -99,10 +104,9 @@ class ChatRoom(models.Model):
         return self.user2 if self.user1 == current_user else self.user1
     
     def get_unread_count(self, user):
-        """Get unread message count for a specific user"""
-        return self.messages.filter(
-            is_read=False
-        ).exclude(sender=user).count()
+        """Get unread message count for a specific user (stored counter)."""
+        from .unread import room_count_for
+        return room_count_for(self, user)
 
     def _is_user1(self, user):
         return self.user1_id == getattr(user, 'id', user)
@@ -198,6 +202,8 @@ class ChatGroupMembership(models.Model):
     # Stamped every time the member opens the group (GET messages).
     last_read_at = models.DateTimeField(null=True, blank=True)
     muted = models.BooleanField(default=False)
+    # Unread badge, kept current by adsyconnect.unread.
+    unread_count = models.PositiveIntegerField(default=0)
     # Typing heartbeat: set on every keystroke batch; a member counts as
     # "typing" while this is a few seconds fresh (clients poll it).
     typing_at = models.DateTimeField(null=True, blank=True)
@@ -1074,3 +1080,56 @@ class GroupMessageReaction(models.Model):
 
     def __str__(self):
         return f"{self.user_id} {self.emoji} on {self.message_id}"
+
+
+class ChatInbox(models.Model):
+    """Per-user change counter for the chat list (see adsyconnect.inbox).
+
+    Bumped, under a row lock, every time one of the user's conversations
+    changes in a way the chat list shows — so versions are handed out in
+    commit order and "changes since N" can never skip one.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chat_inbox',
+        primary_key=True
+    )
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'adsyconnect_chat_inbox'
+
+    def __str__(self):
+        return f"{self.user.username} inbox v{self.version}"
+
+
+class ChatInboxEntry(models.Model):
+    """The inbox version at which one conversation last changed for a user.
+
+    Keyed by id rather than a foreign key, so a deleted room or group keeps
+    its entry and the next delta can tell the client to drop the row.
+    """
+    KIND_ROOM = 'room'
+    KIND_GROUP = 'group'
+    KINDS = [(KIND_ROOM, 'Chat room'), (KIND_GROUP, 'Group')]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='chat_inbox_entries'
+    )
+    kind = models.CharField(max_length=5, choices=KINDS)
+    object_id = models.UUIDField()
+    version = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'adsyconnect_chat_inbox_entries'
+        unique_together = ['user', 'kind', 'object_id']
+        indexes = [
+            models.Index(
+                fields=['user', 'kind', 'version'],
+                name='adsy_inbox_user_kind_ver_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.object_id} v{self.version}"
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db.models import Q
 
 from base.upload_limits import check_upload
 from .models import (
@@ -8,6 +8,7 @@ from .models import (
     BlockedUser, TypingStatus, OnlineStatus,
     ChatGroup, ChatGroupMembership, GroupMessage,
 )
+from .unread import room_count_for
 
 User = get_user_model()
 
@@ -255,27 +256,6 @@ class ChatRoomSerializer(serializers.ModelSerializer):
                 }
         return self._last_message_cache
 
-    def _unread_counts(self):
-        """{room_id: count} — every room's unread total in one grouped query."""
-        if not hasattr(self, '_unread_cache'):
-            user = getattr(self.context.get('request'), 'user', None)
-            room_ids = self._room_ids()
-            if not user or not room_ids:
-                self._unread_cache = {}
-            else:
-                rows = (
-                    Message.objects.filter(
-                        chatroom_id__in=room_ids, is_read=False,
-                    )
-                    .exclude(sender=user)
-                    .values('chatroom_id')
-                    .annotate(n=Count('id'))
-                )
-                self._unread_cache = {
-                    str(row['chatroom_id']): row['n'] for row in rows
-                }
-        return self._unread_cache
-
     def _spam_room_ids(self):
         """Rooms where the other person has sent something marked spam."""
         if not hasattr(self, '_spam_cache'):
@@ -359,9 +339,10 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         return None
     
     def get_unread_count(self, obj):
+        # Stored on the row (adsyconnect/unread.py) — no COUNT per list.
         request = self.context.get('request')
         if request and request.user:
-            return self._unread_counts().get(str(obj.id), 0)
+            return room_count_for(obj, request.user)
         return 0
     
     def _cleared_at_for(self, obj):
@@ -678,66 +659,8 @@ class ChatGroupSerializer(serializers.ModelSerializer):
         """Messages by others since the member last opened the group.
 
         Cutoff = last_read_at, else cleared_at, else joined_at — so a fresh
-        member doesn't inherit the whole history as unread.
+        member doesn't inherit the whole history as unread. Kept on the
+        membership row (adsyconnect/unread.py), so this is a read, not a COUNT.
         """
         m = self._my_membership(obj)
-        if m is None:
-            return 0
-        return self._group_unread_counts().get(str(obj.id), 0)
-
-    def _group_ids(self):
-        instance = self.instance
-        if instance is None:
-            return []
-        if isinstance(instance, ChatGroup):
-            return [instance.id]
-        try:
-            return [group.id for group in instance]
-        except TypeError:
-            return []
-
-    def _group_unread_counts(self):
-        """{group_id: unread} for every listed group, in ONE query.
-
-        A COUNT per group is one round trip per group in the chat list. Each
-        member has their own cutoff, so the counts cannot share a single WHERE
-        — but they can share a single query: one OR-ed clause per group, and
-        the database does the counting and the grouping.
-
-        Deliberately not "fetch the dates and count in Python": that would
-        pull every message in every group into memory, which is worse than the
-        COUNT it replaced for any group with real history.
-        """
-        if not hasattr(self, '_group_unread_cache'):
-            user = getattr(self.context.get('request'), 'user', None)
-            groups = self._group_ids()
-            if not user or not getattr(user, 'is_authenticated', False) or not groups:
-                self._group_unread_cache = {}
-                return self._group_unread_cache
-
-            instance = self.instance
-            rows = [instance] if isinstance(instance, ChatGroup) else list(instance)
-
-            clause = Q(pk__in=[])          # matches nothing, so an empty list is safe
-            for group in rows:
-                membership = self._my_membership(group)
-                if membership is None:
-                    continue
-                cutoff = (membership.last_read_at or membership.cleared_at
-                          or membership.joined_at)
-                if cutoff is None:
-                    clause |= Q(group_id=group.id)
-                else:
-                    clause |= Q(group_id=group.id, created_at__gt=cutoff)
-
-            counted = (
-                GroupMessage.objects.filter(clause, is_deleted=False)
-                .exclude(sender=user)
-                .exclude(message_type='system')
-                .values('group_id')
-                .annotate(n=Count('id'))
-            )
-            self._group_unread_cache = {
-                str(row['group_id']): row['n'] for row in counted
-            }
-        return self._group_unread_cache
+        return m.unread_count if m else 0
@@ -1,8 +1,11 @@
 from django.conf import settings
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Message, ChatRoom, OnlineStatus
+from . import inbox, unread
+from .models import (
+    ChatGroup, ChatGroupMembership, ChatRoom, GroupMessage, Message, OnlineStatus,
+)
 
 
 @receiver(post_save, sender=Message)
@@ -11,6 +14,9 @@ def update_chatroom_on_message(sender, instance, created, **kwargs):
     Update chatroom's last message timestamp and preview when a new message is created
     """
     if created and not instance.is_deleted:
+        # Counter first: the room save below is what bumps the inbox version,
+        # and a delta read in between must not see the old badge.
+        unread.message_created(instance)
         chatroom = instance.chatroom
         chatroom.last_message_at = instance.created_at
         chatroom.last_message_preview = instance.get_preview()
@@ -40,6 +46,79 @@ def handle_message_deletion(sender, instance, **kwargs):
             pass
 
 
+# ── stored unread counters (see unread.py) ───────────────────────────────
+# New messages increment; anything else that can change a count re-derives
+# it. A full save() (no update_fields) is treated as "anything changed".
+# Registered ahead of the inbox receivers, so a counter is settled before
+# the version that announces it.
+
+def _touches(update_fields, names):
+    return update_fields is None or bool(set(update_fields) & names)
+
+
+@receiver(post_save, sender=Message)
+def recount_unread_on_message_change(sender, instance, created, update_fields, **kwargs):
+    if not created and _touches(update_fields, {'is_read', 'is_deleted'}):
+        unread.recount_room(instance.chatroom, instance.receiver_id)
+
+
+@receiver(post_save, sender=ChatRoom)
+def recount_unread_on_room_change(sender, instance, created, update_fields, **kwargs):
+    if not created and _touches(update_fields, {'cleared_at_user1', 'cleared_at_user2'}):
+        unread.recount_room(instance)
+
+
+@receiver(post_save, sender=GroupMessage)
+def count_unread_on_group_message(sender, instance, created, update_fields, **kwargs):
+    if created:
+        unread.group_message_created(instance)
+    elif _touches(update_fields, {'is_deleted'}):
+        unread.recount_group(instance.group_id)
+
+
+@receiver(post_save, sender=ChatGroupMembership)
+def recount_unread_on_membership_change(sender, instance, created, update_fields, **kwargs):
+    if not created and _touches(update_fields, {'cleared_at', 'joined_at'}):
+        unread.recount_group(instance.group_id, instance.user_id)
+
+
+# ── chat inbox versions (see inbox.py) ───────────────────────────────────
+# Every new message saves its room/group (last_message_at), so the room and
+# group receivers below cover new messages; the message receivers only need
+# the later saves — edit, delete, read, spam flag.
+
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+def touch_inbox_on_room_change(sender, instance, **kwargs):
+    inbox.touch_room(instance)
+
+
+@receiver(post_save, sender=Message)
+def touch_inbox_on_message_change(sender, instance, created, **kwargs):
+    if not created:
+        inbox.touch(
+            (instance.sender_id, instance.receiver_id),
+            inbox.ROOM, instance.chatroom_id,
+        )
+
+
+@receiver(post_save, sender=ChatGroup)
+def touch_inbox_on_group_change(sender, instance, **kwargs):
+    inbox.touch_group(instance.pk)
+
+
+@receiver(pre_delete, sender=ChatGroup)
+def touch_inbox_on_group_delete(sender, instance, **kwargs):
+    # pre_, not post_: the memberships are cascaded away before post_delete.
+    inbox.touch_group(instance.pk)
+
+
+@receiver(post_save, sender=GroupMessage)
+def touch_inbox_on_group_message_change(sender, instance, created, **kwargs):
+    if not created:
+        inbox.touch_group(instance.group_id)
+
+
 # sender was 'auth.User', but this project's AUTH_USER_MODEL is base.User —
 # so this receiver was bound to a model that never saves and had NEVER fired.
 # Accounts only got an OnlineStatus row later, as a side effect of going
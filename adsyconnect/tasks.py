@@ -175,3 +175,16 @@ def cleanup_stale_call_sessions():
         'missed': missed_count,
         'ended': ended_count,
     }
+
+
+@shared_task
+def reconcile_chat_unread():
+    """Re-derive stored unread counters that drifted from the messages.
+
+    New messages bump the counters with an increment; a read that lands
+    between a message's insert and its increment can leave one off by one
+    (see adsyconnect/unread.py). Nightly, in batches.
+    """
+    from .unread import reconcile
+
+    return reconcile()
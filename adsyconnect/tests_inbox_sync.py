@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Delta sync for the chat list: only what changed since the client's version.
+
+The list is polled every few seconds. These tests pin the contract the app
+relies on — 304 when nothing moved, just the touched conversations when
+something did, and a `removed` id when a conversation left this list — and
+that a delta costs the same whether the user has three rooms or thirty.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import ChatGroup, ChatGroupMembership, ChatRoom, Message
+
+User = get_user_model()
+
+ROOMS = '/api/adsyconnect/chatrooms/changes/'
+GROUPS = '/api/adsyconnect/groups/changes/'
+
+
+class InboxSyncTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(
+            username='ib1', email='ib1@example.com', password='x',
+            first_name='Me', phone='+880100000901')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.me)
+        self._next = 0
+
+    def person(self):
+        self._next += 1
+        return User.objects.create_user(
+            username='ibp%d' % self._next,
+            email='ibp%d@example.com' % self._next, password='x',
+            phone='+8801000009%02d' % (self._next + 10))
+
+    def conversation(self):
+        other = self.person()
+        room = ChatRoom.objects.create(user1=self.me, user2=other)
+        Message.objects.create(
+            chatroom=room, sender=other, receiver=self.me,
+            content='hi', message_type='text')
+        return room, other
+
+    def sync(self, url=ROOMS, since=None):
+        params = {} if since is None else {'since': since}
+        return self.client.get(url, params)
+
+    # ── the contract ────────────────────────────────────────────────────────
+
+    def test_full_sync_then_nothing_changed_is_a_304(self):
+        self.conversation()
+        self.conversation()
+
+        first = self.sync()
+        self.assertEqual(first.status_code, 200)
+        body = first.json()
+        self.assertTrue(body['full'])
+        self.assertEqual(len(body['rooms']), 2)
+
+        again = self.sync(since=body['version'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_a_new_message_returns_only_that_room(self):
+        busy, other = self.conversation()
+        self.conversation()
+        version = self.sync().json()['version']
+
+        Message.objects.create(
+            chatroom=busy, sender=other, receiver=self.me,
+            content='again', message_type='text')
+
+        body = self.sync(since=version).json()
+        self.assertFalse(body['full'])
+        self.assertEqual([row['id'] for row in body['rooms']], [str(busy.id)])
+        self.assertEqual(body['rooms'][0]['unread_count'], 2)
+        self.assertGreater(body['version'], version)
+
+    def test_marking_read_resyncs_the_badge(self):
+        room, _other = self.conversation()
+        version = self.sync().json()['version']
+
+        self.client.post('/api/adsyconnect/chatrooms/%s/mark_as_read/' % room.id)
+
+        body = self.sync(since=version).json()
+        self.assertEqual(body['rooms'][0]['unread_count'], 0)
+
+    def test_archiving_removes_the_room_from_the_main_list(self):
+        room, _other = self.conversation()
+        version = self.sync().json()['version']
+
+        self.client.post(
+            '/api/adsyconnect/chatrooms/%s/archive/' % room.id,
+            {'archived': True}, format='json')
+
+        body = self.sync(since=version).json()
+        self.assertEqual(body['rooms'], [])
+        self.assertEqual(body['removed'], [str(room.id)])
+
+        archived = self.client.get(ROOMS, {'since': version, 'archived': 'true'})
+        self.assertEqual(
+            [row['id'] for row in archived.json()['rooms']], [str(room.id)])
+
+    def test_a_version_from_the_future_falls_back_to_a_full_sync(self):
+        self.conversation()
+        body = self.sync(since=10 ** 9).json()
+        self.assertTrue(body['full'])
+        self.assertEqual(len(body['rooms']), 1)
+
+    # ── groups ──────────────────────────────────────────────────────────────
+
+    def test_group_message_and_leaving_show_up_in_the_group_delta(self):
+        mate = self.person()
+        group = ChatGroup.objects.create(name='Sync', creator=self.me)
+        for user in (self.me, mate):
+            ChatGroupMembership.objects.create(group=group, user=user)
+        version = self.sync(GROUPS).json()['version']
+
+        sent = self.client.post(
+            '/api/adsyconnect/groups/%s/messages/' % group.id,
+            {'content': 'hello', 'message_type': 'text'}, format='json')
+        self.assertEqual(sent.status_code, 201)
+        body = self.sync(GROUPS, since=version).json()
+        self.assertEqual([row['id'] for row in body['groups']], [str(group.id)])
+
+        self.client.post('/api/adsyconnect/groups/%s/leave/' % group.id)
+        body = self.sync(GROUPS, since=body['version']).json()
+        self.assertEqual(body['groups'], [])
+        self.assertEqual(body['removed'], [str(group.id)])
+
+    def test_role_changes_show_up_in_the_group_delta(self):
+        mate = self.person()
+        group = ChatGroup.objects.create(name='Roles', creator=self.me)
+        ChatGroupMembership.objects.create(group=group, user=self.me, role='admin')
+        ChatGroupMembership.objects.create(group=group, user=mate)
+        theirs = APIClient()
+        theirs.force_authenticate(user=mate)
+        version = theirs.get(GROUPS).json()['version']
+
+        self.client.post(
+            '/api/adsyconnect/groups/%s/promote_admin/' % group.id,
+            {'user_id': str(mate.id)}, format='json')
+        body = theirs.get(GROUPS, {'since': version}).json()
+        self.assertEqual([row['my_role'] for row in body['groups']], ['admin'])
+
+        self.client.post(
+            '/api/adsyconnect/groups/%s/demote_admin/' % group.id,
+            {'user_id': str(mate.id)}, format='json')
+        body = theirs.get(GROUPS, {'since': body['version']}).json()
+        self.assertEqual([row['my_role'] for row in body['groups']], ['member'])
+
+    # ── the cost ────────────────────────────────────────────────────────────
+
+    def test_a_delta_does_not_grow_with_the_conversations(self):
+        def delta_queries():
+            room, other = self.conversation()
+            version = self.sync().json()['version']
+            Message.objects.create(
+                chatroom=room, sender=other, receiver=self.me,
+                content='new', message_type='text')
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.sync(since=version)
+            self.assertEqual(len(response.json()['rooms']), 1)
+            return len(ctx.captured_queries)
+
+        small = delta_queries()
+        for _ in range(10):
+            self.conversation()
+        self.assertEqual(small, delta_queries())
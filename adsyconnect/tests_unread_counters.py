@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Unread badges are stored on the row, not counted on every list render.
+
+ChatRoom.unread_user1/unread_user2 and ChatGroupMembership.unread_count are
+bumped by new messages and re-derived by reads, deletes and clears. These
+tests pin that every path that changes what is unread moves the stored
+number the same way the old COUNT would have, and that the nightly
+reconcile puts back a counter that drifted anyway.
+"""
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import ChatGroup, ChatGroupMembership, ChatRoom, GroupMessage, Message
+
+User = get_user_model()
+
+
+class RoomUnreadCounterTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(
+            username='uc1', email='uc1@example.com', password='x',
+            first_name='Me', phone='+880100000951')
+        self.them = User.objects.create_user(
+            username='uc2', email='uc2@example.com', password='x',
+            first_name='Them', phone='+880100000952')
+        self.room = ChatRoom.objects.create(user1=self.me, user2=self.them)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.me)
+
+    def they_say(self, text='hi'):
+        return Message.objects.create(
+            chatroom=self.room, sender=self.them, receiver=self.me,
+            content=text, message_type='text')
+
+    def counters(self):
+        self.room.refresh_from_db()
+        return self.room.unread_user1, self.room.unread_user2
+
+    def test_a_new_message_counts_for_the_receiver_only(self):
+        self.they_say()
+        self.they_say()
+        Message.objects.create(
+            chatroom=self.room, sender=self.me, receiver=self.them,
+            content='back', message_type='text')
+        self.assertEqual(self.counters(), (2, 1))
+
+    def test_marking_the_room_read_zeroes_my_side(self):
+        self.they_say()
+        Message.objects.create(
+            chatroom=self.room, sender=self.me, receiver=self.them,
+            content='back', message_type='text')
+
+        self.client.post(
+            '/api/adsyconnect/chatrooms/%s/mark_as_read/' % self.room.id)
+        self.assertEqual(self.counters(), (0, 1))
+
+    def test_reading_one_message_over_the_socket_path(self):
+        first = self.they_say()
+        self.they_say()
+        first.mark_as_read()
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_a_deleted_message_stops_counting(self):
+        msg = self.they_say()
+        msg.soft_delete()
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_clearing_the_chat_clears_the_badge(self):
+        self.they_say()
+        self.client.post('/api/adsyconnect/chatrooms/%s/clear/' % self.room.id)
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_a_full_save_of_a_stale_instance_does_not_clobber_the_counter(self):
+        stale = ChatRoom.objects.get(pk=self.room.pk)
+        self.they_say()
+        stale.muted_by_user1 = True
+        stale.save()
+        self.assertEqual(self.counters(), (1, 0))
+
+
+class GroupUnreadCounterTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(
+            username='ug1', email='ug1@example.com', password='x',
+            first_name='Me', phone='+880100000961')
+        self.mate = User.objects.create_user(
+            username='ug2', email='ug2@example.com', password='x',
+            first_name='Mate', phone='+880100000962')
+        self.group = ChatGroup.objects.create(name='Counters', creator=self.me)
+        for user in (self.me, self.mate):
+            ChatGroupMembership.objects.create(group=self.group, user=user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.me)
+
+    def counter(self, user):
+        return ChatGroupMembership.objects.get(
+            group=self.group, user=user).unread_count
+
+    def test_a_message_counts_for_everyone_but_the_sender(self):
+        GroupMessage.objects.create(
+            group=self.group, sender=self.mate, content='hi',
+            message_type='text')
+        GroupMessage.objects.create(
+            group=self.group, sender=self.mate, content='X joined',
+            message_type='system')
+        self.assertEqual(self.counter(self.me), 1)
+        self.assertEqual(self.counter(self.mate), 0)
+
+    def test_mark_read_and_clear(self):
+        GroupMessage.objects.create(
+            group=self.group, sender=self.mate, content='hi',
+            message_type='text')
+        self.client.post('/api/adsyconnect/groups/%s/mark-read/' % self.group.id)
+        self.assertEqual(self.counter(self.me), 0)
+
+        GroupMessage.objects.create(
+            group=self.group, sender=self.me, content='mine',
+            message_type='text')
+        mate = ChatGroupMembership.objects.get(group=self.group, user=self.mate)
+        mate.cleared_at = timezone.now()
+        mate.save(update_fields=['cleared_at'])
+        self.assertEqual(self.counter(self.mate), 0)
+
+
+class ReconcileUnreadTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(
+            username='ux1', email='ux1@example.com', password='x',
+            phone='+880100000971')
+        self.them = User.objects.create_user(
+            username='ux2', email='ux2@example.com', password='x',
+            phone='+880100000972')
+        self.room = ChatRoom.objects.create(user1=self.me, user2=self.them)
+        Message.objects.create(
+            chatroom=self.room, sender=self.them, receiver=self.me,
+            content='hi', message_type='text')
+
+    def test_the_command_fixes_a_drifted_counter(self):
+        ChatRoom.objects.filter(pk=self.room.pk).update(unread_user1=7)
+
+        out = StringIO()
+        call_command('reconcile_chat_unread', '--dry-run', stdout=out)
+        self.assertIn('rooms=1', out.getvalue())
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.unread_user1, 7)
+
+        call_command('reconcile_chat_unread', stdout=StringIO())
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.unread_user1, 1)
+
+        out = StringIO()
+        call_command('reconcile_chat_unread', '--dry-run', stdout=out)
+        self.assertIn('rooms=0 memberships=0', out.getvalue())
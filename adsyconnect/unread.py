@@ -0,0 +1,201 @@
+"""Stored unread counters for 1:1 rooms and group memberships.
+
+The chat list used to COUNT unread messages on every render — one grouped
+query over the message table for the rooms, another with a per-member cutoff
+for the groups — and the list is polled every few seconds. The counts now
+live on the rows the list already loads: ChatRoom.unread_user1/unread_user2
+and ChatGroupMembership.unread_count.
+
+What counts as unread (the same definitions recount_* use):
+
+  * room, for one participant — the other side's messages, not read, not
+    deleted, and newer than that participant's clear point
+  * group, for one member — other members' non-system, non-deleted messages
+    newer than last_read_at, else cleared_at, else joined_at
+
+A new message bumps the counter with an F() increment. Reads, deletes and
+clears re-derive the affected counter with a single UPDATE ... (SELECT COUNT)
+scoped to that one room or member, so they are exact however the counter got
+there. The window between a message's INSERT and its increment can still let
+a concurrent read land in between; `reconcile_chat_unread` (nightly) repairs
+any counter that drifted.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ChatGroupMembership, ChatRoom, GroupMessage, Message
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+SIDES = ('user1', 'user2')
+
+
+def _count(qs, group_field):
+    """COUNT(*) of [qs] as a scalar subquery, 0 when nothing matches."""
+    return Coalesce(
+        Subquery(
+            qs.order_by().values(group_field).annotate(n=Count('pk')).values('n'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def room_unread(side):
+    """Expression: unread messages in the OuterRef room for [side]."""
+    other = 'user2' if side == 'user1' else 'user1'
+    return _count(
+        Message.objects.filter(
+            chatroom=OuterRef('pk'),
+            sender=OuterRef(other),
+            is_read=False,
+            is_deleted=False,
+            created_at__gt=Coalesce(OuterRef(f'cleared_at_{side}'), Value(EPOCH)),
+        ),
+        'chatroom',
+    )
+
+
+def membership_unread():
+    """Expression: unread messages for the OuterRef membership."""
+    return _count(
+        GroupMessage.objects.filter(
+            group=OuterRef('group'),
+            is_deleted=False,
+            created_at__gt=Coalesce(
+                OuterRef('last_read_at'), OuterRef('cleared_at'), OuterRef('joined_at'),
+            ),
+        ).exclude(sender=OuterRef('user')).exclude(message_type='system'),
+        'group',
+    )
+
+
+def side_of(room, user_id):
+    return 'user1' if room.user1_id == user_id else 'user2'
+
+
+def room_count_for(room, user):
+    """The stored count for [user] in [room] (0 for a non-participant)."""
+    user_id = getattr(user, 'id', user)
+    if user_id == room.user1_id:
+        return room.unread_user1
+    if user_id == room.user2_id:
+        return room.unread_user2
+    return 0
+
+
+# ── keeping them current ─────────────────────────────────────────────────
+
+def message_created(message):
+    if message.is_read or message.is_deleted:
+        return
+    room = message.chatroom
+    field = 'unread_' + ('user2' if message.sender_id == room.user1_id else 'user1')
+    ChatRoom.objects.filter(pk=room.pk).update(**{field: F(field) + 1})
+
+
+def recount_rooms(rooms, sides=SIDES):
+    """Re-derive the counters of every room in the [rooms] queryset."""
+    return rooms.update(**{f'unread_{side}': room_unread(side) for side in sides})
+
+
+def recount_room(room, user_id=None):
+    """Re-derive one room's counter — for [user_id]'s side, or both."""
+    sides = SIDES if user_id is None else (side_of(room, user_id),)
+    recount_rooms(ChatRoom.objects.filter(pk=room.pk), sides)
+
+
+def group_message_created(message):
+    if message.is_deleted or message.message_type == 'system':
+        return
+    ChatGroupMembership.objects.filter(group_id=message.group_id).exclude(
+        user_id=message.sender_id
+    ).update(unread_count=F('unread_count') + 1)
+
+
+def recount_memberships(memberships):
+    """Re-derive the counters of every membership in the queryset."""
+    return memberships.update(unread_count=membership_unread())
+
+
+def recount_group(group_id, user_id=None):
+    memberships = ChatGroupMembership.objects.filter(group_id=group_id)
+    if user_id is not None:
+        memberships = memberships.filter(user_id=user_id)
+    recount_memberships(memberships)
+
+
+def mark_group_read(group_id, user_id, at):
+    """Stamp the member's read point and zero their counter, in one UPDATE."""
+    return ChatGroupMembership.objects.filter(
+        group_id=group_id, user_id=user_id
+    ).update(last_read_at=at, unread_count=0)
+
+
+# ── reconciliation ───────────────────────────────────────────────────────
+
+def reconcile_rooms(after=None, batch=1000, fix=True):
+    """One batch of rooms by pk, after [after].
+
+    Returns ([(pk, stored1, stored2, actual1, actual2)] for the rooms whose
+    counters drifted — re-derived unless [fix] is off — and the last pk seen,
+    None when there are no rooms left.
+    """
+    rooms = ChatRoom.objects.order_by('pk')
+    if after is not None:
+        rooms = rooms.filter(pk__gt=after)
+    ids = list(rooms.values_list('pk', flat=True)[:batch])
+    if not ids:
+        return [], None
+    drifted = list(
+        ChatRoom.objects.filter(pk__in=ids)
+        .annotate(actual1=room_unread('user1'), actual2=room_unread('user2'))
+        .filter(~Q(unread_user1=F('actual1')) | ~Q(unread_user2=F('actual2')))
+        .values_list('pk', 'unread_user1', 'unread_user2', 'actual1', 'actual2')
+    )
+    if drifted and fix:
+        recount_rooms(ChatRoom.objects.filter(pk__in=[row[0] for row in drifted]))
+    return drifted, ids[-1]
+
+
+def reconcile_memberships(after=None, batch=1000, fix=True):
+    """reconcile_rooms for group memberships: [(pk, stored, actual)]."""
+    memberships = ChatGroupMembership.objects.order_by('pk')
+    if after is not None:
+        memberships = memberships.filter(pk__gt=after)
+    ids = list(memberships.values_list('pk', flat=True)[:batch])
+    if not ids:
+        return [], None
+    drifted = list(
+        ChatGroupMembership.objects.filter(pk__in=ids)
+        .annotate(actual=membership_unread())
+        .exclude(unread_count=F('actual'))
+        .values_list('pk', 'unread_count', 'actual')
+    )
+    if drifted and fix:
+        recount_memberships(
+            ChatGroupMembership.objects.filter(pk__in=[row[0] for row in drifted]))
+    return drifted, ids[-1]
+
+
+def reconcile(batch=1000, fix=True, on_drift=None):
+    """Check every room and membership counter, batch by batch.
+
+    Returns {'rooms': drifted, 'memberships': drifted}; [on_drift] is called
+    with (kind, row) for each drifted row, as reconcile_rooms/_memberships
+    report it.
+    """
+    drifted = {'rooms': 0, 'memberships': 0}
+    for kind, step in (('rooms', reconcile_rooms),
+                       ('memberships', reconcile_memberships)):
+        after = None
+        while True:
+            rows, after = step(after, batch=batch, fix=fix)
+            drifted[kind] += len(rows)
+            if on_drift is not None:
+                for row in rows:
+                    on_drift(kind, row)
+            if after is None:
+                break
+    return drifted
@@ -20,6 +20,7 @@ from django.db.models import F, Q, Max, Exists, OuterRef
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from . import inbox, unread
 from .models import (
     ChatRoom, Message, MessageReport,
     BlockedUser, TypingStatus, OnlineStatus, ActiveChatSession, CallSession,
@@ -2450,13 +2451,15 @@ def _sync_blocked_chatrooms(blocker, blocked, *, is_blocked):
             blocked_by=blocker,
             blocked_at=timezone.now(),
         )
-        return
-
-    chatrooms.filter(blocked_by=blocker).update(
-        is_blocked=False,
-        blocked_by=None,
-        blocked_at=None,
-    )
+    else:
+        chatrooms.filter(blocked_by=blocker).update(
+            is_blocked=False,
+            blocked_by=None,
+            blocked_at=None,
+        )
+    # .update() sends no signals, so the inbox has to be told here.
+    for room_id in chatrooms.values_list('id', flat=True):
+        inbox.touch((blocker.id, blocked.id), inbox.ROOM, room_id)
 
 
 class ChatRoomViewSet(viewsets.ModelViewSet):
@@ -2491,7 +2494,7 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         # (retrieve, archive/unarchive, mute, …) must still resolve an archived
         # room by id — otherwise unarchiving it would 404 (it's archived, so a
         # filtered queryset would exclude it).
-        if self.action != 'list':
+        if self.action not in ('list', 'changes'):
             return qs
 
         archived_param = str(
@@ -2629,6 +2632,9 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
             is_read=True,
             read_at=read_at
         )
+        if unread_messages:
+            unread.recount_room(chatroom, request.user.id)
+            inbox.touch_room(chatroom, user_ids=[request.user.id])
 
         for message_id, sender_id in unread_messages:
             _broadcast_to_user(
@@ -2659,7 +2665,7 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         chatroom.is_blocked = True
         chatroom.blocked_by = request.user
         chatroom.blocked_at = timezone.now()
-        chatroom.save()
+        chatroom.save(update_fields=['is_blocked', 'blocked_by', 'blocked_at', 'updated_at'])
         _sync_blocked_chatrooms(request.user, other_user, is_blocked=True)
         
         return Response({'status': 'user blocked'})
@@ -2680,7 +2686,7 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         chatroom.is_blocked = False
         chatroom.blocked_by = None
         chatroom.blocked_at = None
-        chatroom.save()
+        chatroom.save(update_fields=['is_blocked', 'blocked_by', 'blocked_at', 'updated_at'])
         _sync_blocked_chatrooms(request.user, other_user, is_blocked=False)
 
         return Response({'status': 'user unblocked'})
@@ -2751,6 +2757,42 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
             'purged': purged,
         })
 
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Delta sync for the chat list: ?since=<version> (see inbox.py).
+
+        Same filters as the list (including ?archived=). Returns only the
+        rooms that changed after [since] — `rooms` to upsert, `removed` ids
+        to drop — plus the `version` to send next time; 304 when nothing
+        changed. Without a usable [since] it is a full sync.
+        """
+        return _inbox_changes(self, request, inbox.ROOM, 'rooms')
+
+
+def _inbox_changes(viewset, request, kind, key):
+    """Shared body of ChatRoomViewSet.changes / ChatGroupViewSet.changes."""
+    since = _to_int(request.query_params.get('since'), -1)
+    version = inbox.current_version(request.user)
+    if since == version:
+        return Response(status=status.HTTP_304_NOT_MODIFIED)
+
+    queryset = viewset.filter_queryset(viewset.get_queryset())
+    full = since < 0 or since > version
+    removed = []
+    if not full:
+        changed = inbox.changed_since(request.user, kind, since)
+        queryset = queryset.filter(pk__in=changed)
+    rows = list(queryset)
+    if not full:
+        present = {row.pk for row in rows}
+        removed = [str(pk) for pk in changed - present]
+    return Response({
+        'version': version,
+        'full': full,
+        key: viewset.get_serializer(rows, many=True).data,
+        'removed': removed,
+    })
+
 
 def _broadcast_message_mutation(message, event_type, payload):
     """Push an edit/delete to BOTH participants over the socket.
@@ -2931,7 +2973,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         chatroom = message.chatroom
         chatroom.last_message_at = message.created_at
         chatroom.last_message_preview = message.get_preview()
-        chatroom.save()
+        chatroom.save(update_fields=['last_message_at', 'last_message_preview', 'updated_at'])
         
         # Realtime delivery first (in-process, fast) so the sender's request is
         # never held up by anything network-bound.
@@ -3659,6 +3701,8 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
             group=group, user_id=user_id
         ).update(role='admin')
         if updated:
+            # .update() skips the signals: the roles changed for every member.
+            inbox.touch_group(group.id)
             target = User.objects.filter(id=user_id).first()
             if target:
                 self._system_msg(
@@ -3688,6 +3732,7 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
                             status=400)
         updated = admins.filter(user_id=user_id).update(role='member')
         if updated:
+            inbox.touch_group(group.id)
             target = User.objects.filter(id=user_id).first()
             if target:
                 self._system_msg(
@@ -3706,6 +3751,7 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
             return err
         value = bool(request.data.get('muted', True))
         group.memberships.filter(user=request.user).update(muted=value)
+        inbox.touch_group(group.id, user_ids=[request.user.id])
         return Response({'muted': value})
 
     def _announce_group(self, group, *, extra_user_ids=(), removed_user_ids=()):
@@ -3755,6 +3801,14 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
             # it — the change itself is already committed.
             logger.exception('group_updated broadcast failed')
 
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Delta sync for the group list: ?since=<version>, same contract as
+        ChatRoomViewSet.changes (`groups` / `removed` / `version`, 304 when
+        nothing changed). A group the user left or that was deleted comes
+        back in `removed`."""
+        return _inbox_changes(self, request, inbox.GROUP, 'groups')
+
     @action(detail=True, methods=['post'], url_path='mark-read')
     def mark_read(self, request, pk=None):
         """Stamp this group as read, without fetching anything.
@@ -3767,8 +3821,8 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
         err = self._require_member(group)
         if err:
             return err
-        group.memberships.filter(user=request.user).update(
-            last_read_at=timezone.now())
+        unread.mark_group_read(group.id, request.user.id, timezone.now())
+        inbox.touch_group(group.id, user_ids=[request.user.id])
         return Response({'ok': True})
 
     @action(detail=True, methods=['get', 'post'])
@@ -3844,6 +3898,9 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
         deleted, _ = ChatGroupMembership.objects.filter(
             group=group, user_id=user_id
         ).delete()
+        if deleted:
+            # No longer a member, so the group touches below won't reach them.
+            inbox.touch_group(group.id, user_ids=[user_id])
         if deleted and target:
             self._system_msg(
                 group,
@@ -3864,6 +3921,7 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
         ChatGroupMembership.objects.filter(
             group=group, user=request.user
         ).delete()
+        inbox.touch_group(group.id, user_ids=[request.user.id])
         # A FRESH queryset, not group.memberships.all().
         #
         # get_object() prefetches memberships__user, so .all() handed back the
@@ -3887,6 +3945,7 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
             if oldest is not None:
                 oldest.role = 'admin'
                 oldest.save(update_fields=['role'])
+                inbox.touch_group(group.id)
         # Member count and the possible new admin both changed for everyone
         # still in it; the leaver's own list needs the row gone.
         self._announce_group(
@@ -3920,8 +3979,8 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
             if membership and membership.cleared_at:
                 qs = qs.filter(created_at__gt=membership.cleared_at)
             msgs = list(qs.order_by('-created_at')[:100])[::-1]
-            # Opening the group marks it read — the list's unread badge
-            # (ChatGroupSerializer.unread_count) counts from this stamp.
+            # Opening the group marks it read — stamps last_read_at and zeroes
+            # the member's stored unread counter (adsyconnect/unread.py).
             #
             # But the app POLLS this endpoint, and every poll used to stamp it.
             # A message arriving while the phone was in a pocket, with this
@@ -3932,8 +3991,11 @@ class ChatGroupViewSet(viewsets.ModelViewSet):
                 request.query_params.get('mark_read', '1')
             ).strip().lower() not in {'0', 'false', 'no'}
             if membership and mark_read:
-                membership.last_read_at = timezone.now()
-                membership.save(update_fields=['last_read_at'])
+                unread.mark_group_read(group.id, request.user.id, timezone.now())
+                # Only a read that clears something changes the list; the
+                # open screen re-stamps this on every poll.
+                if membership.unread_count:
+                    inbox.touch_group(group.id, user_ids=[request.user.id])
             return Response(GroupMessageSerializer(
                 msgs, many=True, context={'request': request}
             ).data)
@@ -522,6 +522,50 @@ RIDESHARE_OSRM_FALLBACK_URLS = [
     if url.strip()
 ]
 RIDESHARE_NOMINATIM_URL = os.getenv("RIDESHARE_NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+# Side of the driver-matching grid cell, in degrees (0.02° ≈ 2.2 km). Changing
+# it needs every DriverProfile.geo_cell recomputed (see rideshare.geo_index).
+RIDESHARE_GEO_CELL_DEGREES = float(os.getenv("RIDESHARE_GEO_CELL_DEGREES", "0.02"))
+# Write-behind location pings (rideshare.location_buffer): pings land in the
+# cache and are flushed to Postgres in batches every few seconds. A ping is kept
+# as a trip breadcrumb only after the driver moved TRAIL_MIN_METERS or
+# TRAIL_MIN_SECONDS passed; the rest only update the live position.
+RIDESHARE_LOCATION_WRITE_BEHIND = _env_bool("RIDESHARE_LOCATION_WRITE_BEHIND", False)
+RIDESHARE_LOCATION_TRAIL_MIN_METERS = float(os.getenv("RIDESHARE_LOCATION_TRAIL_MIN_METERS", "20"))
+RIDESHARE_LOCATION_TRAIL_MIN_SECONDS = float(os.getenv("RIDESHARE_LOCATION_TRAIL_MIN_SECONDS", "15"))
+# Route cache + provider breaker (rideshare.route_cache): routes are cached by
+# pickup/drop snapped to a SNAP_DEGREES grid (0.0005° ≈ 50 m) for
+# CACHE_SECONDS, and a provider that fails BREAKER_FAILURES times in a row is
+# skipped for BREAKER_COOLDOWN_SECONDS. Off = a provider call per request.
+RIDESHARE_ROUTE_CACHE = _env_bool("RIDESHARE_ROUTE_CACHE", True)
+RIDESHARE_ROUTE_SNAP_DEGREES = float(os.getenv("RIDESHARE_ROUTE_SNAP_DEGREES", "0.0005"))
+RIDESHARE_ROUTE_CACHE_SECONDS = int(os.getenv("RIDESHARE_ROUTE_CACHE_SECONDS", "1800"))
+RIDESHARE_ROUTE_SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("RIDESHARE_ROUTE_SINGLE_FLIGHT_WAIT_SECONDS", "2.0"))
+RIDESHARE_ROUTE_BREAKER_FAILURES = int(os.getenv("RIDESHARE_ROUTE_BREAKER_FAILURES", "3"))
+RIDESHARE_ROUTE_BREAKER_COOLDOWN_SECONDS = int(os.getenv("RIDESHARE_ROUTE_BREAKER_COOLDOWN_SECONDS", "60"))
+# Place search / reverse geocode (rideshare.place_lookup): provider x query
+# variant calls run concurrently on a WORKERS-thread pool and whatever has
+# answered by DEADLINE_SECONDS is used. Each answer is cached for
+# CACHE_SECONDS by normalised query and a FOCUS_CELL_DEGREES focus cell
+# (0.05° ≈ 5 km); reverse geocodes by the point on a 0.0003° (≈ 30 m) grid.
+RIDESHARE_LOCATION_CACHE = _env_bool("RIDESHARE_LOCATION_CACHE", True)
+RIDESHARE_LOCATION_CACHE_SECONDS = int(os.getenv("RIDESHARE_LOCATION_CACHE_SECONDS", "43200"))
+RIDESHARE_LOCATION_FOCUS_CELL_DEGREES = float(os.getenv("RIDESHARE_LOCATION_FOCUS_CELL_DEGREES", "0.05"))
+RIDESHARE_REVERSE_GEOCODE_SNAP_DEGREES = float(os.getenv("RIDESHARE_REVERSE_GEOCODE_SNAP_DEGREES", "0.0003"))
+RIDESHARE_LOCATION_LOOKUP_DEADLINE_SECONDS = float(os.getenv("RIDESHARE_LOCATION_LOOKUP_DEADLINE_SECONDS", "3.0"))
+RIDESHARE_LOCATION_LOOKUP_WORKERS = int(os.getenv("RIDESHARE_LOCATION_LOOKUP_WORKERS", "16"))
+# Provider calls queued or running at once, across every search in the
+# process; past it a search skips its uncached calls instead of queueing.
+RIDESHARE_LOCATION_LOOKUP_MAX_BACKLOG = int(os.getenv("RIDESHARE_LOCATION_LOOKUP_MAX_BACKLOG", "64"))
+# Nominatim calls a second, across every process (its usage policy allows 1);
+# a search or reverse geocode past it skips Nominatim rather than waiting.
+RIDESHARE_NOMINATIM_MAX_PER_SECOND = float(os.getenv("RIDESHARE_NOMINATIM_MAX_PER_SECOND", "1"))
+# SearchableLocation search / nearest lookups come from a per-process
+# in-memory index (rideshare.location_index). Each process checks for changes
+# made elsewhere every CHECK_SECONDS and rebuilds after MAX_AGE_SECONDS
+# regardless. Off = the icontains / full-scan queries, as before.
+RIDESHARE_LOCATION_INDEX = _env_bool("RIDESHARE_LOCATION_INDEX", True)
+RIDESHARE_LOCATION_INDEX_CHECK_SECONDS = float(os.getenv("RIDESHARE_LOCATION_INDEX_CHECK_SECONDS", "5"))
+RIDESHARE_LOCATION_INDEX_MAX_AGE_SECONDS = float(os.getenv("RIDESHARE_LOCATION_INDEX_MAX_AGE_SECONDS", "600"))
 
 # iOS VoIP/APNs settings for native CallKit incoming calls.
 # APNS_VOIP_TOPIC normally looks like: com.your.bundle.id.voip
@@ -603,8 +647,8 @@ CELERY_BEAT_SCHEDULE = {
     },
     "build-interest-profiles": {
         "task": "business_network.tasks.build_interest_profiles",
-        # Interest Brain: rebuild per-user interest segments from the last
-        # 30 days of activity — after settlement, before morning traffic.
+        # Interest Brain: fold the day's activity into each active user's
+        # decayed interest segments — after settlement, before morning traffic.
         "schedule": crontab(hour=3, minute=15),
     },
     "daily-monetization-earnings": {
@@ -612,6 +656,10 @@ CELERY_BEAT_SCHEDULE = {
         # Nightly refresh of the current month's creator points/pool shares.
         "schedule": crontab(hour=3, minute=30),
     },
+    "drain-email-outbox": {
+        "task": "base.tasks.drain_email_outbox",
+        "schedule": timedelta(seconds=15),  # Send queued email + due retries
+    },
     "auto-approve-tasks": {
         "task": "base.tasks.check_and_auto_approve_tasks",
         "schedule": timedelta(minutes=30),  # Run every 30 minutes
@@ -636,6 +684,14 @@ CELERY_BEAT_SCHEDULE = {
         "task": "rideshare.tasks.cancel_expired_rides",
         "schedule": timedelta(minutes=2),  # Run every 2 minutes to check 15-minute timeouts
     },
+    "flush-feed-impressions": {
+        "task": "business_network.tasks.flush_feed_impressions",
+        "schedule": timedelta(seconds=10),  # Merge buffered PostSeen impressions
+    },
+    "flush-driver-locations": {
+        "task": "rideshare.tasks.flush_driver_locations",
+        "schedule": timedelta(seconds=10),  # Drain write-behind location pings into Postgres
+    },
     "mark-stale-drivers-offline": {
         "task": "rideshare.tasks.mark_stale_drivers_offline",
         "schedule": timedelta(minutes=2),  # Run every 2 minutes to auto-offline stale drivers
@@ -644,10 +700,19 @@ CELERY_BEAT_SCHEDULE = {
         "task": "adsyconnect.tasks.cleanup_stale_call_sessions",
         "schedule": timedelta(minutes=1),  # Clear stuck ringing/joining calls
     },
+    "reconcile-chat-unread": {
+        "task": "adsyconnect.tasks.reconcile_chat_unread",
+        "schedule": crontab(hour=4, minute=10),  # repair drifted chat unread counters, Dhaka time
+    },
     "aggregate-user-engagement-states": {
         "task": "engagement.tasks.aggregate_user_states",
         "schedule": timedelta(minutes=30),  # Roll events into per-user state + lifecycle
     },
+    "refresh-engagement-activity-rollup": {
+        "task": "engagement.tasks.refresh_activity_rollup",
+        # 06:15 Dhaka = 00:15 UTC, just after the (UTC) rollup day closes.
+        "schedule": crontab(hour=6, minute=15),
+    },
     "run-engagement-nudge-engine": {
         "task": "engagement.tasks.run_nudge_engine",
         # Hourly — the single daily followup push (nudge or promo fallback),
@@ -664,6 +729,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "zonal.tasks.refresh_current_zonal_invoices",
         "schedule": timedelta(hours=12),  # keep current-month invoices fresh; no manual run needed
     },
+    "refresh-zonal-rollups": {
+        "task": "zonal.tasks.refresh_zonal_rollups",
+        "schedule": crontab(hour=0, minute=20),  # roll up yesterday (+ trailing 35 days), Dhaka time
+    },
     "generate-zonal-invoices": {
         "task": "zonal.tasks.generate_monthly_zonal_invoices",
         "schedule": crontab(day_of_month=1, hour=8, minute=0),  # 1st of month, 8am Dhaka (crontab is Dhaka-time)
@@ -674,6 +743,24 @@ CELERY_BEAT_SCHEDULE = {
     },
 }
 
+# Ranked Business Network feed scores a bounded per-user candidate pool
+# (business_network.feed_candidates) instead of every visible post. Flip off to
+# fall back to scoring the full table.
+BN_FEED_CANDIDATE_POOL = _env_bool("BN_FEED_CANDIDATE_POOL", True)
+
+# Feed impressions (PostSeen) are appended to a cache log on the request path
+# and merged into Postgres in batches by flush_feed_impressions. Off = write
+# them inline on every feed page, as before.
+BN_IMPRESSIONS_WRITE_BEHIND = _env_bool("BN_IMPRESSIONS_WRITE_BEHIND", True)
+
+# The nightly Interest Brain rebuild splits active users across this many
+# celery tasks (by user id), so it can run on several workers at once.
+BN_INTEREST_BRAIN_SHARDS = int(os.getenv("BN_INTEREST_BRAIN_SHARDS", "1"))
+
+# Zonal dashboard / invoices read finished days from the ZonalDailyMetric
+# rollup and only the rest live. Off = every figure from the live tables.
+ZONAL_METRIC_ROLLUPS = _env_bool("ZONAL_METRIC_ROLLUPS", True)
+
 # --- Engagement / assistant-brain nudge engine ---
 # Master switch + guard rails. Nudges only deliver during the daytime window,
 # at most one per user per day, with per-nudge cooldowns handled in code.
@@ -758,6 +845,19 @@ EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "AdsyClub <support@adsyclub.com>")
 ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "")
 
+# Non-blocking email (_send_email without wait=True) is queued in the EmailOutbox
+# table and sent by base.email_outbox over a small pool of long-lived SMTP
+# connections. Off = the old thread + fresh connection per message.
+EMAIL_OUTBOX_ENABLED = _env_bool("EMAIL_OUTBOX_ENABLED", True)
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "4"))
+# Provider quota, across the whole pool: sends per second and per day (0 = no cap).
+EMAIL_OUTBOX_PER_SECOND = int(os.getenv("EMAIL_OUTBOX_PER_SECOND", "10"))
+EMAIL_OUTBOX_PER_DAY = int(os.getenv("EMAIL_OUTBOX_PER_DAY", "0"))
+# Messages per SMTP connection before it is recycled (servers cap this).
+EMAIL_OUTBOX_PER_CONNECTION = int(os.getenv("EMAIL_OUTBOX_PER_CONNECTION", "100"))
+# Transient failures retry with backoff (30s, 1m, 2m, …) up to this many attempts.
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+
 # TinyMCE Configuration
 TINYMCE_DEFAULT_CONFIG = {
     "plugins": [
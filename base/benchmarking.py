@@ -0,0 +1,182 @@
+"""Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks build their synthetic data inside one transaction and roll it back
+at the end, so they can be pointed at a staging copy of the real database
+without leaving anything behind.
+"""
+import socketserver
+import statistics
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from base.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+@contextmanager
+def count_queries():
+    """Yield a CaptureQueriesContext; ``len(ctx)`` is the statement count."""
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+
+
+def synthetic_users(count, prefix="bench", batch_size=2000):
+    """Bulk-create ``count`` throwaway users and return them (with ids)."""
+    tag = uuid.uuid4().hex[:6]
+    users = [
+        User(
+            username=f"{prefix}_{tag}_{i}",
+            email=f"{prefix}_{tag}_{i}@bench.invalid",
+            phone=None,
+            referral_code=uuid.uuid4().hex[:10],
+        )
+        for i in range(count)
+    ]
+    return User.objects.bulk_create(users, batch_size=batch_size)
+
+
+def measure(fn, iterations=20):
+    """Call ``fn`` ``iterations`` times; return latency stats in milliseconds."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "mean": statistics.fmean(samples),
+    }
+
+
+def format_stats(stats):
+    return "p50 %.2fms  p99 %.2fms  mean %.2fms" % (
+        stats["p50"], stats["p99"], stats["mean"])
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib / Django's SMTP backend (no TLS; AUTH
+    PLAIN only when the sink is given ``auth``)."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        if sink.handshake:
+            time.sleep(sink.handshake)
+        self.reply("220 sink ESMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                if sink.auth and verb == "EHLO":
+                    self.reply("250-sink")
+                    self.reply("250 AUTH PLAIN")
+                else:
+                    self.reply("250 sink")
+            elif verb == "AUTH":
+                if sink.auth == "accept":
+                    self.reply("235 2.7.0 Authentication successful")
+                else:
+                    self.reply("535 5.7.8 Authentication credentials invalid")
+            elif verb == "MAIL" and sink.refuse_sender:
+                recipients = []
+                self.reply(sink.refuse_sender)
+            elif verb in ("MAIL", "RSET"):
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[-1].strip().strip("<>").lower()
+                if address in sink.refuse:
+                    self.reply("550 5.1.1 No such user")
+                elif address in sink.defer:
+                    self.reply("451 4.2.1 Try again later")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                if not recipients:
+                    self.reply("503 No valid recipients")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for chunk in iter(self.rfile.readline, b""):
+                    if chunk in (b".\r\n", b".\n"):
+                        break
+                    data.append(chunk)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                with sink.lock:
+                    sink.messages.append((list(recipients), b"".join(data)))
+                self.reply("250 OK queued")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+@contextmanager
+def smtp_sink(refuse=(), defer=(), latency=0.0, handshake=0.0, auth=None,
+              refuse_sender=None):
+    """Run a throwaway SMTP server on localhost for the block.
+
+    Yields an object with ``port``, ``messages`` (a list of (recipients, raw
+    bytes)) and ``connections`` (how many SMTP sessions were opened).
+    Recipients in ``refuse`` get a permanent 550, those in ``defer`` a
+    temporary 451. ``latency`` seconds are spent accepting each message and
+    ``handshake`` seconds greeting each connection, like a real provider.
+    ``auth`` ("accept" or "reject") offers AUTH PLAIN and answers every login
+    that way; ``refuse_sender`` is a reply line sent to every MAIL FROM (e.g.
+    a quota refusal). All of these can be changed on the sink mid-block.
+    """
+    server = _SmtpSink(("127.0.0.1", 0), _SmtpHandler)
+    server.sink = sink = type("Sink", (), {})()
+    sink.port = server.server_address[1]
+    sink.messages, sink.connections, sink.lock = [], 0, threading.Lock()
+    sink.refuse = {a.lower() for a in refuse}
+    sink.defer = {a.lower() for a in defer}
+    sink.latency, sink.handshake = latency, handshake
+    sink.auth, sink.refuse_sender = auth, refuse_sender
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield sink
+    finally:
+        server.shutdown()
+        server.server_close()
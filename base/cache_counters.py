@@ -0,0 +1,23 @@
+"""Atomic counters on the Django cache.
+
+``cache.incr`` is atomic on Redis and LocMemCache alike but raises on a
+missing key, and ``cache.add`` + ``cache.incr`` can still lose the key to an
+eviction in between. ``incr`` covers both, for the stats, rate-limit and
+write-behind sequence counters kept in the cache.
+"""
+from django.core.cache import cache
+
+
+def incr(key, delta=1, timeout=None):
+    """Add ``delta`` to the counter at ``key`` (created with ``timeout`` when
+    missing; None keeps it) and return the new value."""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add() and incr(); the counter restarts.
+        cache.set(key, delta, timeout)
+        return delta
@@ -9,7 +9,7 @@ from django.contrib import messages
 from django.utils.safestring import mark_safe
 from django.http import HttpResponseRedirect
 from django.urls import reverse
-from .models import EmailSettings
+from .models import EmailOutbox, EmailSettings
 
 
 class RevealablePasswordInput(forms.PasswordInput):
@@ -339,3 +339,27 @@ class ValidEmailAdmin(admin.ModelAdmin):
     def move_to_unsubscribed(self, request, queryset):
         self._block(request, queryset, "unsubscribed", "UNSUBSCRIBED")
     move_to_unsubscribed.short_description = "Move selected to UNSUBSCRIBED"
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Queued outgoing email (see base.email_outbox). "Pending" rows are waiting
+    for the outbox worker or a retry; "Failed" ones ran out of attempts or were
+    refused. "Retry now" puts selected rows back in the queue."""
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at", "last_error", "created_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "last_error")
+    ordering = ("-id",)
+    readonly_fields = ("subject", "to", "text_content", "html_content", "attempts",
+                       "last_error", "created_at", "sent_at")
+    actions = ["retry_now"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+        n = queryset.exclude(status="sent").update(
+            status="pending", attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"{n} email(s) queued again.", level=messages.SUCCESS)
+    retry_now.short_description = "Retry selected now"
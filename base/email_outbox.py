@@ -0,0 +1,398 @@
+"""Durable outbox for outgoing email, sent over pooled SMTP connections.
+
+``_send_email(wait=False)`` used to start a thread per message, and each
+thread re-read EmailSettings and opened (and TLS-negotiated) its own SMTP
+connection for that one message — a burst of notifications meant a burst of
+threads and handshakes. It now calls ``enqueue``, which writes an EmailOutbox
+row and asks a worker to drain the queue once the surrounding transaction
+commits. ``drain`` then:
+
+  * claims due rows CLAIM_BATCH at a time (SELECT ... FOR UPDATE SKIP LOCKED,
+    leased by pushing ``next_attempt_at`` forward, so a crashed drain's rows
+    come back on their own and two drains never share a row);
+  * sends them from a pool of EMAIL_OUTBOX_WORKERS threads, each holding one
+    open SMTP connection for many messages (recycled every
+    EMAIL_OUTBOX_PER_CONNECTION sends, or after a connection error);
+  * paces the pool to EMAIL_OUTBOX_PER_SECOND and stops for the day at
+    EMAIL_OUTBOX_PER_DAY, the provider's quota;
+  * retries transient failures (4xx replies, dropped connections, timeouts)
+    with exponential backoff up to EMAIL_OUTBOX_MAX_ATTEMPTS, and feeds
+    permanent recipient refusals (5xx) into ``suppress_email``;
+  * stops at the first failure that is about the account rather than the
+    message — can't connect, login refused, sender refused or over quota —
+    since every other row would hit it too: the batch's rows are put back
+    for HOLD without using up an attempt.
+
+Only the calling thread touches the database; the pool threads only talk
+SMTP. ``drain`` returns throughput stats, which the task logs.
+"""
+import logging
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache_counters import incr
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 200
+LEASE = timedelta(minutes=10)
+RETRY_BASE = timedelta(seconds=30)
+HOLD = timedelta(minutes=5)  # how long rows wait after the drain was stopped
+DRAIN_BUDGET = 240          # seconds one drain task may run before handing over
+KICK_KEY = "emailoutbox:kick"
+KICK_WINDOW = 5             # one drain request per burst of enqueues
+DRAIN_LOCK_KEY = "emailoutbox:drain"
+QUOTA_KEY = "emailoutbox:sent:%s"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(subject, to_email, text_content, html_content):
+    """Queue one email for the outbox worker. Returns True once queued. Falls
+    back to the old per-message thread if the outbox can't be written, so a
+    queued send never fails the caller."""
+    from .models import EmailOutbox
+
+    recipients = to_email if isinstance(to_email, (list, tuple)) else [to_email]
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return False
+    try:
+        EmailOutbox.objects.create(
+            subject=(subject or "")[:998],
+            to=recipients,
+            text_content=text_content or "",
+            html_content=html_content or "",
+        )
+    except Exception as exc:
+        logger.warning(f"email outbox unavailable, sending inline: {exc}")
+        from .email_service import _dispatch_async, _send_email
+        _dispatch_async(
+            _send_email, subject, to_email, text_content, html_content, wait=True
+        )
+        return True
+    transaction.on_commit(_kick)
+    return True
+
+
+def enqueue_many(messages):
+    """Queue many emails in one insert; ``messages`` are (subject, to_email,
+    text_content, html_content[, dedupe_key]). A message whose dedupe_key is
+    already in the outbox is skipped. Returns the number of messages given a
+    row (skipped duplicates included: Postgres does not say which they were)."""
+    from .models import EmailOutbox
+
+    rows = []
+    for subject, to_email, text_content, html_content, *key in messages:
+        recipients = to_email if isinstance(to_email, (list, tuple)) else [to_email]
+        recipients = [r for r in recipients if r]
+        if recipients:
+            rows.append(EmailOutbox(
+                subject=(subject or "")[:998],
+                to=recipients,
+                text_content=text_content or "",
+                html_content=html_content or "",
+                dedupe_key=key[0] if key else None,
+            ))
+    if rows:
+        EmailOutbox.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+        transaction.on_commit(_kick)
+    return len(rows)
+
+
+def _kick():
+    """Ask a celery worker to drain now; a burst of enqueues shares one
+    request. The beat schedule drains regardless, so this is best-effort."""
+    try:
+        if cache.add(KICK_KEY, 1, KICK_WINDOW):
+            from .tasks import drain_email_outbox
+            drain_email_outbox.delay()
+    except Exception as exc:
+        logger.warning(f"email outbox kick failed: {exc}")
+
+
+class _RateLimiter:
+    """Spaces sends from every pool thread at least 1/per_second apart."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second > 0 else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class _ConnectionPool:
+    """One open SMTP connection per pool thread, reused across messages."""
+
+    def __init__(self, email_settings, per_connection):
+        self.email_settings = email_settings
+        self.per_connection = max(1, per_connection)
+        self.opened = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def get(self):
+        from .email_service import _smtp_connection
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.sends >= self.per_connection:
+            self.discard()
+            conn = None
+        if conn is None:
+            conn = _smtp_connection(self.email_settings)
+            conn.open()
+            self._local.conn, self._local.sends = conn, 0
+            with self._lock:
+                self._all.append(conn)
+                self.opened += 1
+        self._local.sends += 1
+        return conn
+
+    def discard(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+# Replies about the sending account, not this message: auth required or
+# refused, and (enhanced status x.4.5 / x.7.8) quota or credentials trouble.
+_ACCOUNT_CODES = {421, 454, 530, 534, 535}
+_ACCOUNT_STATUSES = (b"5.4.5", b"4.4.5", b"5.7.8", b"4.7.8")
+
+
+def _account_refusal(exc):
+    if isinstance(exc, (smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError)):
+        return True
+    error = exc.smtp_error if isinstance(exc.smtp_error, bytes) else str(exc.smtp_error).encode()
+    return exc.smtp_code in _ACCOUNT_CODES or error.lstrip().startswith(_ACCOUNT_STATUSES)
+
+
+def _send_one(pool, limiter, halt, row, prepared, from_email):
+    """Send one claimed row on this thread's connection → (row, outcome,
+    detail). outcome is "sent", "retry", "failed", "bounced" (detail is then
+    the refused addresses) or "held" — the account can't send right now, so
+    ``halt`` is set and the rest of the batch is not tried."""
+    from .email_service import _build_message
+
+    if halt.is_set():
+        return row, "held", "drain stopped"
+    recipients, text_content, html_content = prepared
+    limiter.wait()
+    try:
+        connection = pool.get()
+    except Exception as exc:
+        # Can't connect or log in: every other row would fail the same way.
+        halt.set()
+        return row, "held", f"connect: {type(exc).__name__}: {exc}"
+    try:
+        _build_message(
+            row.subject, recipients, text_content, html_content,
+            from_email, connection,
+        ).send()
+        return row, "sent", ""
+    except smtplib.SMTPRecipientsRefused as exc:
+        refused = exc.recipients or {}
+        hard = [addr for addr, (code, _msg) in refused.items() if 500 <= code < 600]
+        if hard and len(hard) == len(refused):
+            return row, "bounced", hard
+        # 4xx for a recipient is the server saying "not now" (greylisting,
+        # mailbox busy): try again later.
+        return row, "retry", f"recipients deferred: {refused}"
+    except smtplib.SMTPResponseException as exc:
+        if _account_refusal(exc):
+            halt.set()
+            pool.discard()
+            return row, "held", f"{exc.smtp_code} {exc.smtp_error!r}"
+        if 500 <= exc.smtp_code < 600:
+            return row, "failed", f"{exc.smtp_code} {exc.smtp_error!r}"
+        pool.discard()
+        return row, "retry", f"{exc.smtp_code} {exc.smtp_error!r}"
+    except Exception as exc:
+        # Dropped connection, timeout, DNS, TLS… the next attempt reconnects.
+        pool.discard()
+        return row, "retry", f"{type(exc).__name__}: {exc}"
+
+
+def _claim(size):
+    from .models import EmailOutbox
+
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:size]
+        )
+        if rows:
+            EmailOutbox.objects.filter(pk__in=[r.pk for r in rows]).update(
+                next_attempt_at=now + LEASE)
+    return rows
+
+
+def _quota_room():
+    """Sends left today under EMAIL_OUTBOX_PER_DAY, or None for no cap."""
+    per_day = _setting("EMAIL_OUTBOX_PER_DAY", 0)
+    if not per_day:
+        return None
+    used = cache.get(QUOTA_KEY % timezone.localdate()) or 0
+    return max(0, per_day - used)
+
+
+def _count_sent(n):
+    if not n or not _setting("EMAIL_OUTBOX_PER_DAY", 0):
+        return
+    key = QUOTA_KEY % timezone.localdate()
+    try:
+        incr(key, n, 60 * 60 * 48)
+    except Exception as exc:
+        logger.warning(f"email outbox quota counter failed: {exc}")
+
+
+def _record(results, stats):
+    """Write a batch's outcomes back in a few statements."""
+    from .email_service import suppress_email
+    from .models import EmailOutbox
+
+    now = timezone.now()
+    max_attempts = _setting("EMAIL_OUTBOX_MAX_ATTEMPTS", 6)
+    sent = [row.pk for row, outcome, _ in results if outcome == "sent"]
+    if sent:
+        EmailOutbox.objects.filter(pk__in=sent).update(
+            status="sent", sent_at=now, attempts=F("attempts") + 1, last_error="")
+    changed = []
+    for row, outcome, detail in results:
+        if outcome == "sent":
+            continue
+        if outcome == "held":
+            # Not this row's fault: back in the queue, attempt not counted.
+            row.next_attempt_at, row.last_error = now + HOLD, detail[:255]
+            stats["held"] += 1
+            changed.append(row)
+            continue
+        row.attempts += 1
+        if outcome == "bounced":
+            for addr in detail:
+                suppress_email(addr, reason="bounced", note="SMTP recipient refused")
+            row.status, row.last_error = "failed", f"refused: {', '.join(detail)}"
+            stats["bounced"] += 1
+        elif outcome == "retry" and row.attempts < max_attempts:
+            row.next_attempt_at = now + RETRY_BASE * (2 ** (row.attempts - 1))
+            row.last_error = detail
+            stats["retried"] += 1
+        else:
+            row.status, row.last_error = "failed", detail
+            stats["failed"] += 1
+        row.last_error = row.last_error[:255]
+        changed.append(row)
+    if changed:
+        EmailOutbox.objects.bulk_update(
+            changed, ["status", "attempts", "next_attempt_at", "last_error"])
+    stats["sent"] += len(sent)
+    _count_sent(len(sent))
+
+
+def drain(*, workers=None, budget=None, limit=None):
+    """Send due outbox rows until the queue is empty, ``budget`` seconds have
+    passed, ``limit`` rows were handled or the daily quota is used up.
+
+    Also stops, putting the batch back, when the account can't send (see
+    ``_send_one``). Returns {"sent", "retried", "failed", "bounced", "held",
+    "connections", "seconds", "per_second"}.
+    """
+    from .email_service import _from_address, _get_email_settings, _prepare_email
+
+    workers = workers or _setting("EMAIL_OUTBOX_WORKERS", 4)
+    stats = {"sent": 0, "retried": 0, "failed": 0, "bounced": 0, "held": 0}
+    started = time.monotonic()
+    email_settings = _get_email_settings()
+    from_email = _from_address(email_settings)
+    pool = _ConnectionPool(email_settings, _setting("EMAIL_OUTBOX_PER_CONNECTION", 100))
+    limiter = _RateLimiter(_setting("EMAIL_OUTBOX_PER_SECOND", 10))
+    halt = threading.Event()
+    handled = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while not budget or time.monotonic() - started < budget:
+                size = CLAIM_BATCH if not limit else min(CLAIM_BATCH, limit - handled)
+                room = _quota_room()
+                if room is not None:
+                    if not room:
+                        logger.info("email outbox: daily quota reached")
+                    size = min(size, room)
+                if size <= 0:
+                    break
+                rows = _claim(size)
+                if not rows:
+                    break
+                handled += len(rows)
+                results, jobs = [], []
+                for row in rows:
+                    prepared = _prepare_email(row.to, row.text_content, row.html_content)
+                    if prepared is None:
+                        results.append((row, "failed", "no deliverable recipients"))
+                    else:
+                        jobs.append((row, prepared))
+                results += executor.map(
+                    lambda job: _send_one(pool, limiter, halt, job[0], job[1], from_email),
+                    jobs)
+                _record(results, stats)
+                if halt.is_set():
+                    reason = next((d for _r, o, d in results
+                                   if o == "held" and d != "drain stopped"), "")
+                    logger.warning(f"email outbox: stopped, account can't send: {reason}")
+                    break
+    finally:
+        pool.close()
+    stats["connections"] = pool.opened
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    stats["per_second"] = (
+        round(stats["sent"] / stats["seconds"], 1) if stats["seconds"] else 0)
+    if handled:
+        logger.info(f"email outbox drained: {stats}")
+    return stats
+
+
+def drain_exclusive(**kwargs):
+    """``drain`` unless another drain is already running (the beat schedule
+    and enqueue kicks would otherwise stack up workers and connections)."""
+    if not cache.add(DRAIN_LOCK_KEY, 1, DRAIN_BUDGET + 60):
+        return {"skipped": True}
+    try:
+        return drain(budget=DRAIN_BUDGET, **kwargs)
+    finally:
+        cache.delete(DRAIN_LOCK_KEY)
+
@@ -156,11 +156,12 @@ def _logo_url():
     return f"{SITE_URL}/static/frontend/images/logo.png"
 
 
-def _base_template(title, body_content, footer_note=""):
+def _base_template(title, body_content, footer_note="", logo=None):
     """Base HTML email — international-grade layout: brand accent, AdsyClub logo
     header, clean body and a professional multi-link footer. Built with tables +
-    inline styles for maximum email-client compatibility."""
-    logo = _logo_url()
+    inline styles for maximum email-client compatibility. Bulk senders pass
+    ``logo`` (one _logo_url() per run) to skip the per-mail lookup."""
+    logo = logo or _logo_url()
     year = timezone.now().year
 
     note_html = ""
@@ -627,74 +628,99 @@ def _valid_email_syntax(email):
         return False
 
 
+def _smtp_connection(email_settings):
+    """An SMTP backend for the configured server (not yet opened)."""
+    return get_connection(
+        host=email_settings['host'],
+        port=email_settings['port'],
+        use_tls=email_settings['use_tls'],
+        username=email_settings['host_user'],
+        password=email_settings['host_password'],
+    )
+
+
+def _from_address(email_settings):
+    """Show the sender as "AdsyClub <address>" (clean display name)."""
+    raw_from = email_settings['from_email']
+    from_addr = parseaddr(raw_from)[1] or raw_from
+    return formataddr((SITE_NAME, from_addr))
+
+
+def _prepare_email(to_email, text_content, html_content):
+    """Deliverable recipients + personalised bodies, or None if nobody is left.
+
+    Drops blanks + syntactically invalid addresses (can't be delivered at all)
+    and remembers those. We intentionally do NOT skip suppressed addresses
+    here: transactional/security mail (OTP, password reset, KYC, withdraw…)
+    must always try, since the user may have fixed a previously-bad address.
+    Marketing/engagement mail skips the suppression list itself before it
+    ever calls _send_email (see send_engagement_email / the CEO backfill).
+    """
+    # Accept a single address or a list of addresses.
+    recipients = to_email if isinstance(to_email, (list, tuple)) else [to_email]
+    clean = []
+    for r in recipients:
+        if not r:
+            continue
+        if not _valid_email_syntax(r):
+            suppress_email(r, reason="invalid", note="bad address format")
+            continue
+        clean.append(r)
+    if not clean:
+        return None
+
+    # Swap the donate + unsubscribe placeholders for unique per-recipient
+    # links (single, known recipient only; generic for multi-recipient).
+    single = clean[0] if len(clean) == 1 else None
+    donate_url = _donate_url_for(single or clean)
+    unsub_url = _unsub_url_for(single)
+    html_content = (html_content or "").replace(DONATE_PLACEHOLDER, donate_url).replace(UNSUB_PLACEHOLDER, unsub_url)
+    text_content = (text_content or "").replace(DONATE_PLACEHOLDER, donate_url).replace(UNSUB_PLACEHOLDER, unsub_url)
+    return clean, text_content, html_content
+
+
+def _build_message(subject, recipients, text_content, html_content, from_email, connection):
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content,
+        from_email=from_email,
+        to=list(recipients),
+        connection=connection,
+    )
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
 def _send_email(subject, to_email, text_content, html_content, wait=False):
     """Send email with HTML and plain text fallback.
 
-    By default the actual SMTP send runs on a background thread and this
-    returns True immediately, so notification emails (transfers, deposits,
-    withdrawals, gig orders, KYC, post-approved, …) never block the HTTP
-    request — each send opens its own SMTP connection (~1-2s). Pass wait=True
-    only where the caller needs the real delivery result: OTP / password reset,
-    the admin "send test email" action, and flows that persist a sent flag.
+    By default the message is queued in the EmailOutbox and this returns True
+    immediately, so notification emails (transfers, deposits, withdrawals, gig
+    orders, KYC, post-approved, …) never block the HTTP request; the outbox
+    worker sends the queue over a few pooled SMTP connections (see
+    base.email_outbox). Pass wait=True only where the caller needs the real
+    delivery result: OTP / password reset, the admin "send test email" action,
+    and flows that persist a sent flag — that path opens its own connection.
     """
     if not wait:
+        if getattr(settings, "EMAIL_OUTBOX_ENABLED", True):
+            from .email_outbox import enqueue
+            return enqueue(subject, to_email, text_content, html_content)
         _dispatch_async(
             _send_email, subject, to_email, text_content, html_content, wait=True
         )
         return True
     try:
         email_settings = _get_email_settings()
-        
-        # Configure email backend dynamically
-        connection = get_connection(
-            host=email_settings['host'],
-            port=email_settings['port'],
-            use_tls=email_settings['use_tls'],
-            username=email_settings['host_user'],
-            password=email_settings['host_password'],
-        )
-        
-        # Show the sender as "AdsyClub <address>" (clean display name).
-        raw_from = email_settings['from_email']
-        from_addr = parseaddr(raw_from)[1] or raw_from
-        from_email = formataddr((SITE_NAME, from_addr))
-
-        # Accept a single address or a list of addresses.
-        recipients = to_email if isinstance(to_email, (list, tuple)) else [to_email]
-        # Drop blanks + syntactically invalid addresses (can't be delivered at all)
-        # and remember those. We intentionally do NOT skip suppressed addresses
-        # here: transactional/security mail (OTP, password reset, KYC, withdraw…)
-        # must always try, since the user may have fixed a previously-bad address.
-        # Marketing/engagement mail skips the suppression list itself before it
-        # ever calls _send_email (see send_engagement_email / the CEO backfill).
-        clean = []
-        for r in recipients:
-            if not r:
-                continue
-            if not _valid_email_syntax(r):
-                suppress_email(r, reason="invalid", note="bad address format")
-                continue
-            clean.append(r)
-        if not clean:
+        prepared = _prepare_email(to_email, text_content, html_content)
+        if prepared is None:
             return False
+        clean, text_content, html_content = prepared
 
-        # Swap the donate + unsubscribe placeholders for unique per-recipient
-        # links (single, known recipient only; generic for multi-recipient).
-        single = clean[0] if len(clean) == 1 else None
-        donate_url = _donate_url_for(single or clean)
-        unsub_url = _unsub_url_for(single)
-        html_content = (html_content or "").replace(DONATE_PLACEHOLDER, donate_url).replace(UNSUB_PLACEHOLDER, unsub_url)
-        text_content = (text_content or "").replace(DONATE_PLACEHOLDER, donate_url).replace(UNSUB_PLACEHOLDER, unsub_url)
-
-        msg = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email=from_email,
-            to=list(clean),
-            connection=connection,
-        )
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        _build_message(
+            subject, clean, text_content, html_content,
+            _from_address(email_settings), _smtp_connection(email_settings),
+        ).send()
 
         logger.info(f"Email sent: '{subject}' to {clean}")
         return True
@@ -2211,48 +2237,16 @@ def _engagement_content_html(feature):
 
 
 
-def send_bn_digest_email(user):
-    """Weekly Business Network community digest — the social-network pull:
-    who followed you, how your posts performed, and faces you may know.
-    Every block links back into the app to bring the user home."""
-    if not getattr(user, "email", ""):
-        return False
-    from django.contrib.auth import get_user_model
-    from business_network.models import (
-        BusinessNetworkFollowerModel,
-        BusinessNetworkPostLike,
-    )
-
-    User = get_user_model()
-    name = user.name or user.first_name or user.username or "there"
-    week_ago = timezone.now() - timedelta(days=7)
-
-    follower_rows = list(
-        BusinessNetworkFollowerModel.objects.filter(
-            following=user, created_at__gte=week_ago
-        ).select_related("follower").order_by("-created_at")[:8]
-    )
-    new_followers = [r.follower for r in follower_rows]
-    follower_count = len(follower_rows)
-    likes_count = BusinessNetworkPostLike.objects.filter(
-        post__author=user, created_at__gte=week_ago
-    ).count()
+DIGEST_BATCH = 1000
+DIGEST_SUGGESTION_POOL = 60   # newest members with a photo, shared by a run
+DIGEST_PROMO_VARIANTS = 8     # promo blocks rendered per run, picked at random
+DIGEST_PACING = 0.4           # seconds between direct sends with the outbox off
 
-    following_ids = list(
-        BusinessNetworkFollowerModel.objects.filter(follower=user)
-        .values_list("following_id", flat=True)
-    )
-    suggestion_pool = list(
-        User.objects.exclude(id=user.id)
-        .exclude(id__in=following_ids)
-        .exclude(image="")
-        .exclude(image=None)
-        .filter(is_active=True)
-        .order_by("-date_joined")[:20]
-    )
-    random.shuffle(suggestion_pool)
-    suggestions = suggestion_pool[:4]
 
+def _bn_digest_message(user, *, follower_count, likes_count, new_followers,
+                       suggestions, promo_html, logo=None):
+    """(subject, text, html) of one weekly digest from already-fetched stats."""
+    name = user.name or user.first_name or user.username or "there"
     subject = "এই সপ্তাহে আপনার নেটওয়ার্কে যা হলো"
     text = (
         f"হ্যালো {name}, এই সপ্তাহে আপনার {follower_count} জন নতুন ফলোয়ার এবং পোস্টে {likes_count}টা লাইক এসেছে।"
@@ -2295,12 +2289,219 @@ def send_bn_digest_email(user):
 {suggestions_block}
 
 {_button("কমিউনিটিতে ফিরে আসুন", SITE_URL + "/business-network")}
-{_service_promo_html("bn")}
+{promo_html}
 """
 
-    html = _base_template(subject, body)
+    return subject, text, _base_template(subject, body, logo=logo)
+
+
+def send_bn_digest_email(user):
+    """Weekly Business Network community digest — the social-network pull:
+    who followed you, how your posts performed, and faces you may know.
+    Every block links back into the app to bring the user home.
+
+    One recipient, fetched and rendered on its own (previews, one-offs); the
+    weekly run goes through send_bn_digest_emails."""
+    if not getattr(user, "email", ""):
+        return False
+    from django.contrib.auth import get_user_model
+    from business_network.models import (
+        BusinessNetworkFollowerModel,
+        BusinessNetworkPostLike,
+    )
+
+    User = get_user_model()
+    week_ago = timezone.now() - timedelta(days=7)
+
+    new_since = BusinessNetworkFollowerModel.objects.filter(
+        following=user, created_at__gte=week_ago
+    )
+    follower_rows = list(
+        new_since.select_related("follower").order_by("-created_at")[:4]
+    )
+    new_followers = [r.follower for r in follower_rows]
+    follower_count = new_since.count()
+    likes_count = BusinessNetworkPostLike.objects.filter(
+        post__author=user, created_at__gte=week_ago
+    ).count()
+
+    following_ids = list(
+        BusinessNetworkFollowerModel.objects.filter(follower=user)
+        .values_list("following_id", flat=True)
+    )
+    suggestion_pool = list(
+        User.objects.exclude(id=user.id)
+        .exclude(id__in=following_ids)
+        .exclude(image="")
+        .exclude(image=None)
+        .filter(is_active=True)
+        .order_by("-date_joined")[:20]
+    )
+    random.shuffle(suggestion_pool)
+    suggestions = suggestion_pool[:4]
+
+    subject, text, html = _bn_digest_message(
+        user,
+        follower_count=follower_count,
+        likes_count=likes_count,
+        new_followers=new_followers,
+        suggestions=suggestions,
+        promo_html=_service_promo_html("bn"),
+    )
     return _send_email(subject, user.email, text, html)
 
+
+def send_bn_digest_emails(users, *, dry_run=False):
+    """The weekly digest for many users at once.
+
+    Per DIGEST_BATCH recipients: one grouped query each for new-follower
+    counts, the latest followers to show, post-like counts and which of the
+    run's suggestion pool they already follow, plus one suppression check —
+    instead of four queries and a full render per user. The logo, the
+    suggestion pool and DIGEST_PROMO_VARIANTS promo blocks are fetched and
+    rendered once per run. Finished messages go to the email outbox in one
+    insert per batch; its pooled, rate-limited worker does the sending. With
+    EMAIL_OUTBOX_ENABLED off they are sent directly, paced, as before.
+    ``dry_run`` builds everything but queues nothing.
+
+    Each message carries a per-user, per-week key, so a retried run does not
+    queue anyone twice. A user whose digest fails to build, or a batch whose
+    queries fail, is logged and skipped.
+
+    ``users``: an iterable of User instances. Returns {"recipients",
+    "queued", "suppressed", "failed"}.
+    """
+    import time
+
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.db.models import Count, F, Window
+    from django.db.models.functions import RowNumber
+    from business_network.models import (
+        BusinessNetworkFollowerModel,
+        BusinessNetworkPostLike,
+    )
+    from .email_outbox import enqueue_many
+    from .models import EmailSuppression
+
+    User = get_user_model()
+    week_ago = timezone.now() - timedelta(days=7)
+    year, week, _ = timezone.localdate().isocalendar()
+    use_outbox = getattr(settings, "EMAIL_OUTBOX_ENABLED", True)
+    logo = _logo_url()
+    promos = [_service_promo_html("bn") for _ in range(DIGEST_PROMO_VARIANTS)]
+    pool = list(
+        User.objects.exclude(image="")
+        .exclude(image=None)
+        .filter(is_active=True)
+        .order_by("-date_joined")[:DIGEST_SUGGESTION_POOL]
+    )
+    pool_ids = [u.pk for u in pool]
+    stats = {"recipients": 0, "queued": 0, "suppressed": 0, "failed": 0}
+
+    def _deliver(messages):
+        if dry_run:
+            return
+        if use_outbox:
+            enqueue_many(messages)
+            return
+        for subject, to_email, text, html, key in messages:
+            # No outbox row to hold the key: the cache does, for the week.
+            if not cache.add(key, 1, 60 * 60 * 24 * 8):
+                continue
+            try:
+                _send_email(subject, to_email, text, html, wait=True)
+            except Exception:
+                logger.exception("bn digest to %s failed", to_email)
+            time.sleep(DIGEST_PACING)
+
+    def _flush(batch):
+        ids = [u.pk for u in batch]
+        suppressed = set(
+            EmailSuppression.objects.filter(
+                email__in={_norm_email(u.email) for u in batch}
+            ).values_list("email", flat=True)
+        )
+        new_since = BusinessNetworkFollowerModel.objects.filter(
+            following_id__in=ids, created_at__gte=week_ago
+        )
+        follower_counts = dict(
+            new_since.order_by().values("following_id")
+            .annotate(n=Count("id")).values_list("following_id", "n")
+        )
+        latest = list(
+            new_since.annotate(rank=Window(
+                RowNumber(), partition_by=[F("following_id")],
+                order_by=F("created_at").desc(),
+            )).filter(rank__lte=4).values_list("following_id", "follower_id")
+        )
+        people = User.objects.only(
+            "id", "image", "name", "first_name", "username"
+        ).in_bulk({follower for _, follower in latest})
+        new_followers = {}
+        for following, follower in latest:
+            if follower in people:
+                new_followers.setdefault(following, []).append(people[follower])
+        likes = dict(
+            BusinessNetworkPostLike.objects.filter(
+                post__author_id__in=ids, created_at__gte=week_ago
+            ).order_by().values("post__author_id")
+            .annotate(n=Count("id")).values_list("post__author_id", "n")
+        )
+        followed = {}
+        for follower, following in BusinessNetworkFollowerModel.objects.filter(
+            follower_id__in=ids, following_id__in=pool_ids
+        ).values_list("follower_id", "following_id"):
+            followed.setdefault(follower, set()).add(following)
+
+        messages = []
+        for user in batch:
+            stats["recipients"] += 1
+            if _norm_email(user.email) in suppressed:
+                stats["suppressed"] += 1
+                continue
+            try:
+                skip = followed.get(user.pk, set())
+                candidates = [p for p in pool if p.pk != user.pk and p.pk not in skip][:20]
+                random.shuffle(candidates)
+                subject, text, html = _bn_digest_message(
+                    user,
+                    follower_count=follower_counts.get(user.pk, 0),
+                    likes_count=likes.get(user.pk, 0),
+                    new_followers=new_followers.get(user.pk, []),
+                    suggestions=candidates[:4],
+                    promo_html=random.choice(promos),
+                    logo=logo,
+                )
+            except Exception:
+                logger.exception("bn digest for user %s failed", user.pk)
+                stats["failed"] += 1
+                continue
+            key = f"bn_digest:{user.pk}:{year}-W{week:02d}"
+            messages.append((subject, user.email, text, html, key))
+        _deliver(messages)
+        stats["queued"] += len(messages)
+
+    def _flush_safely(batch):
+        try:
+            _flush(batch)
+        except Exception:
+            logger.exception("bn digest batch of %d failed", len(batch))
+            stats["failed"] += len(batch)
+
+    batch = []
+    for user in users:
+        if not getattr(user, "email", ""):
+            continue
+        batch.append(user)
+        if len(batch) >= DIGEST_BATCH:
+            _flush_safely(batch)
+            batch = []
+    if batch:
+        _flush_safely(batch)
+    return stats
+
+
 def send_engagement_email(user, *, subject, heading, body_html,
                           button_text="", button_url="", content_feature=None):
     """Generic brain-engine email: a personal heading + helpful body, optional
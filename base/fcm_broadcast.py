@@ -0,0 +1,224 @@
+"""Broadcast engine for pushes to every active device.
+
+``send_push_notification(broadcast=True)`` used to load EVERY active FCM
+token into one list and hand it to one ``messaging.send_each`` call — which
+FCM rejects past 500 messages, and which ran one chunk at a time even when
+it did not. ``broadcast()`` instead:
+
+  * streams tokens from the database in keyset-paginated chunks of
+    ``chunk_size`` (500, FCM's per-call limit), so memory stays flat;
+  * sends chunks concurrently on a bounded worker pool, with at most
+    ``2 * workers`` chunks in flight so a slow FCM cannot pile up the table;
+  * retries transient failures (UNAVAILABLE, INTERNAL, quota, a dropped
+    connection) with exponential backoff — only the tokens that failed;
+  * deactivates dead tokens chunk by chunk, from the calling thread, as
+    results come in rather than once at the very end;
+  * reports progress (``progress`` callback + a log line every few chunks)
+    and returns totals with throughput.
+
+The sender is pluggable: ``FirebaseSender`` talks to FCM, ``FakeFCMSender``
+is an in-process stand-in for tests and load runs (``bench_fcm_broadcast``).
+"""
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+FCM_BROADCAST_WORKERS = int(os.getenv("FCM_BROADCAST_WORKERS", "8"))
+MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.5
+PROGRESS_EVERY_CHUNKS = 20
+
+
+class FirebaseSender:
+    """Sends one chunk through ``messaging.send_each``."""
+
+    def send(self, tokens, title, body, data):
+        from firebase_admin import messaging
+
+        from .fcm_service import build_notification_message
+
+        messages = [build_notification_message(t, title, body, data) for t in tokens]
+        return messaging.send_each(messages).responses
+
+
+class FakeFCMError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class FakeSendResponse:
+    def __init__(self, exception=None):
+        self.exception = exception
+        self.success = exception is None
+
+
+class FakeFCMSender:
+    """Local stand-in for FCM with the failure modes the engine handles.
+
+    ``dead_tokens`` always fail as UNREGISTERED; each of ``flaky_tokens``
+    fails ``flaky_times`` times as UNAVAILABLE, then succeeds; the first
+    ``fail_calls`` calls raise outright (a dropped connection). ``latency``
+    is slept per call, to stand in for the FCM round trip.
+    """
+
+    def __init__(self, dead_tokens=(), flaky_tokens=(), flaky_times=1,
+                 fail_calls=0, latency=0.0):
+        self.dead_tokens = set(dead_tokens)
+        self._flaky = {token: flaky_times for token in flaky_tokens}
+        self._fail_calls = fail_calls
+        self.latency = latency
+        self.calls = 0
+        self.delivered = []
+        self._lock = threading.Lock()
+
+    def send(self, tokens, title, body, data):
+        with self._lock:
+            self.calls += 1
+            if self._fail_calls:
+                self._fail_calls -= 1
+                raise ConnectionError("fake FCM connection reset")
+        if self.latency:
+            time.sleep(self.latency)
+        responses = []
+        with self._lock:
+            for token in tokens:
+                if token in self.dead_tokens:
+                    responses.append(FakeSendResponse(FakeFCMError("UNREGISTERED")))
+                elif self._flaky.get(token):
+                    self._flaky[token] -= 1
+                    responses.append(FakeSendResponse(FakeFCMError("UNAVAILABLE")))
+                else:
+                    self.delivered.append(token)
+                    responses.append(FakeSendResponse())
+        return responses
+
+
+def iter_token_chunks(token_qs, chunk_size=CHUNK_SIZE):
+    """Yield lists of token strings, keyset-paginated on the primary key."""
+    last_pk = None
+    qs = token_qs.order_by("pk")
+    while True:
+        page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+        rows = list(page.values_list("pk", "token")[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        tokens = [token for _, token in rows if token]
+        if tokens:
+            yield tokens
+        if len(rows) < chunk_size:
+            return
+
+
+def _backoff(attempt, base):
+    return base * (2 ** attempt) * (1 + random.random() * 0.25)
+
+
+def _send_chunk(sender, tokens, title, body, data, max_retries, backoff_base):
+    """Worker: deliver one chunk, retrying transient failures. No DB access."""
+    from .fcm_service import is_dead_token_error, is_transient_fcm_error
+
+    result = {"sent": 0, "failed": 0, "retried": 0, "dead": []}
+    pending = tokens
+    attempt = 0
+    while pending:
+        try:
+            responses = sender.send(pending, title, body, data)
+        except Exception as exc:
+            if attempt >= max_retries:
+                logger.warning("fcm broadcast: chunk of %s gave up: %s", len(pending), exc)
+                result["failed"] += len(pending)
+                break
+            result["retried"] += len(pending)
+            time.sleep(_backoff(attempt, backoff_base))
+            attempt += 1
+            continue
+
+        retry = []
+        for token, response in zip(pending, responses):
+            exc = getattr(response, "exception", None)
+            if response.success:
+                result["sent"] += 1
+            elif is_dead_token_error(exc):
+                result["dead"].append(token)
+            elif is_transient_fcm_error(exc) and attempt < max_retries:
+                retry.append(token)
+            else:
+                result["failed"] += 1
+        if not retry:
+            break
+        result["retried"] += len(retry)
+        time.sleep(_backoff(attempt, backoff_base))
+        attempt += 1
+        pending = retry
+    return result
+
+
+def broadcast(token_qs, title, body, data=None, *, sender=None,
+              chunk_size=CHUNK_SIZE, workers=None, max_retries=MAX_RETRIES,
+              backoff_base=BACKOFF_BASE_SECONDS, progress=None):
+    """Push one notification to every token in ``token_qs``.
+
+    Returns ``{"tokens", "sent", "failed", "dead", "deactivated", "retried",
+    "chunks", "elapsed", "per_second"}``; ``progress`` (if given) is called
+    with the same dict after every chunk.
+    """
+    from .fcm_service import deactivate_tokens
+
+    if sender is None:
+        from .fcm_service import FIREBASE_INITIALIZED
+
+        if not FIREBASE_INITIALIZED:
+            logger.error("fcm broadcast skipped: Firebase Admin SDK not initialized")
+            return None
+        sender = FirebaseSender()
+    workers = max(1, workers or FCM_BROADCAST_WORKERS)
+
+    stats = {
+        "tokens": 0, "sent": 0, "failed": 0, "dead": 0, "deactivated": 0,
+        "retried": 0, "chunks": 0, "elapsed": 0.0, "per_second": 0.0,
+    }
+    started = time.perf_counter()
+
+    def record(result):
+        # Runs on the calling thread, so the token UPDATE uses its connection.
+        for key in ("sent", "failed", "retried"):
+            stats[key] += result[key]
+        stats["dead"] += len(result["dead"])
+        stats["deactivated"] += deactivate_tokens(result["dead"])
+        stats["chunks"] += 1
+        stats["elapsed"] = time.perf_counter() - started
+        stats["per_second"] = stats["tokens"] / stats["elapsed"] if stats["elapsed"] else 0.0
+        if progress is not None:
+            progress(dict(stats))
+        if stats["chunks"] % PROGRESS_EVERY_CHUNKS == 0:
+            logger.info("fcm broadcast progress: %s", stats)
+
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fcm-broadcast") as pool:
+        for tokens in iter_token_chunks(token_qs, chunk_size):
+            while len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(future.result())
+            stats["tokens"] += len(tokens)
+            in_flight.add(pool.submit(
+                _send_chunk, sender, tokens, title, body, data,
+                max_retries, backoff_base,
+            ))
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record(future.result())
+
+    stats["elapsed"] = time.perf_counter() - started
+    stats["per_second"] = stats["tokens"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    logger.info("fcm broadcast done: %s", stats)
+    return stats
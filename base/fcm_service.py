@@ -220,38 +220,99 @@ def send_fcm_data_message_async(fcm_token, data, ttl_seconds=60):
     return _enqueue_fcm_send(send_fcm_data_message, fcm_token, data, ttl_seconds)
 
 
-def _deactivate_dead_tokens(tokens, responses):
-    """Deactivate FCM tokens FCM reports as permanently invalid.
+# A token is dead only for permanent errors — the app was uninstalled
+# (UNREGISTERED / registration-token-not-registered / NOT_FOUND) or the token is
+# malformed (INVALID_ARGUMENT). Transient failures (UNAVAILABLE, INTERNAL,
+# quota) say nothing about the token and are worth retrying.
+_PERMANENT_FCM_ERRORS = (
+    'UNREGISTERED', 'NOT_FOUND', 'INVALID_ARGUMENT',
+    'REGISTRATION-TOKEN-NOT-REGISTERED', 'REGISTRATION_TOKEN_NOT_REGISTERED',
+)
+_TRANSIENT_FCM_ERRORS = (
+    'UNAVAILABLE', 'INTERNAL', 'QUOTA', 'RESOURCE_EXHAUSTED',
+    'DEADLINE_EXCEEDED', 'TIMEOUT',
+)
 
-    `tokens` and `responses` are positionally aligned (send_each preserves
-    order). A token is dead only for permanent errors — the app was
-    uninstalled (UNREGISTERED / registration-token-not-registered / NOT_FOUND)
-    or the token is malformed (INVALID_ARGUMENT). Transient failures
-    (UNAVAILABLE, INTERNAL, quota) are left untouched.
-    """
-    PERMANENT = (
-        'UNREGISTERED', 'NOT_FOUND', 'INVALID_ARGUMENT',
-        'REGISTRATION-TOKEN-NOT-REGISTERED', 'REGISTRATION_TOKEN_NOT_REGISTERED',
+
+def _fcm_error_text(exc):
+    code = str(getattr(exc, 'code', '') or '').upper()
+    return f"{code} {type(exc).__name__} {exc}".upper()
+
+
+def is_dead_token_error(exc):
+    return exc is not None and any(
+        p in _fcm_error_text(exc) for p in _PERMANENT_FCM_ERRORS
     )
-    dead = []
-    for tok, resp in zip(tokens, responses):
-        if resp.success:
-            continue
-        exc = getattr(resp, 'exception', None)
-        if exc is None:
-            continue
-        code = str(getattr(exc, 'code', '') or '').upper()
-        text = f"{code} {type(exc).__name__} {exc}".upper()
-        if any(p in text for p in PERMANENT):
-            dead.append(tok)
+
+
+def is_transient_fcm_error(exc):
+    return exc is not None and not is_dead_token_error(exc) and any(
+        p in _fcm_error_text(exc) for p in _TRANSIENT_FCM_ERRORS
+    )
+
+
+def deactivate_tokens(dead):
+    """Mark ``dead`` tokens inactive. Returns how many rows changed."""
     if not dead:
-        return
+        return 0
     try:
         from .models import FCMToken
         n = FCMToken.objects.filter(token__in=dead, is_active=True).update(is_active=False)
         _safe_print(f'[cleanup] Deactivated {n} dead FCM token(s)')
+        return n
     except Exception as e:  # never let cleanup break a send
         _safe_print(f'[cleanup] token deactivation failed: {e}')
+        return 0
+
+
+def _deactivate_dead_tokens(tokens, responses):
+    """Deactivate FCM tokens FCM reports as permanently invalid.
+
+    `tokens` and `responses` are positionally aligned (send_each preserves
+    order). See _PERMANENT_FCM_ERRORS for what counts as dead.
+    """
+    deactivate_tokens([
+        tok for tok, resp in zip(tokens, responses)
+        if not resp.success and is_dead_token_error(getattr(resp, 'exception', None))
+    ])
+
+
+def build_notification_message(token, title, body, data=None):
+    """The alert message send_fcm_notification_multicast and broadcasts send."""
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        data=data or {},
+        token=token,
+        android=messaging.AndroidConfig(
+            priority='high',
+            notification=messaging.AndroidNotification(
+                sound='default',
+                channel_id='oxius_messages',
+                color='#10B981',
+            ),
+        ),
+        # iOS fix: same as send_fcm_notification — apns-push-type=alert
+        # required since iOS 13+ or APNs may drop the message.
+        apns=messaging.APNSConfig(
+            headers={
+                'apns-push-type': 'alert',
+                'apns-priority': '10',
+            },
+            payload=messaging.APNSPayload(
+                aps=messaging.Aps(
+                    sound='default',
+                    mutable_content=True,
+                ),
+            ),
+        ),
+    )
+
+
+# messaging.send_each rejects more than this many messages in one call.
+FCM_SEND_EACH_LIMIT = 500
 
 
 def send_fcm_notification_multicast(fcm_tokens, title, body, data=None):
@@ -284,60 +345,33 @@ def send_fcm_notification_multicast(fcm_tokens, title, body, data=None):
         
         _safe_print(f'Sending multicast to {len(valid_tokens)} tokens')
         
-        # Create individual messages for each token
-        messages = []
-        for token in valid_tokens:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                token=token,
-                android=messaging.AndroidConfig(
-                    priority='high',
-                    notification=messaging.AndroidNotification(
-                        sound='default',
-                        channel_id='oxius_messages',
-                        color='#10B981',
-                    ),
-                ),
-                # iOS fix: same as send_fcm_notification — apns-push-type=alert
-                # required since iOS 13+ or APNs may drop the message.
-                apns=messaging.APNSConfig(
-                    headers={
-                        'apns-push-type': 'alert',
-                        'apns-priority': '10',
-                    },
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            sound='default',
-                            mutable_content=True,
-                        ),
-                    ),
-                ),
-            )
-            messages.append(message)
-        
-        # Use send_each_for_multicast (new API in firebase-admin 7.x)
-        response = messaging.send_each(messages)
-        
+        # send_each takes at most FCM_SEND_EACH_LIMIT messages per call; a
+        # longer list used to fail the whole send. Large audiences should go
+        # through fcm_broadcast.broadcast(), which also parallelises.
+        responses = []
+        for start in range(0, len(valid_tokens), FCM_SEND_EACH_LIMIT):
+            messages = [
+                build_notification_message(token, title, body, data)
+                for token in valid_tokens[start:start + FCM_SEND_EACH_LIMIT]
+            ]
+            responses.extend(messaging.send_each(messages).responses)
+
         # Count successes and failures
-        success_count = sum(1 for r in response.responses if r.success)
-        failure_count = len(response.responses) - success_count
+        success_count = sum(1 for r in responses if r.success)
+        failure_count = len(responses) - success_count
         
         _safe_print(f'Sent {success_count} notifications')
         if failure_count > 0:
             _safe_print(f'[WARN] Failed to send {failure_count} notifications')
             # Log first few failures for debugging
-            for idx, resp in enumerate(response.responses[:3]):
+            for idx, resp in enumerate(responses[:3]):
                 if not resp.success:
                     _safe_print(f'Failure {idx+1}: {resp.exception}')
             # Prune permanently-dead tokens (app uninstalled / token expired) so
             # they stop bloating the DB and wasting FCM quota on every send.
             # Only deactivate on PERMANENT errors — never on transient ones
             # (UNAVAILABLE/INTERNAL/quota), which would wrongly kill live tokens.
-            _deactivate_dead_tokens(valid_tokens, response.responses)
+            _deactivate_dead_tokens(valid_tokens, responses)
 
         # Create a compatible response object
         class CompatibleResponse:
@@ -346,7 +380,7 @@ def send_fcm_notification_multicast(fcm_tokens, title, body, data=None):
                 self.success_count = sum(1 for r in responses if r.success)
                 self.failure_count = len(responses) - self.success_count
         
-        return CompatibleResponse(response.responses)
+        return CompatibleResponse(responses)
     except Exception as e:
         _safe_print(f'[ERROR] Error sending multicast notification: {e}')
         _safe_print(f'Title: {title}')
@@ -356,6 +390,39 @@ def send_fcm_notification_multicast(fcm_tokens, title, body, data=None):
         return None
 
 
+def send_fcm_notification_batch(items):
+    """Send individually addressed alerts: ``items`` is ``(token, title, body,
+    data)`` per device, so each can carry its own payload (e.g. its own
+    notification_id). Sent FCM_SEND_EACH_LIMIT per send_each call.
+
+    Returns ``{"sent": n, "failed": n}``, or None if Firebase is not set up.
+    """
+    if not FIREBASE_INITIALIZED:
+        _safe_print('Cannot send notification: Firebase Admin SDK not initialized')
+        return None
+
+    items = [item for item in items if item[0] and isinstance(item[0], str)]
+    sent = failed = 0
+    for start in range(0, len(items), FCM_SEND_EACH_LIMIT):
+        chunk = items[start:start + FCM_SEND_EACH_LIMIT]
+        try:
+            responses = messaging.send_each([
+                build_notification_message(token, title, body, data)
+                for token, title, body, data in chunk
+            ]).responses
+        except Exception as e:
+            _safe_print(f'[ERROR] Batch send of {len(chunk)} failed: {e}')
+            failed += len(chunk)
+            continue
+        ok = sum(1 for r in responses if r.success)
+        sent += ok
+        failed += len(responses) - ok
+        if ok < len(responses):
+            _deactivate_dead_tokens([item[0] for item in chunk], responses)
+    _safe_print(f'Batch sent {sent} notifications ({failed} failed)')
+    return {"sent": sent, "failed": failed}
+
+
 def send_message_notification(recipient_user, sender_user, sender_name, message_text, chat_id):
     """
     Send notification when user receives a new message
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Email throughput: one connection per message vs the pooled outbox.
+
+Starts a local SMTP sink that spends ``--latency`` ms accepting each message
+(and ``--handshake`` ms greeting each new connection, standing in for TLS +
+auth), points the email settings at it, then times:
+
+  * per message (old) — _send_email(wait=True) for ``--sample`` messages, a
+    fresh connection each, extrapolated to ``--messages``
+  * outbox — ``--messages`` queued with _send_email() and sent by one
+    email_outbox.drain with ``--workers`` pooled connections
+
+Reports wall time, messages/sec and SMTP connections. The rate limit is off
+unless ``--per-second`` is given. Queued rows (and the EmailSettings
+switch-off) are rolled back.
+
+    manage.py bench_email_outbox
+    manage.py bench_email_outbox --messages 5000 --workers 8 --latency 20
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from base import email_outbox
+from base.benchmarking import rolled_back, smtp_sink
+from base.email_service import _send_email
+from base.models import EmailSettings
+
+
+class Command(BaseCommand):
+    help = 'Per-message SMTP sends vs the pooled email outbox, against a local sink.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--sample', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--latency', type=float, default=10.0, help='ms per message')
+        parser.add_argument('--handshake', type=float, default=150.0, help='ms per connection')
+        parser.add_argument('--per-second', type=int, default=0)
+
+    def handle(self, *args, **options):
+        html = '<p>%s</p>' % ('benchmark body ' * 200)
+        with smtp_sink(latency=options['latency'] / 1000.0,
+                       handshake=options['handshake'] / 1000.0) as sink, rolled_back():
+            # The admin-configured server would win over the settings below.
+            EmailSettings.objects.update(is_active=False)
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port, EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+                EMAIL_OUTBOX_PER_SECOND=options['per_second'],
+            ):
+                sample = options['sample']
+                started = time.perf_counter()
+                for i in range(sample):
+                    _send_email('Bench %d' % i, 'bench%d@bench.invalid' % i, 'text', html, wait=True)
+                elapsed = time.perf_counter() - started
+                self._line('per message (old)', elapsed * options['messages'] / sample,
+                           options['messages'], sink.connections * options['messages'] / sample,
+                           extrapolated=True)
+
+                before = sink.connections
+                for i in range(options['messages']):
+                    _send_email('Bench %d' % i, 'bench%d@bench.invalid' % i, 'text', html)
+                stats = email_outbox.drain(workers=options['workers'])
+                self._line('outbox, %d workers' % options['workers'], stats['seconds'],
+                           stats['sent'], sink.connections - before)
+                if stats['retried'] or stats['failed'] or stats['bounced']:
+                    self.stdout.write('  not sent: %s' % stats)
+        self.stdout.write(self.style.SUCCESS('Done — queued rows rolled back.'))
+
+    def _line(self, label, elapsed, sent, connections, extrapolated=False):
+        self.stdout.write('  %-22s %8.1fs  %8.0f msgs/s  %6d connections%s' % (
+            label, elapsed, sent / elapsed if elapsed else 0, connections,
+            '  (extrapolated)' if extrapolated else ''))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Throughput of the push broadcast engine against the fake FCM sender.
+
+Seeds ``--tokens`` synthetic FCM tokens (a small share dead, a small share
+flaky), then broadcasts to them through base.fcm_broadcast with a
+FakeFCMSender that sleeps ``--latency`` seconds per call in place of the FCM
+round trip — once with a single worker (one chunk at a time, as the old
+single send_each path behaved) and once per ``--workers`` value. Nothing is
+sent anywhere and everything is rolled back.
+
+    manage.py bench_fcm_broadcast
+    manage.py bench_fcm_broadcast --tokens 200000 --workers 4,8,16 --latency 0.3
+"""
+import random
+
+from django.core.management.base import BaseCommand
+
+from base.benchmarking import rolled_back
+from base.fcm_broadcast import FakeFCMSender, broadcast
+from base.models import FCMToken
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = 'Broadcast throughput with the fake FCM sender, by worker count (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=50000)
+        parser.add_argument('--workers', default='8')
+        parser.add_argument('--latency', type=float, default=0.2)
+        parser.add_argument('--dead-share', type=float, default=0.02)
+        parser.add_argument('--flaky-share', type=float, default=0.01)
+        parser.add_argument('--seed', type=int, default=9)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        worker_counts = [1] + [int(w) for w in options['workers'].split(',') if w.strip()]
+
+        with rolled_back():
+            tokens = ['bench-fcm-%08d' % i for i in range(options['tokens'])]
+            for start in range(0, len(tokens), BATCH):
+                FCMToken.objects.bulk_create(
+                    [FCMToken(token=t) for t in tokens[start:start + BATCH]])
+            dead = {t for t in tokens if rng.random() < options['dead_share']}
+            flaky = {t for t in tokens if rng.random() < options['flaky_share']}
+            token_qs = FCMToken.objects.filter(token__startswith='bench-fcm-')
+
+            for workers in worker_counts:
+                # Dead tokens were deactivated by the previous run.
+                token_qs.update(is_active=True)
+                sender = FakeFCMSender(
+                    dead_tokens=dead, flaky_tokens=flaky, latency=options['latency'])
+                stats = broadcast(
+                    token_qs.filter(is_active=True), 'Benchmark', 'fake send',
+                    sender=sender, workers=workers, backoff_base=0.05,
+                    progress=self._progress,
+                )
+                self.stdout.write('')
+                self.stdout.write(
+                    '  %2d worker(s): %9.0f tokens/s  %.1fs  sent=%d dead=%d retried=%d failed=%d'
+                    % (workers, stats['per_second'], stats['elapsed'], stats['sent'],
+                       stats['dead'], stats['retried'], stats['failed']))
+
+        self.stdout.write(self.style.SUCCESS('Done — synthetic tokens rolled back.'))
+
+    def _progress(self, stats):
+        if stats['chunks'] % 10 == 0:
+            self.stdout.write(
+                '    %d chunks, %d tokens, %.0f tokens/s'
+                % (stats['chunks'], stats['tokens'], stats['per_second']),
+                ending='\r')
@@ -2325,6 +2325,46 @@ class ValidEmail(User):
         return f"{self.email} ({self.reason})"
 
 
+class EmailOutbox(models.Model):
+    """Durable queue of outgoing email, drained by base.email_outbox.
+
+    ``_send_email(wait=False)`` writes a row here instead of opening an SMTP
+    connection on a thread of its own; the drain task sends the queue over a
+    small pool of long-lived connections, rate-limited, retrying transient
+    failures with backoff. A row is "pending" until it is sent or runs out of
+    attempts; ``next_attempt_at`` is both the retry time and the claim lease.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+    subject = models.CharField(max_length=998)
+    to = models.JSONField(default=list)
+    text_content = models.TextField(blank=True, default="")
+    html_content = models.TextField(blank=True, default="")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=255, blank=True, default="")
+    # Set by batch senders that may be retried (the weekly digest): a second
+    # enqueue with the same key is dropped.
+    dedupe_key = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = "Email Outbox"
+        verbose_name_plural = "Email Outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="email_outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.status})"
+
+
 class EmailSettings(models.Model):
     """Store email configuration settings"""
     email_host = models.CharField(max_length=255, default='smtp.gmail.com')
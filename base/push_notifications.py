@@ -15,6 +15,21 @@ def _stringify(data):
     return {str(k): "" if v is None else str(v) for k, v in (data or {}).items()}
 
 
+# Items per bulk_create / token query / send round in the bulk path.
+BULK_CHUNK = 1000
+
+
+def _base_data(data, deep_link, notification_type):
+    base_data = dict(data or {})
+    if deep_link:
+        base_data["deep_link"] = deep_link
+    base_data["notification_type"] = notification_type
+    # Match the proven like/comment payloads so Android reliably routes the tap
+    # to the app's notification handler (which then follows deep_link).
+    base_data.setdefault("click_action", "FLUTTER_NOTIFICATION_CLICK")
+    return base_data
+
+
 def send_push_notification(
     *,
     title,
@@ -32,40 +47,19 @@ def send_push_notification(
     - users: iterable of User to target. Each gets their own saved + delivered
       notification.
     - broadcast=True: store a single broadcast row (user=None) visible to
-      everyone in the Updates tab, and fan the push out to all active devices.
+      everyone in the Updates tab, and fan the push out to all active devices
+      (chunked, parallel, with retries — see fcm_broadcast.broadcast).
     - platform: restrict the PUSH delivery to a device type — "android" or
       "ios". None/blank = both. (The saved Updates entry is unaffected.)
 
     Returns the list of created UserNotification objects.
     """
-    from .fcm_service import send_fcm_notification_multicast
-
-    base_data = dict(data or {})
-    if deep_link:
-        base_data["deep_link"] = deep_link
-    base_data["notification_type"] = notification_type
-    # Match the proven like/comment payloads so Android reliably routes the tap
-    # to the app's notification handler (which then follows deep_link).
-    base_data.setdefault("click_action", "FLUTTER_NOTIFICATION_CLICK")
+    base_data = _base_data(data, deep_link, notification_type)
 
     platform = (platform or "").strip().lower() or None
 
     created = []
 
-    def _deliver(notification, token_qs):
-        if platform in ("android", "ios"):
-            token_qs = token_qs.filter(device_type=platform)
-        payload = dict(base_data)
-        payload["notification_id"] = str(notification.id)
-        tokens = list(token_qs.values_list("token", flat=True))
-        if tokens:
-            try:
-                send_fcm_notification_multicast(
-                    tokens, title, body, _stringify(payload)
-                )
-            except Exception as e:  # never let a push failure break the caller
-                print(f"[push] FCM send failed: {e}")
-
     if broadcast:
         notification = UserNotification.objects.create(
             user=None,
@@ -77,20 +71,100 @@ def send_push_notification(
             data=base_data,
         )
         created.append(notification)
-        _deliver(notification, FCMToken.objects.filter(is_active=True))
+        # Every active device: streamed in chunks and sent in parallel (see
+        # fcm_broadcast) rather than as one list in one send_each call.
+        token_qs = FCMToken.objects.filter(is_active=True)
+        if platform in ("android", "ios"):
+            token_qs = token_qs.filter(device_type=platform)
+        payload = dict(base_data)
+        payload["notification_id"] = str(notification.id)
+        try:
+            from .fcm_broadcast import broadcast as fcm_broadcast
+
+            fcm_broadcast(token_qs, title, body, _stringify(payload))
+        except Exception as e:  # never let a push failure break the caller
+            print(f"[push] FCM broadcast failed: {e}")
         return created
 
-    for user in users or []:
-        notification = UserNotification.objects.create(
-            user=user,
-            title=title,
-            body=body,
-            deep_link=deep_link,
-            image=image,
-            notification_type=notification_type,
-            data=base_data,
+    # One saved + delivered notification per user, written and sent in bulk.
+    return send_push_notifications_bulk(
+        [(user, title, body, deep_link) for user in users or []],
+        notification_type=notification_type,
+        data=data,
+        image=image,
+        platform=platform,
+    )
+
+
+def send_push_notifications_bulk(
+    items,
+    *,
+    notification_type="general",
+    data=None,
+    image="",
+    platform=None,
+):
+    """Persist + push many per-user notifications in a few round trips.
+
+    - items: iterable of ``(user, title, body, deep_link)``; ``user`` may be a
+      User or a user id. Each item becomes its own UserNotification, and its
+      push carries that notification's id, exactly like send_push_notification.
+    - notification_type / data / image / platform: as for
+      send_push_notification, shared by every item.
+
+    Per BULK_CHUNK items: one bulk_create, one FCMToken query for all their
+    users, and batched send_each calls. Returns the created notifications.
+    """
+    from .fcm_service import send_fcm_notification_batch
+
+    platform = (platform or "").strip().lower() or None
+    created = []
+    chunk = []
+
+    def _flush(chunk):
+        notifications = UserNotification.objects.bulk_create([
+            UserNotification(
+                user_id=getattr(user, "pk", user),
+                title=title,
+                body=body,
+                deep_link=deep_link or "",
+                image=image,
+                notification_type=notification_type,
+                data=_base_data(data, deep_link, notification_type),
+            )
+            for user, title, body, deep_link in chunk
+        ])
+        created.extend(notifications)
+
+        token_qs = FCMToken.objects.filter(
+            user_id__in={n.user_id for n in notifications}, is_active=True
         )
-        created.append(notification)
-        _deliver(notification, FCMToken.objects.filter(user=user, is_active=True))
+        if platform in ("android", "ios"):
+            token_qs = token_qs.filter(device_type=platform)
+        tokens_by_user = {}
+        for user_id, token in token_qs.values_list("user_id", "token"):
+            tokens_by_user.setdefault(user_id, []).append(token)
+
+        messages = []
+        for notification in notifications:
+            payload = dict(notification.data)
+            payload["notification_id"] = str(notification.id)
+            payload = _stringify(payload)
+            for token in tokens_by_user.get(notification.user_id, []):
+                messages.append(
+                    (token, notification.title, notification.body, payload)
+                )
+        if messages:
+            try:
+                send_fcm_notification_batch(messages)
+            except Exception as e:  # never let a push failure break the caller
+                print(f"[push] FCM bulk send failed: {e}")
 
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= BULK_CHUNK:
+            _flush(chunk)
+            chunk = []
+    if chunk:
+        _flush(chunk)
     return created
@@ -15,4 +15,12 @@ def check_and_auto_approve_tasks():
 
     for task in pending_tasks:
         task.approved = True
-        task.save()
\ No newline at end of file
+        task.save()
+
+
+@shared_task
+def drain_email_outbox():
+    """Send queued email (base.email_outbox) over pooled SMTP connections."""
+    from .email_outbox import drain_exclusive
+
+    return drain_exclusive()
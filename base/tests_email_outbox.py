@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Email outbox: queued sends go out over a few pooled SMTP connections.
+
+Runs against a real SMTP conversation with a local sink (base.benchmarking),
+so refusals and deferrals come back exactly as a provider would send them.
+"""
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from base import email_outbox
+from base.benchmarking import smtp_sink
+from base.email_service import _send_email
+from base.models import EmailOutbox, EmailSuppression
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "email-outbox-tests",
+        }
+    },
+    EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+    EMAIL_HOST="127.0.0.1",
+    EMAIL_USE_TLS=False,
+    EMAIL_HOST_USER="",
+    EMAIL_HOST_PASSWORD="",
+    DEFAULT_FROM_EMAIL="AdsyClub <noreply@example.com>",
+    EMAIL_OUTBOX_ENABLED=True,
+    EMAIL_OUTBOX_PER_SECOND=0,
+)
+class EmailOutboxTests(TestCase):
+    def drain(self, sink, **kwargs):
+        with self.settings(EMAIL_PORT=sink.port):
+            return email_outbox.drain(**kwargs)
+
+    def test_queued_mail_is_sent_over_pooled_connections(self):
+        for i in range(12):
+            self.assertTrue(_send_email('Hi %d' % i, 'user%d@example.com' % i, 'text', '<p>html</p>'))
+        self.assertEqual(EmailOutbox.objects.filter(status='pending').count(), 12)
+
+        with smtp_sink() as sink:
+            stats = self.drain(sink, workers=2)
+
+        self.assertEqual(stats['sent'], 12)
+        self.assertEqual(len(sink.messages), 12)
+        self.assertLessEqual(sink.connections, 2)
+        self.assertEqual(
+            sorted(r[0] for r, _ in sink.messages),
+            sorted('user%d@example.com' % i for i in range(12)))
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+
+    def test_refused_recipient_is_failed_and_suppressed(self):
+        _send_email('Hi', 'gone@example.com', 'text', '<p>html</p>')
+
+        with smtp_sink(refuse=['gone@example.com']) as sink:
+            stats = self.drain(sink)
+
+        self.assertEqual(stats['bounced'], 1)
+        self.assertEqual(EmailOutbox.objects.get().status, 'failed')
+        self.assertEqual(EmailSuppression.objects.get(email='gone@example.com').reason, 'bounced')
+
+    def test_deferred_recipient_is_retried_later(self):
+        _send_email('Hi', 'busy@example.com', 'text', '<p>html</p>')
+
+        with smtp_sink(defer=['busy@example.com']) as sink:
+            stats = self.drain(sink)
+            row = EmailOutbox.objects.get()
+            self.assertEqual(stats['retried'], 1)
+            self.assertEqual((row.status, row.attempts), ('pending', 1))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+            self.assertFalse(EmailSuppression.objects.exists())
+
+            # Not due yet: a second drain leaves it alone.
+            self.assertEqual(self.drain(sink)['retried'], 0)
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            sink.defer.clear()
+            self.assertEqual(self.drain(sink)['sent'], 1)
+
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+        self.assertEqual(len(sink.messages), 1)
+
+    def test_retries_stop_at_max_attempts(self):
+        _send_email('Hi', 'busy@example.com', 'text', '<p>html</p>')
+
+        with smtp_sink(defer=['busy@example.com']) as sink, \
+                self.settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1):
+            stats = self.drain(sink)
+
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(EmailOutbox.objects.get().status, 'failed')
+
+    def assert_held(self, count):
+        rows = EmailOutbox.objects.all()
+        self.assertEqual(len(rows), count)
+        for row in rows:
+            self.assertEqual((row.status, row.attempts), ('pending', 0))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+
+    def test_refused_login_holds_the_batch(self):
+        for i in range(3):
+            _send_email('Hi %d' % i, 'user%d@example.com' % i, 'text', '<p>html</p>')
+
+        with smtp_sink(auth='reject') as sink, \
+                self.settings(EMAIL_HOST_USER='outbox', EMAIL_HOST_PASSWORD='wrong'):
+            stats = self.drain(sink, workers=1)
+            self.assertEqual((stats['held'], stats['failed'], stats['sent']), (3, 0, 0))
+            self.assertEqual(sink.connections, 1)   # one login tried, not one per row
+            self.assert_held(3)
+
+            sink.auth = 'accept'
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(self.drain(sink, workers=1)['sent'], 3)
+
+    def test_refused_sender_holds_the_batch(self):
+        for i in range(3):
+            _send_email('Hi %d' % i, 'user%d@example.com' % i, 'text', '<p>html</p>')
+
+        with smtp_sink(refuse_sender='550 5.4.5 Daily sending quota exceeded') as sink:
+            stats = self.drain(sink, workers=1)
+            self.assertEqual((stats['held'], stats['failed'], stats['bounced']), (3, 0, 0))
+            self.assertEqual(sink.connections, 1)
+            self.assertEqual(sink.messages, [])
+            self.assert_held(3)
+            self.assertFalse(EmailSuppression.objects.exists())
+
+            sink.refuse_sender = None
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(self.drain(sink, workers=1)['sent'], 3)
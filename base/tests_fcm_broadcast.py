@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""The broadcast engine, run against the in-process fake FCM sender.
+
+Every token must be delivered exactly once however the chunks interleave on
+the worker pool; dead tokens are deactivated, transient failures retried.
+"""
+from django.test import TestCase
+
+from base.fcm_broadcast import FakeFCMSender, broadcast
+from base.models import FCMToken
+
+
+class BroadcastEngineTests(TestCase):
+    def setUp(self):
+        FCMToken.objects.bulk_create(
+            [FCMToken(token='tok-%03d' % i) for i in range(23)])
+        self.tokens = FCMToken.objects.filter(is_active=True)
+
+    def run_broadcast(self, sender, **kwargs):
+        kwargs.setdefault('chunk_size', 5)
+        kwargs.setdefault('workers', 3)
+        return broadcast(self.tokens, 'Hello', 'World', {'k': 'v'},
+                         sender=sender, backoff_base=0, **kwargs)
+
+    def test_every_token_is_delivered_exactly_once(self):
+        sender = FakeFCMSender()
+        seen = []
+
+        stats = self.run_broadcast(sender, progress=seen.append)
+
+        self.assertEqual(sorted(sender.delivered), sorted(self.tokens.values_list('token', flat=True)))
+        self.assertEqual(stats['tokens'], 23)
+        self.assertEqual(stats['sent'], 23)
+        self.assertEqual(stats['chunks'], 5)
+        self.assertEqual([s['chunks'] for s in seen], [1, 2, 3, 4, 5])
+
+    def test_dead_tokens_are_deactivated_and_not_retried(self):
+        sender = FakeFCMSender(dead_tokens={'tok-001', 'tok-017'})
+
+        stats = self.run_broadcast(sender)
+
+        self.assertEqual(stats['dead'], 2)
+        self.assertEqual(stats['deactivated'], 2)
+        self.assertEqual(stats['retried'], 0)
+        self.assertEqual(
+            set(FCMToken.objects.filter(is_active=False).values_list('token', flat=True)),
+            {'tok-001', 'tok-017'})
+
+    def test_transient_failures_are_retried_until_delivered(self):
+        sender = FakeFCMSender(flaky_tokens={'tok-004', 'tok-020'}, flaky_times=2, fail_calls=1)
+
+        stats = self.run_broadcast(sender)
+
+        self.assertEqual(stats['sent'], 23)
+        self.assertEqual(stats['failed'], 0)
+        self.assertIn('tok-004', sender.delivered)
+        self.assertEqual(FCMToken.objects.filter(is_active=False).count(), 0)
+
+    def test_retries_give_up_after_max_retries(self):
+        sender = FakeFCMSender(flaky_tokens={'tok-004'}, flaky_times=10)
+
+        stats = self.run_broadcast(sender, max_retries=2)
+
+        self.assertEqual(stats['sent'], 22)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['retried'], 2)
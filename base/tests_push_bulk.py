@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""send_push_notifications_bulk: one saved notification per item, pushed in batches.
+
+Each device must still receive the notification_id of its own user's row, and
+the token lookup must not grow with the number of recipients.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from base.models import FCMToken, UserNotification
+from base.push_notifications import send_push_notification, send_push_notifications_bulk
+
+User = get_user_model()
+
+
+class BulkPushTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username='bulk%d' % i, email='bulk%d@example.com' % i,
+                password='x', phone='+88010009%04d' % i)
+            for i in range(6)
+        ]
+        FCMToken.objects.bulk_create(
+            [FCMToken(user=u, token='bulk-tok-%d-a' % i, device_type='android')
+             for i, u in enumerate(self.users)]
+            + [FCMToken(user=self.users[0], token='bulk-tok-0-b', device_type='ios')])
+
+    def send(self, items, **kwargs):
+        with mock.patch('base.fcm_service.send_fcm_notification_batch') as batch:
+            created = send_push_notifications_bulk(items, **kwargs)
+        messages = [m for call in batch.call_args_list for m in call.args[0]]
+        return created, messages
+
+    def test_each_device_gets_its_own_users_notification_id(self):
+        created, messages = self.send(
+            [(u, 'Hi %s' % u.username, 'body', '/x/%d' % u.pk) for u in self.users])
+
+        self.assertEqual(len(created), 6)
+        by_user = {n.user_id: n for n in UserNotification.objects.filter(user__in=self.users)}
+        self.assertEqual(len(by_user), 6)
+        self.assertEqual(len(messages), 7)
+        for token, title, _body, data in messages:
+            owner = FCMToken.objects.get(token=token).user_id
+            self.assertEqual(data['notification_id'], str(by_user[owner].pk))
+            self.assertEqual(data['deep_link'], '/x/%d' % owner)
+            self.assertEqual(title, by_user[owner].title)
+
+    def test_platform_restricts_the_push_but_not_the_rows(self):
+        created, messages = self.send(
+            [(u.pk, 'Hi', '', '') for u in self.users], platform='ios')
+
+        self.assertEqual(len(created), 6)
+        self.assertEqual([m[0] for m in messages], ['bulk-tok-0-b'])
+
+    def test_queries_do_not_grow_with_recipients(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.send([(u, 'Hi', '', '') for u in self.users])
+        token_reads = [q for q in ctx.captured_queries
+                       if f'FROM "{FCMToken._meta.db_table}"' in q['sql']]
+        self.assertEqual(len(token_reads), 1)
+
+    def test_send_push_notification_to_users_uses_the_bulk_path(self):
+        with mock.patch('base.fcm_service.send_fcm_notification_batch') as batch:
+            created = send_push_notification(title='Hello', users=self.users[:2])
+
+        self.assertEqual(len(created), 2)
+        self.assertEqual(batch.call_count, 1)
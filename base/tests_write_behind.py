@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Write-behind log: entries drain in seq order, in batches, one flusher at a
+time, and a seq taken but not yet stored is waited for once, then skipped.
+"""
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from base.write_behind import WriteBehindLog
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "write-behind-tests",
+        }
+    },
+)
+class WriteBehindLogTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.log = WriteBehindLog("test:log", 60, batch=2)
+        self.written = []
+
+    def flush(self, **kwargs):
+        return self.log.flush(lambda entries: self.written.append(list(entries)), **kwargs)
+
+    def test_entries_drain_in_order_and_in_batches(self):
+        for i in range(5):
+            self.log.append(i, also={"test:last": i})
+        self.assertEqual(self.log.depth(), 5)
+        self.assertEqual(cache.get("test:last"), 4)
+
+        self.assertEqual(self.flush(max_entries=3), 3)
+        self.assertEqual(self.written, [[0, 1], [2]])
+        self.assertEqual(self.log.oldest(), 3)
+
+        self.assertEqual(self.flush(), 2)
+        self.assertEqual(self.written[-1], [3, 4])
+        self.assertEqual(self.log.depth(), 0)
+        self.assertIsNone(self.log.oldest())
+
+    def test_a_missing_seq_is_waited_for_once(self):
+        self.log.append("a")
+        seq = self.log.append("lost")
+        self.log.append("c")
+        cache.delete(self.log.log_key % seq)
+
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(self.written, [["a"]])
+        self.assertEqual(self.log.depth(), 2)
+
+        self.assertEqual(self.flush(), 2)
+        self.assertEqual(self.written[-1], ["c"])
+        self.assertEqual(self.log.depth(), 0)
+
+    def test_one_flusher_at_a_time(self):
+        self.log.append("a")
+        cache.add(self.log.lock_key, 1)
+
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.log.depth(), 1)
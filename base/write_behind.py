@@ -0,0 +1,99 @@
+"""Append-only entry log in the Django cache, drained into Postgres in batches.
+
+Hot write paths (driver pings, feed impressions) append one entry per event
+and return; a periodic task drains the log and writes the whole batch in a
+few statements. For a log under ``prefix``:
+
+  * ``<prefix>:<seq>``       — one entry. ``seq`` comes from an atomic
+    ``cache.incr``, so concurrent writers never clobber each other.
+  * ``<prefix>:seq``         — the last seq handed out.
+  * ``<prefix>:flushed``     — the watermark: every seq up to it is written.
+  * ``<prefix>:stuck``       — a seq found missing on the previous flush.
+  * ``<prefix>:flush-lock``  — one flusher at a time.
+
+Only the Django cache API is used (``incr``/``add``/``get_many``), so the same
+code runs on Redis in production and on LocMemCache in tests.
+"""
+from django.core.cache import cache
+
+from .cache_counters import incr
+
+
+class WriteBehindLog:
+    """One log under ``prefix``; entries expire after ``ttl`` seconds."""
+
+    def __init__(self, prefix, ttl, batch=1000, lock_seconds=60):
+        self.log_key = prefix + ":%d"
+        self.seq_key = prefix + ":seq"
+        self.watermark_key = prefix + ":flushed"
+        self.stuck_key = prefix + ":stuck"
+        self.lock_key = prefix + ":flush-lock"
+        self.ttl = ttl
+        self.batch = batch
+        self.lock_seconds = lock_seconds
+
+    def append(self, entry, also=None):
+        """Log ``entry`` and return its seq. ``also`` ({key: value}) is
+        written in the same ``set_many``, with the same TTL."""
+        seq = incr(self.seq_key)
+        values = dict(also or {})
+        values[self.log_key % seq] = entry
+        cache.set_many(values, self.ttl)
+        return seq
+
+    def depth(self, values=None):
+        """Entries logged but not yet flushed. ``values`` may be a
+        ``get_many`` result that already holds the seq and watermark keys."""
+        if values is None:
+            values = cache.get_many([self.seq_key, self.watermark_key])
+        return max(0, values.get(self.seq_key, 0) - values.get(self.watermark_key, 0))
+
+    def oldest(self, values=None):
+        """The oldest entry not yet flushed, or None."""
+        if values is None:
+            values = cache.get_many([self.watermark_key])
+        return cache.get(self.log_key % (values.get(self.watermark_key, 0) + 1))
+
+    def flush(self, write, max_entries=None):
+        """Drain the log in seq order, ``write(entries)`` once per batch of
+        up to ``batch`` entries. Returns the number of seqs read, or 0 when
+        another flush holds the lock."""
+        if not cache.add(self.lock_key, 1, self.lock_seconds):
+            return 0
+        try:
+            head = cache.get(self.seq_key, 0)
+            watermark = cache.get(self.watermark_key, 0)
+            if max_entries is not None:
+                head = min(head, watermark + max_entries)
+
+            drained = 0
+            while watermark < head:
+                upper = min(head, watermark + self.batch)
+                seqs = list(range(watermark + 1, upper + 1))
+                found = cache.get_many([self.log_key % seq for seq in seqs])
+
+                entries = []
+                for seq in seqs:
+                    entry = found.get(self.log_key % seq)
+                    if entry is None:
+                        # The writer has taken this seq but not stored it yet.
+                        # Wait one run for it; if it is still missing then, it
+                        # was lost.
+                        if cache.get(self.stuck_key) != seq:
+                            cache.set(self.stuck_key, seq, self.ttl)
+                            upper = seq - 1
+                            break
+                        continue
+                    entries.append(entry)
+
+                if entries:
+                    write(entries)
+                cache.delete_many([self.log_key % seq for seq in range(watermark + 1, upper + 1)])
+                drained += upper - watermark
+                watermark = upper
+                cache.set(self.watermark_key, watermark, None)
+                if upper < seqs[-1]:
+                    break
+            return drained
+        finally:
+            cache.delete(self.lock_key)
@@ -0,0 +1,188 @@
+"""Retargeting audience membership, stored so one lookup moves one bucket.
+
+An audience used to be one cached Python ``set`` of user-id strings under
+``adaud:<advertiser>``, and serve_ad fetched and unpickled the whole set on
+every request to test a single viewer — megabytes per ad slot for a large
+advertiser.
+
+An audience is now split into ``2**k`` buckets by the high bits of each
+member's UUID (random for uuid4 ids), sized to roughly ``BUCKET_SIZE``
+members. Each bucket is the sorted 16-byte ids of its members concatenated
+into one ``bytes`` value, so the check is a binary search over a few KB.
+The small pointer at ``adaud:<advertiser>`` names the current build and its
+bucket count; a rebuild writes a fresh set of buckets under a new build
+token and flips the pointer last, so a reader never sees a half-written
+audience. Old buckets simply expire.
+
+Because buckets split on the high bits, members in ascending id order fill
+the buckets one after another: ``AudienceWriter`` takes them in that order
+(``ORDER BY`` on the uuid column) and holds a single bucket at a time, so
+the nightly build never has a whole audience in memory.
+
+serve_ad reads the pointers in its one get_many and then, for the
+retargeting ads still in the running, fetches only the viewer's bucket of
+each audience with one more (see ``member_of``). An ``adaud:`` key still
+holding a set from before the bucketed store is checked as it is, until the
+nightly build replaces it.
+"""
+import uuid
+
+from django.core.cache import cache
+
+POINTER_KEY = "adaud:%s"
+BUCKET_KEY = "adaud:%s:%s:%d"
+COUNT_KEY = "adaudcount:%s"
+TTL = 60 * 60 * 26
+BUCKET_SIZE = 256
+WRITE_BATCH = 64
+_ID_BYTES = 16
+
+
+def _as_bytes(user_id):
+    if isinstance(user_id, bytes) and len(user_id) == _ID_BYTES:
+        return user_id
+    if isinstance(user_id, uuid.UUID):
+        return user_id.bytes
+    return uuid.UUID(str(user_id)).bytes
+
+
+def _bucket(member, buckets):
+    # High bits: ascending ids walk the buckets in order.
+    return int.from_bytes(member[:4], "big") * buckets >> 32
+
+
+def _bucket_count(members):
+    buckets = 1
+    while buckets * BUCKET_SIZE < members:
+        buckets *= 2
+    return buckets
+
+
+class AudienceWriter:
+    """Writes one build of ``advertiser_id``'s audience from member ids
+    (UUIDs or UUID strings) added in ascending order, repeats allowed.
+
+    ``expected`` sizes the buckets; it only needs to be about right. Each
+    bucket goes out as soon as the first id past it arrives, in set_many
+    batches of ``WRITE_BATCH``; ``finish`` flips the pointer and returns the
+    member count.
+    """
+
+    def __init__(self, advertiser_id, expected):
+        self.advertiser_id = advertiser_id
+        self.buckets = _bucket_count(expected)
+        self.build = uuid.uuid4().hex[:8]
+        self.count = 0
+        self._index = None
+        self._part = []
+        self._last = None
+        self._batch = {}
+
+    def add(self, user_id):
+        try:
+            member = _as_bytes(user_id)
+        except (TypeError, ValueError):
+            return
+        if self._last is not None and member <= self._last:
+            if member == self._last:
+                return
+            raise ValueError("audience members must be added in ascending order")
+        self._last = member
+        index = _bucket(member, self.buckets)
+        if index != self._index:
+            self._close_bucket()
+            self._index = index
+        self._part.append(member)
+        self.count += 1
+
+    def _close_bucket(self):
+        if self._part:
+            key = BUCKET_KEY % (self.advertiser_id, self.build, self._index)
+            self._batch[key] = b"".join(self._part)
+            self._part = []
+        if len(self._batch) >= WRITE_BATCH:
+            cache.set_many(self._batch, TTL)
+            self._batch = {}
+
+    def finish(self):
+        self._close_bucket()
+        if self._batch:
+            cache.set_many(self._batch, TTL)
+            self._batch = {}
+        cache.set_many({
+            POINTER_KEY % self.advertiser_id: {
+                "build": self.build, "buckets": self.buckets, "count": self.count,
+            },
+            COUNT_KEY % self.advertiser_id: self.count,
+        }, TTL)
+        return self.count
+
+
+def write(advertiser_id, member_ids):
+    """Store ``member_ids`` (UUIDs or UUID strings, any order) as the audience
+    of ``advertiser_id``, replacing the previous build. Returns the member
+    count. Collects and sorts them first; use ``AudienceWriter`` directly
+    when the ids already come sorted.
+    """
+    members = set()
+    for user_id in member_ids:
+        try:
+            members.add(_as_bytes(user_id))
+        except (TypeError, ValueError):
+            continue
+    writer = AudienceWriter(advertiser_id, len(members))
+    for member in sorted(members):
+        writer.add(member)
+    return writer.finish()
+
+
+def contains(blob, user_id):
+    """Binary search for ``user_id`` in one bucket blob."""
+    if not blob:
+        return False
+    target = _as_bytes(user_id)
+    lo, hi = 0, len(blob) // _ID_BYTES
+    while lo < hi:
+        mid = (lo + hi) // 2
+        probe = blob[mid * _ID_BYTES:(mid + 1) * _ID_BYTES]
+        if probe < target:
+            lo = mid + 1
+        elif probe > target:
+            hi = mid
+        else:
+            return True
+    return False
+
+
+def bucket_key(advertiser_id, pointer, user_id):
+    """Cache key of the bucket ``user_id`` would be in, or None when
+    ``pointer`` is not a current-format audience pointer."""
+    if not isinstance(pointer, dict) or "build" not in pointer:
+        return None
+    return BUCKET_KEY % (
+        advertiser_id, pointer["build"],
+        _bucket(_as_bytes(user_id), pointer["buckets"]),
+    )
+
+
+def member_of(user_id, pointers):
+    """Advertisers (keys of ``pointers``, advertiser → pointer value as read
+    from ``POINTER_KEY``) whose audience contains ``user_id``. One get_many."""
+    keys = {}
+    found = set()
+    for advertiser_id, pointer in pointers.items():
+        if isinstance(pointer, (set, frozenset)):
+            # Legacy format: the whole audience as a set of id strings.
+            if str(user_id) in pointer:
+                found.add(advertiser_id)
+            continue
+        key = bucket_key(advertiser_id, pointer, user_id)
+        if key is not None:
+            keys[key] = advertiser_id
+    if keys:
+        blobs = cache.get_many(list(keys))
+        found.update(
+            advertiser_id for key, advertiser_id in keys.items()
+            if contains(blobs.get(key), user_id)
+        )
+    return found
@@ -0,0 +1,133 @@
+"""Per-process index of servable panel ads for serve_ad.
+
+serve_ad used to load up to 200 active AbnAdsPanel rows (with category and
+boosted post) on EVERY ad slot request, then throw most of them away on
+format and placement in Python. A feed page fills many slots, so a page cost
+that many identical queries.
+
+The active ads are now loaded once per process into ``placement → [IndexedAd]``
+buckets, with the static checks (boost/reel format rules, placement
+targeting) already applied and each ad's targeting pre-normalised. serve_ad
+only runs the per-request checks (schedule, budget, viewer targeting) on the
+bucket for its placement.
+
+The index is rebuilt when
+
+  * ``VERSION_KEY`` changes — ``invalidate()`` gives it a new token. It runs
+    on every AbnAdsPanel save/delete (signals.py) and after the code paths
+    that change an ad's status with a queryset ``update()``; or
+  * it is older than ``MAX_AGE`` — views/clicks, which feed the pick
+    weights, are bumped with ``F()`` updates no signal sees. The view cap
+    does not wait for that: ``_bill_ad`` reads the live counter after each
+    bill and completes the ad, and invalidates, as soon as it is reached.
+"""
+import time
+import uuid
+from dataclasses import dataclass
+
+from django.core.cache import cache
+
+VERSION_KEY = "bn_ad_index:version"
+MAX_AGE = 60
+
+
+@dataclass(frozen=True)
+class IndexedAd:
+    ad: object
+    # Lower-cased target areas; empty = everywhere.
+    locations: frozenset
+    # Genders the ad is limited to; empty = no gender targeting.
+    genders: frozenset
+    segments: frozenset
+
+
+_index = None
+
+
+def invalidate():
+    """Make every process rebuild its index on its next serve."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Never set, or evicted: start a new one so no process keeps
+        # trusting an index built against the old token.
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY)
+    return version
+
+
+def _indexed(ad):
+    genders = frozenset(
+        name for name, on in (
+            ("male", ad.male), ("female", ad.female), ("other", ad.other)
+        ) if on
+    )
+    if len(genders) == 3:
+        genders = frozenset()
+    return IndexedAd(
+        ad=ad,
+        locations=frozenset(
+            str(loc).strip().lower() for loc in (ad.target_locations or [])
+        ),
+        genders=genders,
+        segments=frozenset(ad.target_segments or []),
+    )
+
+
+def _servable_at(ad, placement):
+    from .ads_api import BOOST_PLACEMENTS
+
+    if ad.format == "boost":
+        if ad.boosted_post_id is None:
+            return False
+        # A boost is a REAL post — only placements that render a post card.
+        if placement not in BOOST_PLACEMENTS:
+            return False
+    elif placement == "shorts_reel":
+        # The shorts reel plays boosted posts only.
+        return False
+    # Placement targeting: empty list = everywhere. The reel is exempt so
+    # existing boost campaigns keep reaching it.
+    return (
+        placement == "shorts_reel"
+        or not ad.placements
+        or placement in ad.placements
+    )
+
+
+def build():
+    """``{placement: [IndexedAd, ...]}`` for every canonical placement."""
+    from .ads_api import VALID_PLACEMENTS, _PLACEMENT_ALIASES
+    from .models import AbnAdsPanel
+
+    placements = VALID_PLACEMENTS - set(_PLACEMENT_ALIASES)
+    ads = [
+        _indexed(ad)
+        for ad in AbnAdsPanel.objects.filter(status="active")
+        .select_related("category", "user", "boosted_post__author")
+        .order_by("pk")
+    ]
+    return {
+        placement: [entry for entry in ads if _servable_at(entry.ad, placement)]
+        for placement in placements
+    }
+
+
+def candidates(placement):
+    """Active ads that may run at ``placement``, before per-request checks."""
+    global _index
+
+    version = _version()
+    index = _index
+    if (
+        index is None
+        or index["version"] != version
+        or time.monotonic() - index["built_at"] > MAX_AGE
+    ):
+        index = {"version": version, "built_at": time.monotonic(), "buckets": build()}
+        _index = index
+    return index["buckets"].get(placement, [])
@@ -530,6 +530,11 @@ class AbnAdsPanelAdmin(admin.ModelAdmin):
                 f'"{ad.title[:40]}" — {reason} অব্যবহৃত budget ফেরত দেওয়া হয়েছে।',
             )
             refunded += 1
+        if refunded:
+            # Status flipped with update(), which the serve index never sees.
+            from .ad_index import invalidate
+
+            invalidate()
         self.message_user(
             request,
             f"{refunded} ad(s) rejected ({reason_key}); unspent budget refunded.",
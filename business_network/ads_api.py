@@ -19,8 +19,10 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from base.cache_counters import incr
 from base.models import User
 
+from . import ad_audiences, ad_index
 from .models import (
     AbnAdLead,
     AbnAdsPanel,
@@ -189,40 +191,64 @@ def serve_ad(request):
     if share and placement != "shorts_reel" and random.randint(1, 100) <= share:
         return Response({"fallback": "admob"})
 
-    # The shorts reel only carries boosted posts; other placements carry
-    # image/video creatives.
-    want_boost = placement == "shorts_reel"
+    # The index already holds only what each placement can render: boosted
+    # posts for the shorts reel, image/video creatives elsewhere.
+    indexed = ad_index.candidates(placement)
+    # ONE cache round trip for every per-ad / per-viewer counter the checks
+    # and the weighted pick below read — it used to be up to six gets per ad.
+    cap_day = now.date().isoformat()
+    state_keys = []
+    for entry in indexed:
+        ad = entry.ad
+        if ad.daily_budget:
+            state_keys.append(f"adpace:{ad.pk}:{today}")
+        if user is not None:
+            state_keys += [
+                f"adcap:{user.id}:{ad.pk}:{cap_day}",
+                f"adclose:{user.id}:{ad.pk}",
+                f"adrecent:{user.id}:{ad.pk}",
+            ]
+            if ad.category_id:
+                state_keys += [
+                    f"adcatclose:{user.id}:{ad.category_id}",
+                    f"adcatsoft:{user.id}:{ad.category_id}",
+                ]
+            if getattr(ad, "ad_objective", "") == "retargeting":
+                state_keys.append(ad_audiences.POINTER_KEY % ad.user_id)
+    state = cache.get_many(list(dict.fromkeys(state_keys))) if state_keys else {}
+
+    # Retargeting: fetch only the viewer's bucket of each audience in play.
+    audiences = set()
+    if user is not None:
+        pointers = {}
+        for entry in indexed:
+            if getattr(entry.ad, "ad_objective", "") == "retargeting":
+                pointer = state.get(ad_audiences.POINTER_KEY % entry.ad.user_id)
+                if pointer:
+                    pointers[entry.ad.user_id] = pointer
+        if pointers:
+            audiences = ad_audiences.member_of(user.id, pointers)
+
+    user_locs = set()
+    gender = age = None
+    profile = None
+    if user is not None:
+        for attr in ("city", "upazila", "state"):
+            v = (getattr(user, attr, "") or "").strip().lower()
+            if v:
+                user_locs.add(v)
+        gender = _user_gender(user)
+        age = _user_age(user)
+        profile = _ad_profile(user)
+    user_segments = set((profile.segments or [])) if profile else set()
 
-    qs = AbnAdsPanel.objects.filter(status="active").select_related(
-        "category", "boosted_post__author"
-    )
     candidates = []
-    for ad in qs[:200]:
-        is_boost = ad.format == "boost"
-        if is_boost:
-            if ad.boosted_post_id is None:
-                continue
-            # A boost is a REAL post — it can only be served where the client
-            # renders a post card. Everywhere else (compact list strips, app
-            # open, banners) expects a creative with a title and image, which a
-            # boost does not have. Boosts used to be limited to the reel alone,
-            # so a boosted post could never reach the feed at all.
-            if placement not in BOOST_PLACEMENTS:
-                continue
-        elif want_boost:
-            # The shorts reel plays boosted posts only.
-            continue
-        # Placement targeting: empty list = everywhere. The reel is exempt so
-        # existing boost campaigns keep reaching it exactly as before.
-        if (
-            placement != "shorts_reel"
-            and ad.placements
-            and placement not in ad.placements
-        ):
-            continue
+    for entry in indexed:
+        ad = entry.ad
         # Budget / view cap exhausted → auto-complete lazily.
         if ad.estimated_views and ad.views >= ad.estimated_views:
             AbnAdsPanel.objects.filter(pk=ad.pk).update(status="completed")
+            ad_index.invalidate()
             continue
         # Scheduling window.
         if ad.start_at and now < ad.start_at:
@@ -231,44 +257,26 @@ def serve_ad(request):
             continue
         # Daily pacing: stop for today once the daily budget is burned.
         if ad.daily_budget:
-            spent_today = Decimal(str(cache.get(f"adspend:{ad.pk}:{today}") or 0))
+            spent_today = Decimal(state.get(f"adpace:{ad.pk}:{today}") or 0) / 100
             if spent_today >= ad.daily_budget:
                 continue
         # Location targeting: only serve to users we KNOW are in a target
         # area (unknown location never matches a targeted ad).
-        if ad.target_locations:
-            locs = {str(l).strip().lower() for l in ad.target_locations}
-            user_locs = set()
-            if user is not None:
-                for attr in ("city", "upazila", "state"):
-                    v = (getattr(user, attr, "") or "").strip().lower()
-                    if v:
-                        user_locs.add(v)
-            if not (locs & user_locs):
-                continue
+        if entry.locations and not (entry.locations & user_locs):
+            continue
         # Targeted objectives need a known identity — never spend a
         # retargeting/segment-targeted budget on anonymous traffic.
         if user is None and (
             getattr(ad, "ad_objective", "") == "retargeting"
             or (getattr(ad, "ad_objective", "") == "engagement"
-                and ad.target_segments)
+                and entry.segments)
         ):
             continue
         if user is not None:
             # Gender targeting (only filters when the ad targets a subset
             # AND we actually know the viewer's gender).
-            g = _user_gender(user)
-            if g and not (ad.male and ad.female and ad.other):
-                allowed = set()
-                if ad.male:
-                    allowed.add("male")
-                if ad.female:
-                    allowed.add("female")
-                if ad.other:
-                    allowed.add("other")
-                if allowed and g not in allowed:
-                    continue
-            age = _user_age(user)
+            if gender and entry.genders and gender not in entry.genders:
+                continue
             if age is not None:
                 if ad.min_age and age < ad.min_age:
                     continue
@@ -276,30 +284,26 @@ def serve_ad(request):
                     continue
             # Objective targeting.
             objective = getattr(ad, "ad_objective", "engagement")
-            if objective == "engagement" and ad.target_segments:
+            if objective == "engagement" and entry.segments:
                 # Advertiser picked Interest-Brain segments — only matching
                 # users see it (unknown users don't burn targeted budget).
-                prof = _ad_profile(user)
-                segs = set((prof.segments or [])) if prof else set()
-                if not (segs & set(ad.target_segments)):
+                if not (user_segments & entry.segments):
                     continue
             elif objective == "retargeting":
                 # First-party audience membership (built nightly).
-                aud = cache.get(f"adaud:{ad.user_id}")
-                if not aud or str(user.id) not in aud:
+                if ad.user_id not in audiences:
                     continue
             # Daily frequency cap per user+ad — per objective: announcements
             # repeat least (2), retargeting most (6).
             objective_cap = {"announcement": 2, "retargeting": 6}.get(
                 objective, cfg.daily_frequency_cap
             )
-            cap_key = f"adcap:{user.id}:{ad.pk}:{now.date().isoformat()}"
-            if (cache.get(cap_key) or 0) >= objective_cap:
+            if (state.get(f"adcap:{user.id}:{ad.pk}:{cap_day}") or 0) >= objective_cap:
                 continue
             # ✕-closed: this ad or its whole category is muted for 48h.
-            if cache.get(f"adclose:{user.id}:{ad.pk}"):
+            if state.get(f"adclose:{user.id}:{ad.pk}"):
                 continue
-            if cache.get(f"adcatclose:{user.id}:{ad.category_id}"):
+            if state.get(f"adcatclose:{user.id}:{ad.category_id}"):
                 continue
         candidates.append(ad)
 
@@ -311,12 +315,10 @@ def serve_ad(request):
     # ad wins the slot.
     from .interest_brain import classify_ad
 
-    profile = _ad_profile(user)
     weights = (profile.category_weights or {}) if profile else {}
     iscores = (profile.interest_scores or {}) if profile else {}
     gaff = (profile.gender_affinity or {}) if profile else {}
     scored = []
-    user_segments = set((profile.segments or [])) if profile else set()
     for ad in candidates:
         w = 1.0 + float(weights.get(str(ad.category_id), 0))
         objective = getattr(ad, "ad_objective", "engagement")
@@ -355,7 +357,7 @@ def serve_ad(request):
         # Served to this user moments ago — push it far down so adjacent slots
         # get variety, but keep it eligible so a thin pool still fills.
         recency = 1.0
-        if user is not None and cache.get(f"adrecent:{user.id}:{ad.pk}"):
+        if user is not None and state.get(f"adrecent:{user.id}:{ad.pk}"):
             recency = 0.15
         # "Not interested" on a sibling ad: this category drops far down the
         # pick order but keeps serving, so closing one ad can't empty the feed.
@@ -363,7 +365,7 @@ def serve_ad(request):
         if (
             user is not None
             and ad.category_id
-            and cache.get(f"adcatsoft:{user.id}:{ad.category_id}")
+            and state.get(f"adcatsoft:{user.id}:{ad.category_id}")
         ):
             disliked = CLOSE_CATEGORY_SOFT_WEIGHT
         scored.append((ad, w * remaining * quality * recency * disliked))
@@ -526,20 +528,19 @@ def track_ad_events(request):
               else request.META.get("REMOTE_ADDR", "")) or "unknown"
         actor = f"ip:{ip}"
 
+    # Limiter counters are atomic increments: two bursts from one actor can no
+    # longer both read the old count and both slip under the ceiling.
     daily_key = f"adevents:{actor}:{today.isoformat()}"
-    daily_count = cache.get(daily_key) or 0
+    daily_count = incr(daily_key, len(events), 60 * 60 * 26) - len(events)
     if daily_count >= MAX_DAILY_EVENTS_PER_USER:
         return Response({"recorded": 0, "capped": True})
-    cache.set(daily_key, daily_count + len(events), 60 * 60 * 26)
 
     minute_key = f"adevmin:{actor}:{timezone.now().strftime('%H%M')}"
-    minute_count = (cache.get(minute_key) or 0) + len(events)
-    cache.set(minute_key, minute_count, 120)
+    minute_count = incr(minute_key, len(events), 120)
     if minute_count > 40:
         if user is not None:
             strikes_key = f"adstrikes:{user.id}:{today.isoformat()}"
-            strikes = (cache.get(strikes_key) or 0) + 1
-            cache.set(strikes_key, strikes, 60 * 60 * 26)
+            strikes = incr(strikes_key, 1, 60 * 60 * 26)
             if strikes == 3:
                 from .fraud_watch import raise_alert
                 raise_alert(
@@ -550,10 +551,7 @@ def track_ad_events(request):
                 )
         return Response({"recorded": 0, "throttled": True})
 
-    created = 0
-    viewer_views = 0
-    interest_bumps = {}  # category_id -> weight delta
-
+    parsed = []
     for ev in events:
         if not isinstance(ev, dict):
             continue
@@ -563,136 +561,57 @@ def track_ad_events(request):
         source = "admob" if (ev.get("source") == "admob") else "panel"
         placement = (ev.get("placement") or "").strip()[:30]
         placement = _PLACEMENT_ALIASES.get(placement, placement)
-        platform = (ev.get("platform") or "app").strip()[:10]
-
-        ad = None
-        if source == "panel":
-            ad_id = str(ev.get("ad") or "").strip()
-            if ad_id:
-                ad = AbnAdsPanel.objects.filter(pk=ad_id).first()
-            if ad is None:
-                continue
+        parsed.append({
+            "event_type": event_type,
+            "source": source,
+            "placement": placement,
+            "platform": (ev.get("platform") or "app").strip()[:10],
+            "ad": str(ev.get("ad") or "").strip() if source == "panel" else "",
+            "creator": str(ev.get("creator") or "").strip(),
+            "content": str(ev.get("content") or "")[:20],
+        })
 
-        creator = None
-        creator_id = str(ev.get("creator") or "").strip()
-        if creator_id:
-            creator = User.objects.filter(id=creator_id).first()
+    # Every ad and creator the batch mentions, one query each.
+    ads = AbnAdsPanel.objects.in_bulk({e["ad"] for e in parsed if e["ad"]})
+    creators = _users_by_id({e["creator"] for e in parsed if e["creator"]})
 
-        category = ad.category if ad else None
+    rows = []
+    per_ad = {}          # ad pk -> {"impressions": [placements], "clicks": n}
+    viewer_views = 0
+    interest_bumps = {}  # category_id -> weight delta
+
+    for e in parsed:
+        event_type = e["event_type"]
+        ad = ads.get(e["ad"]) if e["source"] == "panel" else None
+        if e["source"] == "panel" and ad is None:
+            continue
+        category_id = ad.category_id if ad else None
 
-        AdEvent.objects.create(
+        rows.append(AdEvent(
             ad=ad,
-            source=source,
+            source=e["source"],
             event_type=event_type,
-            placement=placement,
-            platform=platform,
+            placement=e["placement"],
+            platform=e["platform"],
             user=user,
-            creator=creator,
-            category=category,
+            creator=creators.get(e["creator"]),
+            category_id=category_id,
             # The BN post the ad rode on — per-content creator earnings.
-            content_id=str(ev.get("content") or "")[:20],
-        )
-        created += 1
+            content_id=e["content"],
+        ))
+
+        if ad is not None and user is not None:
+            if event_type == "undo_close":
+                _undo_close(user, ad)
+            elif event_type == "close":
+                _close(user, ad)
 
-        # Undo: the viewer took the ✕ back, so every trace of it goes. ✕ is a
-        # small target right next to the ad, and without this a mis-tap cost
-        # them that advertiser for 30 days.
-        if ad is not None and event_type == "undo_close" and user is not None:
-            cache.delete(f"adclose:{user.id}:{ad.pk}")
-            if ad.category_id:
-                cat = ad.category_id
-                cache.delete(f"adcatsoft:{user.id}:{cat}")
-                cache.delete(f"adcatclose:{user.id}:{cat}")
-                seen = list(cache.get(f"adcatcloses:{user.id}:{cat}") or [])
-                if str(ad.pk) in seen:
-                    seen.remove(str(ad.pk))
-                    cache.set(
-                        f"adcatcloses:{user.id}:{cat}",
-                        seen,
-                        CLOSE_CATEGORY_WINDOW_SECONDS,
-                    )
-
-        # ✕ close: graded suppression (see CLOSE_* above). No billing, no
-        # reward — just the signal.
-        if ad is not None and event_type == "close" and user is not None:
-            cache.set(f"adclose:{user.id}:{ad.pk}", 1, CLOSE_SUPPRESS_SECONDS)
-            if ad.category_id:
-                cat = ad.category_id
-                # Demote the category straight away — still eligible, far less
-                # likely to win a slot.
-                cache.set(
-                    f"adcatsoft:{user.id}:{cat}", 1,
-                    CLOSE_CATEGORY_SOFT_SECONDS,
-                )
-                # Count DISTINCT closed ads, so hammering ✕ on one creative
-                # cannot mute a whole category on its own.
-                seen_key = f"adcatcloses:{user.id}:{cat}"
-                seen = cache.get(seen_key) or []
-                if str(ad.pk) not in seen:
-                    seen = list(seen) + [str(ad.pk)]
-                    cache.set(seen_key, seen, CLOSE_CATEGORY_WINDOW_SECONDS)
-                if len(seen) >= CLOSE_CATEGORY_MUTE_THRESHOLD:
-                    cache.set(
-                        f"adcatclose:{user.id}:{cat}", 1,
-                        CLOSE_CATEGORY_MUTE_SECONDS,
-                    )
-
-        # Panel counters + budget burn (CPV per billable impression). A
-        # per-user+ad daily dedupe cap keeps repeat exposure from burning
-        # budget beyond the frequency cap.
         if ad is not None:
+            counts = per_ad.setdefault(ad.pk, {"impressions": [], "clicks": 0})
             if event_type == "impression":
-                billable = True
-                if user is not None:
-                    # Daily frequency cap: counted HERE, on a real impression,
-                    # not when serve_ad hands the creative out. serve_ad only
-                    # sets a short "just served" marker.
-                    cap_key = (
-                        f"adcap:{user.id}:{ad.pk}:{today.isoformat()}"
-                    )
-                    try:
-                        cache.set(
-                            cap_key, (cache.get(cap_key) or 0) + 1, 60 * 60 * 26
-                        )
-                    except Exception:
-                        pass
-                    dedupe_key = (
-                        f"adbill:{user.id}:{ad.pk}:{today.isoformat()}"
-                    )
-                    seen = cache.get(dedupe_key) or 0
-                    if seen >= cfg.daily_frequency_cap:
-                        billable = False
-                    else:
-                        cache.set(dedupe_key, seen + 1, 60 * 60 * 26)
-                if billable:
-                    # CPV tiering: objective first (retargeting premium,
-                    # announcement cheap), then placement tier.
-                    rate = cfg.cpv_for(
-                        placement, getattr(ad, "ad_objective", None)
-                    )
-                    AbnAdsPanel.objects.filter(pk=ad.pk).update(
-                        views=F("views") + 1,
-                        spent=F("spent") + rate,
-                    )
-                    # Daily pacing counter (serve stops at daily_budget).
-                    spend_key = f"adspend:{ad.pk}:{today.isoformat()}"
-                    prev = Decimal(str(cache.get(spend_key) or 0))
-                    cache.set(spend_key, str(prev + rate), 60 * 60 * 26)
-                    _advertiser_milestones(ad)
-                    if ad.estimated_views and ad.views + 1 >= ad.estimated_views:
-                        AbnAdsPanel.objects.filter(pk=ad.pk).update(
-                            status="completed"
-                        )
-                        notify_advertiser(
-                            ad,
-                            "বিজ্ঞাপন সম্পন্ন হয়েছে 🎉",
-                            f'"{ad.title[:40]}" তার সব views পূর্ণ করেছে। '
-                            "এক ট্যাপে আবার চালাতে পারেন।",
-                        )
+                counts["impressions"].append(e["placement"])
             elif event_type in ("click", "cta_click"):
-                AbnAdsPanel.objects.filter(pk=ad.pk).update(
-                    clicks=F("clicks") + 1
-                )
+                counts["clicks"] += 1
 
         # Viewer reward counter — every tracked impression counts, both
         # AdMob and panel (the user asked to reward total ad exposure).
@@ -700,11 +619,16 @@ def track_ad_events(request):
             viewer_views += 1
 
         # Interest profile: impressions nudge, clicks push hard.
-        if user is not None and category is not None:
+        if user is not None and category_id is not None:
             delta = 1.0 if event_type == "impression" else 4.0
-            key = str(category.pk)
+            key = str(category_id)
             interest_bumps[key] = interest_bumps.get(key, 0.0) + delta
 
+    AdEvent.objects.bulk_create(rows)
+
+    for ad_pk, counts in per_ad.items():
+        _bill_ad(ads[ad_pk], counts, user, cfg, today)
+
     if user is not None and viewer_views and cfg.viewer_reward_enabled:
         row, _ = AdViewerDaily.objects.get_or_create(user=user, date=today)
         AdViewerDaily.objects.filter(pk=row.pk).update(
@@ -719,7 +643,132 @@ def track_ad_events(request):
         profile.category_weights = weights
         profile.save(update_fields=["category_weights", "updated_at"])
 
-    return Response({"recorded": created})
+    return Response({"recorded": len(rows)})
+
+
+def _users_by_id(ids):
+    """{id string: User} for the ids that parse as a User pk and exist."""
+    pks = set()
+    for raw in ids:
+        try:
+            pks.add(User._meta.pk.to_python(raw))
+        except Exception:
+            continue
+    if not pks:
+        return {}
+    return {str(u.pk): u for u in User.objects.filter(pk__in=pks)}
+
+
+def _undo_close(user, ad):
+    """Undo: the viewer took the ✕ back, so every trace of it goes. ✕ is a
+    small target right next to the ad, and without this a mis-tap cost them
+    that advertiser for 30 days."""
+    cache.delete(f"adclose:{user.id}:{ad.pk}")
+    if ad.category_id:
+        cat = ad.category_id
+        cache.delete(f"adcatsoft:{user.id}:{cat}")
+        cache.delete(f"adcatclose:{user.id}:{cat}")
+        seen = list(cache.get(f"adcatcloses:{user.id}:{cat}") or [])
+        if str(ad.pk) in seen:
+            seen.remove(str(ad.pk))
+            cache.set(
+                f"adcatcloses:{user.id}:{cat}",
+                seen,
+                CLOSE_CATEGORY_WINDOW_SECONDS,
+            )
+
+
+def _close(user, ad):
+    """✕ close: graded suppression (see CLOSE_* above). No billing, no
+    reward — just the signal."""
+    cache.set(f"adclose:{user.id}:{ad.pk}", 1, CLOSE_SUPPRESS_SECONDS)
+    if ad.category_id:
+        cat = ad.category_id
+        # Demote the category straight away — still eligible, far less
+        # likely to win a slot.
+        cache.set(
+            f"adcatsoft:{user.id}:{cat}", 1,
+            CLOSE_CATEGORY_SOFT_SECONDS,
+        )
+        # Count DISTINCT closed ads, so hammering ✕ on one creative
+        # cannot mute a whole category on its own.
+        seen_key = f"adcatcloses:{user.id}:{cat}"
+        seen = cache.get(seen_key) or []
+        if str(ad.pk) not in seen:
+            seen = list(seen) + [str(ad.pk)]
+            cache.set(seen_key, seen, CLOSE_CATEGORY_WINDOW_SECONDS)
+        if len(seen) >= CLOSE_CATEGORY_MUTE_THRESHOLD:
+            cache.set(
+                f"adcatclose:{user.id}:{cat}", 1,
+                CLOSE_CATEGORY_MUTE_SECONDS,
+            )
+
+
+def _bill_ad(ad, counts, user, cfg, today):
+    """Apply one request's events for ``ad``: panel counters + budget burn
+    (CPV per billable impression) as ONE update, and the pacing/frequency
+    counters as one atomic increment each.
+
+    A per-user+ad daily dedupe cap keeps repeat exposure from burning budget
+    beyond the frequency cap.
+    """
+    placements = counts["impressions"]
+    billable = placements
+    if placements and user is not None:
+        day = today.isoformat()
+        n = len(placements)
+        # Daily frequency cap: counted HERE, on a real impression, not when
+        # serve_ad hands the creative out. serve_ad only sets a short "just
+        # served" marker.
+        try:
+            incr(f"adcap:{user.id}:{ad.pk}:{day}", n, 60 * 60 * 26)
+        except Exception:
+            pass
+        # Billing dedupe: reserve n slots at once; only the ones that were
+        # still under the cap before this batch bill.
+        seen = incr(f"adbill:{user.id}:{ad.pk}:{day}", n, 60 * 60 * 26) - n
+        billable = placements[: max(0, cfg.daily_frequency_cap - seen)]
+
+    # CPV tiering: objective first (retargeting premium, announcement cheap),
+    # then placement tier.
+    objective = getattr(ad, "ad_objective", None)
+    spend = sum(
+        (cfg.cpv_for(placement, objective) for placement in billable),
+        Decimal("0"),
+    )
+    if billable or counts["clicks"]:
+        AbnAdsPanel.objects.filter(pk=ad.pk).update(
+            views=F("views") + len(billable),
+            spent=F("spent") + spend,
+            clicks=F("clicks") + counts["clicks"],
+        )
+    if not billable:
+        return
+
+    # Daily pacing counter (serve stops at daily_budget), kept in paisa so it
+    # can be an atomic integer increment.
+    incr(
+        f"adpace:{ad.pk}:{today.isoformat()}",
+        int((spend * 100).to_integral_value()),
+        60 * 60 * 26,
+    )
+    # The live counters, not this request's copy plus its own bill: other
+    # requests bill the same ad concurrently, and serve_ad only sees the
+    # index's copy, up to ad_index.MAX_AGE old, until the ad leaves it.
+    ad.views, ad.spent = AbnAdsPanel.objects.filter(pk=ad.pk).values_list(
+        "views", "spent").get()
+    _advertiser_milestones(ad)
+    if (
+        ad.estimated_views and ad.views >= ad.estimated_views
+        and AbnAdsPanel.objects.filter(pk=ad.pk, status="active").update(status="completed")
+    ):
+        ad_index.invalidate()
+        notify_advertiser(
+            ad,
+            "বিজ্ঞাপন সম্পন্ন হয়েছে 🎉",
+            f'"{ad.title[:40]}" তার সব views পূর্ণ করেছে। '
+            "এক ট্যাপে আবার চালাতে পারেন।",
+        )
 
 
 @api_view(["POST"])
@@ -0,0 +1,198 @@
+"""Candidate generation for the ranked Business Network feed.
+
+The ranked feed (BusinessNetworkPostListCreateView.get_queryset) scores a post
+with a dozen per-row expressions — relationship, recency, heat, interest tags,
+seen penalty, jitter. Scoring is cheap per row; doing it to EVERY visible post
+on every page request, then sorting the lot, is not. Nearly all of that work is
+wasted: a post from a stranger, a month old, with no engagement, never makes
+the first hundred pages.
+
+So ranking happens in two stages. This module keeps a bounded per-user pool of
+post ids worth scoring (``POOL_SIZE`` ids from the last ``POOL_WINDOW_DAYS``),
+and the view scores and pages only those. The pool is built from cheap indexed
+reads — posts by the user's network, posts carrying their interest tags, and
+the newest and most recently active public posts — and then kept current
+incrementally instead of rebuilt:
+
+  * a new post is pushed into the pools of its author's followers, and into a
+    global "fresh" list everyone draws from;
+  * a like/comment/save pushes the post into a global "active" list, so a post
+    heating up reaches people whose pool was built before it did.
+
+A pool under ``MIN_POOL_SIZE`` is not used at all — that only happens when
+the last month holds few posts — and the view scores the full visible set
+exactly as before, which at that size is cheap anyway.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+POOL_SIZE = 500
+POOL_WINDOW_DAYS = 30
+POOL_TTL = 60 * 30
+# Incremental pushes keep refreshing the TTL, so an active user's pool could
+# live forever; past this age it is rebuilt so the interest/active parts and
+# the network's older posts catch up.
+POOL_MAX_AGE = 60 * 60 * 2
+MIN_POOL_SIZE = 60
+# How the pool is split between sources before the network tops it up.
+NETWORK_SHARE = 300
+INTEREST_SHARE = 60
+ACTIVE_SHARE = 70
+FRESH_SHARE = 70
+# Global lists every request folds in; small, so reading them is one get_many.
+GLOBAL_LIST_SIZE = 150
+GLOBAL_LIST_TTL = 60 * 60 * 24
+# Pushing a new post into follower pools is done inline, in chunks; beyond
+# this many followers the author is reached through the fresh list instead.
+FANOUT_FOLLOWER_LIMIT = 5000
+FANOUT_CHUNK = 500
+
+FRESH_KEY = "bn_feed_fresh"
+ACTIVE_KEY = "bn_feed_active"
+
+
+def _pool_key(user_id):
+    return f"bn_feed_pool:{user_id}"
+
+
+def enabled():
+    return getattr(settings, "BN_FEED_CANDIDATE_POOL", True)
+
+
+def _merge(*groups, limit):
+    merged = []
+    seen = set()
+    for group in groups:
+        for post_id in group:
+            if post_id in seen:
+                continue
+            seen.add(post_id)
+            merged.append(post_id)
+            if len(merged) >= limit:
+                return merged
+    return merged
+
+
+def build_pool(user, relationships):
+    """Select up to POOL_SIZE candidate post ids for ``user``.
+
+    ``relationships`` is the view's cached relationship dict (following,
+    followers, second_degree, interest_tags, co_engaged_authors).
+    """
+    from .models import BusinessNetworkPost
+
+    window_start = timezone.now() - timedelta(days=POOL_WINDOW_DAYS)
+    recent = BusinessNetworkPost.objects.filter(
+        is_banned=False, created_at__gte=window_start
+    )
+    network_ids = {
+        user.id,
+        *relationships.get("following", []),
+        *relationships.get("followers", []),
+        *relationships.get("second_degree", []),
+        *relationships.get("co_engaged_authors", []),
+    }
+
+    network = list(
+        recent.filter(author_id__in=network_ids)
+        .order_by("-created_at")
+        .values_list("id", flat=True)[:POOL_SIZE]
+    )
+    interest = []
+    interest_tags = relationships.get("interest_tags") or []
+    if interest_tags:
+        interest = list(
+            recent.filter(tags__tag__in=interest_tags)
+            .order_by("-created_at")
+            .values_list("id", flat=True)
+            .distinct()[:INTEREST_SHARE]
+        )
+    public = recent.filter(visibility="public")
+    active = list(
+        public.filter(last_activity_at__isnull=False)
+        .order_by("-last_activity_at")
+        .values_list("id", flat=True)[:ACTIVE_SHARE]
+    )
+    fresh = list(
+        public.order_by("-created_at").values_list("id", flat=True)[:FRESH_SHARE]
+    )
+
+    return _merge(
+        network[:NETWORK_SHARE], interest, active, fresh, network[NETWORK_SHARE:],
+        limit=POOL_SIZE,
+    )
+
+
+def candidate_ids(user, relationships):
+    """Post ids the ranked feed should score for ``user``, or None for "all".
+
+    None means the pool is too small to be worth restricting to — the caller
+    scores the full visible set as it always did.
+    """
+    key = _pool_key(user.id)
+    found = cache.get_many([key, FRESH_KEY, ACTIVE_KEY])
+    pool = found.get(key)
+    now = timezone.now().timestamp()
+    if pool is None or now - pool["built_at"] > POOL_MAX_AGE:
+        pool = {"ids": build_pool(user, relationships), "built_at": now}
+        cache.set(key, pool, POOL_TTL)
+
+    if len(pool["ids"]) < MIN_POOL_SIZE:
+        return None
+    return _merge(
+        pool["ids"], found.get(FRESH_KEY) or [], found.get(ACTIVE_KEY) or [],
+        limit=POOL_SIZE + 2 * GLOBAL_LIST_SIZE,
+    )
+
+
+def invalidate_pool(*users):
+    """Drop pools whose inputs changed (follow/unfollow); rebuilt on next read."""
+    cache.delete_many([_pool_key(getattr(u, "id", u)) for u in users if u])
+
+
+def _push_global(key, post_id):
+    # Read-modify-write without a lock: two writers racing can drop one id,
+    # which only costs that post a slot until the next pool rebuild.
+    ids = [pid for pid in (cache.get(key) or []) if pid != post_id]
+    cache.set(key, [post_id, *ids][:GLOBAL_LIST_SIZE], GLOBAL_LIST_TTL)
+
+
+def note_activity(post_id):
+    """A post's counters moved — let every feed consider it."""
+    _push_global(ACTIVE_KEY, post_id)
+
+
+def push_new_post(post):
+    """Add a freshly created post to its audience's pools."""
+    from .models import BusinessNetworkFollowerModel
+
+    if post.is_banned:
+        return
+    if post.visibility == "public":
+        _push_global(FRESH_KEY, post.id)
+
+    follower_ids = list(
+        BusinessNetworkFollowerModel.objects.filter(following_id=post.author_id)
+        .values_list("follower_id", flat=True)[:FANOUT_FOLLOWER_LIMIT]
+    )
+    audience = [post.author_id, *follower_ids]
+    for start in range(0, len(audience), FANOUT_CHUNK):
+        keys = [_pool_key(uid) for uid in audience[start:start + FANOUT_CHUNK]]
+        # Only pools that exist are touched; a missing one is built fresh,
+        # with this post in it, on the user's next feed read.
+        pools = cache.get_many(keys)
+        if not pools:
+            continue
+        cache.set_many(
+            {
+                key: {
+                    "ids": [post.id, *[pid for pid in pool["ids"] if pid != post.id]][:POOL_SIZE],
+                    "built_at": pool["built_at"],
+                }
+                for key, pool in pools.items()
+            },
+            POOL_TTL,
+        )
@@ -0,0 +1,147 @@
+"""Write-behind buffer for feed impressions (PostSeen).
+
+Every feed page used to persist its impressions inline: a PostSeen SELECT, a
+``bulk_create`` for new pairs and an ``UPDATE ... times_seen = F() + 1`` for
+the rest — three statements, and row locks on a hot table, on the response
+path of the most requested endpoint in the app.
+
+With ``BN_IMPRESSIONS_WRITE_BEHIND`` on (the default), serving a page only
+appends one entry to a cache log:
+
+  * ``bn:seen:log:<seq>`` — ``{"u": user_id, "p": [post ids], "at": ts}``,
+    in a base.write_behind log.
+
+``flush()`` (the ``flush_feed_impressions`` task, every few seconds) drains the
+log, folds it into one ``(user, post) → count, last seen`` map and merges that
+into PostSeen with ONE ``INSERT ... ON CONFLICT DO UPDATE`` per batch.
+
+The per-user ``business_network_seen_posts`` cache list still gives the next
+page read-your-writes demotion, so the few seconds a batch waits are never
+visible in the feed. ``stats()`` reports the buffer depth and flush lag.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from base.cache_counters import incr
+from base.write_behind import WriteBehindLog
+
+logger = logging.getLogger(__name__)
+
+LAST_FLUSH_KEY = "bn:seen:last-flush"
+STAT_KEY = "bn:seenstat:%s"
+
+STAT_NAMES = ("buffered", "flushed_rows")
+
+# Many missed flushes' worth; a log entry older than this is simply lost,
+# which only costs a little seen-demotion.
+BUFFER_TTL = 60 * 60 * 6
+FLUSH_BATCH = 1000
+FLUSH_LOCK_SECONDS = 120
+UPSERT_CHUNK = 1000
+
+_log = WriteBehindLog("bn:seen:log", BUFFER_TTL, FLUSH_BATCH, FLUSH_LOCK_SECONDS)
+
+
+def enabled():
+    return bool(getattr(settings, "BN_IMPRESSIONS_WRITE_BEHIND", True))
+
+
+def _bump(name, amount=1):
+    incr(STAT_KEY % name, amount)
+
+
+def record(user_id, post_ids):
+    """Buffer one served page of impressions for ``user_id``."""
+    _log.append({"u": str(user_id), "p": list(post_ids), "at": timezone.now().timestamp()})
+    _bump("buffered")
+
+
+def record_now(user_id, post_ids):
+    """Persist impressions inline — the path used before the buffer existed.
+
+    Kept for when the buffer is switched off or the cache is unreachable.
+    """
+    upsert({(str(user_id), post_id): (1, timezone.now()) for post_id in post_ids})
+
+
+def stats():
+    """Buffer depth and flush lag, for the task log and ``bn_impressions``.
+
+    ``depth``        log entries (feed pages) not yet merged into PostSeen
+    ``lag_seconds``  age of the oldest of them — how far PostSeen is behind
+    ``last_flush``   when a flush last merged anything, with how many rows
+    """
+    keys = [STAT_KEY % name for name in STAT_NAMES]
+    values = cache.get_many(keys + [_log.seq_key, _log.watermark_key, LAST_FLUSH_KEY])
+    result = {name: values.get(STAT_KEY % name, 0) for name in STAT_NAMES}
+    result["depth"] = _log.depth(values)
+    result["lag_seconds"] = 0.0
+    if result["depth"]:
+        oldest = _log.oldest(values)
+        if oldest is not None:
+            result["lag_seconds"] = round(timezone.now().timestamp() - oldest["at"], 1)
+    result["last_flush"] = values.get(LAST_FLUSH_KEY)
+    return result
+
+
+def _aggregate(entries):
+    merged = {}
+    for entry in entries:
+        seen_at = datetime.fromtimestamp(entry["at"], tz=dt_timezone.utc)
+        for post_id in entry["p"]:
+            key = (entry["u"], post_id)
+            count, last = merged.get(key, (0, seen_at))
+            merged[key] = (count + 1, max(last, seen_at))
+    return merged
+
+
+def upsert(merged):
+    """Merge ``{(user_id, post_id): (count, last_seen_at)}`` into PostSeen.
+
+    One statement per chunk. Pairs whose post or user was deleted since the
+    impression are dropped by the joins instead of failing the whole batch.
+    """
+    from base.models import User
+
+    from .models import BusinessNetworkPost, PostSeen
+
+    rows = [
+        (user_id, post_id, count, last_seen_at)
+        for (user_id, post_id), (count, last_seen_at) in merged.items()
+    ]
+    seen_table = PostSeen._meta.db_table
+    written = 0
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[start:start + UPSERT_CHUNK]
+        placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(chunk))
+        sql = (
+            f"INSERT INTO {seen_table} (user_id, post_id, times_seen, last_seen_at) "
+            f"SELECT v.user_id::uuid, v.post_id, v.n::integer, v.at::timestamptz "
+            f"FROM (VALUES {placeholders}) AS v (user_id, post_id, n, at) "
+            f"JOIN {BusinessNetworkPost._meta.db_table} p ON p.id = v.post_id "
+            f"JOIN {User._meta.db_table} u ON u.id = v.user_id::uuid "
+            f"ON CONFLICT (user_id, post_id) DO UPDATE SET "
+            f"times_seen = {seen_table}.times_seen + EXCLUDED.times_seen, "
+            f"last_seen_at = GREATEST({seen_table}.last_seen_at, EXCLUDED.last_seen_at)"
+        )
+        params = [value for row in chunk for value in row]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            written += max(cursor.rowcount, 0)
+    return written
+
+
+def _write(entries):
+    rows = upsert(_aggregate(entries))
+    _bump("flushed_rows", rows)
+    cache.set(LAST_FLUSH_KEY, {"at": timezone.now().isoformat(), "rows": rows}, None)
+
+
+def flush(max_entries=None):
+    """Drain the impression log into PostSeen. Returns the entries read."""
+    return _log.flush(_write, max_entries)
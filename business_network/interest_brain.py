@@ -8,23 +8,31 @@ Design (all in-process, no extra infra):
 1. A fixed INTEREST_TAXONOMY of segments, each with Bangla + English
    keywords. Content is classified by keyword hits — cheap, transparent,
    and easy to tune from one place.
-2. `build_profile(user)` sweeps the user's last 30 days of activity,
-   classifies every piece of content they touched, and weights it by how
-   strong the signal is (save > comment > like > watch > feed view;
-   hide/report are negative). Scores are normalized to 0–100.
+2. `build_profiles(user_ids)` reads a batch of users' activity with one
+   grouped query per signal, joins it to the stored hits of the content
+   they touched, and weights it by how strong the signal is (save >
+   comment > like > watch > feed view; hide/report are negative). Raw
+   totals are kept on the profile and decay with HALF_LIFE_DAYS, so each
+   nightly build reads only the activity since the last one. Scores are
+   normalized to 0–100.
 3. Results land on UserAdProfile: `interest_scores` (per-segment 0–100),
    `segments` (top segments + activity level), `gender_affinity` (share of
    engagement on male vs female creators' content).
-4. serve_ad() classifies each ad's text the same way (cached) and boosts
-   ads whose segments overlap the viewer's — on top of the existing
-   ad-category weights, frequency caps and targeting filters.
-
-Run nightly via `build_interest_profiles` (celery beat).
+4. serve_ad() reads each ad's segments the same way and boosts ads whose
+   segments overlap the viewer's — on top of the existing ad-category
+   weights, frequency caps and targeting filters.
+5. Classification runs once per piece of content, not once per read: posts
+   and ads keep their keyword hits in ``interest_hits``, recomputed by a
+   pre_save signal only when the text hash changes (and for posts, when
+   tags change). Rows from before that existed are filled on first read.
+
+Run nightly via `build_interest_profiles` (celery beat), optionally split
+across BN_INTEREST_BRAIN_SHARDS worker processes.
 """
+import hashlib
 import logging
 from datetime import timedelta
 
-from django.core.cache import cache
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -116,8 +124,14 @@ W_HIDE = -6.0
 W_REPORT = -8.0
 
 LOOKBACK_DAYS = 30
-# Per-signal row caps keep one hyperactive user from stalling the nightly job.
-ROW_CAP = 500
+# Scores decay instead of dropping off a hard 30-day edge. At this half-life a
+# steady activity rate settles at the same total a 30-day window held
+# (30 * ln 2 ≈ 21 days), so the activity thresholds keep their meaning.
+HALF_LIFE_DAYS = 21
+# Users per round of grouped activity queries in build_profiles.
+PROFILE_BATCH = 500
+# Post/ad ids per vector lookup.
+VECTOR_CHUNK = 2000
 
 # ── Soft mood/tone word lists (NOT a clinical assessment — a light content
 # tone signal so serving/feed can soften experiences for low-tone users). ──
@@ -133,153 +147,347 @@ NEGATIVE_WORDS = (
 )
 
 
+def taxonomy_version():
+    """Fingerprint of the keyword lists the matchers are compiled from."""
+    return text_hash(
+        *(f"{seg}={'|'.join(kws)}" for seg, kws in INTEREST_TAXONOMY.items()),
+        "+" + "|".join(POSITIVE_WORDS), "-" + "|".join(NEGATIVE_WORDS),
+    )
+
+
+_compiled_matchers = None
+
+
+def _compiled():
+    """(interest matcher, its segment per keyword, mood matcher, mood signs).
+
+    Compiled on first use in each process. The taxonomy lives in code, so a
+    new version only ever arrives with a new process; ``taxonomy_version()``
+    identifies which one a process compiled.
+    """
+    global _compiled_matchers
+    if _compiled_matchers is None:
+        from .keyword_matcher import KeywordMatcher
+
+        segments = [seg for seg, kws in INTEREST_TAXONOMY.items() for _ in kws]
+        keywords = [kw for kws in INTEREST_TAXONOMY.values() for kw in kws]
+        signs = [1] * len(POSITIVE_WORDS) + [-1] * len(NEGATIVE_WORDS)
+        _compiled_matchers = (
+            KeywordMatcher(keywords), segments,
+            KeywordMatcher(POSITIVE_WORDS + NEGATIVE_WORDS), signs,
+        )
+        logger.info("interest matchers compiled for taxonomy %s", taxonomy_version())
+    return _compiled_matchers
+
+
 def classify_text(text):
-    """Return {segment: hit_count} for a blob of content text."""
+    """Return {segment: hit_count} for a blob of content text — the number of
+    each segment's keywords that occur in it, found in one pass."""
     if not text:
         return {}
-    t = text.lower()
-    hits = {}
-    for segment, keywords in INTEREST_TAXONOMY.items():
-        n = sum(1 for kw in keywords if kw in t)
-        if n:
-            hits[segment] = n
-    return hits
+    matcher, segments, _, _ = _compiled()
+    counts = {}
+    for index in matcher.found(text.lower()):
+        seg = segments[index]
+        counts[seg] = counts.get(seg, 0) + 1
+    return {seg: counts[seg] for seg in INTEREST_TAXONOMY if seg in counts}
+
+
+def mood_counts(text):
+    """(positive, negative) mood-word occurrences in ``text``."""
+    if not text:
+        return 0, 0
+    _, _, matcher, signs = _compiled()
+    pos = neg = 0
+    for index, n in matcher.counts(text.lower()).items():
+        if signs[index] > 0:
+            pos += n
+        else:
+            neg += n
+    return pos, neg
 
 
 def _post_text(post):
     if post is None:
         return ""
     parts = [post.title or "", post.content or ""]
-    try:
-        parts.extend(t.tag for t in post.tags.all()[:10])
-    except Exception:
-        pass
+    if not post._state.adding:  # a post being created has no tags yet
+        try:
+            parts.extend(t.tag for t in post.tags.all()[:10])
+        except Exception:
+            pass
     return " ".join(parts)
 
 
+def text_hash(*parts):
+    """Fingerprint of the text a classification was computed from."""
+    joined = "\x1f".join(part or "" for part in parts)
+    return hashlib.md5(joined.encode("utf-8")).hexdigest()
+
+
+def refresh_post_hits(post, persist=False):
+    """Re-classify ``post`` onto its ``interest_hits`` / ``interest_text_hash``.
+
+    Called from pre_save with ``persist=False`` (the save writes the fields);
+    elsewhere ``persist=True`` writes them with an update(), so no signals and
+    no ``updated_at`` bump.
+    """
+    post.interest_hits = classify_text(_post_text(post))
+    post.interest_text_hash = text_hash(post.title, post.content)
+    if persist and post.pk:
+        type(post).objects.filter(pk=post.pk).update(
+            interest_hits=post.interest_hits,
+            interest_text_hash=post.interest_text_hash,
+        )
+    return post.interest_hits
+
+
+def refresh_ad_hits(ad, persist=False):
+    """Same as refresh_post_hits, for an ad creative's title + description."""
+    ad.interest_hits = classify_text(f"{ad.title} {ad.description}")
+    ad.interest_text_hash = text_hash(ad.title, ad.description)
+    if persist and ad.pk:
+        type(ad).objects.filter(pk=ad.pk).update(
+            interest_hits=ad.interest_hits,
+            interest_text_hash=ad.interest_text_hash,
+        )
+    return ad.interest_hits
+
+
+def post_hits(post):
+    """{segment: hit_count} for a post — precomputed, filled lazily if not."""
+    if post is None:
+        return {}
+    if not post.interest_text_hash:
+        return refresh_post_hits(post, persist=True)
+    return post.interest_hits or {}
+
+
+def ad_hits(ad):
+    """{segment: hit_count} for an ad's own copy — precomputed like posts."""
+    if not ad.interest_text_hash:
+        return refresh_ad_hits(ad, persist=True)
+    return ad.interest_hits or {}
+
+
 def classify_ad(ad):
-    """Segments for an ad creative, cached — serve calls this per request."""
-    key = f"adtags:{ad.pk}"
-    tags = cache.get(key)
-    if tags is None:
-        text = f"{ad.title} {ad.description}"
-        if ad.boosted_post_id:
-            try:
-                text += " " + _post_text(ad.boosted_post)
-            except Exception:
-                pass
-        tags = list(classify_text(text).keys())
-        cache.set(key, tags, 60 * 60 * 6)
-    return tags
+    """Segments for an ad creative (and its boosted post). serve_ad calls this
+    for every candidate, so it only reads precomputed hits."""
+    tags = set(ad_hits(ad))
+    if ad.boosted_post_id:
+        try:
+            tags.update(post_hits(ad.boosted_post))
+        except Exception:
+            pass
+    return list(tags)
+
+
+def _merge_hits(*groups):
+    merged = {}
+    for hits in groups:
+        for seg, n in hits.items():
+            merged[seg] = merged.get(seg, 0) + n
+    return merged
 
 
-def build_profile(user):
-    """Classify one user from their recent activity. Returns the profile
-    dict that lands on UserAdProfile (also saves it)."""
+def _empty_state():
+    return {
+        "scores": {}, "gender": {"male": 0.0, "female": 0.0},
+        "total": 0.0, "video": 0.0, "pos": 0, "neg": 0,
+    }
+
+
+def _decayed(state, days):
+    """``state`` (a profile's ``brain_state``) aged by ``days``."""
+    fresh = _empty_state()
+    if not state:
+        return fresh
+    factor = 0.5 ** (max(days, 0.0) / HALF_LIFE_DAYS)
+    fresh["scores"] = {
+        seg: v * factor for seg, v in (state.get("scores") or {}).items()
+    }
+    for g in ("male", "female"):
+        fresh["gender"][g] = (state.get("gender") or {}).get(g, 0.0) * factor
+    for key in ("total", "video", "pos", "neg"):
+        fresh[key] = (state.get(key) or 0) * factor
+    return fresh
+
+
+def _bump(state, hits, weight, gender=None):
+    # Negative signals (hide/report) carry no activity or creator affinity.
+    for seg, n in hits.items():
+        state["scores"][seg] = state["scores"].get(seg, 0.0) + weight * min(n, 3)
+    if weight > 0:
+        state["total"] += weight
+        g = (gender or "").strip().lower()
+        if g in state["gender"]:
+            state["gender"][g] += weight
+
+
+def _mood(state, text):
+    pos, neg = mood_counts(text)
+    state["pos"] += pos
+    state["neg"] += neg
+
+
+def _post_vectors(post_ids):
+    """{post_id: (hits, author gender)} — one query per chunk; posts that were
+    never classified are classified (and persisted) here, once."""
+    from .models import BusinessNetworkPost
+
+    vectors = {}
+    missing = []
+    ids = list(post_ids)
+    for start in range(0, len(ids), VECTOR_CHUNK):
+        for pk, hits, digest, gender in BusinessNetworkPost.objects.filter(
+            pk__in=ids[start:start + VECTOR_CHUNK]
+        ).order_by().values_list(
+            "pk", "interest_hits", "interest_text_hash", "author__gender"
+        ):
+            if digest:
+                vectors[pk] = (hits or {}, gender)
+            else:
+                missing.append(pk)
+    for start in range(0, len(missing), VECTOR_CHUNK):
+        for post in BusinessNetworkPost.objects.filter(
+            pk__in=missing[start:start + VECTOR_CHUNK]
+        ).select_related("author").prefetch_related("tags"):
+            vectors[post.pk] = (
+                post_hits(post), getattr(post.author, "gender", None),
+            )
+    return vectors
+
+
+def _ad_vectors(ad_ids):
+    """{ad_id: hits} for ads, classifying never-classified ones once."""
+    from .models import AbnAdsPanel
+
+    vectors = {}
+    missing = []
+    for pk, hits, digest in AbnAdsPanel.objects.filter(
+        pk__in=list(ad_ids)
+    ).order_by().values_list("pk", "interest_hits", "interest_text_hash"):
+        if digest:
+            vectors[pk] = hits or {}
+        else:
+            missing.append(pk)
+    for ad in AbnAdsPanel.objects.filter(pk__in=missing):
+        vectors[ad.pk] = ad_hits(ad)
+    return vectors
+
+
+def _read_activity(user_ids, since, states):
+    """Add every signal ``user_ids`` produced after ``since`` to ``states``.
+
+    One grouped query per signal for the whole batch, then one post-vector
+    and one ad-vector lookup for everything those rows touched.
+    """
+    from django.db.models import Count
+
     from .models import (
         AdEvent,
         BusinessNetworkMediaLike,
         BusinessNetworkMediaView,
+        BusinessNetworkPost,
         BusinessNetworkPostComment,
         BusinessNetworkPostLike,
         HiddenPost,
         PostReport,
         PostSeen,
-        UserAdProfile,
         UserSavedPosts,
     )
 
-    since = timezone.now() - timedelta(days=LOOKBACK_DAYS)
-    scores = {}
-    gender_units = {"male": 0.0, "female": 0.0}
-    total_signal = 0.0
-    video_signal = 0.0
-
-    def bump(text, weight, author=None):
-        nonlocal total_signal
-        hits = classify_text(text)
-        for seg, n in hits.items():
-            scores[seg] = scores.get(seg, 0.0) + weight * min(n, 3)
-        if weight > 0:
-            total_signal += weight
-            if author is not None:
-                g = (author.gender or "").strip().lower()
-                if g in gender_units:
-                    gender_units[g] += weight
-
-    # Feed views (weak but plentiful)
-    for seen in (
-        PostSeen.objects.filter(user=user, last_seen_at__gte=since)
-        .select_related("post", "post__author")
-        .prefetch_related("post__tags")[:ROW_CAP]
-    ):
-        bump(_post_text(seen.post), W_FEED_VIEW, seen.post.author)
-
-    # Post likes / comments / saves
-    for like in (
-        BusinessNetworkPostLike.objects.filter(user=user, created_at__gte=since)
-        .select_related("post", "post__author")
-        .prefetch_related("post__tags")[:ROW_CAP]
+    # (user_id, post_id, weight) per post-level signal.
+    post_rows = []
+    for model, user_field, weight, time_field in (
+        (PostSeen, "user_id", W_FEED_VIEW, "last_seen_at"),
+        (BusinessNetworkPostLike, "user_id", W_LIKE, "created_at"),
+        (UserSavedPosts, "user_id", W_SAVE, "created_at"),
+        (HiddenPost, "user_id", W_HIDE, "created_at"),
+        (PostReport, "user_id", W_REPORT, "created_at"),
     ):
-        bump(_post_text(like.post), W_LIKE, like.post.author)
+        rows = model.objects.filter(
+            **{f"{user_field}__in": user_ids, f"{time_field}__gt": since}
+        ).order_by().values_list(user_field, "post_id")
+        post_rows.extend((uid, post_id, weight) for uid, post_id in rows)
 
-    for cm in (
+    comments = list(
         BusinessNetworkPostComment.objects.filter(
-            author=user, created_at__gte=since
-        )
-        .select_related("post", "post__author")
-        .prefetch_related("post__tags")[:ROW_CAP]
-    ):
-        bump(_post_text(cm.post) + " " + (cm.content or ""), W_COMMENT,
-             cm.post.author)
-
-    for sv in (
-        UserSavedPosts.objects.filter(user=user, created_at__gte=since)
-        .select_related("post", "post__author")
-        .prefetch_related("post__tags")[:ROW_CAP]
-    ):
-        bump(_post_text(sv.post), W_SAVE, sv.post.author)
-
-    # Video watches + likes (what kind of videos they actually watch)
-    for mv in (
-        BusinessNetworkMediaView.objects.filter(user=user, created_at__gte=since)
-        .select_related("media")[:ROW_CAP]
-    ):
-        post = mv.media.business_network_posts.select_related("author").first()
-        if post is not None:
-            bump(_post_text(post), W_VIDEO_WATCH, post.author)
-            video_signal += W_VIDEO_WATCH
-
-    for ml in (
-        BusinessNetworkMediaLike.objects.filter(user=user, created_at__gte=since)
-        .select_related("media")[:ROW_CAP]
-    ):
-        post = ml.media.business_network_posts.select_related("author").first()
-        if post is not None:
-            bump(_post_text(post), W_VIDEO_LIKE, post.author)
-            video_signal += W_VIDEO_LIKE
-
-    # Negative signals: content they hide or report
-    for h in (
-        HiddenPost.objects.filter(user=user, created_at__gte=since)
-        .select_related("post")[:ROW_CAP]
-    ):
-        bump(_post_text(h.post), W_HIDE)
+            author_id__in=user_ids, created_at__gt=since
+        ).order_by().values_list("author_id", "post_id", "content")
+    )
 
-    for r in (
-        PostReport.objects.filter(user=user, created_at__gte=since)
-        .select_related("post")[:ROW_CAP]
-    ):
-        bump(_post_text(r.post), W_REPORT)
+    # Video watches + likes (what kind of videos they actually watch), read
+    # per media and mapped onto the post the media belongs to.
+    media_rows = [
+        (uid, media_id, W_VIDEO_WATCH * n)
+        for uid, media_id, n in BusinessNetworkMediaView.objects.filter(
+            user_id__in=user_ids, created_at__gt=since
+        ).order_by().values("user_id", "media_id").annotate(n=Count("id"))
+        .values_list("user_id", "media_id", "n")
+    ]
+    media_rows += [
+        (uid, media_id, W_VIDEO_LIKE)
+        for uid, media_id in BusinessNetworkMediaLike.objects.filter(
+            user_id__in=user_ids, created_at__gt=since
+        ).order_by().values_list("user_id", "media_id")
+    ]
+    media_post = {}
+    if media_rows:
+        for media_id, post_id in BusinessNetworkPost.objects.filter(
+            media__in={m for _, m, _ in media_rows}
+        ).values_list("media", "pk"):
+            media_post.setdefault(media_id, post_id)
 
     # Ad interactions (clicks are the strongest purchase-intent signal)
-    for ev in (
+    ad_rows = list(
         AdEvent.objects.filter(
-            user=user, created_at__gte=since, source="panel", ad__isnull=False
-        ).select_related("ad")[:ROW_CAP]
-    ):
-        w = W_AD_CLICK if ev.event_type in ("click", "cta_click") else W_AD_IMPRESSION
-        bump(f"{ev.ad.title} {ev.ad.description}", w)
+            user_id__in=user_ids, created_at__gt=since,
+            source="panel", ad__isnull=False,
+        ).order_by().values("user_id", "ad_id", "event_type")
+        .annotate(n=Count("id")).values_list("user_id", "ad_id", "event_type", "n")
+    )
+
+    vectors = _post_vectors(
+        {p for _, p, _ in post_rows}
+        | {p for _, p, _ in comments}
+        | set(media_post.values())
+    )
+    ad_vectors = _ad_vectors({a for _, a, _, _ in ad_rows})
+    no_post = ({}, None)
+
+    for uid, post_id, weight in post_rows:
+        hits, gender = vectors.get(post_id, no_post)
+        _bump(states[uid], hits, weight, gender)
+    for uid, post_id, content in comments:
+        hits, gender = vectors.get(post_id, no_post)
+        _bump(states[uid], _merge_hits(hits, classify_text(content)), W_COMMENT, gender)
+        _mood(states[uid], content)
+    for uid, media_id, weight in media_rows:
+        post_id = media_post.get(media_id)
+        if post_id is None:
+            continue
+        hits, gender = vectors.get(post_id, no_post)
+        _bump(states[uid], hits, weight, gender)
+        states[uid]["video"] += weight
+    for uid, ad_id, event_type, n in ad_rows:
+        w = W_AD_CLICK if event_type in ("click", "cta_click") else W_AD_IMPRESSION
+        _bump(states[uid], ad_vectors.get(ad_id, {}), w * n)
+
+    # ── Soft mood/tone from the user's OWN recent words (posts+comments).
+    # A gentle product signal only — never a diagnosis, never shown to the
+    # user, never sold to advertisers as a targeting option. ──
+    for uid, title, content in BusinessNetworkPost.objects.filter(
+        author_id__in=user_ids, created_at__gt=since
+    ).order_by().values_list("author_id", "title", "content"):
+        _mood(states[uid], f"{title or ''} {content or ''}")
+
+
+def _profile_from_state(state):
+    """Turn accumulated signal into what lands on UserAdProfile."""
+    scores = state["scores"]
+    total_signal = state["total"]
+    video_signal = state["video"]
 
     # ── Normalize to 0–100 ──
     positives = {k: v for k, v in scores.items() if v > 0}
@@ -291,27 +499,10 @@ def build_profile(user):
             if norm >= 5:
                 interest_scores[seg] = round(norm, 1)
 
-    # ── Soft mood/tone from the user's OWN recent words (posts+comments).
-    # A gentle product signal only — never a diagnosis, never shown to the
-    # user, never sold to advertisers as a targeting option. ──
-    from .models import BusinessNetworkPost
-
-    own_texts = []
-    for p in BusinessNetworkPost.objects.filter(
-        author=user, created_at__gte=since
-    )[:100]:
-        own_texts.append(f"{p.title or ''} {p.content or ''}")
-    for own_cm in BusinessNetworkPostComment.objects.filter(
-        author=user, created_at__gte=since
-    )[:200]:
-        own_texts.append(own_cm.content or "")
-    blob = " ".join(own_texts).lower()
-    pos_hits = sum(blob.count(w) for w in POSITIVE_WORDS)
-    neg_hits = sum(blob.count(w) for w in NEGATIVE_WORDS)
-
     # ── Segments: top interests + activity level + heavy-video flag ──
     ranked = sorted(interest_scores.items(), key=lambda x: -x[1])
     segments = [seg for seg, _ in ranked[:3]]
+    pos_hits, neg_hits = state["pos"], state["neg"]
     if pos_hits + neg_hits >= 3:
         if neg_hits > pos_hits * 2:
             segments.append("mood_low")
@@ -327,6 +518,7 @@ def build_profile(user):
         segments.append("video_lover")
 
     # ── Gender affinity (share of engagement on male/female creators) ──
+    gender_units = state["gender"]
     g_total = gender_units["male"] + gender_units["female"]
     gender_affinity = {}
     if g_total > 0:
@@ -334,18 +526,6 @@ def build_profile(user):
             "male": round(gender_units["male"] / g_total * 100),
             "female": round(gender_units["female"] / g_total * 100),
         }
-
-    profile, _ = UserAdProfile.objects.get_or_create(user=user)
-    profile.interest_scores = interest_scores
-    profile.segments = segments
-    profile.gender_affinity = gender_affinity
-    profile.brain_built_at = timezone.now()
-    profile.save(
-        update_fields=[
-            "interest_scores", "segments", "gender_affinity",
-            "brain_built_at", "updated_at",
-        ]
-    )
     return {
         "interest_scores": interest_scores,
         "segments": segments,
@@ -353,6 +533,82 @@ def build_profile(user):
     }
 
 
+def build_profiles(user_ids, now=None):
+    """Rebuild the profiles of ``user_ids`` (one batch) and save them.
+
+    Each profile continues from its decayed ``brain_state``, so only activity
+    after its ``brain_built_at`` is read; a user with no state reads the last
+    LOOKBACK_DAYS. Users are grouped by that watermark — pass the run's
+    ``now`` to every batch and after the first nightly run they all share
+    one — and each group costs a fixed number of grouped queries however
+    many users it holds.
+
+    Returns ``{user_id: profile dict}``.
+    """
+    from .models import UserAdProfile
+
+    now = now or timezone.now()
+    floor = now - timedelta(days=LOOKBACK_DAYS)
+    user_ids = list(user_ids)
+    existing = {
+        p.user_id: p for p in UserAdProfile.objects.filter(user_id__in=user_ids)
+    }
+
+    states = {}
+    groups = {}  # since -> [user_id]
+    for uid in user_ids:
+        profile = existing.get(uid)
+        built = profile.brain_built_at if profile is not None else None
+        if profile is not None and profile.brain_state and built:
+            since = max(built, floor)
+            states[uid] = _decayed(
+                profile.brain_state, (now - built).total_seconds() / 86400
+            )
+        else:
+            since = floor
+            states[uid] = _empty_state()
+        groups.setdefault(since, []).append(uid)
+
+    for since, uids in groups.items():
+        _read_activity(uids, since, states)
+
+    results = {}
+    to_update, to_create = [], []
+    for uid in user_ids:
+        result = _profile_from_state(states[uid])
+        results[uid] = result
+        profile = existing.get(uid) or UserAdProfile(user_id=uid)
+        profile.interest_scores = result["interest_scores"]
+        profile.segments = result["segments"]
+        profile.gender_affinity = result["gender_affinity"]
+        profile.brain_state = states[uid]
+        profile.brain_built_at = now
+        profile.updated_at = now
+        (to_update if profile.pk else to_create).append(profile)
+    if to_update:
+        UserAdProfile.objects.bulk_update(
+            to_update,
+            [
+                "interest_scores", "segments", "gender_affinity",
+                "brain_state", "brain_built_at", "updated_at",
+            ],
+        )
+    if to_create:
+        UserAdProfile.objects.bulk_create(to_create, ignore_conflicts=True)
+    return results
+
+
+def build_profile(user):
+    """Classify one user from their recent activity. Returns the profile
+    dict that lands on UserAdProfile (also saves it)."""
+    return build_profiles([user.pk])[user.pk]
+
+
+def in_shard(user_id, shard, shards):
+    """Stable split of users across ``shards`` worker processes."""
+    return user_id.int % shards == shard if shards > 1 else True
+
+
 def active_user_ids(days=LOOKBACK_DAYS):
     """Users worth profiling: anyone with BN activity in the window."""
     from .models import (
@@ -0,0 +1,88 @@
+"""Single-pass multi-keyword matcher (Aho–Corasick) for the Interest Brain.
+
+``classify_text`` used to run ``kw in text`` once per keyword of every
+segment, and the mood pass ``text.count(w)`` once per mood word, so a post
+was re-scanned a few hundred times. ``KeywordMatcher`` compiles the keyword
+list into one automaton and walks the text once, whatever the number of
+keywords. It works on characters, so Bangla and English mix freely (the
+caller lower-cases, exactly as before).
+
+Two answers, matching the substring semantics the callers relied on:
+
+  * ``found(text)`` — indices of the keywords that occur at least once
+    (``kw in text``);
+  * ``counts(text)`` — non-overlapping occurrences per keyword, scanning
+    left to right (``text.count(kw)``).
+"""
+
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        # Keyword indices that end at each state, including those inherited
+        # through failure links (suffixes that are keywords themselves).
+        self._out = [()]
+        for index, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (index,)
+        # An empty keyword is "in" every text.
+        self._always = tuple(i for i, kw in enumerate(self.keywords) if not kw)
+
+        # Breadth-first: failure links, inherited outputs, then each state's
+        # complete transition table (its own edges over its failure state's
+        # table), so matching never has to follow a failure link.
+        self._delta = [dict(self._goto[0])] + [None] * (len(self._goto) - 1)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            if state:
+                delta = dict(self._delta[self._fail[state]])
+                delta.update(self._goto[state])
+                self._delta[state] = delta
+            for ch, nxt in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def found(self, text):
+        """Set of keyword indices occurring in ``text``."""
+        delta, out = self._delta, self._out
+        hits = set(self._always)
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                hits.update(out[state])
+        return hits
+
+    def counts(self, text):
+        """{keyword index: non-overlapping occurrences} — ``text.count``."""
+        delta, out, keywords = self._delta, self._out, self.keywords
+        counts = {}
+        next_free = {}  # keyword index -> first position a new match may start
+        state = 0
+        for position, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            for index in out[state]:
+                start = position - len(keywords[index]) + 1
+                if start >= next_free.get(index, 0):
+                    counts[index] = counts.get(index, 0) + 1
+                    next_free[index] = position + 1
+        for index in self._always:
+            counts[index] = len(text) + 1
+        return counts
@@ -0,0 +1,59 @@
+"""Build the Following / Shorts timelines ahead of the first read.
+
+A timeline that is missing from the cache is rebuilt on the owner's next
+Following-feed request, so nothing breaks without this. Running it after a
+deploy or a cache flush just moves that one query per user off the request
+path, for the users most likely to open the feed.
+
+    python manage.py backfill_bn_timelines                 # active last 7 days
+    python manage.py backfill_bn_timelines --days 30
+    python manage.py backfill_bn_timelines --user <uuid>
+    python manage.py backfill_bn_timelines --no-video      # main timeline only
+    python manage.py backfill_bn_timelines --dry-run
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import User
+from business_network import timelines
+from business_network.models import BusinessNetworkFollowerModel
+
+
+class Command(BaseCommand):
+    help = "Rebuild cached Following/Shorts timelines for recently active users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--user", action="append", default=[])
+        parser.add_argument("--limit", type=int, default=0)
+        parser.add_argument("--no-video", action="store_true")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        # Only users who follow someone have a timeline worth building.
+        followers = BusinessNetworkFollowerModel.objects.values("follower_id")
+        qs = User.objects.filter(id__in=followers)
+        if opts["user"]:
+            qs = qs.filter(id__in=opts["user"])
+        else:
+            since = timezone.now() - timedelta(days=opts["days"])
+            qs = qs.filter(last_login__gte=since).order_by("-last_login")
+        user_ids = qs.values_list("id", flat=True)
+        if opts["limit"]:
+            user_ids = user_ids[: opts["limit"]]
+        user_ids = list(user_ids)
+
+        self.stdout.write(f"{len(user_ids)} user(s) to backfill")
+        if opts["dry_run"]:
+            return
+
+        entries = 0
+        for user_id in user_ids:
+            entries += len(timelines.rebuild(user_id))
+            if not opts["no_video"]:
+                entries += len(timelines.rebuild(user_id, video=True))
+        self.stdout.write(
+            self.style.SUCCESS(f"Done: {len(user_ids)} user(s), {entries} entries")
+        )
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Serve-time cost of a retargeting membership check, by audience size.
+
+For each ``--sizes`` value, writes a synthetic audience of random user ids
+through ad_audiences and times what serve_ad now does per retargeting ad
+(one get_many for the viewer's bucket + a binary search), for a member and
+for a non-member. For comparison it also times the old layout — the whole
+audience as one cached set of id strings, fetched to test one viewer — and
+reports the bytes each check moves. Talks only to the cache; the synthetic
+audiences are deleted afterwards.
+
+    manage.py bench_ad_audience
+    manage.py bench_ad_audience --sizes 1000,100000,1000000 --iterations 200
+"""
+import pickle
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from base.benchmarking import format_stats, measure
+from business_network import ad_audiences
+
+
+class Command(BaseCommand):
+    help = 'Membership-check latency and transfer at several audience sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,100000,1000000')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--legacy-iterations', type=int, default=10)
+
+    def handle(self, *args, **options):
+        for size in [int(s) for s in options['sizes'].split(',') if s.strip()]:
+            advertiser = 'bench-%s' % uuid.uuid4().hex[:8]
+            members = [uuid.uuid4() for _ in range(size)]
+            member, stranger = members[size // 2], uuid.uuid4()
+
+            ad_audiences.write(advertiser, members)
+            pointer = cache.get(ad_audiences.POINTER_KEY % advertiser)
+            bucket = cache.get(ad_audiences.bucket_key(advertiser, pointer, member))
+            assert ad_audiences.member_of(member, {advertiser: pointer}) == {advertiser}
+
+            legacy_key = 'bench-adaud-legacy:%s' % advertiser
+            legacy = {str(m) for m in members}
+            cache.set(legacy_key, legacy, 600)
+            legacy_bytes = len(pickle.dumps(legacy, pickle.HIGHEST_PROTOCOL))
+
+            self.stdout.write('%d members (%d buckets)' % (size, pointer['buckets']))
+            self.stdout.write('  bucketed, member ..... %s  %7d bytes' % (
+                format_stats(measure(
+                    lambda: ad_audiences.member_of(member, {advertiser: pointer}),
+                    options['iterations'])),
+                len(bucket)))
+            self.stdout.write('  bucketed, non-member . %s' % format_stats(measure(
+                lambda: ad_audiences.member_of(stranger, {advertiser: pointer}),
+                options['iterations'])))
+            self.stdout.write('  whole set (old) ...... %s  %7d bytes' % (
+                format_stats(measure(
+                    lambda: str(member) in (cache.get(legacy_key) or ()),
+                    options['legacy_iterations'])),
+                legacy_bytes))
+
+            cache.delete_many(
+                [legacy_key, ad_audiences.POINTER_KEY % advertiser,
+                 ad_audiences.COUNT_KEY % advertiser]
+                + [ad_audiences.BUCKET_KEY % (advertiser, pointer['build'], i)
+                   for i in range(pointer['buckets'])])
+        self.stdout.write(self.style.SUCCESS('Done — synthetic audiences deleted.'))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Load-test track_ad_events with the event bursts the app actually sends.
+
+Seeds synthetic active panel ads, content creators and one viewer per
+request, then replays ``--requests`` POSTs of 5–``--max-burst`` events each:
+mostly impressions across a few ads, with clicks, skips, the odd ✕ close and
+AdMob impressions mixed in, as a feed scroll flushes them. Each viewer sends
+one burst so the per-minute limiter never throttles the run.
+
+Reports events/sec, per-request latency and DB statements per request.
+Everything is rolled back; the run's pacing counters are deleted.
+
+    manage.py bench_ad_events
+    manage.py bench_ad_events --requests 1000 --ads 80 --max-burst 40
+"""
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from base.benchmarking import count_queries, format_stats, rolled_back, synthetic_users
+from business_network import ad_index
+from business_network.ads_api import track_ad_events
+from business_network.models import AbnAdsPanel, AbnAdsPanelCategory, AdEvent
+
+PLACEMENTS = ['bn_feed', 'bn_feed', 'bn_feed', 'shorts_banner', 'shorts_reel', 'gigs_list']
+EVENT_MIX = (
+    ['impression'] * 14 + ['click'] * 2 + ['cta_click', 'skip', 'skip', 'close']
+)
+
+
+class Command(BaseCommand):
+    help = 'Events/sec and statements per request for track_ad_events bursts (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--ads', type=int, default=40)
+        parser.add_argument('--creators', type=int, default=20)
+        parser.add_argument('--max-burst', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=13)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+
+        with rolled_back():
+            category = AbnAdsPanelCategory.objects.create(id='benchevcat', name='Bench')
+            ads = AbnAdsPanel.objects.bulk_create([
+                AbnAdsPanel(
+                    id='benchev%d' % i, title='Benchmark ad %d' % i,
+                    description='synthetic', category=category,
+                    budget=100000, estimated_views=10 ** 7, status='active')
+                for i in range(options['ads'])
+            ])
+            creators = synthetic_users(options['creators'], prefix='benchevcreator')
+            viewers = synthetic_users(options['requests'], prefix='benchevviewer')
+
+            latencies, statements = [], []
+            events_sent = 0
+            started = time.perf_counter()
+            for viewer in viewers:
+                events = self._burst(rng, ads, creators, options['max_burst'])
+                request = factory.post('/api/bn/ads/track/', {'events': events}, format='json')
+                force_authenticate(request, user=viewer)
+                with count_queries() as ctx:
+                    request_started = time.perf_counter()
+                    track_ad_events(request)
+                    latencies.append((time.perf_counter() - request_started) * 1000)
+                statements.append(len(ctx))
+                events_sent += len(events)
+            elapsed = time.perf_counter() - started
+            recorded = AdEvent.objects.filter(placement__in=PLACEMENTS, user__in=viewers).count()
+
+        today = timezone.localdate().isoformat()
+        cache.delete_many(['adpace:%s:%s' % (ad.pk, today) for ad in ads])
+        ad_index.invalidate()
+
+        latencies.sort()
+        n = len(latencies)
+        self.stdout.write(
+            '%d requests, %d events (%d recorded)' % (n, events_sent, recorded))
+        self.stdout.write('  %.0f events/s  %.1f requests/s' % (
+            events_sent / elapsed, n / elapsed))
+        self.stdout.write('  latency: %s' % format_stats({
+            'p50': latencies[n // 2],
+            'p99': latencies[min(n - 1, int(n * 0.99))],
+            'mean': sum(latencies) / n,
+        }))
+        self.stdout.write('  statements/request: mean %.1f  max %d  (%.2f per event)' % (
+            sum(statements) / n, max(statements), sum(statements) / events_sent))
+        self.stdout.write(self.style.SUCCESS('Done — synthetic ads and events rolled back.'))
+
+    def _burst(self, rng, ads, creators, max_burst):
+        # A scroll session touches a handful of ads, several times each.
+        session_ads = rng.sample(ads, min(len(ads), rng.randint(1, 4)))
+        events = []
+        for _ in range(rng.randint(5, max(5, max_burst))):
+            placement = rng.choice(PLACEMENTS)
+            if rng.random() < 0.1:
+                events.append({'event_type': 'impression', 'source': 'admob',
+                               'placement': placement})
+                continue
+            events.append({
+                'event_type': rng.choice(EVENT_MIX),
+                'ad': rng.choice(session_ads).pk,
+                'placement': placement,
+                'creator': str(rng.choice(creators).pk),
+                'content': str(rng.randint(1, 50000)),
+            })
+        return events
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Load-test serve_ad the way a feed page drives it: many slots per page.
+
+Seeds synthetic active panel ads (a mix of placements, budgets and location
+targeting) plus one viewer, then fills ``--slots`` ad slots per page
+for ``--pages`` pages of the given placement, two ways:
+
+  * per-request load — the ad index is invalidated before every serve, so
+    each slot loads the active ads from Postgres as serve_ad always used to
+  * ad index — the per-process index is built once and reused
+
+Reports serves/sec, per-serve latency and queries per page. The viewer's
+per-ad cache state is read with one get_many either way. Everything is
+rolled back.
+
+    manage.py bench_ad_serving
+    manage.py bench_ad_serving --ads 500 --slots 12 --pages 30 --placement bn_feed
+"""
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from base.benchmarking import count_queries, format_stats, rolled_back, synthetic_users
+from business_network import ad_index
+from business_network.ads_api import VALID_PLACEMENTS, serve_ad
+from business_network.models import AbnAdsPanel, AbnAdsPanelCategory
+
+BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = 'Serves/sec for a many-slot feed page, with and without the ad index (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ads', type=int, default=200)
+        parser.add_argument('--slots', type=int, default=10)
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument('--placement', default='bn_feed')
+        parser.add_argument('--seed', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with rolled_back():
+            viewer = synthetic_users(1, prefix='benchadviewer')[0]
+            self._seed_ads(options['ads'], rng)
+
+            per_request = self._run(viewer, options, invalidate_each=True)
+            indexed = self._run(viewer, options, invalidate_each=False)
+        ad_index.invalidate()  # the index still holds the rolled-back ads
+
+        for label, result in (('per-request load', per_request), ('ad index', indexed)):
+            self.stdout.write(
+                '  %-17s %8.1f serves/s  %s  %.1f queries/page'
+                % (label, result['rate'], format_stats(result['latency']),
+                   result['queries_per_page']))
+        self.stdout.write(self.style.SUCCESS('Done — synthetic ads rolled back.'))
+
+    def _seed_ads(self, count, rng):
+        categories = AbnAdsPanelCategory.objects.bulk_create(
+            [AbnAdsPanelCategory(id='benchcat%d' % i, name='Bench %d' % i) for i in range(8)])
+        placements = sorted(VALID_PLACEMENTS)
+        ads = []
+        for i in range(count):
+            ads.append(AbnAdsPanel(
+                id='benchad%d' % i,
+                title='Benchmark ad %d' % i,
+                description='synthetic',
+                category=rng.choice(categories),
+                male=True, female=True, other=True,
+                budget=1000,
+                daily_budget=rng.choice([None, 50, 200]),
+                estimated_views=100000,
+                views=rng.randint(0, 5000),
+                clicks=rng.randint(0, 100),
+                placements=rng.choice([[], rng.sample(placements, 3)]),
+                target_locations=rng.choice([[], [], ['dhaka']]),
+                status='active',
+            ))
+        AbnAdsPanel.objects.bulk_create(ads, batch_size=BATCH)
+
+    def _run(self, viewer, options, invalidate_each):
+        factory = APIRequestFactory()
+        ad_index.invalidate()
+        latencies = []
+        queries = 0
+        started = time.perf_counter()
+        for _ in range(options['pages']):
+            with count_queries() as ctx:
+                for _ in range(options['slots']):
+                    if invalidate_each:
+                        ad_index.invalidate()
+                    request = factory.get(
+                        '/api/bn/ads/serve/', {'placement': options['placement']})
+                    force_authenticate(request, user=viewer)
+                    slot_started = time.perf_counter()
+                    serve_ad(request)
+                    latencies.append((time.perf_counter() - slot_started) * 1000)
+            queries += len(ctx)
+        elapsed = time.perf_counter() - started
+        cache.delete_many(['adrecent:%s:benchad%d' % (viewer.id, i) for i in range(options['ads'])])
+
+        latencies.sort()
+        serves = len(latencies)
+        return {
+            'rate': serves / elapsed if elapsed else 0.0,
+            'latency': {
+                'p50': latencies[serves // 2],
+                'p99': latencies[min(serves - 1, int(serves * 0.99))],
+                'mean': sum(latencies) / serves,
+            },
+            'queries_per_page': queries / options['pages'],
+        }
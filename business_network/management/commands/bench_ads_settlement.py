@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Time the nightly ads settlement's two per-user steps at scale.
+
+Seeds ``--profiles`` UserAdProfile rows with a handful of interest weights
+each and ``--viewers`` AdViewerDaily rows for yesterday, then times:
+
+  * interest decay, per row (old) — load + decay + save() for ``--sample``
+    profiles, extrapolated to the whole set
+  * interest decay, set-based — decay_interest_weights over every profile
+  * viewer rewards — reward_ad_viewers over every viewer row (pushes are
+    persisted; with no FCM tokens seeded nothing leaves the box)
+
+Reports wall time, rows/sec and statements for each. Everything is rolled
+back.
+
+    manage.py bench_ads_settlement
+    manage.py bench_ads_settlement --profiles 100000 --viewers 20000
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.benchmarking import count_queries, rolled_back, synthetic_users
+from business_network.models import AdsSystemConfig, AdViewerDaily, UserAdProfile
+from business_network.tasks import decay_interest_weights, reward_ad_viewers
+
+BATCH = 5000
+SEED_CHUNK = 20000
+
+
+class Command(BaseCommand):
+    help = 'Ads settlement decay + reward time, per-row vs set-based (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=1000000)
+        parser.add_argument('--viewers', type=int, default=100000)
+        parser.add_argument('--categories', type=int, default=6,
+                            help='interest weights per profile')
+        parser.add_argument('--sample', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=23)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        cfg = AdsSystemConfig.get()
+        day = timezone.localdate() - timedelta(days=1)
+        with rolled_back():
+            # Seeded a chunk at a time: a million User instances at once do
+            # not fit in a small box's memory.
+            seeded = 0
+            while seeded < options['profiles']:
+                users = [u.pk for u in synthetic_users(
+                    min(SEED_CHUNK, options['profiles'] - seeded), prefix='benchset')]
+                UserAdProfile.objects.bulk_create(
+                    [UserAdProfile(user_id=uid, category_weights={
+                        str(rng.randint(1, 40)): round(rng.uniform(0.1, 20), 2)
+                        for _ in range(options['categories'])}) for uid in users],
+                    batch_size=BATCH)
+                AdViewerDaily.objects.bulk_create(
+                    [AdViewerDaily(user_id=uid, date=day, views=rng.randint(0, 200))
+                     for uid in users[:max(0, options['viewers'] - seeded)]],
+                    batch_size=BATCH)
+                seeded += len(users)
+                self.stdout.write('  seeded %d/%d profiles' % (
+                    seeded, options['profiles']), ending='\r')
+            self.stdout.write('')
+            self.stdout.write('%d profiles, %d viewer rows' % (
+                seeded, min(seeded, options['viewers'])))
+
+            self._line('decay, per row (old)', *self._per_row(cfg, options['sample']),
+                       options['sample'], scale=seeded)
+            with count_queries() as ctx:
+                started = time.perf_counter()
+                decayed = decay_interest_weights(cfg)
+                elapsed = time.perf_counter() - started
+            self._line('decay, set-based', elapsed, len(ctx), decayed)
+
+            if cfg.views_per_diamond:
+                with count_queries() as ctx:
+                    started = time.perf_counter()
+                    rewarded = reward_ad_viewers(cfg, day)
+                    elapsed = time.perf_counter() - started
+                self._line('viewer rewards', elapsed, len(ctx), rewarded)
+        self.stdout.write(self.style.SUCCESS('Done — synthetic settlement data rolled back.'))
+
+    def _per_row(self, cfg, sample):
+        """The loop step 3 used to run, over ``sample`` profiles."""
+        factor = 0.5 ** (1.0 / max(1, cfg.interest_decay_days))
+        with count_queries() as ctx:
+            started = time.perf_counter()
+            for profile in UserAdProfile.objects.exclude(category_weights={})[:sample]:
+                profile.category_weights = {
+                    k: round(float(v) * factor, 2)
+                    for k, v in (profile.category_weights or {}).items()
+                    if float(v) * factor >= 0.2
+                }
+                profile.save(update_fields=['category_weights', 'updated_at'])
+            elapsed = time.perf_counter() - started
+        return elapsed, len(ctx)
+
+    def _line(self, label, elapsed, statements, rows, scale=None):
+        if scale:
+            elapsed, statements, rows = (
+                elapsed * scale / rows, statements * scale / rows, scale)
+        self.stdout.write('  %-22s %8.1fs  %9.0f rows/s  %9d statements%s' % (
+            label, elapsed, rows / elapsed if elapsed else 0, statements,
+            '  (extrapolated)' if scale else ''))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Wall time of the weekly Business Network digest run, in dry-run mode.
+
+Seeds ``--recipients`` recently-active users with a week of follows and
+likes among themselves, then times:
+
+  * per user (old) — send_bn_digest_email for ``--sample`` users with the
+    send itself stubbed out, extrapolated; the old loop also slept 0.4s per
+    user, which is reported separately
+  * batched — send_bn_digest_emails(dry_run=True) over every recipient:
+    grouped stats, shared fragments, nothing queued
+
+Reports wall time, recipients/sec and statements. Everything is rolled back.
+
+    manage.py bench_bn_digest
+    manage.py bench_bn_digest --recipients 10000 --follows 5
+"""
+import random
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base import email_service
+from base.benchmarking import count_queries, rolled_back, synthetic_users
+from business_network.models import (
+    BusinessNetworkFollowerModel,
+    BusinessNetworkPost,
+    BusinessNetworkPostLike,
+)
+
+BATCH = 5000
+OLD_SLEEP = 0.4
+
+
+class Command(BaseCommand):
+    help = 'Weekly digest wall time, per-user vs batched, dry run (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=3, help='new follows per user')
+        parser.add_argument('--likes', type=int, default=3, help='likes given per user')
+        parser.add_argument('--sample', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with rolled_back():
+            users = synthetic_users(options['recipients'], prefix='benchdig')
+            ids = [u.pk for u in users]
+            type(users[0]).objects.filter(pk__in=ids).update(last_login=timezone.now())
+            self._seed(ids, options, rng)
+            self.stdout.write('%d recipients' % len(users))
+
+            sample = users[:options['sample']]
+            with mock.patch.object(email_service, '_send_email', return_value=True), \
+                    count_queries() as ctx:
+                started = time.perf_counter()
+                for user in sample:
+                    email_service.send_bn_digest_email(user)
+                elapsed = time.perf_counter() - started
+            scale = len(users) / len(sample)
+            self._line('per user (old)', elapsed * scale, len(ctx) * scale, len(users),
+                       '  (extrapolated, + %.0fs of sleep)' % (OLD_SLEEP * len(users)))
+
+            with count_queries() as ctx:
+                started = time.perf_counter()
+                stats = email_service.send_bn_digest_emails(users, dry_run=True)
+                elapsed = time.perf_counter() - started
+            self._line('batched, dry run', elapsed, len(ctx), stats['recipients'])
+        self.stdout.write(self.style.SUCCESS('Done — synthetic users rolled back.'))
+
+    def _seed(self, ids, options, rng):
+        follows, seen = [], set()
+        for uid in ids:
+            for target in rng.sample(ids, options['follows']):
+                if target != uid and (uid, target) not in seen:
+                    seen.add((uid, target))
+                    follows.append(BusinessNetworkFollowerModel(
+                        id='bf%d' % len(follows), follower_id=uid, following_id=target))
+        BusinessNetworkFollowerModel.objects.bulk_create(follows, batch_size=BATCH)
+
+        posts = [BusinessNetworkPost(id='9%019d' % i, slug='bench-dig-%d' % i,
+                                     author_id=uid, content='bench')
+                 for i, uid in enumerate(ids[::10])]
+        BusinessNetworkPost.objects.bulk_create(posts, batch_size=BATCH)
+        likes, seen = [], set()
+        for uid in ids:
+            for post in rng.sample(posts, min(len(posts), options['likes'])):
+                if (post.pk, uid) not in seen:
+                    seen.add((post.pk, uid))
+                    likes.append(BusinessNetworkPostLike(
+                        id='bd%d' % len(likes), post_id=post.pk, user_id=uid))
+        BusinessNetworkPostLike.objects.bulk_create(likes, batch_size=BATCH)
+
+    def _line(self, label, elapsed, statements, size, note=''):
+        self.stdout.write('  %-18s %8.1fs  %9.0f recipients/s  %9d statements%s' % (
+            label, elapsed, size / elapsed if elapsed else 0, statements, note))
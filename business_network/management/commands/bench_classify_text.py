@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Throughput of the Interest Brain keyword classifier.
+
+Times ``classify_text`` (the compiled single-pass matcher) over a corpus of
+real-sized post texts against the per-keyword substring scan it replaced,
+checks both give the same hits, and compares them with reading the
+precomputed ``interest_hits`` the profiler and serve_ad now use.
+
+The corpus is the newest ``--posts`` posts in the database (title + content
++ tags, as the profiler sees them). With ``--synthetic``, or when there are
+too few posts, it is built from the taxonomy keywords mixed into filler text
+at the length of an average post.
+
+Read-only — nothing is written.
+
+    manage.py bench_classify_text
+    manage.py bench_classify_text --posts 20000 --rounds 5
+    manage.py bench_classify_text --synthetic --length 600
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from business_network.interest_brain import (
+    INTEREST_TAXONOMY,
+    NEGATIVE_WORDS,
+    POSITIVE_WORDS,
+    _post_text,
+    classify_text,
+    mood_counts,
+)
+from business_network.models import BusinessNetworkPost
+
+FILLER = (
+    "আজকে আমাদের দোকানে নতুন জিনিস এসেছে সবাই আমন্ত্রিত "
+    "today we are sharing an update with everyone thanks for the support "
+).split()
+
+
+def scan_classify(text):
+    """The per-keyword substring scan classify_text used to be."""
+    if not text:
+        return {}
+    t = text.lower()
+    hits = {}
+    for segment, keywords in INTEREST_TAXONOMY.items():
+        n = sum(1 for kw in keywords if kw in t)
+        if n:
+            hits[segment] = n
+    return hits
+
+
+def scan_mood(text):
+    t = (text or "").lower()
+    return (sum(t.count(w) for w in POSITIVE_WORDS),
+            sum(t.count(w) for w in NEGATIVE_WORDS))
+
+
+class Command(BaseCommand):
+    help = 'Posts/sec and MB/s of classify_text, compiled vs substring scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--synthetic', action='store_true')
+        parser.add_argument('--length', type=int, default=400,
+                            help='characters per synthetic post')
+        parser.add_argument('--seed', type=int, default=3)
+
+    def handle(self, *args, **options):
+        corpus, hits = [], []
+        if not options['synthetic']:
+            posts = (
+                BusinessNetworkPost.objects.order_by('-created_at')
+                .prefetch_related('tags')[:options['posts']]
+            )
+            for post in posts:
+                corpus.append(_post_text(post))
+                hits.append(post.interest_hits or {})
+        if len(corpus) < 100:
+            corpus = self._synthetic(options)
+            hits = [classify_text(text) for text in corpus]
+            self.stdout.write('synthetic corpus')
+
+        chars = sum(len(text) for text in corpus)
+        self.stdout.write('%d posts, %.0f chars/post on average'
+                          % (len(corpus), chars / len(corpus)))
+
+        mismatched = sum(1 for text in corpus
+                         if classify_text(text) != scan_classify(text)
+                         or mood_counts(text) != scan_mood(text))
+        if mismatched:
+            self.stdout.write(self.style.ERROR(
+                '%d texts differ from the substring scan' % mismatched))
+
+        for label, classify, mood in (
+            ('substring scan (old)', scan_classify, scan_mood),
+            ('compiled matcher ...', classify_text, mood_counts),
+        ):
+            elapsed = self._time(lambda: [classify(text) for text in corpus],
+                                 options['rounds'])
+            self.stdout.write('  %s classify %10.0f posts/s  %6.2f MB/s'
+                              % (label, len(corpus) / elapsed, chars / elapsed / 1e6))
+            elapsed = self._time(lambda: [mood(text) for text in corpus],
+                                 options['rounds'])
+            self.stdout.write('  %s mood     %10.0f posts/s  %6.2f MB/s'
+                              % (label, len(corpus) / elapsed, chars / elapsed / 1e6))
+        elapsed = self._time(lambda: [dict(h) for h in hits], options['rounds'])
+        self.stdout.write('  precomputed hits .... %10.0f posts/s'
+                          % (len(corpus) / elapsed))
+
+    def _time(self, fn, rounds):
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            fn()
+            took = time.perf_counter() - started
+            best = took if best is None else min(best, took)
+        return best or 1e-9
+
+    def _synthetic(self, options):
+        rng = random.Random(options['seed'])
+        keywords = [kw for kws in INTEREST_TAXONOMY.values() for kw in kws]
+        corpus = []
+        for _ in range(options['posts']):
+            words = []
+            while sum(len(w) + 1 for w in words) < options['length']:
+                words.append(rng.choice(keywords) if rng.random() < 0.08 else rng.choice(FILLER))
+            corpus.append(' '.join(words))
+        return corpus
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the ranked feed with and without the candidate pool.
+
+Seeds synthetic authors and posts (spread over the last 90 days, with random
+engagement counters), a viewer who follows a slice of the authors, then times
+the first page of the ranked feed two ways at each table size:
+
+  * full scoring — BN_FEED_CANDIDATE_POOL off: every visible post is scored
+    and sorted, which is what the feed did before the pool existed
+  * candidate pool — BN_FEED_CANDIDATE_POOL on: only the viewer's pool is
+    (the pool is warmed once first, as it would be after the first request)
+
+Only the ranking query is timed (get_queryset + first page of ids), not
+serialisation, which is the same for both. Everything is rolled back.
+
+    manage.py bench_feed_ranking
+    manage.py bench_feed_ranking --sizes 100000,1000000 --iterations 30
+"""
+import random
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from base.benchmarking import format_stats, measure, rolled_back, synthetic_users
+from business_network import feed_candidates
+from business_network.models import BusinessNetworkFollowerModel, BusinessNetworkPost
+from business_network.views import BusinessNetworkPostListCreateView
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = 'Time the ranked feed first page with and without the candidate pool (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100000,1000000')
+        parser.add_argument('--authors', type=int, default=5000)
+        parser.add_argument('--following', type=int, default=300)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=11)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(',') if s.strip())
+        rng = random.Random(options['seed'])
+
+        with rolled_back():
+            viewer = synthetic_users(1, prefix='benchviewer')[0]
+            authors = synthetic_users(options['authors'], prefix='benchauthor')
+            BusinessNetworkFollowerModel.objects.bulk_create(
+                [
+                    BusinessNetworkFollowerModel(
+                        id='bf%d' % i, follower=viewer, following=author)
+                    for i, author in enumerate(rng.sample(authors, options['following']))
+                ],
+                batch_size=BATCH,
+            )
+
+            seeded = 0
+            for size in sizes:
+                self._seed_posts(seeded, size, authors, rng)
+                seeded = size
+                self._report(size, viewer, options['iterations'])
+
+        self.stdout.write(self.style.SUCCESS('Done — synthetic posts rolled back.'))
+
+    def _seed_posts(self, start, stop, authors, rng):
+        for batch_start in range(start, stop, BATCH):
+            batch_stop = min(stop, batch_start + BATCH)
+            BusinessNetworkPost.objects.bulk_create(
+                [
+                    BusinessNetworkPost(
+                        # Numeric tail so the feed's jitter expression applies.
+                        id='9%019d' % i,
+                        slug='bench-%d' % i,
+                        author=rng.choice(authors),
+                        content='benchmark post %d' % i,
+                        visibility='public',
+                        like_count=rng.randint(0, 40),
+                        comment_count=rng.randint(0, 10),
+                        save_count=rng.randint(0, 5),
+                    )
+                    for i in range(batch_start, batch_stop)
+                ],
+                batch_size=BATCH,
+            )
+        # bulk_create stamps created_at with "now"; spread the new rows out.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE %s SET created_at = NOW() - random() * INTERVAL \'90 days\', '
+                'last_activity_at = NOW() - random() * INTERVAL \'30 days\' '
+                'WHERE slug LIKE %%s' % BusinessNetworkPost._meta.db_table,
+                ['bench-%'],
+            )
+            cursor.execute('ANALYZE %s' % BusinessNetworkPost._meta.db_table)
+
+    def _first_page(self, viewer):
+        django_request = APIRequestFactory().get('/api/bn/posts/', {'page': 1})
+        request = Request(django_request)
+        request.user = viewer
+        view = BusinessNetworkPostListCreateView()
+        view.request = request
+        view.args, view.kwargs, view.format_kwarg = (), {}, None
+        return list(view.get_queryset().values_list('id', flat=True)[:7])
+
+    def _report(self, size, viewer, iterations):
+        cache.delete_many([
+            'bn_feed_pool:%s' % viewer.id,
+            feed_candidates.FRESH_KEY,
+            feed_candidates.ACTIVE_KEY,
+        ])
+        self.stdout.write('')
+        self.stdout.write('%d posts' % size)
+        with override_settings(BN_FEED_CANDIDATE_POOL=False):
+            stats = measure(lambda: self._first_page(viewer), iterations)
+        self.stdout.write('  full scoring .... %s' % format_stats(stats))
+        with override_settings(BN_FEED_CANDIDATE_POOL=True):
+            self._first_page(viewer)  # build the pool
+            stats = measure(lambda: self._first_page(viewer), iterations)
+        self.stdout.write('  candidate pool .. %s' % format_stats(stats))
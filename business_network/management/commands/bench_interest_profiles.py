@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Time the nightly Interest Brain rebuild at several active-user counts.
+
+For each ``--sizes`` value, seeds that many synthetic users with a month of
+feed views and likes over a shared pool of classified posts, then times:
+
+  * one user at a time — build_profiles([user]) for ``--sample`` users,
+    extrapolated to the whole set (what a per-user loop costs)
+  * batched, first build — every user in PROFILE_BATCH batches, reading the
+    full LOOKBACK_DAYS window
+  * batched, incremental — the next night: a day of new activity for a
+    share of the users, folded into the decayed state
+
+Reports wall time, users/sec and statements for each. Everything is rolled
+back.
+
+    manage.py bench_interest_profiles
+    manage.py bench_interest_profiles --sizes 10000,100000 --posts 20000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from base.benchmarking import count_queries, rolled_back, synthetic_users
+from business_network.interest_brain import (
+    INTEREST_TAXONOMY,
+    PROFILE_BATCH,
+    build_profiles,
+    classify_text,
+    text_hash,
+)
+from business_network.models import (
+    BusinessNetworkPost,
+    BusinessNetworkPostLike,
+    PostSeen,
+    UserAdProfile,
+)
+
+BATCH = 5000
+FILLER = "today we are sharing an update with everyone thanks for the support".split()
+
+
+class Command(BaseCommand):
+    help = 'Interest Brain rebuild time, per-user vs batched vs incremental (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000')
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--views', type=int, default=20, help='feed views per user')
+        parser.add_argument('--likes', type=int, default=4, help='likes per user')
+        parser.add_argument('--sample', type=int, default=300)
+        parser.add_argument('--daily-share', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=17)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with rolled_back():
+            authors = synthetic_users(200, prefix='benchibauthor')
+            posts = self._seed_posts(options['posts'], authors, rng)
+            # Posts nobody has touched yet: tomorrow's activity lands on these.
+            fresh = posts[-max(1, len(posts) // 10):]
+            old = posts[:len(posts) - len(fresh)]
+            for size in [int(s) for s in options['sizes'].split(',') if s.strip()]:
+                self._run(size, old, fresh, options, rng)
+        self.stdout.write(self.style.SUCCESS('Done — synthetic activity rolled back.'))
+
+    def _seed_posts(self, count, authors, rng):
+        keywords = [kw for kws in INTEREST_TAXONOMY.values() for kw in kws]
+        posts = []
+        for i in range(count):
+            words = [rng.choice(keywords) if rng.random() < 0.15 else rng.choice(FILLER)
+                     for _ in range(40)]
+            content = ' '.join(words)
+            posts.append(BusinessNetworkPost(
+                id='8%019d' % i, slug='bench-ib-%d' % i, author=rng.choice(authors),
+                content=content, interest_hits=classify_text(content),
+                interest_text_hash=text_hash(None, content)))
+        BusinessNetworkPost.objects.bulk_create(posts, batch_size=BATCH)
+        return [p.pk for p in posts]
+
+    def _run(self, size, old, fresh, options, rng):
+        users = [u.pk for u in synthetic_users(size, prefix='benchib')]
+        seen, likes = [], []
+        for uid in users:
+            for post_id in rng.sample(old, min(len(old), options['views'])):
+                seen.append(PostSeen(user_id=uid, post_id=post_id))
+            for post_id in rng.sample(old, min(len(old), options['likes'])):
+                likes.append(BusinessNetworkPostLike(
+                    id='bl%d' % (len(likes) + size * 100), user_id=uid, post_id=post_id))
+        PostSeen.objects.bulk_create(seen, batch_size=BATCH)
+        BusinessNetworkPostLike.objects.bulk_create(likes, batch_size=BATCH)
+        # bulk_create stamps "now"; spread the month of activity out.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE %s SET last_seen_at = NOW() - random() * INTERVAL \'29 days\' '
+                'WHERE user_id = ANY(%%s)' % PostSeen._meta.db_table, [users])
+            cursor.execute(
+                'UPDATE %s SET created_at = NOW() - random() * INTERVAL \'29 days\' '
+                'WHERE user_id = ANY(%%s)' % BusinessNetworkPostLike._meta.db_table, [users])
+
+        self.stdout.write('')
+        self.stdout.write('%d active users, %d views, %d likes' % (size, len(seen), len(likes)))
+
+        sample = users[:options['sample']]
+        with count_queries() as ctx:
+            started = time.perf_counter()
+            for uid in sample:
+                build_profiles([uid])
+            elapsed = time.perf_counter() - started
+        UserAdProfile.objects.filter(user_id__in=sample).delete()
+        self._line('one user at a time', elapsed * size / len(sample),
+                   len(ctx) * size / len(sample), size, extrapolated=True)
+
+        self._line('batched, first build', *self._batched(users), size)
+
+        day = [uid for uid in users if rng.random() < options['daily_share']]
+        PostSeen.objects.bulk_create(
+            [PostSeen(user_id=uid, post_id=rng.choice(fresh)) for uid in day],
+            batch_size=BATCH, ignore_conflicts=True)
+        self._line('batched, incremental', *self._batched(users), size)
+
+    def _batched(self, users):
+        with count_queries() as ctx:
+            started = time.perf_counter()
+            now = timezone.now()
+            for start in range(0, len(users), PROFILE_BATCH):
+                build_profiles(users[start:start + PROFILE_BATCH], now=now)
+            elapsed = time.perf_counter() - started
+        return elapsed, len(ctx)
+
+    def _line(self, label, elapsed, statements, size, extrapolated=False):
+        self.stdout.write('  %-22s %8.1fs  %9.0f users/s  %9d statements%s' % (
+            label, elapsed, size / elapsed if elapsed else 0, statements,
+            '  (extrapolated)' if extrapolated else ''))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Nightly creator-earnings run through a month, 10k creators.
+
+Seeds ``--creators`` approved creators (one post with one photo each) and a
+pool of ``--viewers`` older accounts, then a month of engagement for last
+month: per creator per day ``--views-per-day`` views from distinct viewers,
+and a like, a comment and a follow each with ``--engagement-rate`` odds.
+Then replays the month night by night (``timezone.now`` pinned to the cron's
+03:30 Dhaka = 21:30 UTC) and reports, at a few nights:
+
+  * per creator (old) — creator_points for ``--sample`` creators over the
+    month so far, extrapolated to every creator; grows with the date
+  * rollup — compute_period_earnings: the new day rolled up once, today
+    read live, the rest summed from CreatorDailyPoints; stays flat
+
+Everything is rolled back.
+
+    manage.py bench_monetization
+    manage.py bench_monetization --creators 2000 --views-per-day 10
+"""
+import random
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.benchmarking import count_queries, rolled_back, synthetic_users
+from business_network.models import (
+    BusinessNetworkFollowerModel,
+    BusinessNetworkMedia,
+    BusinessNetworkMediaView,
+    BusinessNetworkPost,
+    BusinessNetworkPostComment,
+    BusinessNetworkPostLike,
+    ContentMonetizationApplication,
+    ContentMonetizationSettings,
+)
+from business_network.monetization import compute_period_earnings, creator_points, period_bounds
+
+CHUNK = 1000
+TIMESTAMPED = (BusinessNetworkMediaView, BusinessNetworkPostLike,
+               BusinessNetworkPostComment, BusinessNetworkFollowerModel)
+
+
+class Command(BaseCommand):
+    help = 'Nightly creator-earnings run, per creator vs rollup, through a month (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--creators', type=int, default=10000)
+        parser.add_argument('--viewers', type=int, default=20000)
+        parser.add_argument('--views-per-day', type=int, default=5)
+        parser.add_argument('--engagement-rate', type=float, default=0.3)
+        parser.add_argument('--sample', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        first = timezone.localtime().date().replace(day=1) - timedelta(days=1)
+        period = '%04d-%02d' % (first.year, first.month)
+        start, end = period_bounds(period)
+        days = (end - start).days
+
+        with rolled_back():
+            started = time.perf_counter()
+            creators = self._seed(start, days, options, rng)
+            self.stdout.write('seeded %d creators, %d days in %.1fs' % (
+                len(creators), days, time.perf_counter() - started))
+            conf = ContentMonetizationSettings.current()
+            sample = creators[:options['sample']]
+            checkpoints = {2, days // 4, days // 2, 3 * days // 4, days}
+
+            for night in range(1, days + 1):
+                now = start + timedelta(days=night - 1, hours=21, minutes=30)
+                with mock.patch('django.utils.timezone.now', return_value=now):
+                    with count_queries() as ctx:
+                        began = time.perf_counter()
+                        summary = compute_period_earnings(period, rebuild=False)
+                        rollup = time.perf_counter() - began
+                    if night not in checkpoints:
+                        continue
+                    with count_queries() as old_ctx:
+                        began = time.perf_counter()
+                        for user in sample:
+                            creator_points(user, start, now, conf)
+                        old = time.perf_counter() - began
+                scale = len(creators) / max(len(sample), 1)
+                self.stdout.write(
+                    '  night %2d  per creator (old) %7.1fs %8d queries   '
+                    'rollup %6.2fs %5d queries  (%d day(s) rolled up)' % (
+                        night, old * scale, len(old_ctx) * scale,
+                        rollup, len(ctx), summary['days_rolled_up']))
+
+        self.stdout.write(self.style.SUCCESS('Done — synthetic creators rolled back.'))
+
+    def _seed(self, start, days, options, rng):
+        creators = synthetic_users(options['creators'], prefix='benchcreator')
+        viewers = [u.pk for u in synthetic_users(options['viewers'], prefix='benchviewer')]
+        type(creators[0]).objects.filter(
+            pk__in=[u.pk for u in creators] + viewers,
+        ).update(date_joined=start - timedelta(days=90))
+        ContentMonetizationApplication.objects.bulk_create(
+            [ContentMonetizationApplication(user=u, status='approved') for u in creators],
+            batch_size=5000,
+        )
+
+        tag = rng.randrange(10 ** 6)
+        seq = iter(range(10 ** 9))
+
+        def new_id(prefix):
+            return '%s%d_%d' % (prefix, tag, next(seq))
+
+        def stamp(day):
+            return start + timedelta(days=day, seconds=rng.randrange(86400))
+
+        # created_at is auto_now_add; let the seeded timestamps through.
+        patches = [mock.patch.object(model._meta.get_field('created_at'), 'auto_now_add', False)
+                   for model in TIMESTAMPED]
+        for patch in patches:
+            patch.start()
+        try:
+            rate, per_day = options['engagement_rate'], options['views_per_day']
+            for offset in range(0, len(creators), CHUNK):
+                chunk = creators[offset:offset + CHUNK]
+                posts = [BusinessNetworkPost(id=new_id('bp'), author=u, content='bench')
+                         for u in chunk]
+                media = [BusinessNetworkMedia(id=new_id('bm'), type='image') for _ in chunk]
+                BusinessNetworkPost.objects.bulk_create(posts)
+                BusinessNetworkMedia.objects.bulk_create(media)
+                BusinessNetworkPost.media.through.objects.bulk_create([
+                    BusinessNetworkPost.media.through(
+                        businessnetworkpost_id=p.id, businessnetworkmedia_id=m.id)
+                    for p, m in zip(posts, media)
+                ])
+
+                views, likes, comments, follows = [], [], [], []
+                for user, post, item in zip(chunk, posts, media):
+                    audience = rng.sample(viewers, min(len(viewers), per_day * days + days))
+                    for i, viewer in enumerate(audience[:per_day * days]):
+                        views.append(BusinessNetworkMediaView(
+                            media=item, user_id=viewer, created_at=stamp(i // per_day)))
+                    fans = iter(audience[per_day * days:])
+                    for day in range(days):
+                        fan = next(fans)
+                        if rng.random() < rate:
+                            likes.append(BusinessNetworkPostLike(
+                                id=new_id('bl'), post=post, user_id=fan, created_at=stamp(day)))
+                        if rng.random() < rate:
+                            comments.append(BusinessNetworkPostComment(
+                                id=new_id('bc'), post=post, author_id=fan,
+                                content='bench', created_at=stamp(day)))
+                        if rng.random() < rate:
+                            follows.append(BusinessNetworkFollowerModel(
+                                id=new_id('bf'), follower_id=fan, following=user,
+                                created_at=stamp(day)))
+                BusinessNetworkMediaView.objects.bulk_create(views, batch_size=5000)
+                BusinessNetworkPostLike.objects.bulk_create(likes, batch_size=5000)
+                BusinessNetworkPostComment.objects.bulk_create(comments, batch_size=5000)
+                BusinessNetworkFollowerModel.objects.bulk_create(follows, batch_size=5000)
+                self.stdout.write('  seeded %d/%d creators' % (
+                    offset + len(chunk), len(creators)), ending='\r')
+            self.stdout.write('')
+        finally:
+            for patch in patches:
+                patch.stop()
+        return creators
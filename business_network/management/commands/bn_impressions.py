@@ -0,0 +1,27 @@
+"""Show (or drain) the feed impression buffer.
+
+Feed pages append their impressions to a cache log that flush_feed_impressions
+merges into PostSeen every few seconds. ``depth`` is how many pages are
+waiting and ``lag_seconds`` how old the oldest of them is — a growing lag
+means the worker is not running or cannot keep up.
+
+    python manage.py bn_impressions            # stats only
+    python manage.py bn_impressions --flush    # drain now, then stats
+"""
+from django.core.management.base import BaseCommand
+
+from business_network import impressions
+
+
+class Command(BaseCommand):
+    help = "Report feed impression buffer depth and flush lag; optionally flush."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flush", action="store_true")
+
+    def handle(self, *args, **opts):
+        if opts["flush"]:
+            drained = impressions.flush()
+            self.stdout.write(f"flushed {drained} page(s)")
+        for name, value in impressions.stats().items():
+            self.stdout.write(f"  {name}: {value}")
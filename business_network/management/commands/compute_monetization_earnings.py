@@ -16,7 +16,14 @@ class Command(BaseCommand):
             default=None,
             help="Month to compute as YYYY-MM (default: current month).",
         )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            default=None,
+            help="Re-derive the month's daily rollup from the raw rows "
+            "(always done for a closed month).",
+        )
 
     def handle(self, *args, **options):
-        summary = compute_period_earnings(options["period"])
+        summary = compute_period_earnings(options["period"], rebuild=options["rebuild"])
         self.stdout.write(self.style.SUCCESS(str(summary)))
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_network', '0075_alter_abnadspanel_ad_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abnadspanel',
+            name='interest_hits',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='abnadspanel',
+            name='interest_text_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='businessnetworkpost',
+            name='interest_hits',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='businessnetworkpost',
+            name='interest_text_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_network', '0076_interest_hits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useradprofile',
+            name='brain_state',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,74 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_network', '0077_useradprofile_brain_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreatorPointsDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('view_cap', models.PositiveIntegerField()),
+                ('min_account_age_days', models.PositiveIntegerField()),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CreatorDailyPoints',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('valid_views', models.PositiveIntegerField(default=0)),
+                ('young_views', models.PositiveIntegerField(default=0)),
+                ('likes', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('followers_gained', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monetization_daily_points', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='bn_creator_points_day_idx')],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CreatorViewerTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=7)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monetization_viewer_tallies', to=settings.AUTH_USER_MODEL)),
+                ('viewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('period', 'creator', 'viewer')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='businessnetworkmediaview',
+            index=models.Index(fields=['created_at'], name='bn_media_view_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessnetworkpostlike',
+            index=models.Index(fields=['created_at'], name='bn_like_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessnetworkpostcomment',
+            index=models.Index(fields=['created_at'], name='bn_comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessnetworkfollowermodel',
+            index=models.Index(fields=['created_at'], name='bn_follow_created_idx'),
+        ),
+    ]
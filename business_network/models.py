@@ -165,6 +165,10 @@ class BusinessNetworkMediaView(models.Model):
     class Meta:
         # unique_together already provides the (media, user) index we look up on.
         unique_together = ['media', 'user']
+        indexes = [
+            # The monetization rollup reads one day of views at a time.
+            models.Index(fields=['created_at'], name='bn_media_view_created_idx'),
+        ]
 
 
 class BusinessNetworkMediaLike(models.Model):
@@ -269,6 +273,11 @@ class BusinessNetworkPost(models.Model):
     save_count = models.PositiveIntegerField(default=0)
     # Last time anyone liked/commented/saved — used to surface freshly active posts.
     last_activity_at = models.DateTimeField(null=True, blank=True)
+    # Interest Brain keyword hits ({segment: count}) for title + content +
+    # tags, and a hash of the title/content they were computed from. Kept
+    # current by signals so profiling never re-classifies a post on read.
+    interest_hits = models.JSONField(default=dict, blank=True, editable=False)
+    interest_text_hash = models.CharField(max_length=32, blank=True, editable=False)
 
     class Meta:
         indexes = [
@@ -324,6 +333,7 @@ class BusinessNetworkPostLike(models.Model):
         indexes = [
             models.Index(fields=["user", "-created_at"], name="bn_like_user_recent_idx"),
             models.Index(fields=["post", "user"], name="bn_like_post_user_idx"),
+            models.Index(fields=["created_at"], name="bn_like_created_idx"),
         ]
 
     def generate_id(self):
@@ -376,6 +386,7 @@ class BusinessNetworkPostComment(models.Model):
         indexes = [
             models.Index(fields=["author", "-created_at"], name="bn_comment_author_recent_idx"),
             models.Index(fields=["post", "author", "-created_at"], name="bn_comment_post_author_idx"),
+            models.Index(fields=["created_at"], name="bn_comment_created_idx"),
         ]
     def generate_id(self):
         return make_timestamp_id(BusinessNetworkPostComment)
@@ -439,6 +450,7 @@ class BusinessNetworkFollowerModel(models.Model):
         indexes = [
             models.Index(fields=["follower", "following"], name="bn_follow_follower_idx"),
             models.Index(fields=["following", "follower"], name="bn_follow_following_idx"),
+            models.Index(fields=["created_at"], name="bn_follow_created_idx"),
         ]
     
     def generate_id(self):
@@ -600,6 +612,10 @@ class AbnAdsPanel(models.Model):
     # Money consumed so far (views * CPV) — never exceeds budget.
     spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     estimated_views = models.PositiveIntegerField(default=0)
+    # Interest Brain keyword hits for title + description (see the post
+    # fields of the same name); serve_ad reads these for every candidate.
+    interest_hits = models.JSONField(default=dict, blank=True, editable=False)
+    interest_text_hash = models.CharField(max_length=32, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -1347,6 +1363,71 @@ class CreatorMonthlyEarning(models.Model):
         )
 
 
+class CreatorDailyPoints(models.Model):
+    """One approved creator's point inputs for one finished day.
+
+    compute_period_earnings sums these instead of re-reading the month's
+    views, likes, comments and follows (business_network.monetization). A
+    row is written for every approved creator for every rolled-up day, zeros
+    included, so a creator approved mid-month shows up as missing days and
+    is back-filled.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="monetization_daily_points"
+    )
+    day = models.DateField()
+    valid_views = models.PositiveIntegerField(default=0)
+    # Views from accounts created within 30 days of the period's end.
+    young_views = models.PositiveIntegerField(default=0)
+    likes = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    followers_gained = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["user", "day"]
+        indexes = [
+            models.Index(fields=["day"], name="bn_creator_points_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}: {self.valid_views} views"
+
+
+class CreatorViewerTally(models.Model):
+    """Capped valid views one viewer gave one creator over a period's
+    rolled-up days — what the top-10-viewer share fraud signal reads."""
+
+    period = models.CharField(max_length=7)  # "YYYY-MM"
+    creator = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="monetization_viewer_tallies"
+    )
+    viewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["period", "creator", "viewer"]
+
+    def __str__(self):
+        return f"{self.period} {self.viewer_id} -> {self.creator_id}: {self.views}"
+
+
+class CreatorPointsDay(models.Model):
+    """A day folded into CreatorDailyPoints, and the view rules it was folded
+    with — a day folded under other rules is rebuilt."""
+
+    day = models.DateField(unique=True)
+    view_cap = models.PositiveIntegerField()
+    min_account_age_days = models.PositiveIntegerField()
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["day"]
+
+    def __str__(self):
+        return f"{self.day} (rolled up {self.built_at:%Y-%m-%d %H:%M})"
+
+
 class PostSeen(models.Model):
     """Persistent per-user post impressions (which feed posts were served).
 
@@ -1639,6 +1720,9 @@ class UserAdProfile(models.Model):
     # engagement share on male vs female creators — {"male": 70, "female": 30}
     gender_affinity = models.JSONField(default=dict, blank=True)
     brain_built_at = models.DateTimeField(null=True, blank=True)
+    # Decayed raw signal totals the next build continues from, so it only
+    # reads activity since brain_built_at (see interest_brain.build_profiles).
+    brain_state = models.JSONField(default=dict, blank=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -12,14 +12,25 @@ Valid-view rules applied here (anti-fraud layer 1):
     of the view carry no points;
   * one viewer contributes at most `viewer_daily_view_cap` valid views per
     creator per day.
+
+`creator_points` answers for one creator (the earnings page, live).
+`compute_period_earnings` answers for all of them from a per-day rollup
+(CreatorDailyPoints) it extends by one day each night.
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
-from django.db.models import Count, F
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber, TruncDate
 from django.utils import timezone
 
+# fraud_score's volume floor: below it the viewer-concentration share is
+# never looked at, so compute_period_earnings doesn't compute it.
+SIGNAL_MIN_VIEWS = 200
+TOP_VIEWERS = 10
+
 
 def period_bounds(period):
     """'YYYY-MM' → (start, end) aware datetimes covering that month."""
@@ -266,42 +277,381 @@ def creator_content_breakdown(user, start, end, conf, limit=25):
     }
 
 
-def compute_period_earnings(period=None):
+def _day_start(day, tz):
+    return timezone.make_aware(datetime.combine(day, time.min), tz)
+
+
+def _runs(days):
+    """Sorted ``days`` as lists of consecutive days."""
+    runs = []
+    for day in days:
+        if runs and runs[-1][-1] + timedelta(days=1) == day:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _grouped_points(creator_ids, start, end, conf, period_end):
+    """creator_points for every creator in ``creator_ids`` at once, over
+    [start, end): one grouped query per source instead of six per creator.
+
+    Returns ``(days, viewers)`` — ``{(creator, day): [valid_views,
+    young_views, likes, comments, followers_gained]}`` and
+    ``{(creator, viewer): capped valid views}``. Young viewers are judged
+    against ``period_end``, as creator_points judges them against its end.
+    """
+    from .models import (
+        BusinessNetworkFollowerModel,
+        BusinessNetworkMediaView,
+        BusinessNetworkPostComment,
+        BusinessNetworkPostLike,
+    )
+
+    days = {}
+    viewers = {}
+    if not creator_ids:
+        return days, viewers
+
+    def bucket(creator, day):
+        counts = days.get((creator, day))
+        if counts is None:
+            counts = days[(creator, day)] = [0, 0, 0, 0, 0]
+        return counts
+
+    cap = max(conf.viewer_daily_view_cap, 1)
+    author = "media__business_network_posts__author_id"
+    view_rows = (
+        BusinessNetworkMediaView.objects.filter(
+            created_at__gte=start,
+            created_at__lt=end,
+            **{f"{author}__in": creator_ids},
+        )
+        .filter(
+            created_at__gte=F("user__date_joined")
+            + timedelta(days=conf.viewer_min_account_age_days)
+        )
+        .order_by()
+        .values(creator=F(author), viewer=F("user_id"), day=TruncDate("created_at"))
+        # distinct: a media item on two of the creator's posts is one view.
+        .annotate(
+            n=Count("id", distinct=True),
+            young=Count(
+                "id",
+                distinct=True,
+                filter=Q(user__date_joined__gte=period_end - timedelta(days=30)),
+            ),
+        )
+    )
+    for row in view_rows.iterator(chunk_size=5000):
+        creator, viewer = row["creator"], row["viewer"]
+        if creator == viewer:
+            continue
+        capped = min(row["n"], cap)
+        counts = bucket(creator, row["day"])
+        counts[0] += capped
+        counts[1] += row["young"]
+        viewers[(creator, viewer)] = viewers.get((creator, viewer), 0) + capped
+
+    sources = (
+        (2, BusinessNetworkPostLike.objects.exclude(user_id=F("post__author_id")),
+         "post__author_id"),
+        (3, BusinessNetworkPostComment.objects.exclude(author_id=F("post__author_id")),
+         "post__author_id"),
+        (4, BusinessNetworkFollowerModel.objects.all(), "following_id"),
+    )
+    for slot, qs, creator_field in sources:
+        rows = (
+            qs.filter(
+                created_at__gte=start,
+                created_at__lt=end,
+                **{f"{creator_field}__in": creator_ids},
+            )
+            .order_by()
+            .values(creator=F(creator_field), day=TruncDate("created_at"))
+            .annotate(n=Count("id"))
+            .values_list("creator", "day", "n")
+        )
+        for creator, day, n in rows:
+            bucket(creator, day)[slot] += n
+    return days, viewers
+
+
+def _fold(period, days, creator_ids, conf, period_end, tz):
+    """Roll the consecutive finished ``days`` up for ``creator_ids``: a
+    CreatorDailyPoints row per creator per day (zeros too) and their capped
+    views added onto the period's viewer tallies."""
+    from .models import CreatorDailyPoints, CreatorViewerTally
+
+    grouped, viewers = _grouped_points(
+        creator_ids,
+        _day_start(days[0], tz),
+        _day_start(days[-1] + timedelta(days=1), tz),
+        conf,
+        period_end,
+    )
+    zero = (0, 0, 0, 0, 0)
+    CreatorDailyPoints.objects.bulk_create(
+        [
+            CreatorDailyPoints(
+                user_id=creator,
+                day=day,
+                valid_views=counts[0],
+                young_views=counts[1],
+                likes=counts[2],
+                comments=counts[3],
+                followers_gained=counts[4],
+            )
+            for creator in creator_ids
+            for day in days
+            for counts in (grouped.get((creator, day), zero),)
+        ],
+        batch_size=2000,
+    )
+    if not viewers:
+        return
+    stored = CreatorViewerTally.objects.filter(
+        period=period,
+        creator_id__in={c for c, _v in viewers},
+        viewer_id__in={v for _c, v in viewers},
+    ).values_list("creator_id", "viewer_id", "views")
+    for creator, viewer, n in stored:
+        if (creator, viewer) in viewers:
+            viewers[(creator, viewer)] += n
+    CreatorViewerTally.objects.bulk_create(
+        [
+            CreatorViewerTally(period=period, creator_id=c, viewer_id=v, views=n)
+            for (c, v), n in viewers.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["period", "creator", "viewer"],
+        update_fields=["views"],
+        batch_size=2000,
+    )
+
+
+def _top_viewer_views(period, creator_ids, live_viewers):
+    """``{creator: valid views from its TOP_VIEWERS biggest viewers}`` over
+    the rolled-up days plus ``live_viewers`` (today's, not rolled up)."""
+    from .models import CreatorViewerTally
+
+    if not creator_ids:
+        return {}
+    merged = {c: {} for c in creator_ids}
+    ranked = (
+        CreatorViewerTally.objects.filter(period=period, creator_id__in=creator_ids)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("creator_id"),
+                order_by=F("views").desc(),
+            )
+        )
+        .filter(rank__lte=TOP_VIEWERS)
+        .values_list("creator_id", "viewer_id", "views")
+    )
+    for creator, viewer, n in ranked:
+        merged[creator][viewer] = n
+    # A viewer outside a creator's stored top 10 can only enter it through
+    # today's views, so today's viewers are the only other ones to look up.
+    live = {key: n for key, n in live_viewers.items() if key[0] in merged}
+    if live:
+        stored = CreatorViewerTally.objects.filter(
+            period=period,
+            creator_id__in={c for c, _v in live},
+            viewer_id__in={v for _c, v in live},
+        ).values_list("creator_id", "viewer_id", "views")
+        for creator, viewer, n in stored:
+            merged[creator][viewer] = n
+        for (creator, viewer), n in live.items():
+            merged[creator][viewer] = merged[creator].get(viewer, 0) + n
+    return {
+        creator: sum(sorted(views.values(), reverse=True)[:TOP_VIEWERS])
+        for creator, views in merged.items()
+    }
+
+
+def _roll_up(period, start, end, creator_ids, conf, tz, now, rebuild):
+    """Bring the period's CreatorDailyPoints up to date; returns the finished
+    days it covers and how many were rolled up just now."""
+    from .models import (
+        ContentMonetizationSettings,
+        CreatorDailyPoints,
+        CreatorPointsDay,
+        CreatorViewerTally,
+    )
+
+    first_day = timezone.localtime(start, tz).date()
+    last_day = timezone.localtime(end - timedelta(microseconds=1), tz).date()
+    finished_until = min(end, _day_start(timezone.localtime(now, tz).date(), tz))
+    finished = []
+    day = first_day
+    while _day_start(day + timedelta(days=1), tz) <= finished_until:
+        finished.append(day)
+        day += timedelta(days=1)
+
+    rules = (max(conf.viewer_daily_view_cap, 1), conf.viewer_min_account_age_days)
+    in_period = {"day__gte": first_day, "day__lte": last_day}
+    with transaction.atomic():
+        # One refresh at a time.
+        ContentMonetizationSettings.objects.select_for_update().filter(pk=conf.pk).first()
+        marked = {
+            m.day: (m.view_cap, m.min_account_age_days)
+            for m in CreatorPointsDay.objects.filter(**in_period)
+        }
+        if rebuild or any(r != rules for r in marked.values()):
+            CreatorDailyPoints.objects.filter(**in_period).delete()
+            CreatorViewerTally.objects.filter(period=period).delete()
+            CreatorPointsDay.objects.filter(**in_period).delete()
+            marked = {}
+
+        # Creators approved after some days were rolled up have no rows for
+        # them: back-fill just those creators.
+        done = sorted(marked)
+        if done:
+            have = dict(
+                CreatorDailyPoints.objects.filter(user_id__in=creator_ids, **in_period)
+                .order_by()
+                .values("user_id")
+                .annotate(n=Count("id"))
+                .values_list("user_id", "n")
+            )
+            late = [c for c in creator_ids if have.get(c, 0) < len(done)]
+            if late:
+                CreatorDailyPoints.objects.filter(user_id__in=late, **in_period).delete()
+                CreatorViewerTally.objects.filter(period=period, creator_id__in=late).delete()
+                for run in _runs(done):
+                    _fold(period, run, late, conf, end, tz)
+
+        new_days = [d for d in finished if d not in marked]
+        for run in _runs(new_days):
+            _fold(period, run, creator_ids, conf, end, tz)
+        CreatorPointsDay.objects.bulk_create(
+            [
+                CreatorPointsDay(day=d, view_cap=rules[0], min_account_age_days=rules[1])
+                for d in new_days
+            ]
+        )
+    return first_day, last_day, len(new_days)
+
+
+def compute_period_earnings(period=None, rebuild=None):
     """(Re)compute every approved creator's points + pool share for a month.
 
     Safe to run repeatedly (daily cron + after month close): rows already
     paid or forfeited are left untouched; everything else is refreshed.
-    Returns a small summary dict for logging.
+
+    Finished days are rolled up once into CreatorDailyPoints (all creators
+    in one grouped pass) and summed from there, so the nightly run reads one
+    new day of raw rows plus today's, not the whole month. ``rebuild`` re-
+    derives the month from the raw rows instead; it defaults to on for a
+    closed month, so the final run also drops anything deleted since (an
+    unlike, a removed fake account). Returns a small summary dict for logging.
     """
     from .models import (
         ContentMonetizationApplication,
         ContentMonetizationSettings,
+        CreatorDailyPoints,
         CreatorMonthlyEarning,
     )
 
     period = period or current_period()
     start, end = period_bounds(period)
     conf = ContentMonetizationSettings.current()
+    tz = timezone.get_current_timezone()
+    now = timezone.now()
+    if rebuild is None:
+        rebuild = end <= now
+
+    creator_ids = list(
+        ContentMonetizationApplication.objects.filter(status="approved")
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
 
-    creators = [
-        app.user
-        for app in ContentMonetizationApplication.objects.filter(
-            status="approved"
-        ).select_related("user")
-    ]
+    first_day, last_day, rolled_up = _roll_up(
+        period, start, end, creator_ids, conf, tz, now, rebuild
+    )
 
-    results = {}
-    for user in creators:
-        results[user.pk] = (user, creator_points(user, start, end, conf))
+    totals = {c: [0, 0, 0, 0, 0] for c in creator_ids}
+    sums = (
+        CreatorDailyPoints.objects.filter(
+            user_id__in=creator_ids, day__gte=first_day, day__lte=last_day
+        )
+        .order_by()
+        .values("user_id")
+        .annotate(
+            v=Sum("valid_views"),
+            y=Sum("young_views"),
+            l=Sum("likes"),
+            c=Sum("comments"),
+            f=Sum("followers_gained"),
+        )
+        .values_list("user_id", "v", "y", "l", "c", "f")
+    )
+    for creator, *counts in sums:
+        totals[creator] = list(counts)
+
+    # Today is not finished, so it is never rolled up: read it live.
+    live_viewers = {}
+    today_start = _day_start(timezone.localtime(now, tz).date(), tz)
+    if start <= today_start < end:
+        live, live_viewers = _grouped_points(
+            creator_ids, today_start, min(end, now), conf, end
+        )
+        for (creator, _day), counts in live.items():
+            totals[creator] = [a + b for a, b in zip(totals[creator], counts)]
+
+    # The concentration signal only counts from fraud_score's volume floor.
+    top_views = _top_viewer_views(
+        period,
+        [c for c, t in totals.items() if t[0] >= SIGNAL_MIN_VIEWS],
+        live_viewers,
+    )
 
-    total_points = sum(p["total_points"] for _, p in results.values())
+    results = {}
+    for creator, (views, young, likes, comments, followers) in totals.items():
+        results[creator] = {
+            "valid_views": views,
+            "likes": likes,
+            "comments": comments,
+            "followers_gained": followers,
+            "total_points": (
+                views * conf.point_view
+                + likes * conf.point_like
+                + comments * conf.point_comment
+                + followers * conf.point_follower
+            ),
+            "top10_share": top_views.get(creator, 0) / views if views else 0.0,
+            "young_share": min(young / views, 1.0) if views else 0.0,
+        }
+
+    total_points = sum(p["total_points"] for p in results.values())
     pool = conf.monthly_pool_amount or Decimal("0")
 
-    updated = 0
-    for user, points in results.values():
-        row, _created = CreatorMonthlyEarning.objects.get_or_create(
-            user=user, period=period
+    rows = {
+        row.user_id: row
+        for row in CreatorMonthlyEarning.objects.filter(
+            period=period, user_id__in=creator_ids
+        )
+    }
+    missing = [c for c in creator_ids if c not in rows]
+    if missing:
+        CreatorMonthlyEarning.objects.bulk_create(
+            [CreatorMonthlyEarning(user_id=c, period=period) for c in missing],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        rows.update(
+            (row.user_id, row)
+            for row in CreatorMonthlyEarning.objects.filter(
+                period=period, user_id__in=missing
+            )
         )
+
+    changed = []
+    for creator, points in results.items():
+        row = rows[creator]
         if row.status in ("paid", "forfeited"):
             continue
         share = (
@@ -321,26 +671,31 @@ def compute_period_earnings(period=None):
         if row.fraud_score >= 50 and row.status == "accruing":
             row.status = "held"
             row.note = "Auto-flagged: anomalous view pattern"
-        row.save(
-            update_fields=[
-                "valid_views",
-                "likes",
-                "comments",
-                "followers_gained",
-                "total_points",
-                "amount",
-                "fraud_score",
-                "status",
-                "note",
-                "updated_at",
-            ]
-        )
-        updated += 1
+        row.updated_at = now  # bulk_update skips auto_now
+        changed.append(row)
+
+    CreatorMonthlyEarning.objects.bulk_update(
+        changed,
+        [
+            "valid_views",
+            "likes",
+            "comments",
+            "followers_gained",
+            "total_points",
+            "amount",
+            "fraud_score",
+            "status",
+            "note",
+            "updated_at",
+        ],
+        batch_size=1000,
+    )
 
     return {
         "period": period,
-        "creators": len(creators),
-        "updated": updated,
+        "creators": len(creator_ids),
+        "updated": len(changed),
+        "days_rolled_up": rolled_up,
         "total_points": total_points,
         "pool": str(pool),
     }
@@ -1,16 +1,18 @@
 import re
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
 from django.db.models import F, Q, Value
 from django.db.models.functions import Concat, Greatest, Trim
 from django.utils import timezone
 from django.db.models.signals import pre_save
 from .models import (
+    AbnAdsPanel,
     BusinessNetworkFollowerModel,
     BusinessNetworkPostLike,
     BusinessNetworkPostComment,
     BusinessNetworkMindforceComment,
+    BusinessNetworkMedia,
     BusinessNetworkMediaLike,
     BusinessNetworkMediaComment,
     BusinessNetworkNotification,
@@ -41,6 +43,98 @@ def _bump_post_counter(post_id, field, delta, touch_activity):
     if touch_activity:
         updates["last_activity_at"] = timezone.now()
     BusinessNetworkPost.objects.filter(pk=post_id).update(**updates)
+    if touch_activity:
+        _note_feed_activity(post_id)
+
+
+# ---------------------------------------------------------------------------
+# Ranked-feed candidate pools (feed_candidates.py)
+# ---------------------------------------------------------------------------
+# Best-effort: a cache hiccup here must never fail the like/post/follow that
+# triggered it — the pool just catches up on its next rebuild.
+
+def _note_feed_activity(post_id):
+    from . import feed_candidates
+    try:
+        feed_candidates.note_activity(post_id)
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=BusinessNetworkPost)
+def push_post_into_feed_pools(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from . import feed_candidates
+    try:
+        feed_candidates.push_new_post(instance)
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=BusinessNetworkFollowerModel)
+@receiver(post_delete, sender=BusinessNetworkFollowerModel)
+def invalidate_feed_pools_on_follow_change(sender, instance, **kwargs):
+    from . import feed_candidates
+    try:
+        feed_candidates.invalidate_pool(instance.follower_id, instance.following_id)
+    except Exception:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Following-feed timelines (timelines.py)
+# ---------------------------------------------------------------------------
+# Same best-effort rule: a missing push is repaired when the timeline is next
+# rebuilt from the database.
+
+@receiver(post_save, sender=BusinessNetworkPost)
+def fan_out_post_to_timelines(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from . import timelines
+    try:
+        timelines.fan_out(instance)
+    except Exception:
+        pass
+
+
+@receiver(m2m_changed, sender=BusinessNetworkPost.media.through)
+def fan_out_video_to_timelines(sender, instance, action, reverse, pk_set, **kwargs):
+    # Media is attached after the post row is created, so the Shorts timeline
+    # learns about a video here rather than in post_save.
+    if action != "post_add" or reverse or not pk_set:
+        return
+    from . import timelines
+    try:
+        if BusinessNetworkMedia.objects.filter(pk__in=pk_set, type="video").exists():
+            timelines.fan_out(instance, video=True)
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=BusinessNetworkFollowerModel)
+@receiver(post_delete, sender=BusinessNetworkFollowerModel)
+def invalidate_timelines_on_follow_change(sender, instance, **kwargs):
+    from . import timelines
+    try:
+        timelines.invalidate(instance.follower_id)
+    except Exception:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# serve_ad's per-process ad index (ad_index.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=AbnAdsPanel)
+@receiver(post_delete, sender=AbnAdsPanel)
+def invalidate_ad_index(sender, instance, **kwargs):
+    from . import ad_index
+    try:
+        ad_index.invalidate()
+    except Exception:
+        pass
 
 
 @receiver(post_save, sender=BusinessNetworkPostLike)
@@ -336,6 +430,59 @@ def create_mindforce_comment_notification(sender, instance, created, **kwargs):
             content=f"Marked your advice as a solution to '{instance.mindforce_problem.title}'"
         )
 
+# ---------------------------------------------------------------------------
+# Interest Brain classification (interest_brain.py)
+# ---------------------------------------------------------------------------
+# Posts and ads carry their keyword hits so profiling and ad serving never
+# re-classify on read. Recomputed only when the text actually changed.
+
+@receiver(pre_save, sender=BusinessNetworkPost)
+@receiver(pre_save, sender=AbnAdsPanel)
+def classify_interests_on_text_change(sender, instance, raw=False, **kwargs):
+    from .interest_brain import refresh_ad_hits, refresh_post_hits, text_hash
+
+    instance._interest_changed = False
+    if raw:
+        return
+    if sender is AbnAdsPanel:
+        current, refresh = text_hash(instance.title, instance.description), refresh_ad_hits
+    else:
+        current, refresh = text_hash(instance.title, instance.content), refresh_post_hits
+    if instance.interest_text_hash == current:
+        return
+    try:
+        refresh(instance)
+        instance._interest_changed = True
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=BusinessNetworkPost)
+@receiver(post_save, sender=AbnAdsPanel)
+def persist_interests_left_out_of_update_fields(sender, instance, update_fields=None, **kwargs):
+    # save(update_fields=["content"]) writes the text but not the hits that
+    # pre_save just recomputed from it.
+    if not getattr(instance, "_interest_changed", False) or update_fields is None:
+        return
+    if "interest_hits" in update_fields:
+        return
+    sender.objects.filter(pk=instance.pk).update(
+        interest_hits=instance.interest_hits,
+        interest_text_hash=instance.interest_text_hash,
+    )
+
+
+@receiver(m2m_changed, sender=BusinessNetworkPost.tags.through)
+def reclassify_post_on_tag_change(sender, instance, action, reverse, **kwargs):
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    from .interest_brain import refresh_post_hits
+    try:
+        refresh_post_hits(instance, persist=True)
+    except Exception:
+        pass
+
+
 @receiver(pre_save, sender=GoldSponsor)
 def _store_prev_sponsor_status(sender, instance, **kwargs):
     if instance.pk:
@@ -11,6 +11,13 @@ SITE = "https://adsyclub.com"
 RENEW_DEEPLINK = f"{SITE}/business-network"         # Gold Sponsor management hub (sidebar)
 DEPOSIT_DEEPLINK = f"{SITE}/deposit-withdraw"      # top-up wallet
 
+# ads_daily_settlement works in chunks so neither step holds more than this
+# many rows (or row locks) at a time.
+REWARD_CHUNK = 1000      # AdViewerDaily rows claimed + credited per transaction
+DECAY_CHUNK = 50000      # UserAdProfile id range decayed per UPDATE
+
+AUDIENCE_CHUNK = 5000    # audience member ids fetched per cursor round trip
+
 
 def _notify_sponsor(sponsor, stage, *, push_title, push_body, email_subject,
                     email_heading, email_body_html, deep_link,
@@ -220,14 +227,16 @@ def compute_monetization_earnings_task(period=None):
 
 
 @shared_task
-def send_weekly_bn_digests():
+def send_weekly_bn_digests(dry_run=False):
     """Weekly community digest to recently-active users — the social-network
-    style follow-up that pulls people back into Business Network."""
-    import time as _time
+    style follow-up that pulls people back into Business Network. Stats are
+    gathered in grouped queries per batch and the mails handed to the email
+    outbox, whose pooled, rate-limited worker paces delivery (see
+    base.email_service.send_bn_digest_emails)."""
     from datetime import timedelta
     from django.utils import timezone
     from django.contrib.auth import get_user_model
-    from base.email_service import send_bn_digest_email
+    from base.email_service import send_bn_digest_emails
 
     User = get_user_model()
     cutoff = timezone.now() - timedelta(days=45)
@@ -235,16 +244,11 @@ def send_weekly_bn_digests():
         User.objects.filter(is_active=True, last_login__gte=cutoff)
         .exclude(email="")
         .exclude(email=None)
+        .only("id", "email", "name", "first_name", "username")
     )
-    sent = 0
-    for user in users.iterator():
-        try:
-            send_bn_digest_email(user)
-            sent += 1
-        except Exception:
-            continue
-        _time.sleep(0.4)  # SMTP-friendly pacing
-    return sent
+    stats = send_bn_digest_emails(users.iterator(chunk_size=2000), dry_run=dry_run)
+    logger.info("weekly bn digests: %s", stats)
+    return stats["queued"]
 
 
 @shared_task
@@ -337,6 +341,138 @@ def send_weekly_ad_reports():
     return {"sent": sent}
 
 
+def reward_ad_viewers(cfg, day):
+    """Settlement step 1: pay yesterday's viewer diamond rewards.
+
+    Works through the unrewarded AdViewerDaily rows of ``day`` REWARD_CHUNK at
+    a time. Each chunk is claimed by one conditional UPDATE ... RETURNING —
+    two beat schedulers running the task at once (a known hazard on this
+    deployment) can never both claim a row — and, in the same transaction,
+    credited with one balance UPDATE per distinct diamond amount and one
+    DiamondTransaction bulk_create. The pushes then go out with one
+    send_push_notifications_bulk call per chunk. Returns the users rewarded.
+    """
+    from collections import defaultdict
+
+    from django.db import connection, transaction
+    from django.db.models import F
+
+    from base.models import DiamondTransaction, User
+    from engagement.services import track_many
+    from .models import AdViewerDaily
+
+    claim_sql = (
+        "UPDATE %s SET rewarded = TRUE, diamonds_awarded = LEAST(views / %%s, %%s) "
+        "WHERE id = ANY(%%s) AND rewarded = FALSE "
+        "RETURNING user_id, views, diamonds_awarded" % AdViewerDaily._meta.db_table
+    )
+    pending = AdViewerDaily.objects.filter(date=day, rewarded=False).order_by("id")
+    rewarded = 0
+    last_id = 0
+    while True:
+        ids = list(
+            pending.filter(id__gt=last_id).values_list("id", flat=True)[:REWARD_CHUNK]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    claim_sql, [cfg.views_per_diamond, cfg.max_daily_diamonds, ids])
+                claimed = [row for row in cursor.fetchall() if row[2] > 0]
+            by_amount = defaultdict(list)
+            for user_id, _views, diamonds in claimed:
+                by_amount[diamonds].append(user_id)
+            for diamonds, user_ids in by_amount.items():
+                User.objects.filter(pk__in=user_ids).update(
+                    diamond_balance=F("diamond_balance") + diamonds)
+            txns = DiamondTransaction.objects.bulk_create([
+                DiamondTransaction(
+                    user_id=user_id,
+                    transaction_type="bonus",
+                    amount=diamonds,
+                    completed=True,
+                    approved=True,
+                    description=f"Daily ad-view reward for {day} ({views} views)",
+                )
+                for user_id, views, diamonds in claimed
+            ])
+        if not claimed:
+            continue
+        rewarded += len(claimed)
+
+        # bulk_create skips the post_save receiver that logs "diamond_txn".
+        track_many([
+            {
+                "user": txn.user_id,
+                "event_type": "diamond_txn",
+                "surface": "wallet",
+                "object_type": "diamond",
+                "object_id": txn.pk,
+                "metadata": {"amount": txn.amount},
+            }
+            for txn in txns
+        ])
+        try:
+            from base.push_notifications import send_push_notifications_bulk
+
+            send_push_notifications_bulk(
+                [
+                    (
+                        user_id,
+                        "আজকের রিওয়ার্ড 🎁",
+                        f"গতকাল বিজ্ঞাপন দেখার জন্য আপনি {diamonds} ডায়মন্ড "
+                        "রিওয়ার্ড পেয়েছেন!",
+                        "https://adsyclub.com/business-network",
+                    )
+                    for user_id, _views, diamonds in claimed
+                ],
+                notification_type="ad_reward",
+            )
+        except Exception:
+            logger.exception("ad reward pushes failed for %s users", len(claimed))
+    return rewarded
+
+
+def decay_interest_weights(cfg):
+    """Settlement step 3: halve everyone's ad-interest weights every
+    ``interest_decay_days``, dropping weights that fall below 0.2.
+
+    Done in Postgres, one UPDATE per DECAY_CHUNK ids: each row's
+    category_weights is rebuilt from jsonb_each, so no profile is loaded into
+    Python and each statement's locks and WAL stay bounded. Returns the
+    profiles touched.
+    """
+    from decimal import Decimal
+
+    from django.db import connection
+    from django.db.models import Max, Min
+
+    from .models import UserAdProfile
+
+    # Same half-life as before, passed as numeric so ROUND(numeric, 2) applies.
+    factor = Decimal(repr(0.5 ** (1.0 / max(1, cfg.interest_decay_days))))
+    sql = (
+        "UPDATE {table} SET category_weights = COALESCE(("
+        "  SELECT jsonb_object_agg(key, ROUND((value #>> '{{}}')::numeric * %s, 2))"
+        "  FROM jsonb_each(category_weights)"
+        "  WHERE (value #>> '{{}}')::numeric * %s >= 0.2"
+        "), '{{}}'::jsonb), updated_at = NOW() "
+        "WHERE id > %s AND id <= %s AND category_weights <> '{{}}'::jsonb"
+    ).format(table=UserAdProfile._meta.db_table)
+    bounds = UserAdProfile.objects.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None:
+        return 0
+    decayed = 0
+    with connection.cursor() as cursor:
+        for start in range(bounds["lo"] - 1, bounds["hi"], DECAY_CHUNK):
+            cursor.execute(sql, [factor, factor, start, start + DECAY_CHUNK])
+            decayed += cursor.rowcount
+    return decayed
+
+
 @shared_task
 def ads_daily_settlement(target_date=None):
     """Nightly ads settlement (runs for YESTERDAY unless target_date given):
@@ -353,17 +489,11 @@ def ads_daily_settlement(target_date=None):
     from datetime import timedelta
     from decimal import Decimal
 
-    from django.db.models import Count, F, Q
+    from django.db.models import Count, Q
 
     from base import wallet
-    from base.models import DiamondTransaction, User
-    from .models import (
-        AdEvent,
-        AdsSystemConfig,
-        AdViewerDaily,
-        CreatorAdEarning,
-        UserAdProfile,
-    )
+    from base.models import User
+    from .models import AdEvent, AdsSystemConfig, CreatorAdEarning
 
     cfg = AdsSystemConfig.get()
     day = target_date or (timezone.localdate() - timedelta(days=1))
@@ -371,53 +501,7 @@ def ads_daily_settlement(target_date=None):
     # ── 1. Viewer diamond rewards ────────────────────────────────────────
     rewarded_users = 0
     if cfg.viewer_reward_enabled and cfg.views_per_diamond:
-        rows = AdViewerDaily.objects.filter(date=day, rewarded=False)
-        for row in rows:
-            diamonds = min(
-                row.views // cfg.views_per_diamond, cfg.max_daily_diamonds
-            )
-            # CLAIM BEFORE AWARDING. `row.rewarded = True` followed by a save
-            # was already the right ordering, but it was not conditional: two
-            # beat schedulers running the task at once (a known hazard on this
-            # deployment) both saw rewarded=False and both awarded. The
-            # conditional UPDATE lets exactly one through.
-            claimed = type(row).objects.filter(
-                pk=row.pk, rewarded=False,
-            ).update(rewarded=True, diamonds_awarded=diamonds)
-            if not claimed:
-                continue
-            row.rewarded = True
-            row.diamonds_awarded = diamonds
-            if diamonds <= 0:
-                continue
-            user = row.user
-            User.objects.filter(pk=user.pk).update(
-                diamond_balance=F("diamond_balance") + diamonds)
-            user.refresh_from_db(fields=["diamond_balance"])
-            DiamondTransaction.objects.create(
-                user=user,
-                transaction_type="bonus",
-                amount=diamonds,
-                completed=True,
-                approved=True,
-                description=f"Daily ad-view reward for {day} ({row.views} views)",
-            )
-            rewarded_users += 1
-            try:
-                from base.push_notifications import send_push_notification
-
-                send_push_notification(
-                    title="আজকের রিওয়ার্ড 🎁",
-                    body=(
-                        f"গতকাল বিজ্ঞাপন দেখার জন্য আপনি {diamonds} ডায়মন্ড "
-                        "রিওয়ার্ড পেয়েছেন!"
-                    ),
-                    deep_link="https://adsyclub.com/business-network",
-                    notification_type="ad_reward",
-                    users=[user],
-                )
-            except Exception:
-                logger.exception("ad reward push failed for user %s", user.id)
+        rewarded_users = reward_ad_viewers(cfg, day)
 
     # ── 2. Creator earnings ──────────────────────────────────────────────
     share = Decimal(cfg.creator_share_percent) / Decimal(100)
@@ -475,25 +559,18 @@ def ads_daily_settlement(target_date=None):
         credited_creators += 1
 
     # ── 3. Interest decay ────────────────────────────────────────────────
-    decay_days = max(1, cfg.interest_decay_days)
-    factor = 0.5 ** (1.0 / decay_days)  # half-life = interest_decay_days
-    for profile in UserAdProfile.objects.exclude(category_weights={}):
-        weights = {
-            k: round(float(v) * factor, 2)
-            for k, v in (profile.category_weights or {}).items()
-            if float(v) * factor >= 0.2
-        }
-        profile.category_weights = weights
-        profile.save(update_fields=["category_weights", "updated_at"])
+    decayed_profiles = decay_interest_weights(cfg)
 
     logger.info(
-        "ads_daily_settlement %s: %s viewers rewarded, %s creators credited",
-        day, rewarded_users, credited_creators,
+        "ads_daily_settlement %s: %s viewers rewarded, %s creators credited, "
+        "%s profiles decayed",
+        day, rewarded_users, credited_creators, decayed_profiles,
     )
     return {
         "date": str(day),
         "viewers_rewarded": rewarded_users,
         "creators_credited": credited_creators,
+        "profiles_decayed": decayed_profiles,
     }
 
 
@@ -509,10 +586,12 @@ def security_sweep():
 @shared_task
 def build_ad_audiences():
     """Nightly retargeting audiences: for every advertiser with an ACTIVE
-    retargeting ad, union their chosen first-party sources into a cached
-    user-id set the serve endpoint checks in O(1)."""
-    from django.core.cache import cache
+    retargeting ad, union their chosen first-party sources in the database
+    and stream the ids, in order, into the bucketed audience the serve
+    endpoint checks one bucket at a time (see ad_audiences)."""
+    from django.db.models import F
 
+    from . import ad_audiences
     from .models import (
         AbnAdsPanel,
         AdEvent,
@@ -533,46 +612,60 @@ def build_ad_audiences():
         entry = by_advertiser.setdefault(
             ad.user_id, {"sources": set(), "days": 7}
         )
-        entry["sources"].update(ad.retarget_sources or ["ad_engagers"])
-        entry["days"] = max(entry["days"], ad.retarget_days or 30)
+        try:
+            entry["sources"].update(ad.retarget_sources or ["ad_engagers"])
+            entry["days"] = max(entry["days"], int(ad.retarget_days or 30))
+        except (TypeError, ValueError):
+            logger.warning("build_ad_audiences: bad targeting on ad %s", ad.pk)
 
-    for advertiser_id, spec in by_advertiser.items():
+    def members(qs, column):
+        return qs.annotate(member=F(column)).order_by().values_list("member", flat=True)
+
+    def build(advertiser_id, spec):
         since = timezone.now() - timedelta(days=spec["days"])
-        ids = set()
         src = spec["sources"]
+
+        sources = []
         if "ad_engagers" in src:
-            ids.update(
-                str(u) for u in AdEvent.objects.filter(
-                    ad__user_id=advertiser_id, user__isnull=False,
-                    created_at__gte=since,
-                ).values_list("user_id", flat=True).distinct()
-            )
+            sources.append(members(AdEvent.objects.filter(
+                ad__user_id=advertiser_id, user__isnull=False, created_at__gte=since,
+            ), "user_id"))
         if "followers" in src:
-            ids.update(
-                str(u) for u in BusinessNetworkFollowerModel.objects.filter(
-                    following_id=advertiser_id, created_at__gte=since,
-                ).values_list("follower_id", flat=True)
-            )
+            sources.append(members(BusinessNetworkFollowerModel.objects.filter(
+                following_id=advertiser_id, created_at__gte=since,
+            ), "follower_id"))
         if "post_engagers" in src:
-            ids.update(
-                str(u) for u in BusinessNetworkPostLike.objects.filter(
-                    post__author_id=advertiser_id, created_at__gte=since,
-                ).values_list("user_id", flat=True).distinct()
-            )
-            ids.update(
-                str(u) for u in BusinessNetworkPostComment.objects.filter(
-                    post__author_id=advertiser_id, created_at__gte=since,
-                ).values_list("author_id", flat=True).distinct()
-            )
+            sources.append(members(BusinessNetworkPostLike.objects.filter(
+                post__author_id=advertiser_id, created_at__gte=since,
+            ), "user_id"))
+            sources.append(members(BusinessNetworkPostComment.objects.filter(
+                post__author_id=advertiser_id, created_at__gte=since,
+            ), "author_id"))
         if "post_viewers" in src:
-            ids.update(
-                str(u) for u in PostSeen.objects.filter(
-                    post__author_id=advertiser_id, last_seen_at__gte=since,
-                ).values_list("user_id", flat=True).distinct()[:20000]
-            )
-        ids.discard(str(advertiser_id))  # never retarget yourself
-        cache.set(f"adaud:{advertiser_id}", ids, 60 * 60 * 26)
-        cache.set(f"adaudcount:{advertiser_id}", len(ids), 60 * 60 * 26)
+            sources.append(members(PostSeen.objects.filter(
+                post__author_id=advertiser_id, last_seen_at__gte=since,
+            ), "user_id").distinct()[:20000])
+
+        # One UNION streamed in id order straight into the bucket writer, which
+        # holds a single bucket at a time (and drops repeats, which arrive
+        # next to each other).
+        if sources:
+            audience = sources[0].union(*sources[1:])
+            writer = ad_audiences.AudienceWriter(advertiser_id, audience.count())
+            for user_id in audience.order_by("member").iterator(chunk_size=AUDIENCE_CHUNK):
+                if user_id != advertiser_id:   # never retarget yourself
+                    writer.add(user_id)
+        else:
+            writer = ad_audiences.AudienceWriter(advertiser_id, 0)
+        writer.finish()
+
+    for advertiser_id, spec in by_advertiser.items():
+        try:
+            build(advertiser_id, spec)
+        except Exception:
+            # One bad targeting spec must not cost every advertiser after it.
+            logger.exception("build_ad_audiences: advertiser %s failed", advertiser_id)
+            continue
         built += 1
 
     logger.info("build_ad_audiences: %s audiences", built)
@@ -580,28 +673,66 @@ def build_ad_audiences():
 
 
 @shared_task
-def build_interest_profiles():
+def build_interest_profiles(shard=None, shards=None):
     """Nightly Interest Brain rebuild: classify every recently-active user
-    into interest segments from their last 30 days of activity (views, video
-    watches, likes, comments, saves, hides, reports, ad clicks). Powers
-    interest-matched ad serving — see interest_brain.py."""
-    from base.models import User
-    from .interest_brain import active_user_ids, build_profile
-
-    ids = active_user_ids()
+    into interest segments from their activity (views, video watches, likes,
+    comments, saves, hides, reports, ad clicks), continuing from each
+    profile's decayed state. Powers interest-matched ad serving — see
+    interest_brain.py.
+
+    With BN_INTEREST_BRAIN_SHARDS > 1 the beat run only fans out one task per
+    shard; each shard builds its slice of users in batches."""
+    from django.conf import settings
+
+    from .interest_brain import PROFILE_BATCH, active_user_ids, build_profiles, in_shard
+
+    shards = shards or getattr(settings, "BN_INTEREST_BRAIN_SHARDS", 1)
+    if shard is None and shards > 1:
+        for index in range(shards):
+            build_interest_profiles.delay(index, shards)
+        return {"shards": shards}
+
+    ids = sorted(u for u in active_user_ids() if in_shard(u, shard or 0, shards))
+    # One clock for the whole run: every profile gets the same brain_built_at,
+    # so the next run reads them all as a single watermark group.
+    now = timezone.now()
     built = errors = 0
-    for user in User.objects.filter(id__in=ids).iterator(chunk_size=100):
+    for start in range(0, len(ids), PROFILE_BATCH):
+        batch = ids[start:start + PROFILE_BATCH]
         try:
-            build_profile(user)
-            built += 1
+            built += len(build_profiles(batch, now=now))
         except Exception:
-            errors += 1
-            logger.exception("interest brain failed for user %s", user.id)
+            errors += len(batch)
+            logger.exception(
+                "interest brain failed for a batch of %s users", len(batch)
+            )
 
-    logger.info("build_interest_profiles: %s built, %s errors", built, errors)
+    logger.info(
+        "build_interest_profiles: %s built, %s errors (shard %s/%s)",
+        built, errors, shard or 0, shards,
+    )
     return {"built": built, "errors": errors}
 
 
+@shared_task
+def flush_feed_impressions():
+    """Every 10 seconds: merge buffered feed impressions into PostSeen — one
+    upsert per batch instead of three statements per feed page. Warns when the
+    buffer falls behind; see impressions.py."""
+    from . import impressions
+
+    try:
+        drained = impressions.flush()
+    except Exception:
+        logger.exception("flush_feed_impressions failed")
+        return 0
+    if drained:
+        stats = impressions.stats()
+        log = logger.warning if stats["lag_seconds"] > 120 else logger.info
+        log("flush_feed_impressions: %s page(s) merged; stats=%s", drained, stats)
+    return drained
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 720p transcode
 # ─────────────────────────────────────────────────────────────────────────────
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Retargeting audiences: bucketed membership, and serve_ad reading it."""
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import ad_audiences
+from .models import (
+    AbnAdsPanel,
+    AbnAdsPanelCategory,
+    AdsSystemConfig,
+    BusinessNetworkFollowerModel,
+    BusinessNetworkPost,
+    BusinessNetworkPostLike,
+)
+from .tasks import build_ad_audiences
+
+User = get_user_model()
+
+LOCMEM = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ad-audience-tests",
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM)
+class AudienceStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_membership_is_exact_across_buckets(self):
+        members = [uuid.uuid4() for _ in range(2000)]
+        outsiders = [uuid.uuid4() for _ in range(200)]
+        advertiser = uuid.uuid4()
+
+        self.assertEqual(ad_audiences.write(advertiser, members + [str(members[0])]), 2000)
+
+        pointer = cache.get(ad_audiences.POINTER_KEY % advertiser)
+        self.assertGreater(pointer['buckets'], 1)
+        for user_id in members[:200]:
+            self.assertEqual(ad_audiences.member_of(user_id, {advertiser: pointer}), {advertiser})
+        for user_id in outsiders:
+            self.assertEqual(ad_audiences.member_of(user_id, {advertiser: pointer}), set())
+
+    def test_a_rebuild_replaces_the_audience(self):
+        advertiser, old, new = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        ad_audiences.write(advertiser, [old])
+        ad_audiences.write(advertiser, [new])
+
+        pointer = cache.get(ad_audiences.POINTER_KEY % advertiser)
+        self.assertEqual(ad_audiences.member_of(new, {advertiser: pointer}), {advertiser})
+        self.assertEqual(ad_audiences.member_of(old, {advertiser: pointer}), set())
+
+    def test_the_writer_streams_sorted_ids_a_bucket_at_a_time(self):
+        advertiser = uuid.uuid4()
+        members = sorted(uuid.uuid4() for _ in range(2000))
+        writer = ad_audiences.AudienceWriter(advertiser, len(members))
+        with patch.object(ad_audiences, 'WRITE_BATCH', 1):
+            for user_id in members[:1500]:
+                writer.add(user_id)
+                writer.add(str(user_id))    # repeats arrive next to each other
+            first = ad_audiences.BUCKET_KEY % (advertiser, writer.build, 0)
+            self.assertIsNotNone(cache.get(first))          # already written
+            self.assertIsNone(cache.get(ad_audiences.POINTER_KEY % advertiser))
+            with self.assertRaises(ValueError):
+                writer.add(members[0])
+            for user_id in members[1500:]:
+                writer.add(user_id)
+            self.assertEqual(writer.finish(), 2000)
+
+        pointer = cache.get(ad_audiences.POINTER_KEY % advertiser)
+        for user_id in members[::50]:
+            self.assertEqual(ad_audiences.member_of(user_id, {advertiser: pointer}), {advertiser})
+
+    def test_a_legacy_set_audience_is_still_read(self):
+        advertiser, user_id = uuid.uuid4(), uuid.uuid4()
+        legacy = {advertiser: {str(user_id)}}
+        self.assertEqual(ad_audiences.member_of(user_id, legacy), {advertiser})
+        self.assertEqual(ad_audiences.member_of(uuid.uuid4(), legacy), set())
+
+
+@override_settings(CACHES=LOCMEM)
+class RetargetingServeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        config = AdsSystemConfig.get()
+        config.admob_share_percent = 0
+        config.save()
+        self.advertiser = User.objects.create_user(
+            username='aud0', email='aud0@example.com', password='x',
+            phone='+880100009001')
+        self.member = User.objects.create_user(
+            username='aud1', email='aud1@example.com', password='x',
+            phone='+880100009002')
+        self.stranger = User.objects.create_user(
+            username='aud2', email='aud2@example.com', password='x',
+            phone='+880100009003')
+        self.ad = AbnAdsPanel.objects.create(
+            user=self.advertiser, title='Come back', description='-',
+            category=AbnAdsPanelCategory.objects.create(name='Shops'),
+            budget=100, estimated_views=1000, status='active',
+            ad_objective='retargeting')
+        ad_audiences.write(self.advertiser.id, [self.member.id])
+
+    def serve(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/bn/ads/serve/', {'placement': 'bn_feed'})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_only_audience_members_are_served(self):
+        self.assertEqual(self.serve(self.member)['ad']['id'], self.ad.pk)
+        self.assertEqual(self.serve(self.stranger), {'fallback': 'admob'})
+
+
+@override_settings(CACHES=LOCMEM)
+class BuildAudiencesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.advertiser, self.fan, self.liker, self.stranger = (
+            User.objects.create_user(
+                username='build%d' % i, email='build%d@example.com' % i,
+                password='x', phone='+88010000910%d' % i)
+            for i in range(4))
+        AbnAdsPanel.objects.create(
+            user=self.advertiser, title='Come back', description='-',
+            category=AbnAdsPanelCategory.objects.create(name='Shops'),
+            budget=100, estimated_views=1000, status='active',
+            ad_objective='retargeting', retarget_sources=['followers', 'post_engagers'])
+
+    def test_sources_are_unioned_without_the_advertiser(self):
+        post = BusinessNetworkPost.objects.create(author=self.advertiser, content='x')
+        BusinessNetworkFollowerModel.objects.create(follower=self.fan, following=self.advertiser)
+        for user in (self.fan, self.liker, self.advertiser):
+            BusinessNetworkPostLike.objects.create(post=post, user=user)
+
+        self.assertEqual(build_ad_audiences(), {'audiences': 1})
+
+        pointer = cache.get(ad_audiences.POINTER_KEY % self.advertiser.id)
+        self.assertEqual(pointer['count'], 2)
+        pointers = {self.advertiser.id: pointer}
+        for user, expected in ((self.fan, True), (self.liker, True),
+                               (self.advertiser, False), (self.stranger, False)):
+            self.assertEqual(bool(ad_audiences.member_of(user.id, pointers)), expected)
+
+    def test_one_failing_advertiser_does_not_stop_the_others(self):
+        other = User.objects.create_user(
+            username='build9', email='build9@example.com', password='x',
+            phone='+880100009109')
+        AbnAdsPanel.objects.create(
+            user=other, title='Again', description='-',
+            category=AbnAdsPanelCategory.objects.first(),
+            budget=100, estimated_views=1000, status='active',
+            ad_objective='retargeting', retarget_sources=['followers'])
+        finish = ad_audiences.AudienceWriter.finish
+
+        def flaky(writer):
+            if writer.advertiser_id == self.advertiser.id:
+                raise RuntimeError('bad spec')
+            return finish(writer)
+
+        with patch.object(ad_audiences.AudienceWriter, 'finish', flaky):
+            self.assertEqual(build_ad_audiences(), {'audiences': 1})
+        self.assertIsNone(cache.get(ad_audiences.POINTER_KEY % self.advertiser.id))
+        self.assertIsNotNone(cache.get(ad_audiences.POINTER_KEY % other.id))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""track_ad_events ingests a batch in a fixed number of statements.
+
+Counters must come out exactly as the per-event path left them: one view and
+one CPV charge per billable impression, billing stopped at the daily
+frequency cap, clicks counted, and the pacing counter in step with spend.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import AbnAdsPanel, AbnAdsPanelCategory, AdEvent, AdsSystemConfig
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "ad-events-tests",
+        }
+    },
+)
+class TrackAdEventsBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cfg = AdsSystemConfig.get()
+        self.viewer = User.objects.create_user(
+            username='ev0', email='ev0@example.com', password='x',
+            phone='+880100008001')
+        self.creator = User.objects.create_user(
+            username='ev1', email='ev1@example.com', password='x',
+            phone='+880100008002')
+        category = AbnAdsPanelCategory.objects.create(name='Shops')
+        self.ads = [
+            AbnAdsPanel.objects.create(
+                title='Ad %d' % i, description='-', category=category,
+                budget=100, estimated_views=1000, status='active')
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+
+    def track(self, events):
+        response = self.client.post('/api/bn/ads/track/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def impression(self, ad, placement='bn_feed'):
+        return {'event_type': 'impression', 'ad': ad.pk, 'placement': placement,
+                'creator': str(self.creator.pk), 'content': '42'}
+
+    def test_counters_and_billing_cap(self):
+        cap = self.cfg.daily_frequency_cap
+        ad, other = self.ads[0], self.ads[1]
+        events = [self.impression(ad) for _ in range(cap + 2)]
+        events += [{'event_type': 'click', 'ad': ad.pk, 'placement': 'bn_feed'}]
+        events += [self.impression(other, 'shorts_reel')]
+
+        result = self.track(events)
+
+        self.assertEqual(result['recorded'], cap + 4)
+        self.assertEqual(AdEvent.objects.filter(ad=ad).count(), cap + 3)
+        self.assertEqual(
+            AdEvent.objects.filter(creator=self.creator, content_id='42').count(), cap + 3)
+        ad.refresh_from_db()
+        rate = self.cfg.cpv_for('bn_feed')
+        self.assertEqual(ad.views, cap)
+        self.assertEqual(ad.clicks, 1)
+        self.assertEqual(ad.spent, rate * cap)
+        other.refresh_from_db()
+        self.assertEqual(other.spent, self.cfg.cpv_for('shorts_reel'))
+
+        day = timezone.localdate().isoformat()
+        self.assertEqual(cache.get(f'adcap:{self.viewer.id}:{ad.pk}:{day}'), cap + 2)
+        self.assertEqual(Decimal(cache.get(f'adpace:{ad.pk}:{day}')) / 100, rate * cap)
+
+        # The next batch finds the cap already reached and bills nothing.
+        self.track([self.impression(ad)])
+        ad.refresh_from_db()
+        self.assertEqual(ad.views, cap)
+
+    def test_statements_do_not_grow_with_the_batch(self):
+        self.track([self.impression(self.ads[0])])  # profile + reward rows exist
+
+        def statements(n):
+            cache.clear()
+            events = [self.impression(self.ads[i % 3]) for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.track(events)
+            return len(ctx)
+
+        self.assertEqual(statements(6), statements(30))
+
+    def test_unknown_ads_and_creators_are_skipped(self):
+        result = self.track([
+            {'event_type': 'impression', 'ad': 'nope', 'placement': 'bn_feed'},
+            {'event_type': 'impression', 'source': 'admob', 'placement': 'bn_feed',
+             'creator': 'not-a-uuid'},
+        ])
+
+        self.assertEqual(result['recorded'], 1)
+        event = AdEvent.objects.get()
+        self.assertEqual(event.source, 'admob')
+        self.assertIsNone(event.creator_id)
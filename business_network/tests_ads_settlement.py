@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""ads_daily_settlement: batched viewer rewards and set-based interest decay."""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from base.models import DiamondTransaction, UserNotification
+from engagement.models import UserEvent
+
+from .models import AdsSystemConfig, AdViewerDaily, UserAdProfile
+from .tasks import ads_daily_settlement
+
+User = get_user_model()
+
+DAY = date(2026, 1, 10)
+
+
+class AdsDailySettlementTests(TestCase):
+    def setUp(self):
+        cfg = AdsSystemConfig.get()
+        cfg.viewer_reward_enabled = True
+        cfg.views_per_diamond = 10
+        cfg.max_daily_diamonds = 3
+        cfg.interest_decay_days = 1
+        cfg.save()
+        self.users = [
+            User.objects.create_user(
+                username='set%d' % i, email='set%d@example.com' % i, password='x',
+                phone='+88010000700%d' % i)
+            for i in range(3)
+        ]
+
+    def test_viewer_rewards_are_credited_once(self):
+        heavy, light, idle = self.users
+        AdViewerDaily.objects.create(user=heavy, date=DAY, views=95)
+        AdViewerDaily.objects.create(user=light, date=DAY, views=12)
+        AdViewerDaily.objects.create(user=idle, date=DAY, views=4)
+
+        result = ads_daily_settlement(target_date=DAY)
+        ads_daily_settlement(target_date=DAY)
+
+        self.assertEqual(result['viewers_rewarded'], 2)
+        self.assertEqual(
+            dict(AdViewerDaily.objects.values_list('user_id', 'diamonds_awarded')),
+            {heavy.pk: 3, light.pk: 1, idle.pk: 0})
+        self.assertFalse(AdViewerDaily.objects.filter(rewarded=False).exists())
+        for user, diamonds in ((heavy, 3), (light, 1), (idle, 0)):
+            before = user.diamond_balance
+            user.refresh_from_db(fields=['diamond_balance'])
+            self.assertEqual(user.diamond_balance - before, diamonds)
+
+        txns = DiamondTransaction.objects.filter(transaction_type='bonus')
+        self.assertEqual(sorted(txns.values_list('amount', flat=True)), [1, 3])
+        self.assertEqual(
+            txns.get(user=heavy).description,
+            'Daily ad-view reward for 2026-01-10 (95 views)')
+        self.assertEqual(
+            UserEvent.objects.filter(event_type='diamond_txn').count(), 2)
+        notes = UserNotification.objects.filter(notification_type='ad_reward')
+        self.assertEqual(sorted(notes.values_list('user_id', flat=True)),
+                         sorted([heavy.pk, light.pk]))
+        self.assertIn('3 ডায়মন্ড', notes.get(user=heavy).body)
+
+    def test_interest_weights_decay_in_bulk(self):
+        a, b, c = self.users
+        UserAdProfile.objects.create(user=a, category_weights={'1': 10, '2': 0.3, '3': 0.41})
+        UserAdProfile.objects.create(user=b, category_weights={'4': 0.2})
+        UserAdProfile.objects.create(user=c, category_weights={})
+
+        result = ads_daily_settlement(target_date=DAY)
+
+        self.assertEqual(result['profiles_decayed'], 2)
+        weights = dict(UserAdProfile.objects.values_list('user_id', 'category_weights'))
+        # Half-life of one day: every weight halves, those under 0.2 drop out.
+        self.assertEqual(weights[a.pk], {'1': 5.0, '3': 0.21})
+        self.assertEqual(weights[b.pk], {})
+        self.assertEqual(weights[c.pk], {})
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Weekly Business Network digest: grouped stats, queued through the outbox."""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from base import email_service
+from base.email_service import send_bn_digest_emails
+from base.models import EmailOutbox, EmailSuppression
+
+from .models import (
+    BusinessNetworkFollowerModel,
+    BusinessNetworkPost,
+    BusinessNetworkPostLike,
+)
+from .tasks import send_weekly_bn_digests
+
+User = get_user_model()
+
+
+class WeeklyDigestTests(TestCase):
+    def make_user(self, i):
+        return User.objects.create_user(
+            username='dig%d' % i, email='dig%d@example.com' % i, password='x',
+            phone='+8801000060%02d' % i)
+
+    def setUp(self):
+        self.users = [self.make_user(i) for i in range(12)]
+        User.objects.filter(pk__in=[u.pk for u in self.users]).update(
+            last_login=timezone.now())
+        self.star, self.quiet, self.gone = self.users[:3]
+        for fan in self.users[3:8]:
+            BusinessNetworkFollowerModel.objects.create(follower=fan, following=self.star)
+        post = BusinessNetworkPost.objects.create(
+            author=self.star, content='hello', visibility='public')
+        for fan in self.users[3:6]:
+            BusinessNetworkPostLike.objects.create(post=post, user=fan)
+        EmailSuppression.objects.create(email='dig2@example.com', reason='unsubscribed')
+
+    def test_digests_are_queued_with_each_users_stats(self):
+        self.assertEqual(send_weekly_bn_digests(), 11)
+
+        queued = {row.to[0]: row for row in EmailOutbox.objects.all()}
+        self.assertNotIn(self.gone.email, queued)
+        self.assertIn('5 জন নতুন ফলোয়ার', queued[self.star.email].text_content)
+        self.assertIn('3টা লাইক', queued[self.star.email].text_content)
+        self.assertIn('0 জন নতুন ফলোয়ার', queued[self.quiet.email].text_content)
+        self.assertIn('/business-network/profile/%s' % self.users[7].pk,
+                      queued[self.star.email].html_content)
+
+    def test_dry_run_queues_nothing(self):
+        self.assertEqual(send_weekly_bn_digests(dry_run=True), 11)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_queries_do_not_grow_with_recipients(self):
+        def count(users):
+            with CaptureQueriesContext(connection) as ctx:
+                send_bn_digest_emails(users, dry_run=True)
+            return len(ctx)
+
+        self.assertEqual(count(self.users[:3]), count(self.users))
+
+    def test_a_retried_run_queues_nobody_twice(self):
+        send_weekly_bn_digests()
+        send_weekly_bn_digests()
+        self.assertEqual(EmailOutbox.objects.count(), 11)
+
+    def test_one_failing_user_does_not_stop_the_rest(self):
+        build = email_service._bn_digest_message
+
+        def flaky(user, **kwargs):
+            if user.pk == self.quiet.pk:
+                raise RuntimeError('boom')
+            return build(user, **kwargs)
+
+        with mock.patch.object(email_service, '_bn_digest_message', side_effect=flaky):
+            stats = send_bn_digest_emails(self.users)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['queued'], 10)
+        self.assertFalse(EmailOutbox.objects.filter(to__contains=[self.quiet.email]).exists())
+
+    @override_settings(
+        EMAIL_OUTBOX_ENABLED=False,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                            'LOCATION': 'bn-digest-tests'}},
+    )
+    def test_outbox_off_sends_directly_once(self):
+        cache.clear()
+        with mock.patch.object(email_service, '_send_email') as send, \
+                mock.patch.object(email_service, 'DIGEST_PACING', 0):
+            send_bn_digest_emails(self.users)
+            send_bn_digest_emails(self.users)
+        self.assertEqual(send.call_count, 11)
+        self.assertFalse(EmailOutbox.objects.exists())
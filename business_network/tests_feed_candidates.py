@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""The ranked feed scores a candidate pool, not the whole posts table.
+
+These check what is IN the pool and that the feed only ranks from it; the
+ranking itself is unchanged and covered by the feed query tests.
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import feed_candidates
+from .models import BusinessNetworkFollowerModel, BusinessNetworkPost
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "feed-candidate-tests",
+        }
+    },
+    BN_FEED_CANDIDATE_POOL=True,
+)
+class FeedCandidatePoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(
+            username='fc0', email='fc0@example.com', password='x',
+            phone='+880100004001')
+        self.friend = User.objects.create_user(
+            username='fc1', email='fc1@example.com', password='x',
+            phone='+880100004002')
+        self.stranger = User.objects.create_user(
+            username='fc2', email='fc2@example.com', password='x',
+            phone='+880100004003')
+        BusinessNetworkFollowerModel.objects.create(
+            follower=self.viewer, following=self.friend)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+
+        # Tiny fixtures would otherwise always fall back to full scoring.
+        min_size = patch.object(feed_candidates, 'MIN_POOL_SIZE', 1)
+        min_size.start()
+        self.addCleanup(min_size.stop)
+
+    def feed_ids(self):
+        response = self.client.get('/api/bn/posts/?page_size=15')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_old_posts_outside_the_pool_are_not_ranked(self):
+        recent = BusinessNetworkPost.objects.create(
+            author=self.friend, content='recent', visibility='public')
+        old = BusinessNetworkPost.objects.create(
+            author=self.stranger, content='old', visibility='public')
+        BusinessNetworkPost.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=90))
+        # Creating it pushed it onto the global fresh list; a real 90-day-old
+        # post has long since scrolled off it.
+        cache.delete(feed_candidates.FRESH_KEY)
+
+        ids = self.feed_ids()
+
+        self.assertIn(recent.id, ids)
+        self.assertNotIn(old.id, ids)
+
+    def test_full_scoring_still_sees_everything_when_switched_off(self):
+        old = BusinessNetworkPost.objects.create(
+            author=self.stranger, content='old', visibility='public')
+        BusinessNetworkPost.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=90))
+
+        with override_settings(BN_FEED_CANDIDATE_POOL=False):
+            self.assertIn(old.id, self.feed_ids())
+
+    def test_a_followed_authors_new_post_is_pushed_into_the_pool(self):
+        BusinessNetworkPost.objects.create(
+            author=self.friend, content='first', visibility='public')
+        self.feed_ids()  # builds the pool
+
+        fresh = BusinessNetworkPost.objects.create(
+            author=self.friend, content='second', visibility='followers')
+
+        pool = cache.get('bn_feed_pool:%s' % self.viewer.id)
+        self.assertEqual(pool['ids'][0], fresh.id)
+        self.assertIn(fresh.id, self.feed_ids())
+
+    def test_following_someone_rebuilds_the_pool(self):
+        BusinessNetworkPost.objects.create(
+            author=self.friend, content='first', visibility='public')
+        self.feed_ids()
+        self.assertIsNotNone(cache.get('bn_feed_pool:%s' % self.viewer.id))
+
+        BusinessNetworkFollowerModel.objects.create(
+            follower=self.viewer, following=self.stranger)
+
+        self.assertIsNone(cache.get('bn_feed_pool:%s' % self.viewer.id))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Feed impressions are buffered on the request path and merged in batches.
+
+The feed page itself must not touch PostSeen; the flush folds every buffered
+page into one upsert, adding to times_seen for pairs that already exist.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import impressions
+from .models import BusinessNetworkPost, PostSeen
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "impression-tests",
+        }
+    },
+    BN_IMPRESSIONS_WRITE_BEHIND=True,
+)
+class ImpressionBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(
+            username='im0', email='im0@example.com', password='x',
+            phone='+880100006001')
+        self.author = User.objects.create_user(
+            username='im1', email='im1@example.com', password='x',
+            phone='+880100006002')
+        self.posts = [
+            BusinessNetworkPost.objects.create(
+                author=self.author, content='post %d' % i, visibility='public')
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_serving_a_page_only_buffers(self):
+        response = self.client.get('/api/bn/posts/')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertFalse(PostSeen.objects.exists())
+        self.assertEqual(impressions.stats()['depth'], 1)
+
+    def test_flush_merges_pages_into_one_row_per_pair(self):
+        post_ids = [post.id for post in self.posts]
+        PostSeen.objects.create(user=self.viewer, post=self.posts[0], times_seen=4)
+        impressions.record(self.viewer.id, post_ids)
+        impressions.record(self.viewer.id, post_ids[:1])
+
+        self.assertEqual(impressions.flush(), 2)
+
+        seen = dict(
+            PostSeen.objects.filter(user=self.viewer).values_list('post_id', 'times_seen'))
+        self.assertEqual(seen, {post_ids[0]: 6, post_ids[1]: 1, post_ids[2]: 1})
+        stats = impressions.stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['last_flush']['rows'], 3)
+
+    def test_a_deleted_post_does_not_fail_the_batch(self):
+        gone = self.posts[0]
+        impressions.record(self.viewer.id, [gone.id, self.posts[1].id])
+        gone.delete()
+
+        impressions.flush()
+
+        self.assertEqual(
+            list(PostSeen.objects.values_list('post_id', flat=True)), [self.posts[1].id])
+
+    def test_switched_off_writes_inline(self):
+        with override_settings(BN_IMPRESSIONS_WRITE_BEHIND=False):
+            self.client.get('/api/bn/posts/')
+
+        self.assertTrue(PostSeen.objects.filter(user=self.viewer).exists())
+        self.assertEqual(impressions.stats()['depth'], 0)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""Interest classification is computed when content is written, not read.
+
+Posts and ads keep their keyword hits; these check that the hits follow the
+text (including edits saved with update_fields and tag changes) and that
+serve-time classification of an ad does no classifying at all.
+
+Profiles are then built from those hits in batches, continuing from each
+profile's decayed state rather than re-reading the whole window.
+"""
+import random
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import interest_brain
+from .keyword_matcher import KeywordMatcher
+from .management.commands.bench_classify_text import scan_classify, scan_mood
+from .models import (
+    AbnAdsPanel,
+    AbnAdsPanelCategory,
+    BusinessNetworkPost,
+    BusinessNetworkPostLike,
+    BusinessNetworkPostTag,
+    UserAdProfile,
+)
+
+User = get_user_model()
+
+
+class PrecomputedInterestHitsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='ib0', email='ib0@example.com', password='x',
+            phone='+880100008001')
+
+    def test_a_new_post_is_classified_on_save(self):
+        post = BusinessNetworkPost.objects.create(
+            author=self.author, content='Best biryani recipe in town')
+        post.refresh_from_db()
+        self.assertEqual(set(post.interest_hits), {'food'})
+
+    def test_an_edit_saved_with_update_fields_reclassifies(self):
+        post = BusinessNetworkPost.objects.create(
+            author=self.author, content='Best biryani recipe in town')
+        post.content = 'New laptop and gaming phone'
+        post.save(update_fields=['content'])
+
+        post.refresh_from_db()
+        self.assertEqual(set(post.interest_hits), {'tech'})
+
+    def test_tags_are_part_of_the_classification(self):
+        post = BusinessNetworkPost.objects.create(author=self.author, content='hello')
+        post.tags.add(BusinessNetworkPostTag.objects.create(tag='saree'))
+
+        post.refresh_from_db()
+        self.assertIn('fashion', post.interest_hits)
+
+    def test_classify_ad_reads_the_stored_hits(self):
+        ad = AbnAdsPanel.objects.create(
+            title='Eid saree sale', description='fashion week',
+            category=AbnAdsPanelCategory.objects.create(name='Shops'), budget=10)
+        ad = AbnAdsPanel.objects.get(pk=ad.pk)
+
+        with patch.object(interest_brain, 'classify_text') as classify:
+            tags = interest_brain.classify_ad(ad)
+
+        classify.assert_not_called()
+        self.assertEqual(tags, ['fashion'])
+
+
+class IncrementalProfileBuildTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='ib1', email='ib1@example.com', password='x',
+            phone='+880100008011')
+        self.food = BusinessNetworkPost.objects.create(
+            author=self.author, content='Best biryani recipe in town')
+        # Two keyword hits each, so the posts weigh the same.
+        self.tech = BusinessNetworkPost.objects.create(
+            author=self.author, content='New laptop and phone')
+        self.viewers = [
+            User.objects.create_user(
+                username='ibv%d' % i, email='ibv%d@example.com' % i, password='x',
+                phone='+88010000802%d' % i)
+            for i in range(6)
+        ]
+
+    def like(self, user, post):
+        BusinessNetworkPostLike.objects.create(user=user, post=post)
+
+    def test_the_next_build_reads_only_new_activity(self):
+        viewer = self.viewers[0]
+        self.like(viewer, self.food)
+        BusinessNetworkPostLike.objects.filter(user=viewer).update(
+            created_at=timezone.now() - timedelta(days=25))
+
+        first = interest_brain.build_profile(viewer)
+        self.assertEqual(first['interest_scores'], {'food': 100.0})
+        total = UserAdProfile.objects.get(user=viewer).brain_state['total']
+
+        # Built one half-life ago with nothing new since: the old like is not
+        # read again, it has only decayed.
+        UserAdProfile.objects.filter(user=viewer).update(
+            brain_built_at=timezone.now() - timedelta(days=interest_brain.HALF_LIFE_DAYS))
+        interest_brain.build_profile(viewer)
+        state = UserAdProfile.objects.get(user=viewer).brain_state
+        self.assertAlmostEqual(state['total'], total / 2, places=3)
+
+        self.like(viewer, self.tech)
+        result = interest_brain.build_profile(viewer)
+        self.assertEqual(result['interest_scores']['tech'], 100.0)
+        self.assertEqual(result['interest_scores']['food'], 50.0)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        for viewer in self.viewers:
+            self.like(viewer, self.food)
+            self.like(viewer, self.tech)
+
+        def queries(users):
+            with CaptureQueriesContext(connection) as ctx:
+                interest_brain.build_profiles([u.pk for u in users])
+            return len(ctx)
+
+        self.assertEqual(queries(self.viewers[:2]), queries(self.viewers[2:]))
+
+
+SAMPLE_TEXTS = [
+    '',
+    'Best biryani recipe in town',
+    'নতুন ল্যাপটপ আর মোবাইল ফোন — mobile banking দিয়ে বিকাশ পেমেন্ট',
+    'EID COLLECTION: শাড়ি, পাঞ্জাবি, জুতা, bag 50% off!!',
+    'আলহামদুলিল্লাহ খুশি happy happy happyhappy 🎉 সবাই ভালো থাকুন',
+    'মন খারাপ… একা একা লাগে, so tired and sad; কষ্টকষ্ট',
+    'world cup cricket ম্যাচ at the gym; fitness ফিটনেস',
+    'appapp ai-driven software, gaming গেম ইন্টারনেট',
+    'real estate: flat, land, জমি ও প্লট ভাড়া',
+]
+
+
+class KeywordMatcherEquivalenceTests(SimpleTestCase):
+    """The compiled matcher must give exactly what the substring scans gave."""
+
+    def corpus(self):
+        rng = random.Random(7)
+        words = [kw for kws in interest_brain.INTEREST_TAXONOMY.values() for kw in kws]
+        words += list(interest_brain.POSITIVE_WORDS + interest_brain.NEGATIVE_WORDS)
+        filler = 'আজকে আমাদের দোকানে নতুন জিনিস এসেছে today we are sharing an update'.split()
+        texts = list(SAMPLE_TEXTS)
+        for _ in range(500):
+            parts = []
+            for _ in range(rng.randint(1, 80)):
+                roll = rng.random()
+                if roll < 0.12:
+                    parts.append(rng.choice(words).upper())
+                elif roll < 0.25:
+                    parts.append(rng.choice(words) * rng.randint(1, 3))
+                else:
+                    parts.append(rng.choice(filler))
+            texts.append(rng.choice([' ', '', '-', '\n']).join(parts))
+        return texts
+
+    def test_classify_text_matches_the_substring_scan(self):
+        for text in self.corpus():
+            with self.subTest(text=text[:40]):
+                result = interest_brain.classify_text(text)
+                self.assertEqual(result, scan_classify(text))
+                self.assertEqual(list(result), list(scan_classify(text)))
+
+    def test_mood_counts_match_str_count(self):
+        for text in self.corpus():
+            with self.subTest(text=text[:40]):
+                self.assertEqual(interest_brain.mood_counts(text), scan_mood(text))
+
+    def test_overlapping_and_nested_keywords(self):
+        matcher = KeywordMatcher(['aa', 'a', 'aaa', 'b', 'ab', 'bab', ''])
+        rng = random.Random(3)
+        for _ in range(300):
+            text = ''.join(rng.choice('ab') for _ in range(rng.randint(0, 12)))
+            counts = matcher.counts(text)
+            self.assertEqual(
+                [counts.get(i, 0) for i in range(len(matcher.keywords))],
+                [text.count(kw) for kw in matcher.keywords], text)
+            self.assertEqual(
+                matcher.found(text),
+                {i for i, kw in enumerate(matcher.keywords) if kw in text}, text)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Creator earnings: one grouped pass over a per-day rollup.
+
+compute_period_earnings must land on the same numbers creator_points gives
+each creator on its own, roll each finished day up once, back-fill a
+creator approved mid-month, and leave paid rows alone.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import (
+    BusinessNetworkFollowerModel,
+    BusinessNetworkMedia,
+    BusinessNetworkMediaView,
+    BusinessNetworkPost,
+    BusinessNetworkPostComment,
+    BusinessNetworkPostLike,
+    ContentMonetizationApplication,
+    ContentMonetizationSettings,
+    CreatorMonthlyEarning,
+    CreatorPointsDay,
+)
+from .monetization import compute_period_earnings, creator_points, period_bounds
+
+User = get_user_model()
+
+
+def _previous_period():
+    first = timezone.localtime().date().replace(day=1) - timedelta(days=1)
+    return '%04d-%02d' % (first.year, first.month)
+
+
+class CreatorEarningsRollupTests(TestCase):
+    def make_user(self, i, joined_days_before=90):
+        user = User.objects.create_user(
+            username='mon%d' % i, email='mon%d@example.com' % i, password='x',
+            phone='+8801000070%02d' % i)
+        User.objects.filter(pk=user.pk).update(
+            date_joined=self.start - timedelta(days=joined_days_before))
+        return user
+
+    def at(self, obj, day, hour=10):
+        type(obj).objects.filter(pk=obj.pk).update(
+            created_at=self.start + timedelta(days=day, hours=hour))
+
+    def post_with_media(self, author, n_media=1):
+        post = BusinessNetworkPost.objects.create(author=author, content='x')
+        media = [BusinessNetworkMedia.objects.create(type='image') for _ in range(n_media)]
+        post.media.add(*media)
+        return post, media
+
+    def view(self, media, viewer, day):
+        self.at(BusinessNetworkMediaView.objects.create(media=media, user=viewer), day)
+
+    def setUp(self):
+        self.period = _previous_period()
+        self.start, self.end = period_bounds(self.period)
+        self.conf = ContentMonetizationSettings.current()
+        self.conf.monthly_pool_amount = Decimal('1000.00')
+        self.conf.viewer_daily_view_cap = 2
+        self.conf.save()
+
+        self.alice, self.bob, self.cara = (self.make_user(i) for i in range(3))
+        viewers = [self.make_user(10 + i) for i in range(3)]
+        fresh = self.make_user(20, joined_days_before=-3)   # joins mid-month
+
+        post_a, media_a = self.post_with_media(self.alice, n_media=3)
+        post_b, media_b = self.post_with_media(self.bob)
+        _post_c, media_c = self.post_with_media(self.cara)
+
+        # Day 2: viewer 0 sees three of Alice's media (capped to 2), viewer 1
+        # one; Alice's own view and the fresh account's view carry nothing.
+        for media in media_a:
+            self.view(media, viewers[0], 2)
+        self.view(media_a[0], viewers[1], 2)
+        self.view(media_a[1], self.alice, 2)
+        self.view(media_a[2], fresh, 4)
+        # Day 9: Bob gets a view, a like, a comment and a follower.
+        self.view(media_b[0], viewers[2], 9)
+        self.at(BusinessNetworkPostLike.objects.create(post=post_b, user=viewers[0]), 9)
+        self.at(BusinessNetworkPostLike.objects.create(post=post_b, user=self.bob), 9)
+        self.at(BusinessNetworkPostComment.objects.create(
+            post=post_a, author=viewers[1], content='nice'), 9)
+        self.at(BusinessNetworkFollowerModel.objects.create(
+            follower=viewers[2], following=self.alice), 12)
+        self.view(media_c[0], viewers[1], 5)
+
+        for user in (self.alice, self.bob):
+            ContentMonetizationApplication.objects.create(user=user, status='approved')
+
+    def assert_matches_creator_points(self, user):
+        expected = creator_points(user, self.start, self.end, self.conf)
+        row = CreatorMonthlyEarning.objects.get(user=user, period=self.period)
+        self.assertEqual(
+            (row.valid_views, row.likes, row.comments, row.followers_gained, row.total_points),
+            (expected['valid_views'], expected['likes'], expected['comments'],
+             expected['followers_gained'], expected['total_points']))
+
+    def test_one_pass_matches_per_creator_points(self):
+        summary = compute_period_earnings(self.period, rebuild=False)
+
+        self.assertEqual(summary['creators'], 2)
+        self.assertEqual(summary['updated'], 2)
+        self.assertEqual(
+            summary['days_rolled_up'], (self.end - self.start).days)
+        for user in (self.alice, self.bob):
+            self.assert_matches_creator_points(user)
+        alice = CreatorMonthlyEarning.objects.get(user=self.alice, period=self.period)
+        self.assertEqual(alice.valid_views, 3)
+        amounts = CreatorMonthlyEarning.objects.filter(
+            period=self.period).values_list('amount', flat=True)
+        self.assertEqual(sum(amounts), Decimal('1000.00'))
+
+    def test_rolled_up_days_are_not_read_again(self):
+        compute_period_earnings(self.period, rebuild=False)
+        marked = CreatorPointsDay.objects.count()
+
+        again = compute_period_earnings(self.period, rebuild=False)
+        self.assertEqual(again['days_rolled_up'], 0)
+        self.assertEqual(CreatorPointsDay.objects.count(), marked)
+        self.assert_matches_creator_points(self.alice)
+
+        # A change to an already rolled-up day waits for a rebuild.
+        post = BusinessNetworkPost.objects.filter(author=self.alice).first()
+        self.at(BusinessNetworkPostLike.objects.create(post=post, user=self.bob), 3)
+        compute_period_earnings(self.period, rebuild=False)
+        alice = CreatorMonthlyEarning.objects.get(user=self.alice, period=self.period)
+        self.assertEqual(alice.likes, 0)
+        compute_period_earnings(self.period)   # closed month: rebuilt
+        self.assert_matches_creator_points(self.alice)
+
+    def test_a_creator_approved_later_is_back_filled(self):
+        compute_period_earnings(self.period, rebuild=False)
+        ContentMonetizationApplication.objects.create(user=self.cara, status='approved')
+
+        summary = compute_period_earnings(self.period, rebuild=False)
+        self.assertEqual(summary['creators'], 3)
+        self.assert_matches_creator_points(self.cara)
+        self.assert_matches_creator_points(self.alice)
+
+    def test_changed_view_rules_rebuild_the_month(self):
+        compute_period_earnings(self.period, rebuild=False)
+        self.conf.viewer_daily_view_cap = 5
+        self.conf.save()
+
+        compute_period_earnings(self.period, rebuild=False)
+        self.assert_matches_creator_points(self.alice)
+        self.assertEqual(
+            set(CreatorPointsDay.objects.values_list('view_cap', flat=True)), {5})
+
+    def test_paid_rows_are_left_alone(self):
+        CreatorMonthlyEarning.objects.create(
+            user=self.alice, period=self.period, status='paid', amount=Decimal('5.00'))
+
+        summary = compute_period_earnings(self.period, rebuild=False)
+        self.assertEqual(summary['updated'], 1)
+        paid = CreatorMonthlyEarning.objects.get(user=self.alice, period=self.period)
+        self.assertEqual((paid.amount, paid.valid_views), (Decimal('5.00'), 0))
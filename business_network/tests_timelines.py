@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""The Following feed reads a cached fan-out timeline, not an IN-list sort.
+
+These check that new posts reach an existing timeline, that follow changes
+rebuild it, that large authors are merged on read, and that cursor pages
+neither repeat nor skip posts when new ones arrive in between.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import timelines
+from .models import BusinessNetworkFollowerModel, BusinessNetworkMedia, BusinessNetworkPost
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "timeline-tests",
+        }
+    },
+)
+class FollowingTimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(
+            username='tl0', email='tl0@example.com', password='x',
+            phone='+880100005001')
+        self.friend = User.objects.create_user(
+            username='tl1', email='tl1@example.com', password='x',
+            phone='+880100005002')
+        self.stranger = User.objects.create_user(
+            username='tl2', email='tl2@example.com', password='x',
+            phone='+880100005003')
+        BusinessNetworkFollowerModel.objects.create(
+            follower=self.viewer, following=self.friend)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+
+    def post(self, author, content='hello', visibility='public'):
+        return BusinessNetworkPost.objects.create(
+            author=author, content=content, visibility=visibility)
+
+    def following_ids(self, **params):
+        response = self.client.get(
+            '/api/bn/posts/', {'feed': 'following', 'page_size': 10, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_a_new_post_is_pushed_into_an_existing_timeline(self):
+        first = self.post(self.friend, 'first')
+        self.assertEqual(self.following_ids(), [first.id])  # builds the timeline
+
+        second = self.post(self.friend, 'second', visibility='followers')
+        self.post(self.stranger, 'not followed')
+
+        self.assertEqual(cache.get('bn_tl:%s' % self.viewer.id)[0][0], second.id)
+        self.assertEqual(self.following_ids(), [second.id, first.id])
+
+    def test_following_someone_rebuilds_the_timeline(self):
+        self.post(self.friend)
+        theirs = self.post(self.stranger)
+        self.following_ids()
+        self.assertIsNotNone(cache.get('bn_tl:%s' % self.viewer.id))
+
+        BusinessNetworkFollowerModel.objects.create(
+            follower=self.viewer, following=self.stranger)
+
+        self.assertIsNone(cache.get('bn_tl:%s' % self.viewer.id))
+        self.assertIn(theirs.id, self.following_ids())
+
+    def test_large_authors_are_merged_on_read(self):
+        self.following_ids()  # empty timeline, cached
+        with patch.object(timelines, 'FANOUT_FOLLOWER_LIMIT', 0):
+            cache.delete(timelines.LARGE_AUTHORS_KEY)
+            post = self.post(self.friend)
+            # Not pushed into anyone's timeline...
+            self.assertEqual(cache.get('bn_tl:%s' % self.viewer.id), [])
+            # ...but still shown, read from the author's posts directly.
+            self.assertEqual(self.following_ids(), [post.id])
+
+    def test_video_timeline_only_holds_posts_with_a_video(self):
+        self.post(self.friend, 'text only')
+        self.following_ids(media='video')
+        with_video = self.post(self.friend, 'clip')
+        with_video.media.add(
+            BusinessNetworkMedia.objects.create(type='video'))
+
+        self.assertEqual(self.following_ids(media='video'), [with_video.id])
+
+    def test_cursor_pages_are_stable_while_new_posts_arrive(self):
+        posts = [self.post(self.friend, 'post %d' % i) for i in range(5)]
+        newest_first = [p.id for p in reversed(posts)]
+
+        response = self.client.get(
+            '/api/bn/posts/', {'feed': 'following', 'cursor': '', 'page_size': 3})
+        body = response.json()
+        self.assertEqual([row['id'] for row in body['results']], newest_first[:3])
+
+        self.post(self.friend, 'arrived in between')
+
+        response = self.client.get(
+            '/api/bn/posts/',
+            {'feed': 'following', 'cursor': body['next_cursor'], 'page_size': 3})
+        body = response.json()
+        self.assertEqual([row['id'] for row in body['results']], newest_first[3:])
+        self.assertIsNone(body['next_cursor'])
@@ -0,0 +1,207 @@
+"""Fan-out-on-write timelines for the "following" feed and the Shorts tab.
+
+``?feed=following`` is newest-first posts from the people a user follows. It
+used to be answered by ``author_id__in=<every followed id>`` sorted by
+``-created_at`` on every page — fine for someone following fifty accounts, a
+large IN-list sort for someone following thousands.
+
+Each user now has a capped, newest-first timeline of ``[post_id, created_ts]``
+pairs in the cache (and a second one holding only posts with a video, for the
+Shorts tab). A new post is pushed into its followers' timelines when it is
+created; a video is pushed into their video timelines when it is attached. The
+view then only fetches the handful of ids on the requested page.
+
+  * Large authors (more than ``FANOUT_FOLLOWER_LIMIT`` followers) are not
+    fanned out — one post would mean that many cache writes. Their recent posts
+    are merged in on read instead (fan-out-on-read), from one indexed query.
+  * A missing timeline (new user, evicted key, follow/unfollow) is rebuilt from
+    the database in one query, capped at ``TIMELINE_SIZE``.
+  * Pages can be addressed by number (existing clients) or by an opaque
+    ``cursor`` that stays stable while new posts arrive.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+TIMELINE_SIZE = 800
+TIMELINE_TTL = 60 * 60 * 24 * 3
+FANOUT_FOLLOWER_LIMIT = 10000
+FANOUT_CHUNK = 500
+# Large-author posts merged on read only need to cover what a timeline of
+# TIMELINE_SIZE entries plausibly spans.
+LARGE_AUTHOR_WINDOW_DAYS = 30
+LARGE_AUTHORS_KEY = "bn_tl_large_authors"
+LARGE_AUTHORS_TTL = 60 * 60
+
+VISIBLE_TO_FOLLOWERS = ("public", "followers")
+
+
+def _key(user_id, video=False):
+    return f"bn_tl:{user_id}:video" if video else f"bn_tl:{user_id}"
+
+
+def _timestamp(value):
+    return value.timestamp()
+
+
+def _prepend(entries, post_id, created_ts):
+    entries = [entry for entry in entries if entry[0] != post_id]
+    entries.insert(0, [post_id, created_ts])
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    return entries[:TIMELINE_SIZE]
+
+
+def large_author_ids():
+    """Authors too big to fan out — read-side merged instead. Cached hourly."""
+    from .models import BusinessNetworkFollowerModel
+
+    ids = cache.get(LARGE_AUTHORS_KEY)
+    if ids is None:
+        ids = [
+            str(row["following_id"])
+            for row in BusinessNetworkFollowerModel.objects.values("following_id")
+            .annotate(n=Count("id"))
+            .filter(n__gt=FANOUT_FOLLOWER_LIMIT)
+        ]
+        cache.set(LARGE_AUTHORS_KEY, ids, LARGE_AUTHORS_TTL)
+    return set(ids)
+
+
+def _timeline_posts(video):
+    from .models import BusinessNetworkPost
+
+    qs = BusinessNetworkPost.objects.filter(
+        is_banned=False, visibility__in=VISIBLE_TO_FOLLOWERS
+    )
+    if video:
+        qs = qs.filter(media__type="video").distinct()
+    return qs
+
+
+def rebuild(user_id, video=False):
+    """Fan-out-on-read for one user: rebuild their timeline from the database."""
+    from .models import BusinessNetworkFollowerModel
+
+    following = BusinessNetworkFollowerModel.objects.filter(
+        follower_id=user_id
+    ).values("following_id")
+    rows = (
+        _timeline_posts(video)
+        .filter(author_id__in=following)
+        .order_by("-created_at")
+        .values_list("id", "created_at")[:TIMELINE_SIZE]
+    )
+    entries = [[post_id, _timestamp(created_at)] for post_id, created_at in rows]
+    cache.set(_key(user_id, video), entries, TIMELINE_TTL)
+    return entries
+
+
+def timeline(user, video=False):
+    """The user's newest-first ``[post_id, created_ts]`` entries."""
+    from .models import BusinessNetworkFollowerModel
+
+    entries = cache.get(_key(user.id, video))
+    if entries is None:
+        return rebuild(user.id, video)
+
+    large = large_author_ids()
+    if not large:
+        return entries
+    followed_large = list(
+        BusinessNetworkFollowerModel.objects.filter(
+            follower=user, following_id__in=large
+        ).values_list("following_id", flat=True)
+    )
+    if not followed_large:
+        return entries
+
+    since = timezone.now() - timedelta(days=LARGE_AUTHOR_WINDOW_DAYS)
+    extra = (
+        _timeline_posts(video)
+        .filter(author_id__in=followed_large, created_at__gte=since)
+        .order_by("-created_at")
+        .values_list("id", "created_at")[:TIMELINE_SIZE]
+    )
+    merged = {entry[0]: entry for entry in entries}
+    for post_id, created_at in extra:
+        merged.setdefault(post_id, [post_id, _timestamp(created_at)])
+    return sorted(merged.values(), key=lambda entry: entry[1], reverse=True)[
+        :TIMELINE_SIZE
+    ]
+
+
+def encode_cursor(entry):
+    return f"{entry[1]:.6f}_{entry[0]}"
+
+
+def page_after(entries, cursor, size):
+    """Up to ``size`` entries strictly older than ``cursor``, and the next cursor.
+
+    The cursor names the last entry the client already has, so posts arriving
+    at the top between requests never shift or repeat the next page.
+    """
+    if cursor:
+        try:
+            raw_ts, post_id = cursor.split("_", 1)
+            after = (float(raw_ts), post_id)
+        except ValueError:
+            after = None
+        if after is not None:
+            entries = [
+                entry for entry in entries
+                if (entry[1], entry[0]) < after
+            ]
+    page = entries[:size]
+    next_cursor = encode_cursor(page[-1]) if len(entries) > size else None
+    return page, next_cursor
+
+
+def invalidate(*user_ids):
+    """Follow graph changed — rebuild these users' timelines on next read."""
+    keys = []
+    for user_id in user_ids:
+        if user_id:
+            keys.extend([_key(user_id), _key(user_id, video=True)])
+    cache.delete_many(keys)
+
+
+def fan_out(post, video=False):
+    """Push ``post`` into the timelines of its author's followers.
+
+    Only timelines already in the cache are touched; a missing one is rebuilt,
+    with this post in it, when its owner next reads it.
+    """
+    from .models import BusinessNetworkFollowerModel
+
+    if post.is_banned or post.visibility not in VISIBLE_TO_FOLLOWERS:
+        return 0
+    if str(post.author_id) in large_author_ids():
+        return 0
+
+    follower_ids = list(
+        BusinessNetworkFollowerModel.objects.filter(following_id=post.author_id)
+        .values_list("follower_id", flat=True)[: FANOUT_FOLLOWER_LIMIT + 1]
+    )
+    if len(follower_ids) > FANOUT_FOLLOWER_LIMIT:
+        # Crossed the line since the large-author list was cached.
+        cache.delete(LARGE_AUTHORS_KEY)
+        return 0
+
+    created_ts = _timestamp(post.created_at or timezone.now())
+    pushed = 0
+    for start in range(0, len(follower_ids), FANOUT_CHUNK):
+        keys = [_key(uid, video) for uid in follower_ids[start:start + FANOUT_CHUNK]]
+        timelines = cache.get_many(keys)
+        if not timelines:
+            continue
+        cache.set_many(
+            {
+                key: _prepend(entries, post.id, created_ts)
+                for key, entries in timelines.items()
+            },
+            TIMELINE_TTL,
+        )
+        pushed += len(timelines)
+    return pushed
@@ -38,6 +38,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from base.models import User
+from . import feed_candidates, impressions, timelines
 from .feed_annotations import feed_count_annotations
 from .tasks import generate_bn_video_thumbnail, transcode_bn_video
 from .feed_visibility import visible_posts_q
@@ -432,8 +433,36 @@ class BusinessNetworkPostListCreateView(generics.ListCreateAPIView):
                 post_ids.append(str(row["id"]))
         return post_ids
 
+    def _is_following_feed(self):
+        return self.request.query_params.get("feed") == "following"
+
+    def _list_following_by_cursor(self, request):
+        """Cursor-paged Following feed: ``{"results": [...], "next_cursor": ...}``.
+
+        Opt-in with ``?cursor=`` (empty for the first page). Unlike page
+        numbers, a cursor never repeats or skips posts when new ones land at
+        the top of the timeline between requests.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page_size = self.paginator.get_page_size(request) or 7
+        entries, next_cursor = timelines.page_after(
+            self._timeline_entries,
+            request.query_params.get("cursor"),
+            page_size,
+        )
+        posts = queryset.filter(id__in=[entry[0] for entry in entries])
+        serializer = self.get_serializer(posts, many=True)
+        return Response({"results": serializer.data, "next_cursor": next_cursor})
+
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
+        if (
+            self._is_following_feed()
+            and "cursor" in request.query_params
+            and request.user.is_authenticated
+        ):
+            response = self._list_following_by_cursor(request)
+        else:
+            response = super().list(request, *args, **kwargs)
         if not request.user.is_authenticated or response.status_code >= 400:
             return response
 
@@ -441,43 +470,31 @@ class BusinessNetworkPostListCreateView(generics.ListCreateAPIView):
         if post_ids:
             seen_cache_key = f"business_network_seen_posts:{request.user.id}"
             existing_seen_ids = cache.get(seen_cache_key, [])
-            merged_seen_ids = list(dict.fromkeys(post_ids + existing_seen_ids))[
-                : self.seen_cache_limit
-            ]
-            cache.set(seen_cache_key, merged_seen_ids, self.seen_cache_ttl)
+            # Re-served posts (pull-to-refresh, back navigation) are already
+            # at the head of the list; only rewrite it when something is new.
+            if existing_seen_ids[: len(post_ids)] != post_ids:
+                merged_seen_ids = list(dict.fromkeys(post_ids + existing_seen_ids))[
+                    : self.seen_cache_limit
+                ]
+                cache.set(seen_cache_key, merged_seen_ids, self.seen_cache_ttl)
 
             # Persist impressions so seen-demotion survives cache restarts
             # (the cache-only list evaporated and let the same posts pin the
-            # top again). bulk upsert: insert new pairs, touch existing.
-            try:
-                from .models import PostSeen
-
-                existing = set(
-                    PostSeen.objects.filter(
-                        user=request.user, post_id__in=post_ids
-                    ).values_list("post_id", flat=True)
-                )
-                fresh = [pid for pid in post_ids if pid not in existing]
-                if fresh:
-                    PostSeen.objects.bulk_create(
-                        [
-                            PostSeen(user=request.user, post_id=pid)
-                            for pid in fresh
-                        ],
-                        ignore_conflicts=True,
-                    )
-                if existing:
-                    from django.db.models import F as _F
-                    from django.utils import timezone as _tz
-
-                    PostSeen.objects.filter(
-                        user=request.user, post_id__in=list(existing)
-                    ).update(
-                        times_seen=_F("times_seen") + 1,
-                        last_seen_at=_tz.now(),
-                    )
-            except Exception:  # pragma: no cover — never break the feed
-                pass
+            # top again). Buffered and merged into PostSeen in batches by
+            # flush_feed_impressions (impressions.py); the list above covers
+            # the seconds in between.
+            buffered = False
+            if impressions.enabled():
+                try:
+                    impressions.record(request.user.id, post_ids)
+                    buffered = True
+                except Exception:  # cache down — write them inline instead
+                    pass
+            if not buffered:
+                try:
+                    impressions.record_now(request.user.id, post_ids)
+                except Exception:  # pragma: no cover — never break the feed
+                    pass
 
         return response
 
@@ -495,17 +512,19 @@ class BusinessNetworkPostListCreateView(generics.ListCreateAPIView):
         from people the user follows only (used by the Shorts "Following" tab).
         `&media=video` additionally keeps only posts that carry a video.
         """
-        if self.request.query_params.get("feed") == "following":
+        if self._is_following_feed():
             if not self.request.user.is_authenticated:
                 return BusinessNetworkPost.objects.none()
-            following_ids = list(
-                BusinessNetworkFollowerModel.objects.filter(
-                    follower=self.request.user
-                ).values_list("following_id", flat=True)
+            # The capped fan-out timeline (timelines.py) already holds the
+            # newest posts of everyone followed, so this only fetches rows by
+            # id — no IN-list over every followed author to sort.
+            video_only = self.request.query_params.get("media") == "video"
+            self._timeline_entries = timelines.timeline(
+                self.request.user, video=video_only
             )
             qs = (
                 BusinessNetworkPost.objects.filter(
-                    author_id__in=following_ids,
+                    id__in=[entry[0] for entry in self._timeline_entries],
                     is_banned=False,
                     visibility__in=["public", "followers"],
                 )
@@ -528,10 +547,8 @@ class BusinessNetworkPostListCreateView(generics.ListCreateAPIView):
                 # This branch carried no annotations, so every count on the
                 # Following tab was a query per post.
                 .annotate(**feed_count_annotations(self.request.user))
-                .order_by("-created_at")
+                .order_by("-created_at", "-id")
             )
-            if self.request.query_params.get("media") == "video":
-                qs = qs.filter(media__type="video").distinct()
             return qs
 
         if not self.request.user.is_authenticated:
@@ -754,6 +771,13 @@ class BusinessNetworkPostListCreateView(generics.ListCreateAPIView):
             | Q(author_id__in=blocked_by_user_ids)
         )
 
+        # Score only this user's candidate pool (feed_candidates) instead of
+        # every visible post; None means the pool is too small to bother.
+        if feed_candidates.enabled():
+            candidate_post_ids = feed_candidates.candidate_ids(user, cached_data)
+            if candidate_post_ids is not None:
+                queryset = queryset.filter(id__in=candidate_post_ids)
+
         # ── Join-free relevance scoring ──────────────────────────────────
         # The score is built ONLY from Case/F/arithmetic and the model's
         # DENORMALIZED counters (like_count/comment_count/save_count) plus a
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import NudgeLog, UserEvent, UserState
+from .models import NudgeLog, UserActivityDay, UserEvent, UserState
 
 
 @admin.register(UserEvent)
@@ -18,6 +18,21 @@ class UserEventAdmin(admin.ModelAdmin):
         return False  # events are written by track(), never by hand
 
 
+@admin.register(UserActivityDay)
+class UserActivityDayAdmin(admin.ModelAdmin):
+    list_display = ("day", "user", "events", "last_event_at", "updated_at")
+    list_filter = ("day",)
+    search_fields = ("user__email",)
+    date_hierarchy = "day"
+    readonly_fields = (
+        "user", "day", "events", "surfaces", "hours", "event_types",
+        "last_event_at", "updated_at",
+    )
+
+    def has_add_permission(self, request):
+        return False  # folded from UserEvent by engagement.rollups
+
+
 @admin.register(UserState)
 class UserStateAdmin(admin.ModelAdmin):
     list_display = (
@@ -0,0 +1,141 @@
+"""Runtime and peak memory of aggregate_user_states at 10M events.
+
+Seeds ``--users`` synthetic users and ``--events`` UserEvents spread over the
+last 30 days (inserted server-side with generate_series, in time order, so
+ids follow created_at as they do in production), then reports wall time,
+peak Python memory (tracemalloc) and statement count for:
+
+  * old event pass — what every run used to do first: read all 30 days of
+    UserEvent and group them per user in memory
+  * first run — aggregate_user_states with no rollup yet: backfills
+    UserActivityDay from the log and recomputes every user (the once-a-day
+    full pass costs the same minus the backfill)
+  * steady run — after ``--new-events`` more events from the last half hour:
+    folds just those and recomputes just the users they touched
+
+tracemalloc slows Python down, for every run alike: compare the runs with
+each other, not with production timings. Postgres only. Everything is rolled
+back.
+
+    python manage.py bench_activity_rollup                      # 10M events
+    python manage.py bench_activity_rollup --users 20000 --events 1000000
+"""
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from base.benchmarking import count_queries, rolled_back, synthetic_users
+
+CHUNK = 1000000
+USER_CHUNK = 20000
+EVENT_TYPES = ["app_open", "screen_view", "post_like", "post_comment", "post_create",
+               "product_view", "ride_request", "follow", "diamond_txn", "recharge"]
+SURFACES = ["feed", "eshop", "rideshare", "chat", "gigs", "wallet", ""]
+
+
+class Command(BaseCommand):
+    help = "Runtime / peak memory of aggregate_user_states, old pass vs rollup (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--events", type=int, default=10000000)
+        parser.add_argument("--new-events", type=int, default=20000)
+
+    def handle(self, *args, **opts):
+        from engagement.models import ActivityWatermark, UserEvent
+        from engagement.tasks import aggregate_user_states
+
+        with rolled_back():
+            started = time.perf_counter()
+            ids = []
+            for start in range(0, opts["users"], USER_CHUNK):
+                ids += [u.pk for u in synthetic_users(
+                    min(USER_CHUNK, opts["users"] - start), prefix="benchactivity")]
+            now = timezone.now()
+            chunks = max(1, -(-opts["events"] // CHUNK))
+            span = timedelta(days=30)
+            for i in range(chunks):
+                count = min(CHUNK, opts["events"] - i * CHUNK)
+                self._insert(UserEvent._meta.db_table, ids, count,
+                             now - span + span * i / chunks, span / chunks)
+                self.stdout.write("  seeded %d/%d events" % (
+                    i * CHUNK + count, opts["events"]), ending="\r")
+            self.stdout.write("")
+            self.stdout.write("seeded %d users, %d events in %.1fs" % (
+                len(ids), opts["events"], time.perf_counter() - started))
+            ActivityWatermark.objects.all().delete()
+
+            self._run("old event pass ", self._old_event_pass)
+            self._run("first run ......", aggregate_user_states)
+            self._insert(UserEvent._meta.db_table, ids, opts["new_events"],
+                         timezone.now() - timedelta(minutes=33), timedelta(minutes=30))
+            self._run("steady run .....", aggregate_user_states)
+
+        self.stdout.write(self.style.SUCCESS("Done — synthetic users and events rolled back."))
+
+    def _insert(self, table, ids, count, start, span):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table}
+                    (user_id, event_type, surface, object_type, object_id,
+                     metadata, session_id, created_at)
+                SELECT ids[1 + floor(random() * cardinality(ids))::int],
+                       types[1 + floor(random() * cardinality(types))::int],
+                       surfaces[1 + floor(random() * cardinality(surfaces))::int],
+                       '', '', '{{}}'::jsonb, '', at
+                FROM (SELECT %s::uuid[] AS ids, %s::text[] AS types,
+                             %s::text[] AS surfaces) p,
+                     (SELECT %s::timestamptz + random() * %s::interval AS at
+                      FROM generate_series(1, %s)) g
+                ORDER BY at
+                """,
+                [ids, EVENT_TYPES, SURFACES, start, span, count],
+            )
+
+    def _old_event_pass(self):
+        from engagement.models import UserEvent
+
+        now = timezone.now()
+        since_30d, since_7d = now - timedelta(days=30), now - timedelta(days=7)
+        per_user_days, per_user_days_7d = defaultdict(set), defaultdict(set)
+        per_user_count_30d, per_user_count_7d = Counter(), Counter()
+        per_user_last = {}
+        per_user_surfaces, per_user_hours = defaultdict(Counter), defaultdict(Counter)
+        per_user_types = defaultdict(set)
+        rows = UserEvent.objects.filter(
+            created_at__gte=since_30d, user__isnull=False
+        ).values_list("user_id", "created_at", "surface", "event_type")
+        for uid, created, surface, etype in rows.iterator(chunk_size=2000):
+            local = timezone.localtime(created)
+            d = local.date()
+            per_user_days[uid].add(d)
+            per_user_count_30d[uid] += 1
+            per_user_types[uid].add(etype)
+            if surface:
+                per_user_surfaces[uid][surface] += 1
+            per_user_hours[uid][local.hour] += 1
+            if created >= since_7d:
+                per_user_count_7d[uid] += 1
+                per_user_days_7d[uid].add(d)
+            prev = per_user_last.get(uid)
+            if prev is None or created > prev:
+                per_user_last[uid] = created
+        return {"processed": len(per_user_count_30d)}
+
+    def _run(self, label, fn):
+        tracemalloc.start()
+        with count_queries() as ctx:
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write("  %s %7.1fs  peak %7.1f MB  %6d queries  %s" % (
+            label, elapsed, peak / 2 ** 20, len(ctx),
+            {k: v for k, v in result.items() if k != "timestamp"}))
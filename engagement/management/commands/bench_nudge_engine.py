@@ -0,0 +1,94 @@
+"""Dry-run the nudge engine over a synthetic user base and time it.
+
+Seeds ``--users`` synthetic users with a UserState each (a spread of
+lifecycle stages and pending items, so every catalog entry and the promo
+fallback get picked), plus NudgeLog push history over the last two weeks for
+``--history-share`` of them. Then runs ``run_nudge_engine(dry_run=True)`` and
+reports wall time, statement count and the plan by nudge. Nothing is sent and
+everything is rolled back.
+
+    python manage.py bench_nudge_engine                  # 1M users
+    python manage.py bench_nudge_engine --users 100000 --history-share 0.5
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.benchmarking import count_queries, rolled_back, synthetic_users
+
+CHUNK = 20000
+
+STAGES = ["new", "onboarding", "activated", "habitual", "at_risk", "dormant", "churned"]
+PENDING = [
+    {},
+    {"kyc": True, "withdrawable_balance": "250.00"},
+    {"kyc": True},
+    {"profile_incomplete": True},
+    {"no_location": True},
+    {"area_label": "Kushtia Sadar", "area_services": [{"cat": "Electrician", "n": 4}]},
+]
+HISTORY_KEYS = ["kyc_verify", "profile_complete", "onboarding_explore", "promo_eshop_1"]
+
+
+class Command(BaseCommand):
+    help = "Wall time and query count of a dry-run nudge pass over synthetic users (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000000)
+        parser.add_argument("--history-share", type=float, default=0.3)
+        parser.add_argument("--seed", type=int, default=11)
+
+    def handle(self, *args, **opts):
+        from engagement.models import NudgeLog, UserState
+        from engagement.tasks import run_nudge_engine
+
+        rng = random.Random(opts["seed"])
+        now = timezone.now()
+
+        with rolled_back():
+            started = time.perf_counter()
+            for start in range(0, opts["users"], CHUNK):
+                users = synthetic_users(min(CHUNK, opts["users"] - start), prefix="benchnudge")
+                UserState.objects.bulk_create(
+                    [
+                        UserState(
+                            user=u,
+                            lifecycle_stage=rng.choice(STAGES),
+                            pending=rng.choice(PENDING),
+                        )
+                        for u in users
+                    ],
+                    batch_size=5000,
+                )
+                logs = [
+                    NudgeLog(user=u, nudge_key=rng.choice(HISTORY_KEYS), channel="push")
+                    for u in users
+                    if rng.random() < opts["history_share"]
+                ]
+                logs = NudgeLog.objects.bulk_create(logs, batch_size=5000)
+                # sent_at is auto_now_add: spread it over two weeks afterwards.
+                by_day = {}
+                for log in logs:
+                    by_day.setdefault(rng.randrange(14), []).append(log.pk)
+                for days, pks in by_day.items():
+                    NudgeLog.objects.filter(pk__in=pks).update(
+                        sent_at=now - timedelta(days=days, hours=1))
+                self.stdout.write(
+                    "  seeded %d/%d" % (start + len(users), opts["users"]), ending="\r")
+            self.stdout.write("")
+            self.stdout.write("seeded in %.1fs" % (time.perf_counter() - started))
+
+            with count_queries() as ctx:
+                started = time.perf_counter()
+                result = run_nudge_engine(dry_run=True)
+                elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            "  run_nudge_engine(dry_run=True): %.1fs  %d queries  %d planned  (%.0f users/s)"
+            % (elapsed, len(ctx), result["sent"], opts["users"] / elapsed if elapsed else 0))
+        for key, count in sorted(result["by_nudge"].items(), key=lambda kv: -kv[1]):
+            self.stdout.write("    %-24s %d" % (key, count))
+        self.stdout.write(self.style.SUCCESS("Done — synthetic users rolled back."))
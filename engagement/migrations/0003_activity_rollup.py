@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0002_nudgelog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('states_day', models.DateField(blank=True, null=True)),
+                ('states_ran_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserActivityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('surfaces', models.JSONField(blank=True, default=dict)),
+                ('hours', models.JSONField(blank=True, default=dict)),
+                ('event_types', models.JSONField(blank=True, default=list)),
+                ('last_event_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagement_activity_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='eng_activity_day_idx'), models.Index(fields=['updated_at'], name='eng_activity_updated_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='eng_activity_user_day_uniq')],
+            },
+        ),
+    ]
@@ -39,6 +39,53 @@ class UserEvent(models.Model):
         return f"{self.event_type} by {who} @ {self.created_at:%Y-%m-%d %H:%M}"
 
 
+class UserActivityDay(models.Model):
+    """One user's UserEvents for one day, folded together: what UserState's
+    activity windows, habits and value tier are computed from. Maintained by
+    ``engagement.rollups`` — incrementally from new events, and the trailing
+    days re-derived nightly."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="engagement_activity_days",
+    )
+    day = models.DateField()
+    events = models.PositiveIntegerField(default=0)
+    surfaces = models.JSONField(default=dict, blank=True)      # {"feed": 12, ...}
+    hours = models.JSONField(default=dict, blank=True)         # {"21": 4, ...}
+    event_types = models.JSONField(default=list, blank=True)   # distinct, sorted
+    last_event_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day"], name="eng_activity_user_day_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="eng_activity_day_idx"),
+            models.Index(fields=["updated_at"], name="eng_activity_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}: {self.events} events"
+
+
+class ActivityWatermark(models.Model):
+    """Single row (pk=1): how far the UserEvent log has been folded into
+    UserActivityDay, and when UserState was last brought up to date."""
+
+    last_event_id = models.BigIntegerField(default=0)
+    # Day of the last pass that recomputed every user (windows slide daily).
+    states_day = models.DateField(null=True, blank=True)
+    # Start of the last finished aggregate_user_states run.
+    states_ran_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"events <= {self.last_event_id}, states {self.states_ran_at}"
+
+
 class UserState(models.Model):
     """Per-user rolled-up profile the brain reads cheaply. One row per user,
     refreshed by ``engagement.tasks.aggregate_user_states`` (Phase B)."""
@@ -0,0 +1,305 @@
+"""Per-user daily activity rollup behind ``aggregate_user_states``.
+
+Every half hour ``aggregate_user_states`` re-read the last 30 days of
+UserEvent — every row, for every user — to rebuild the same few numbers it
+had built half an hour earlier. Those numbers only need, per user and day:
+how many events, on which surfaces, at which hours, of which types, and the
+last one. UserActivityDay keeps exactly that, and:
+
+  * ``fold`` adds the events past the watermark
+    (``ActivityWatermark.last_event_id``), read by primary key in
+    ``FOLD_BATCH`` slices, onto their (user, day) rows and moves the
+    watermark in the same transaction. Events younger than ``FOLD_LAG`` wait
+    for the next run, so an insert that is still committing is not skipped.
+  * ``rebuild`` re-derives whole days from the log — nightly for the
+    trailing ``REBUILD_DAYS`` (``refresh``), which also recovers anything
+    ``fold`` stepped over (a transaction open longer than FOLD_LAG), and for
+    the trailing window on first use. It writes each day once the scan is
+    past it, so the 30-day backfill holds about a day in memory, not 30.
+  * ``window`` sums a set of users' rows over the trailing 30 days — what
+    UserState's activity fields are computed from.
+
+Both writers hold the watermark row's lock, so they never interleave. Days
+are ``timezone.localtime`` days, as the old in-memory pass used.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+FOLD_BATCH = 20000
+FOLD_LAG = timedelta(minutes=2)
+WINDOW_DAYS = 30
+REBUILD_DAYS = 2
+# Event ids are only roughly in created_at order; read this far past the
+# start of the first rebuilt day before stopping.
+REBUILD_SLACK = timedelta(hours=1)
+
+ROW_FIELDS = ["events", "surfaces", "hours", "event_types", "last_event_at", "updated_at"]
+
+
+def _today():
+    return timezone.localtime(timezone.now()).date()
+
+
+class _Day:
+    """One (user, day)'s events while they are being folded."""
+
+    __slots__ = ("events", "surfaces", "hours", "types", "last")
+
+    def __init__(self):
+        self.events = 0
+        self.surfaces = Counter()
+        self.hours = Counter()
+        self.types = set()
+        self.last = None
+
+    def add(self, local, surface, event_type):
+        self.events += 1
+        if surface:
+            self.surfaces[surface] += 1
+        self.hours[local.hour] += 1
+        self.types.add(event_type)
+        if self.last is None or local > self.last:
+            self.last = local
+
+    def add_row(self, row):
+        self.events += row.events
+        self.surfaces.update(row.surfaces)
+        self.hours.update({int(h): n for h, n in row.hours.items()})
+        self.types.update(row.event_types)
+        if row.last_event_at and (self.last is None or row.last_event_at > self.last):
+            self.last = row.last_event_at
+
+    def as_row(self, user_id, day):
+        from .models import UserActivityDay
+
+        return UserActivityDay(
+            user_id=user_id,
+            day=day,
+            events=self.events,
+            surfaces=dict(self.surfaces),
+            hours={str(h): n for h, n in sorted(self.hours.items())},
+            event_types=sorted(self.types),
+            last_event_at=self.last,
+        )
+
+
+def _collect(days, user_id, created, surface, event_type):
+    local = timezone.localtime(created)
+    key = (user_id, local.date())
+    acc = days.get(key)
+    if acc is None:
+        acc = days[key] = _Day()
+    acc.add(local, surface, event_type)
+    return key
+
+
+def _watermark():
+    """The watermark row, locked until the caller's transaction ends. Made on
+    first use, starting at the newest event with the trailing window rebuilt
+    from the log."""
+    from .models import ActivityWatermark, UserEvent
+
+    mark = ActivityWatermark.objects.select_for_update().filter(pk=1).first()
+    if mark is not None:
+        return mark
+    top = UserEvent.objects.aggregate(top=Max("id"))["top"] or 0
+    _, created = ActivityWatermark.objects.get_or_create(pk=1, defaults={"last_event_id": top})
+    mark = ActivityWatermark.objects.select_for_update().get(pk=1)
+    if created:
+        today = _today()
+        _rebuild(mark, today - timedelta(days=WINDOW_DAYS), today)
+    return mark
+
+
+def _merge(days):
+    """Add ``{(user_id, day): _Day}`` onto whatever rows those keys have."""
+    from .models import UserActivityDay
+
+    if not days:
+        return
+    stored = UserActivityDay.objects.filter(
+        user_id__in={u for u, _d in days},
+        day__in={d for _u, d in days},
+    )
+    for row in stored:
+        acc = days.get((row.user_id, row.day))
+        if acc is not None:
+            acc.add_row(row)
+    UserActivityDay.objects.bulk_create(
+        [acc.as_row(u, d) for (u, d), acc in days.items()],
+        update_conflicts=True,
+        unique_fields=["user", "day"],
+        update_fields=ROW_FIELDS,
+        batch_size=1000,
+    )
+
+
+def fold():
+    """Add the events past the watermark onto their UserActivityDay rows.
+    Returns the number of events read."""
+    from .models import UserEvent
+
+    cutoff = timezone.now() - FOLD_LAG
+    folded = 0
+    while True:
+        with transaction.atomic():
+            mark = _watermark()
+            rows = list(
+                UserEvent.objects.filter(id__gt=mark.last_event_id)
+                .order_by("id")
+                .values_list("id", "user_id", "created_at", "surface", "event_type")[:FOLD_BATCH]
+            )
+            done = len(rows) < FOLD_BATCH
+            for i, row in enumerate(rows):
+                if row[2] >= cutoff:
+                    # Too recent: leave it, and everything after it, for later.
+                    rows, done = rows[:i], True
+                    break
+            if not rows:
+                return folded
+
+            days = {}
+            for _id, user_id, created, surface, event_type in rows:
+                if user_id is not None:
+                    _collect(days, user_id, created, surface, event_type)
+            _merge(days)
+            mark.last_event_id = rows[-1][0]
+            mark.save(update_fields=["last_event_id", "updated_at"])
+        folded += len(rows)
+        if done:
+            return folded
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _rebuild(mark, first_day, last_day):
+    """Re-derive days [first_day, last_day]. The log is read newest first and
+    each day is written as soon as the scan is REBUILD_SLACK past its start,
+    so only a day or two of (user, day) totals is held at a time however
+    long the range."""
+    from .models import UserActivityDay, UserEvent
+
+    UserActivityDay.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+    stop = _day_start(first_day) - REBUILD_SLACK
+    events = (
+        UserEvent.objects.filter(id__lte=mark.last_event_id)
+        .order_by("-id")
+        .values_list("user_id", "created_at", "surface", "event_type")
+    )
+    open_days = {}      # day -> {(user_id, day): _Day}
+    closed = set()
+    late = {}           # events for a day already written: ids further off than the slack
+    close_at = None     # scan older than this: the newest open day is complete
+    written = 0
+
+    def close(before):
+        nonlocal written
+        for day in sorted(open_days, reverse=True):
+            if _day_start(day) - REBUILD_SLACK <= before:
+                return _day_start(day) - REBUILD_SLACK
+            rows = open_days.pop(day)
+            closed.add(day)
+            UserActivityDay.objects.bulk_create(
+                [acc.as_row(u, d) for (u, d), acc in rows.items()], batch_size=1000,
+            )
+            written += len(rows)
+        return None
+
+    for user_id, created, surface, event_type in events.iterator(chunk_size=5000):
+        if created < stop:
+            break
+        if close_at is not None and created < close_at:
+            close_at = close(created)
+        if user_id is None:
+            continue
+        day = timezone.localtime(created).date()
+        if day in closed:
+            _collect(late, user_id, created, surface, event_type)
+        elif first_day <= day <= last_day:
+            if day not in open_days:
+                open_days[day] = {}
+                start = _day_start(day) - REBUILD_SLACK
+                close_at = start if close_at is None else max(close_at, start)
+            _collect(open_days[day], user_id, created, surface, event_type)
+    close(stop - REBUILD_SLACK)
+    _merge(late)
+
+    # Rows may also have gone away: have the next state pass look at everyone.
+    mark.states_day = None
+    mark.save(update_fields=["states_day", "updated_at"])
+    return written
+
+
+def rebuild(first_day, last_day=None):
+    """Re-derive the rows for days [first_day, last_day] (default today) from
+    the events up to the watermark. Returns the rows written."""
+    with transaction.atomic():
+        mark = _watermark()
+        return _rebuild(mark, first_day, last_day or _today())
+
+
+def refresh(days=REBUILD_DAYS):
+    """Rebuild the trailing ``days`` days, today included."""
+    return rebuild(_today() - timedelta(days=days - 1))
+
+
+def changed_since(since):
+    """Users whose rows were written at or after ``since``."""
+    from .models import UserActivityDay
+
+    return set(
+        UserActivityDay.objects.filter(updated_at__gte=since)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+
+
+class Activity:
+    """A user's trailing-window totals, as aggregate_user_states reads them."""
+
+    __slots__ = ("days", "days_7d", "events_30d", "events_7d", "last",
+                 "surfaces", "hours", "types")
+
+    def __init__(self):
+        self.days = set()
+        self.days_7d = set()
+        self.events_30d = 0
+        self.events_7d = 0
+        self.last = None
+        self.surfaces = Counter()
+        self.hours = Counter()
+        self.types = set()
+
+
+def window(user_ids, now):
+    """``{user_id: Activity}`` over the last WINDOW_DAYS (whole days) for
+    ``user_ids``; users without a row in the window are left out."""
+    from .models import UserActivityDay
+
+    first = timezone.localtime(now - timedelta(days=WINDOW_DAYS)).date()
+    first_7d = timezone.localtime(now - timedelta(days=7)).date()
+    out = {}
+    rows = UserActivityDay.objects.filter(user_id__in=user_ids, day__gte=first).values_list(
+        "user_id", "day", "events", "surfaces", "hours", "event_types", "last_event_at",
+    )
+    for user_id, day, events, surfaces, hours, event_types, last in rows:
+        act = out.get(user_id)
+        if act is None:
+            act = out[user_id] = Activity()
+        act.days.add(day)
+        act.events_30d += events
+        if day >= first_7d:
+            act.days_7d.add(day)
+            act.events_7d += events
+        act.surfaces.update(surfaces)
+        act.hours.update({int(h): n for h, n in hours.items()})
+        act.types.update(event_types)
+        if last and (act.last is None or last > act.last):
+            act.last = last
+    return out
@@ -44,6 +44,33 @@ def track(
         return None
 
 
+def track_many(events):
+    """Bulk ``track``: one INSERT for many events. Each event is a dict of
+    ``track``'s keyword arguments plus ``user`` (a User or a user id) and
+    ``event_type``. For batch jobs whose ``bulk_create`` skips the post_save
+    receivers that would otherwise have tracked each row. Never raises."""
+    try:
+        from .models import UserEvent
+
+        rows = [
+            UserEvent(
+                user_id=getattr(e.get("user"), "pk", e.get("user")),
+                event_type=e["event_type"][:64],
+                surface=(e.get("surface") or "")[:32],
+                object_type=(e.get("object_type") or "")[:64],
+                object_id=str(e.get("object_id") or "")[:64],
+                session_id=(e.get("session_id") or "")[:64],
+                metadata=e.get("metadata") or {},
+            )
+            for e in events
+            if e.get("event_type")
+        ]
+        return UserEvent.objects.bulk_create(rows, batch_size=1000)
+    except Exception:  # pragma: no cover - defensive, never propagate
+        logger.exception("engagement.track_many failed")
+        return []
+
+
 def _norm_area(value):
     """Lowercase + trimmed key for case-insensitive area matching."""
     return (value or "").strip().lower()
@@ -1,6 +1,7 @@
 """Phase B — Memory.
 
-A periodic job that rolls the raw UserEvent log (plus chat presence) into one
+A periodic job that rolls the UserEvent log — through the per-day activity
+rollup in ``engagement.rollups`` — plus chat presence into one
 compact UserState row per user: activity windows, streaks, lifecycle stage,
 churn risk, value tier, habits and a "pending" snapshot the nudge engine and
 assistant will read. Pure backend; safe to run repeatedly.
@@ -14,9 +15,10 @@ from datetime import timedelta
 from celery import shared_task
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Max
 from django.utils import timezone
 
-from .models import NudgeLog, UserEvent, UserState
+from .models import NudgeLog, UserState
 from base.name_utils import friendly_first_name
 
 logger = logging.getLogger(__name__)
@@ -30,6 +32,9 @@ CORE_ACTIONS = {
     "gig_complete", "diamond_txn", "deposit",
 }
 
+# States evaluated, and nudges queued, per round of the nudge engine.
+NUDGE_BATCH = 1000
+
 
 def _lifecycle(now, joined, last_active, active_days_7d, events_30d):
     """Heuristic lifecycle stage. Order matters."""
@@ -87,50 +92,101 @@ def _streak(day_set, today):
     return n
 
 
+def _pending(user, now, area_index, resolve_user_area):
+    """The "pending" snapshot for one user: things the nudges can act on."""
+    pending = {}
+    if not getattr(user, "kyc", False):
+        pending["kyc"] = True
+    # Profile completeness — flag when key fields are missing so the brain
+    # can nudge the user to finish (better reach, trust and matches).
+    if not (
+        (getattr(user, "name", "") or "").strip()
+        and getattr(user, "image", None)
+        and (getattr(user, "phone", "") or "").strip()
+        and getattr(user, "gender", None)
+        and getattr(user, "date_of_birth", None)
+    ):
+        pending["profile_incomplete"] = True
+    try:
+        if user.balance and float(user.balance) > 0:
+            pending["withdrawable_balance"] = float(user.balance)
+    except (TypeError, ValueError):
+        pass
+    if getattr(user, "is_pro", False) and user.pro_validity:
+        if user.pro_validity <= now + timedelta(days=3):
+            pending["subscription_expiring"] = user.pro_validity.isoformat()
+
+    # Local targeting: how many live services exist in the user's area
+    # (profile address, else last-searched location). Powers the
+    # "N electricians, M plumbers near you" nudge + email; when we have
+    # no location at all, flag it so we can ask them to add an address.
+    if resolve_user_area is not None:
+        area_label, area_level, area_key = resolve_user_area(user)
+        if area_key:
+            cats = area_index.get(area_level, {}).get(area_key, [])
+            if cats:
+                pending["area_label"] = area_label
+                pending["area_services"] = [
+                    {"cat": c, "n": n} for c, n in cats[:3]
+                ]
+        else:
+            pending["no_location"] = True
+    return pending
+
+
+def _last_active(*candidates):
+    candidates = [c for c in candidates if c]
+    return max(candidates) if candidates else None
+
+
+def _is_stale(stored, user, now, pending, seen):
+    """Whether a user's stored state no longer holds, without reading their
+    activity: the pending snapshot changed, they were seen since, or time
+    alone moved their lifecycle stage, churn risk or tier."""
+    if stored is None or stored["pending"] != pending:
+        return True
+    last_active = _last_active(stored["last_active_at"], seen, user.last_login)
+    if last_active != stored["last_active_at"]:
+        return True
+    if _lifecycle(now, user.date_joined, last_active,
+                  stored["active_days_7d"], stored["events_30d"]) != stored["lifecycle_stage"]:
+        return True
+    if _churn_risk(last_active, now, stored["active_days_streak"]) != stored["churn_risk"]:
+        return True
+    return bool(getattr(user, "is_pro", False)) != (stored["value_tier"] == "pro")
+
+
+STATE_BATCH = 2000
+
+
 @shared_task
 def aggregate_user_states():
+    """Bring UserState up to date from the daily activity rollup.
+
+    New events are folded into UserActivityDay first (engagement.rollups).
+    Then, once a day — the windows and streaks move with the date — every
+    user is recomputed from their rollup rows; on the other runs only users
+    whose rows changed, whose pending snapshot changed, who were seen since,
+    or whose stage or risk time alone has moved.
+    """
+    from . import rollups
+    from .models import ActivityWatermark
+
     now = timezone.now()
-    today = now.date()
-    since_30d = now - timedelta(days=30)
-    since_7d = now - timedelta(days=7)
-
-    # --- One pass over recent events, grouped in memory (cheap at our scale) ---
-    per_user_days = defaultdict(set)          # user_id -> {date}
-    per_user_days_7d = defaultdict(set)
-    per_user_count_30d = Counter()
-    per_user_count_7d = Counter()
-    per_user_last = {}                        # user_id -> datetime
-    per_user_surfaces = defaultdict(Counter)
-    per_user_hours = defaultdict(Counter)
-    per_user_types = defaultdict(set)
-
-    rows = UserEvent.objects.filter(
-        created_at__gte=since_30d, user__isnull=False
-    ).values_list("user_id", "created_at", "surface", "event_type")
-    for uid, created, surface, etype in rows.iterator(chunk_size=2000):
-        local = timezone.localtime(created)
-        d = local.date()
-        per_user_days[uid].add(d)
-        per_user_count_30d[uid] += 1
-        per_user_types[uid].add(etype)
-        if surface:
-            per_user_surfaces[uid][surface] += 1
-        per_user_hours[uid][local.hour] += 1
-        if created >= since_7d:
-            per_user_count_7d[uid] += 1
-            per_user_days_7d[uid].add(d)
-        prev = per_user_last.get(uid)
-        if prev is None or created > prev:
-            per_user_last[uid] = created
-
-    # Chat presence as a passive "active" signal.
-    presence = {}
+    today = timezone.localtime(now).date()
+    folded = rollups.fold()
+    # Rows written from here on are the next run's "changed"; the fold's own
+    # are read below.
+    read_from = timezone.now()
+    mark = ActivityWatermark.objects.get(pk=1)
+    full = mark.states_day != today or mark.states_ran_at is None
+    changed = set() if full else rollups.changed_since(mark.states_ran_at)
+
     try:
         from adsyconnect.models import OnlineStatus
-        for uid, seen in OnlineStatus.objects.values_list("user_id", "last_seen"):
-            presence[uid] = seen
     except Exception:  # pragma: no cover
         logger.exception("could not load OnlineStatus presence")
+        OnlineStatus = None
 
     # Pre-aggregate live service-post counts by area ONCE (one grouped query),
     # so the per-user loop below is just dict lookups instead of N queries.
@@ -142,8 +198,6 @@ def aggregate_user_states():
         area_index = {"upazila": {}, "city": {}, "state": {}}
         resolve_user_area = None
 
-    processed = 0
-    states = []
     user_qs = User.objects.all().only(
         "id", "date_joined", "last_login", "is_pro", "pro_validity",
         "kyc", "kyc_pending", "balance",
@@ -151,108 +205,123 @@ def aggregate_user_states():
         "upazila", "city", "state",
         "last_search_upazila", "last_search_city", "last_search_state",
     )
-    for user in user_qs.iterator(chunk_size=500):
-        uid = user.id
+    processed = 0
+    batch = []
+    for user in user_qs.iterator(chunk_size=STATE_BATCH):
+        batch.append(user)
+        if len(batch) >= STATE_BATCH:
+            processed += _refresh_states(batch, now, today, full, changed, OnlineStatus,
+                                         area_index, resolve_user_area)
+            batch = []
+    if batch:
+        processed += _refresh_states(batch, now, today, full, changed, OnlineStatus,
+                                     area_index, resolve_user_area)
+
+    ActivityWatermark.objects.filter(pk=1).update(states_ran_at=read_from)
+    if full:
+        # Unless a rebuild asked for another full pass meanwhile.
+        ActivityWatermark.objects.filter(pk=1, states_day=mark.states_day).update(states_day=today)
+
+    result = {
+        "processed": processed,
+        "folded": folded,
+        "full": full,
+        "timestamp": now.isoformat(),
+    }
+    logger.info("aggregate_user_states: %s", result)
+    return result
+
+
+def _refresh_states(users, now, today, full, changed, OnlineStatus, area_index, resolve_user_area):
+    """Recompute and upsert the states of ``users`` that need it. Returns how
+    many were written."""
+    from . import rollups
+
+    ids = [u.id for u in users]
+    stored = {
+        row["user_id"]: row
+        for row in UserState.objects.filter(user_id__in=ids).values(
+            "user_id", "last_active_at", "active_days_7d", "events_30d",
+            "active_days_streak", "longest_streak", "lifecycle_stage",
+            "churn_risk", "value_tier", "pending",
+        )
+    }
+    presence = {}
+    if OnlineStatus is not None:
+        presence = dict(
+            OnlineStatus.objects.filter(user_id__in=ids).values_list("user_id", "last_seen")
+        )
+
+    due = []
+    for user in users:
         try:
-            ev_last = per_user_last.get(uid)
-            seen = presence.get(uid)
-            candidates = [c for c in (ev_last, seen, user.last_login) if c]
-            last_active = max(candidates) if candidates else None
-
-            days_set = per_user_days.get(uid, set())
-            streak = _streak(days_set, today)
-            events_30d = per_user_count_30d.get(uid, 0)
-            active_days_7d = len(per_user_days_7d.get(uid, set()))
-
-            stage = _lifecycle(now, user.date_joined, last_active, active_days_7d, events_30d)
-            types = per_user_types.get(uid, set())
-            has_create = "post_create" in types
-            has_earn = bool(types & {"diamond_txn", "gig_complete", "deposit"})
-
-            top_surfaces = dict(per_user_surfaces.get(uid, Counter()).most_common(5))
-            preferred_hours = [h for h, _ in per_user_hours.get(uid, Counter()).most_common(3)]
-
-            pending = {}
-            if not getattr(user, "kyc", False):
-                pending["kyc"] = True
-            # Profile completeness — flag when key fields are missing so the brain
-            # can nudge the user to finish (better reach, trust and matches).
-            if not (
-                (getattr(user, "name", "") or "").strip()
-                and getattr(user, "image", None)
-                and (getattr(user, "phone", "") or "").strip()
-                and getattr(user, "gender", None)
-                and getattr(user, "date_of_birth", None)
-            ):
-                pending["profile_incomplete"] = True
-            try:
-                if user.balance and float(user.balance) > 0:
-                    pending["withdrawable_balance"] = float(user.balance)
-            except (TypeError, ValueError):
-                pass
-            if getattr(user, "is_pro", False) and user.pro_validity:
-                if user.pro_validity <= now + timedelta(days=3):
-                    pending["subscription_expiring"] = user.pro_validity.isoformat()
-
-            # Local targeting: how many live services exist in the user's area
-            # (profile address, else last-searched location). Powers the
-            # "N electricians, M plumbers near you" nudge + email; when we have
-            # no location at all, flag it so we can ask them to add an address.
-            if resolve_user_area is not None:
-                area_label, area_level, area_key = resolve_user_area(user)
-                if area_key:
-                    cats = area_index.get(area_level, {}).get(area_key, [])
-                    if cats:
-                        pending["area_label"] = area_label
-                        pending["area_services"] = [
-                            {"cat": c, "n": n} for c, n in cats[:3]
-                        ]
-                else:
-                    pending["no_location"] = True
+            pending = _pending(user, now, area_index, resolve_user_area)
+            if (full or user.id in changed
+                    or _is_stale(stored.get(user.id), user, now, pending, presence.get(user.id))):
+                due.append((user, pending))
+        except Exception:  # pragma: no cover - never let one user break the run
+            logger.exception("aggregate_user_states failed for user %s", user.id)
+    if not due:
+        return 0
 
-            state = UserState(
+    activity = rollups.window([user.id for user, _p in due], now)
+    empty = rollups.Activity()
+    states = []
+    for user, pending in due:
+        uid = user.id
+        try:
+            act = activity.get(uid, empty)
+            last_active = _last_active(act.last, presence.get(uid), user.last_login)
+            streak = _streak(act.days, today)
+            active_days_7d = len(act.days_7d)
+            stage = _lifecycle(now, user.date_joined, last_active, active_days_7d, act.events_30d)
+            has_create = "post_create" in act.types
+            has_earn = bool(act.types & {"diamond_txn", "gig_complete", "deposit"})
+            top_surfaces = dict(act.surfaces.most_common(5))
+            previous = stored.get(uid)
+
+            states.append(UserState(
                 user_id=uid,
                 last_active_at=last_active,
                 active_days_7d=active_days_7d,
-                active_days_30d=len(days_set),
-                events_7d=per_user_count_7d.get(uid, 0),
-                events_30d=events_30d,
+                active_days_30d=len(act.days),
+                events_7d=act.events_7d,
+                events_30d=act.events_30d,
                 active_days_streak=streak,
-                longest_streak=streak,  # refined once we persist history
+                # Preserves the historical max.
+                longest_streak=max(streak, previous["longest_streak"] if previous else 0),
                 lifecycle_stage=stage,
                 churn_risk=_churn_risk(last_active, now, streak),
                 value_tier=_value_tier(user, top_surfaces, has_create, has_earn),
                 top_surfaces=top_surfaces,
-                preferred_hours=preferred_hours,
+                preferred_hours=[h for h, _ in act.hours.most_common(3)],
                 pending=pending,
-            )
-            states.append(state)
-            processed += 1
+            ))
         except Exception:  # pragma: no cover - never let one user break the run
             logger.exception("aggregate_user_states failed for user %s", uid)
 
-    # Upsert in bulk. longest_streak preserves the historical max.
-    update_fields = [
-        "last_active_at", "active_days_7d", "active_days_30d", "events_7d",
-        "events_30d", "active_days_streak", "lifecycle_stage", "churn_risk",
-        "value_tier", "top_surfaces", "preferred_hours", "pending", "updated_at",
-    ]
-    existing_longest = dict(
-        UserState.objects.values_list("user_id", "longest_streak")
-    )
-    for s in states:
-        s.longest_streak = max(s.active_days_streak, existing_longest.get(s.user_id, 0))
     UserState.objects.bulk_create(
         states,
         update_conflicts=True,
         unique_fields=["user"],
-        update_fields=update_fields + ["longest_streak"],
+        update_fields=[
+            "last_active_at", "active_days_7d", "active_days_30d", "events_7d",
+            "events_30d", "active_days_streak", "longest_streak", "lifecycle_stage",
+            "churn_risk", "value_tier", "top_surfaces", "preferred_hours", "pending",
+            "updated_at",
+        ],
         batch_size=500,
     )
+    return len(states)
 
-    result = {"processed": processed, "timestamp": now.isoformat()}
-    logger.info("aggregate_user_states: %s", result)
-    return result
+
+@shared_task
+def refresh_activity_rollup():
+    """Re-derive the trailing days of the daily activity rollup from the event
+    log (engagement.rollups), picking up any event the incremental fold
+    stepped over. Nightly, just after the day closes."""
+    from .rollups import refresh
+    return refresh()
 
 
 # ---------------------------------------------------------------------------
@@ -295,115 +364,160 @@ def run_nudge_engine(dry_run=False):
         if n.reliable or lifecycle_enabled
     ]
 
-    # Preload recent push history for caps/cooldowns (one query). This engine
-    # is now the SINGLE daily followup: it sends the best activity nudge, or a
-    # feature promo when none applies — so a user gets exactly ONE followup
-    # push a day. `last_any` therefore counts BOTH nudges and promos.
+    # Preload recent push history for caps/cooldowns (one grouped query). This
+    # engine is now the SINGLE daily followup: it sends the best activity
+    # nudge, or a feature promo when none applies — so a user gets exactly ONE
+    # followup push a day. `last_any` therefore counts BOTH nudges and promos,
+    # and the same rows give each user's recent promos for pick_promo.
     since = now - timedelta(days=14)
+    promo_since = now - timedelta(days=7)
     last_any = {}                         # user_id -> latest followup sent_at
     last_by_key = defaultdict(dict)       # user_id -> {nudge_key: sent_at}
-    for uid, key, sent in (
+    recent_promos = defaultdict(set)      # user_id -> promo keys sent in 7d
+    for uid, key, last in (
         NudgeLog.objects.filter(sent_at__gte=since, channel="push")
-        .values_list("user_id", "nudge_key", "sent_at")
+        .values("user_id", "nudge_key")
+        .annotate(last=Max("sent_at"))
+        .values_list("user_id", "nudge_key", "last")
     ):
-        if uid not in last_any or sent > last_any[uid]:
-            last_any[uid] = sent
-        prev = last_by_key[uid].get(key)
-        if prev is None or sent > prev:
-            last_by_key[uid][key] = sent
-
-    # Candidate states: only stages/conditions any nudge cares about.
+        if uid not in last_any or last > last_any[uid]:
+            last_any[uid] = last
+        last_by_key[uid][key] = last
+        if key.startswith("promo_") and last >= promo_since:
+            recent_promos[uid].add(key)
+
+    # Candidate states: only stages/conditions any nudge cares about. Inactive
+    # and suspended accounts are dropped by the query, not row by row.
     states = (
         UserState.objects.select_related("user")
         .exclude(lifecycle_stage="churned")  # don't chase the long-gone here
+        .filter(user__is_active=True, user__is_suspended=False)
     )
 
-    sent = 0
+    day_ago = now - timedelta(days=1)
+    runs_remaining = max(1, end_h - local_hour)
+    totals = {"sent": 0}
     plan = []  # for dry-run reporting
-    for state in states.iterator(chunk_size=500):
-        if sent >= per_run_cap:
-            break
-        user = state.user
-        if getattr(user, "is_suspended", False) or not getattr(user, "is_active", True):
-            continue
-        # One followup push per user per day (nudge or promo).
-        la = last_any.get(user.id)
-        if la and la >= now - timedelta(days=1):
-            continue
+    batch = []
 
-        # Spread sends across the remaining window so they don't all fire at
-        # the first run of the day. Guaranteed to send by the final run
-        # (runs_remaining hits 1 -> probability 1.0). Skipped in dry-run.
-        if not dry_run:
-            runs_remaining = max(1, end_h - local_hour)
-            if random.random() >= (1.0 / runs_remaining):
-                continue
+    def _decide(batch):
+        """Pick each state's nudge, one catalog entry at a time over the batch.
 
-        chosen = None
+        Returns ``[(state, key, title, body, deep_link, ntype)]`` in batch
+        order. No queries: everything needed was preloaded above.
+        """
+        from .feature_promos import pick_promo
+
+        chosen = {}
+        undecided = batch
         for nudge in catalog:
-            try:
-                if not nudge.eligible(state, user):
-                    continue
-                prev = last_by_key.get(user.id, {}).get(nudge.key)
-                if prev and prev >= now - timedelta(days=nudge.cooldown_days):
-                    continue
-                chosen = nudge
+            if not undecided:
                 break
-            except Exception:  # pragma: no cover
-                logger.exception("nudge eligibility failed: %s", nudge.key)
-
-        # Decide the payload: the best activity nudge, or a feature promo as
-        # a fallback so every user still gets one useful followup a day.
-        if chosen is not None:
-            try:
-                title, body = chosen.build(state, user)
-            except Exception:  # pragma: no cover
-                logger.exception("nudge build failed: %s", chosen.key)
+            cooldown_since = now - timedelta(days=nudge.cooldown_days)
+            still = []
+            for state in undecided:
+                try:
+                    ok = nudge.eligible(state, state.user)
+                except Exception:  # pragma: no cover
+                    logger.exception("nudge eligibility failed: %s", nudge.key)
+                    ok = False
+                if ok:
+                    prev = last_by_key.get(state.user_id, {}).get(nudge.key)
+                    ok = not (prev and prev >= cooldown_since)
+                if ok:
+                    chosen[state.user_id] = nudge
+                else:
+                    still.append(state)
+            undecided = still
+
+        decided = []
+        for state in batch:
+            user = state.user
+            nudge = chosen.get(state.user_id)
+            # Decide the payload: the best activity nudge, or a feature promo
+            # as a fallback so every user still gets one useful followup a day.
+            if nudge is not None:
+                try:
+                    title, body = nudge.build(state, user)
+                except Exception:  # pragma: no cover
+                    logger.exception("nudge build failed: %s", nudge.key)
+                    continue
+                decided.append(
+                    (state, nudge.key, title, body, nudge.deep_link, "assistant")
+                )
                 continue
-            send_key, deep_link, ntype = chosen.key, chosen.deep_link, "assistant"
-        else:
-            from .feature_promos import pick_promo
-
-            recent_promos = set(
-                NudgeLog.objects.filter(
-                    user=user,
-                    nudge_key__startswith="promo_",
-                    sent_at__gte=now - timedelta(days=7),
-                ).values_list("nudge_key", flat=True)
+            send_key, title, body, deep_link = pick_promo(
+                exclude_keys=recent_promos.get(state.user_id, set())
             )
-            send_key, title, body, deep_link = pick_promo(exclude_keys=recent_promos)
             _first = friendly_first_name(
                 getattr(user, "name", "") or getattr(user, "first_name", ""),
                 fallback="",
             )
             if _first:
                 body = f"{_first}, {body}"
-            ntype = "feature"
-
-        if dry_run:
-            plan.append({"user": user.id, "nudge": send_key, "title": title})
-            sent += 1
-            continue
-
-        try:
-            from base.push_notifications import send_push_notification
-            send_push_notification(
-                title=title,
-                body=body,
-                deep_link=deep_link,
-                notification_type=ntype,
-                users=[user],
-            )
-            NudgeLog.objects.create(
-                user=user,
-                nudge_key=send_key,
+            decided.append((state, send_key, title, body, deep_link, "feature"))
+        return decided
+
+    def _deliver(decided):
+        """Queue one batch: bulk notifications + pushes per type, then the
+        NudgeLog rows in one insert."""
+        from base.push_notifications import send_push_notifications_bulk
+
+        by_type = defaultdict(list)
+        for state, key, title, body, deep_link, ntype in decided:
+            by_type[ntype].append((state.user, title, body, deep_link))
+        delivered = set()
+        for ntype, items in by_type.items():
+            try:
+                send_push_notifications_bulk(items, notification_type=ntype)
+            except Exception:  # pragma: no cover - never let one batch kill the run
+                logger.exception("nudge batch send failed: %s x%s", ntype, len(items))
+                continue
+            delivered.add(ntype)
+        NudgeLog.objects.bulk_create([
+            NudgeLog(
+                user_id=state.user_id,
+                nudge_key=key,
                 channel="push",
                 title=title,
                 deep_link=deep_link,
             )
-            sent += 1
-        except Exception:  # pragma: no cover - never let one send kill the run
-            logger.exception("nudge send failed: %s -> %s", send_key, user.id)
+            for state, key, title, body, deep_link, ntype in decided
+            if ntype in delivered
+        ])
+        return sum(1 for d in decided if d[5] in delivered)
+
+    def _flush(batch):
+        decided = _decide(batch)[: per_run_cap - totals["sent"]]
+        if dry_run:
+            plan.extend(
+                {"user": d[0].user_id, "nudge": d[1], "title": d[2]} for d in decided
+            )
+            totals["sent"] += len(decided)
+        elif decided:
+            totals["sent"] += _deliver(decided)
+
+    for state in states.iterator(chunk_size=NUDGE_BATCH):
+        if totals["sent"] >= per_run_cap:
+            break
+        # One followup push per user per day (nudge or promo).
+        la = last_any.get(state.user_id)
+        if la and la >= day_ago:
+            continue
+
+        # Spread sends across the remaining window so they don't all fire at
+        # the first run of the day. Guaranteed to send by the final run
+        # (runs_remaining hits 1 -> probability 1.0). Skipped in dry-run.
+        if not dry_run and random.random() >= (1.0 / runs_remaining):
+            continue
+
+        batch.append(state)
+        if len(batch) >= NUDGE_BATCH:
+            _flush(batch)
+            batch = []
+    if batch and totals["sent"] < per_run_cap:
+        _flush(batch)
+    sent = totals["sent"]
 
     result = {"sent": sent, "dry_run": dry_run, "timestamp": now.isoformat()}
     if dry_run:
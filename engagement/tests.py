@@ -0,0 +1,273 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from engagement import feature_promos, rollups
+from engagement.models import ActivityWatermark, NudgeLog, UserActivityDay, UserEvent, UserState
+from engagement.tasks import _churn_risk, _is_stale, _lifecycle, aggregate_user_states, run_nudge_engine
+
+User = get_user_model()
+
+
+class NudgeEngineTests(TestCase):
+    """run_nudge_engine picks one nudge per user per day from the catalog, in
+    priority order, honouring cooldowns, and falls back to a feature promo."""
+
+    def make_state(self, i, stage="activated", **pending):
+        user = User.objects.create_user(
+            username="nudge%d" % i,
+            email="nudge%d@example.com" % i,
+            password="testpass123",
+            phone="0171000%04d" % i,
+        )
+        UserState.objects.update_or_create(
+            user=user, defaults={"lifecycle_stage": stage, "pending": pending})
+        return user
+
+    def log(self, user, key, days_ago):
+        row = NudgeLog.objects.create(user=user, nudge_key=key, channel="push")
+        NudgeLog.objects.filter(pk=row.pk).update(
+            sent_at=timezone.now() - timedelta(days=days_ago))
+
+    def plan(self, **kwargs):
+        result = run_nudge_engine(dry_run=True, **kwargs)
+        return {p["user"]: p["nudge"] for p in result["plan"]}
+
+    def test_highest_priority_eligible_nudge_wins(self):
+        money = self.make_state(1, kyc=True, withdrawable_balance="250")
+        kyc = self.make_state(2, kyc=True)
+        fresh = self.make_state(3, stage="new")
+        churned = self.make_state(4, stage="churned", kyc=True)
+
+        plan = self.plan()
+        self.assertEqual(plan[money.pk], "kyc_withdraw")
+        self.assertEqual(plan[kyc.pk], "kyc_verify")
+        self.assertEqual(plan[fresh.pk], "onboarding_explore")
+        self.assertNotIn(churned.pk, plan)
+
+    def test_lifecycle_nudges_wait_for_the_flag(self):
+        dormant = self.make_state(1, stage="dormant")
+
+        with override_settings(ENGAGEMENT_LIFECYCLE_NUDGES_ENABLED=False):
+            self.assertTrue(self.plan()[dormant.pk].startswith("promo_"))
+        with override_settings(ENGAGEMENT_LIFECYCLE_NUDGES_ENABLED=True):
+            self.assertEqual(self.plan()[dormant.pk], "winback_dormant")
+
+    def test_cooldown_moves_on_to_the_next_nudge(self):
+        user = self.make_state(1, kyc=True, withdrawable_balance="250")
+        self.log(user, "kyc_withdraw", days_ago=3)     # 7-day cooldown
+
+        self.assertEqual(self.plan()[user.pk], "kyc_verify")
+
+        NudgeLog.objects.filter(user=user).update(
+            sent_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(self.plan()[user.pk], "kyc_withdraw")
+
+    def test_one_followup_a_day(self):
+        user = self.make_state(1, kyc=True)
+        self.log(user, "promo_x_1", days_ago=0)
+
+        self.assertNotIn(user.pk, self.plan())
+
+    def test_promo_fallback_skips_recent_promos(self):
+        user = self.make_state(1)
+        self.log(user, "promo_eshop_1", days_ago=2)
+
+        with patch.object(feature_promos, "pick_promo", wraps=feature_promos.pick_promo) as pick:
+            plan = self.plan()
+        self.assertTrue(plan[user.pk].startswith("promo_"))
+        self.assertIn("promo_eshop_1", pick.call_args.kwargs["exclude_keys"])
+
+    def test_dry_run_sends_and_logs_nothing(self):
+        self.make_state(1, kyc=True)
+        self.make_state(2)
+
+        with patch("base.push_notifications.send_push_notifications_bulk") as send:
+            result = run_nudge_engine(dry_run=True)
+        send.assert_not_called()
+        self.assertEqual(result["sent"], 2)
+        self.assertEqual(result["by_nudge"]["kyc_verify"], 1)
+        self.assertFalse(NudgeLog.objects.exists())
+
+    @override_settings(ENGAGEMENT_NUDGES_ENABLED=True, ENGAGEMENT_NUDGE_HOURS=(0, 24))
+    def test_live_run_sends_per_type_and_logs(self):
+        kyc = self.make_state(1, kyc=True)
+        plain = self.make_state(2)
+
+        with patch("engagement.tasks.random.random", return_value=0.0), \
+                patch("base.push_notifications.send_push_notifications_bulk") as send:
+            result = run_nudge_engine()
+        self.assertEqual(result["sent"], 2)
+        self.assertEqual(
+            sorted(c.kwargs["notification_type"] for c in send.call_args_list),
+            ["assistant", "feature"])
+        logged = dict(NudgeLog.objects.values_list("user_id", "nudge_key"))
+        self.assertEqual(logged[kyc.pk], "kyc_verify")
+        self.assertTrue(logged[plain.pk].startswith("promo_"))
+
+        # Second run the same day: nobody is due again.
+        with patch("engagement.tasks.random.random", return_value=0.0), \
+                patch("base.push_notifications.send_push_notifications_bulk"):
+            self.assertEqual(run_nudge_engine()["sent"], 0)
+
+
+class ActivityRollupTests(TestCase):
+    """UserActivityDay is folded from the event log past the watermark,
+    re-derived by rebuild, and aggregate_user_states reads it — in full once
+    a day, for changed or stale users only otherwise."""
+
+    def make_user(self, i):
+        return User.objects.create_user(
+            username="roll%d" % i,
+            email="roll%d@example.com" % i,
+            password="testpass123",
+            phone="0171200%04d" % i,
+        )
+
+    def event(self, user, at, surface="feed", event_type="view"):
+        row = UserEvent.objects.create(user=user, event_type=event_type, surface=surface)
+        UserEvent.objects.filter(pk=row.pk).update(created_at=at)
+        return row
+
+    def events(self, user):
+        return sum(UserActivityDay.objects.filter(user=user).values_list("events", flat=True))
+
+    def noon(self, days_ago):
+        day = rollups._today() - timedelta(days=days_ago)
+        return rollups._day_start(day) + timedelta(hours=12)
+
+    def test_first_use_backfills_the_window(self):
+        user = self.make_user(1)
+        self.event(user, self.noon(rollups.WINDOW_DAYS + 5))
+        self.event(user, self.noon(3))
+        self.event(user, self.noon(3), surface="eshop")
+
+        self.assertEqual(rollups.fold(), 0)
+        row = UserActivityDay.objects.get(user=user)
+        self.assertEqual(row.day, rollups._today() - timedelta(days=3))
+        self.assertEqual(row.events, 2)
+        self.assertEqual(row.surfaces, {"feed": 1, "eshop": 1})
+        self.assertEqual(row.hours, {"12": 2})
+
+    def test_fold_reads_past_the_watermark_and_waits_out_the_lag(self):
+        user = self.make_user(1)
+        rollups.fold()
+        now = timezone.now()
+        settled = self.event(user, now - timedelta(minutes=10))
+        fresh = self.event(user, now - timedelta(seconds=30))
+
+        self.assertEqual(rollups.fold(), 1)
+        self.assertEqual(ActivityWatermark.objects.get(pk=1).last_event_id, settled.pk)
+        self.assertEqual(self.events(user), 1)
+        self.assertEqual(rollups.fold(), 0)
+
+        with patch("django.utils.timezone.now", return_value=now + rollups.FOLD_LAG):
+            self.assertEqual(rollups.fold(), 1)
+        self.assertEqual(ActivityWatermark.objects.get(pk=1).last_event_id, fresh.pk)
+        self.assertEqual(self.events(user), 2)
+
+    def test_rebuild_recovers_what_fold_stepped_over(self):
+        user = self.make_user(1)
+        rollups.fold()
+        skipped = self.event(user, timezone.now() - timedelta(minutes=10))
+        # As if the insert was still committing when fold passed its id.
+        ActivityWatermark.objects.filter(pk=1).update(
+            last_event_id=skipped.pk, states_day=rollups._today())
+        self.assertEqual(rollups.fold(), 0)
+        self.assertEqual(self.events(user), 0)
+
+        self.assertEqual(rollups.refresh(), 1)
+        self.assertEqual(self.events(user), 1)
+        self.assertIsNone(ActivityWatermark.objects.get(pk=1).states_day)
+
+    def test_rebuild_writes_day_by_day_and_keeps_late_ids(self):
+        user = self.make_user(1)
+        rollups.fold()
+        # A low id well ahead of its neighbours: read after day 1 is written.
+        self.event(user, self.noon(1) + timedelta(hours=3))
+        self.event(user, self.noon(2))
+        self.event(user, self.noon(1))
+        self.event(user, self.noon(0) - timedelta(hours=11))
+        ActivityWatermark.objects.filter(pk=1).update(
+            last_event_id=UserEvent.objects.order_by("-id").values_list("id", flat=True)[0])
+
+        rollups.rebuild(rollups._today() - timedelta(days=2))
+        days = dict(UserActivityDay.objects.filter(user=user).values_list("day", "events"))
+        today = rollups._today()
+        self.assertEqual(days, {
+            today: 1,
+            today - timedelta(days=1): 2,
+            today - timedelta(days=2): 1,
+        })
+
+        # Rebuilding again replaces the rows rather than adding to them.
+        rollups.rebuild(today - timedelta(days=2))
+        self.assertEqual(self.events(user), 4)
+
+    def test_full_pass_once_a_day_then_changed_users_only(self):
+        quiet, busy, kyc = self.make_user(1), self.make_user(2), self.make_user(3)
+        for user in (quiet, busy, kyc):
+            self.event(user, timezone.now() - timedelta(minutes=10))
+
+        result = aggregate_user_states()
+        self.assertTrue(result["full"])
+        self.assertEqual(result["processed"], User.objects.count())
+        self.assertEqual(UserState.objects.get(user=busy).events_30d, 1)
+
+        result = aggregate_user_states()
+        self.assertFalse(result["full"])
+        self.assertEqual(result["processed"], 0)
+
+        self.event(busy, timezone.now() - timedelta(minutes=5))
+        User.objects.filter(pk=kyc.pk).update(kyc=True)
+        result = aggregate_user_states()
+        self.assertFalse(result["full"])
+        self.assertEqual(result["folded"], 1)
+        self.assertEqual(result["processed"], 2)
+        self.assertEqual(UserState.objects.get(user=busy).events_30d, 2)
+        self.assertNotIn("kyc", UserState.objects.get(user=kyc).pending)
+
+        # A rebuild asks for the next pass to cover everyone again.
+        rollups.refresh()
+        self.assertTrue(aggregate_user_states()["full"])
+
+    def test_longest_streak_survives_the_rollup(self):
+        veteran, fresh = self.make_user(1), self.make_user(2)
+        UserState.objects.create(user=veteran, longest_streak=10)
+        for days_ago in (0, 1, 2):
+            self.event(fresh, self.noon(days_ago) - timedelta(hours=12))
+        self.event(veteran, timezone.now() - timedelta(minutes=10))
+
+        aggregate_user_states()
+        self.assertEqual(UserState.objects.get(user=veteran).longest_streak, 10)
+        self.assertEqual(UserState.objects.get(user=fresh).longest_streak, 3)
+
+        self.event(veteran, timezone.now() - timedelta(minutes=5))
+        self.assertEqual(aggregate_user_states()["processed"], 1)
+        self.assertEqual(UserState.objects.get(user=veteran).longest_streak, 10)
+
+    def test_stale_on_pending_presence_or_time_alone(self):
+        user = self.make_user(1)
+        now = timezone.now()
+        user.date_joined = now - timedelta(days=60)
+        last_active = now - timedelta(days=1)
+        stored = {
+            "pending": {"kyc": True},
+            "last_active_at": last_active,
+            "active_days_7d": 2,
+            "events_30d": 9,
+            "active_days_streak": 2,
+            "lifecycle_stage": _lifecycle(now, user.date_joined, last_active, 2, 9),
+            "churn_risk": _churn_risk(last_active, now, 2),
+            "value_tier": "explorer",
+        }
+
+        self.assertFalse(_is_stale(stored, user, now, {"kyc": True}, None))
+        self.assertTrue(_is_stale(None, user, now, {"kyc": True}, None))
+        self.assertTrue(_is_stale(stored, user, now, {}, None))
+        self.assertTrue(_is_stale(stored, user, now, {"kyc": True}, now))
+        # No new activity, but a week on the stage has moved to dormant.
+        self.assertTrue(_is_stale(stored, user, now + timedelta(days=7), {"kyc": True}, None))
@@ -62,7 +62,7 @@ class RideTrackingConsumer(AsyncJsonWebsocketConsumer):
                 )
                 return
 
-            location = await self._save_location(content)
+            location = await self._save_location(content, ride)
             await self.send_json(
                 {
                     "type": "ack",
@@ -120,14 +120,13 @@ class RideTrackingConsumer(AsyncJsonWebsocketConsumer):
 
         return await _fetch()
 
-    async def _save_location(self, payload):
+    async def _save_location(self, payload, ride):
+        # `ride` was just loaded (with assigned_driver) by receive_json to
+        # authorise the sender; re-reading it here doubled the per-ping reads.
         from channels.db import database_sync_to_async
 
         @database_sync_to_async
         def _store():
-            ride = Ride.objects.select_related("assigned_driver__user").get(
-                id=self.ride_id
-            )
             return DriverLocationService.update_location(
                 driver_profile=ride.assigned_driver,
                 latitude=payload.get("latitude"),
@@ -0,0 +1,73 @@
+"""Grid-cell spatial index for driver matching.
+
+Every driver with a GPS fix carries the key of the fixed-size lat/lng cell it
+is standing in (``DriverProfile.geo_cell``). A "who is near this point" query
+then only has to read the handful of cells that overlap the search circle,
+instead of loading every online driver in the country and measuring each one.
+
+Cells are ``RIDESHARE_GEO_CELL_DEGREES`` on a side (0.02° ≈ 2.2 km north-south,
+≈ 2 km east-west at Bangladesh latitudes). The exact haversine check still runs
+on whatever the cells return, so the index only decides *which rows are read*,
+never who matches.
+"""
+from math import cos, floor, radians
+
+from django.conf import settings
+
+KM_PER_DEGREE_LAT = 111.32
+DEFAULT_CELL_DEGREES = 0.02
+
+
+def cell_degrees():
+    return float(getattr(settings, "RIDESHARE_GEO_CELL_DEGREES", DEFAULT_CELL_DEGREES))
+
+
+def cell_size_km():
+    return cell_degrees() * KM_PER_DEGREE_LAT
+
+
+def cell_for(latitude, longitude):
+    """Cell key for a point, or "" when the point is missing/unparseable."""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return ""
+    size = cell_degrees()
+    return f"{floor(latitude / size)}:{floor(longitude / size)}"
+
+
+def cells_within(latitude, longitude, radius_km):
+    """Keys of every cell that overlaps the bounding box of the search circle."""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    size = cell_degrees()
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    # Clamp the cosine so a (theoretical) polar query can't divide by ~0.
+    lng_delta = radius_km / (KM_PER_DEGREE_LAT * max(cos(radians(latitude)), 0.01))
+
+    row_lo = floor((latitude - lat_delta) / size)
+    row_hi = floor((latitude + lat_delta) / size)
+    col_lo = floor((longitude - lng_delta) / size)
+    col_hi = floor((longitude + lng_delta) / size)
+    return [
+        f"{row}:{col}"
+        for row in range(row_lo, row_hi + 1)
+        for col in range(col_lo, col_hi + 1)
+    ]
+
+
+def search_rings(radius_km):
+    """Growing radii for a k-nearest search, ending exactly at ``radius_km``.
+
+    Starts at one cell and doubles, so a dense area is answered from the
+    nearest few cells and a sparse one widens only as far as it has to.
+    """
+    radius_km = float(radius_km)
+    ring = cell_size_km()
+    rings = []
+    while ring < radius_km:
+        rings.append(ring)
+        ring *= 2
+    rings.append(radius_km)
+    return rings
@@ -0,0 +1,275 @@
+"""Write-behind buffer for driver location pings.
+
+A driver app pings every few seconds. Writing each ping straight to Postgres
+(a DriverProfile save plus a DriverLocation insert, inside a transaction) made
+the location table the hottest write path in the project, for data that is
+mostly read as "where is this driver *now*".
+
+With ``RIDESHARE_LOCATION_WRITE_BEHIND`` on, a ping only touches the cache:
+
+  * ``rs:pos:<driver>:v`` — the driver's ping count, from an atomic
+    ``cache.incr``. Ping ``v`` writes its position once, under
+    ``rs:pos:<driver>:<v>``, and reads ping ``v - 1``'s for the trail, so
+    two pings in flight for one driver never overwrite each other. Dispatch
+    and ride tracking read the newest from here, so they are never behind
+    the device.
+  * ``rs:log:<seq>``      — an append-only ping log (base.write_behind).
+
+A ping is four cache round trips: the two counters, the previous position
+and one ``set_many``. The ingest counters are kept by the flush.
+
+``flush()`` (the ``flush_driver_locations`` task, every few seconds) drains the
+log: one ``bulk_update`` of DriverProfile for every driver that moved, and one
+``bulk_create`` of the pings worth keeping as breadcrumbs. A ping is kept only
+when the driver moved ``RIDESHARE_LOCATION_TRAIL_MIN_METERS`` or
+``RIDESHARE_LOCATION_TRAIL_MIN_SECONDS`` passed since the last kept one, or the
+ride changed; the rest are coalesced into the latest position.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from base.cache_counters import incr
+from base.write_behind import WriteBehindLog
+
+from . import geo_index
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "rs:pos:%s:v"
+POSITION_KEY = "rs:pos:%s:%d"
+STAT_KEY = "rs:locstat:%s"
+
+STAT_NAMES = ("ingested", "coalesced", "flushed", "profiles_synced")
+
+# Outlives a driver's stale window and many missed flushes comfortably.
+BUFFER_TTL = 60 * 60
+FLUSH_BATCH = 1000
+FLUSH_LOCK_SECONDS = 60
+
+_log = WriteBehindLog("rs:log", BUFFER_TTL, FLUSH_BATCH, FLUSH_LOCK_SECONDS)
+
+
+def enabled():
+    return bool(getattr(settings, "RIDESHARE_LOCATION_WRITE_BEHIND", False))
+
+
+def _trail_min_meters():
+    return float(getattr(settings, "RIDESHARE_LOCATION_TRAIL_MIN_METERS", 20))
+
+
+def _trail_min_seconds():
+    return float(getattr(settings, "RIDESHARE_LOCATION_TRAIL_MIN_SECONDS", 15))
+
+
+def _bump(name, amount=1):
+    incr(STAT_KEY % name, amount)
+
+
+def stats():
+    """Ingest counters plus the current log backlog."""
+    keys = [STAT_KEY % name for name in STAT_NAMES]
+    values = cache.get_many(keys + [_log.seq_key, _log.watermark_key])
+    result = {name: values.get(STAT_KEY % name, 0) for name in STAT_NAMES}
+    result["backlog"] = _log.depth(values)
+    return result
+
+
+def _as_decimal(value):
+    if value is None or value == "":
+        return None
+    return Decimal(str(value))
+
+
+def _to_location(driver_id, entry):
+    from .models import DriverLocation
+
+    return DriverLocation(
+        id=uuid.UUID(entry["id"]),
+        driver_id=driver_id,
+        ride_id=entry.get("ride_id"),
+        latitude=_as_decimal(entry["lat"]),
+        longitude=_as_decimal(entry["lng"]),
+        heading=_as_decimal(entry.get("heading")),
+        speed_kph=_as_decimal(entry.get("speed_kph")),
+        accuracy_meters=_as_decimal(entry.get("accuracy_meters")),
+        recorded_at=datetime.fromtimestamp(entry["at"], tz=dt_timezone.utc),
+    )
+
+
+def _should_keep(previous, entry):
+    if not previous or previous.get("kept_at") is None:
+        return True
+    if previous.get("ride_id") != entry.get("ride_id"):
+        return True
+    if entry["at"] - previous["kept_at"] >= _trail_min_seconds():
+        return True
+
+    from .services import RoutingService
+
+    moved_km = RoutingService._haversine_distance_km(
+        float(previous["kept_lat"]),
+        float(previous["kept_lng"]),
+        float(entry["lat"]),
+        float(entry["lng"]),
+    )
+    return moved_km * 1000 >= _trail_min_meters()
+
+
+def ingest(driver_profile, latitude, longitude, ride=None, heading=None,
+           speed_kph=None, accuracy_meters=None):
+    """Record a ping in the cache and return it as an unsaved DriverLocation."""
+    now = timezone.now()
+    entry = {
+        "id": str(uuid.uuid4()),
+        "driver_id": driver_profile.pk,
+        "ride_id": str(ride.pk) if ride else None,
+        "lat": str(latitude),
+        "lng": str(longitude),
+        "heading": None if heading is None else str(heading),
+        "speed_kph": None if speed_kph is None else str(speed_kph),
+        "accuracy_meters": None if accuracy_meters is None else str(accuracy_meters),
+        "at": now.timestamp(),
+    }
+
+    version = incr(VERSION_KEY % driver_profile.pk)
+    previous = cache.get(POSITION_KEY % (driver_profile.pk, version - 1))
+    keep = _should_keep(previous, entry)
+    entry["keep"] = keep
+
+    position = dict(entry)
+    if keep:
+        position.update(kept_lat=entry["lat"], kept_lng=entry["lng"], kept_at=entry["at"])
+    else:
+        position.update(
+            kept_lat=previous["kept_lat"],
+            kept_lng=previous["kept_lng"],
+            kept_at=previous["kept_at"],
+        )
+
+    _log.append(entry, also={POSITION_KEY % (driver_profile.pk, version): position})
+
+    location = _to_location(driver_profile.pk, entry)
+    location.driver = driver_profile
+    location.ride = ride
+    return location
+
+
+def latest_positions(driver_ids):
+    """Map driver id → latest buffered position dict, for the ids that have one.
+
+    A ping that has taken its version but not written its position yet is
+    passed over for the one before it.
+    """
+    if not driver_ids:
+        return {}
+    versions = cache.get_many([VERSION_KEY % driver_id for driver_id in driver_ids])
+    wanted = {}
+    for driver_id in driver_ids:
+        version = versions.get(VERSION_KEY % driver_id)
+        if version:
+            wanted[driver_id] = [POSITION_KEY % (driver_id, v) for v in (version, version - 1)]
+    found = cache.get_many([key for keys in wanted.values() for key in keys])
+    positions = {}
+    for driver_id, keys in wanted.items():
+        position = found.get(keys[0]) or found.get(keys[1])
+        if position:
+            positions[driver_id] = position
+    return positions
+
+
+def apply_latest_positions(drivers):
+    """Overlay buffered positions onto DriverProfile instances in place.
+
+    Dispatch loads candidates from Postgres (whose position may be a flush
+    behind) and measures distance from whatever this leaves on the instance.
+    """
+    if not enabled() or not drivers:
+        return drivers
+    try:
+        positions = latest_positions([driver.pk for driver in drivers])
+    except Exception:
+        logger.exception("location buffer: position overlay failed")
+        return drivers
+    for driver in drivers:
+        position = positions.get(driver.pk)
+        if not position:
+            continue
+        recorded_at = datetime.fromtimestamp(position["at"], tz=dt_timezone.utc)
+        if driver.last_location_at and driver.last_location_at >= recorded_at:
+            continue
+        driver.current_latitude = _as_decimal(position["lat"])
+        driver.current_longitude = _as_decimal(position["lng"])
+        driver.last_location_at = recorded_at
+    return drivers
+
+
+def latest_ride_location(ride):
+    """The newest buffered ping for ``ride`` as an unsaved DriverLocation, or None."""
+    if not enabled() or not ride.assigned_driver_id:
+        return None
+    position = latest_positions([ride.assigned_driver_id]).get(ride.assigned_driver_id)
+    if not position or position.get("ride_id") != str(ride.pk):
+        return None
+    return _to_location(ride.assigned_driver_id, position)
+
+
+def flush(max_entries=None):
+    """Drain the ping log into Postgres. Returns the number of log entries read."""
+    from .models import DriverLocation, DriverProfile
+
+    return _log.flush(
+        lambda entries: _write_entries(entries, DriverLocation, DriverProfile),
+        max_entries,
+    )
+
+
+def _write_entries(entries, DriverLocation, DriverProfile):
+    if not entries:
+        return
+
+    breadcrumbs = [
+        _to_location(entry["driver_id"], entry) for entry in entries if entry.get("keep")
+    ]
+    _bump("ingested", len(entries))
+    if len(breadcrumbs) < len(entries):
+        _bump("coalesced", len(entries) - len(breadcrumbs))
+    if breadcrumbs:
+        DriverLocation.objects.bulk_create(breadcrumbs, batch_size=500, ignore_conflicts=True)
+        _bump("flushed", len(breadcrumbs))
+
+    latest = {}
+    for entry in entries:
+        current = latest.get(entry["driver_id"])
+        if current is None or entry["at"] >= current["at"]:
+            latest[entry["driver_id"]] = entry
+
+    profiles = list(
+        DriverProfile.objects.filter(pk__in=list(latest)).only(
+            "id", "current_latitude", "current_longitude", "geo_cell",
+            "last_location_at", "last_seen_at", "updated_at",
+        )
+    )
+    now = timezone.now()
+    for profile in profiles:
+        entry = latest[profile.pk]
+        recorded_at = datetime.fromtimestamp(entry["at"], tz=dt_timezone.utc)
+        profile.current_latitude = _as_decimal(entry["lat"])
+        profile.current_longitude = _as_decimal(entry["lng"])
+        profile.geo_cell = geo_index.cell_for(entry["lat"], entry["lng"])
+        profile.last_location_at = recorded_at
+        if profile.last_seen_at is None or profile.last_seen_at < recorded_at:
+            profile.last_seen_at = recorded_at
+        profile.updated_at = now
+    DriverProfile.objects.bulk_update(
+        profiles,
+        ["current_latitude", "current_longitude", "geo_cell",
+         "last_location_at", "last_seen_at", "updated_at"],
+        batch_size=500,
+    )
+    _bump("profiles_synced", len(profiles))
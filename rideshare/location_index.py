@@ -0,0 +1,233 @@
+"""Process-local index over active SearchableLocations (admin and custom).
+
+Every reverse geocode loaded every active SearchableLocation and measured the
+distance to each one, and every place search ran an OR of ``icontains``
+filters — name, subtitle and keywords, for each query variant — that no
+B-tree index can serve. Both are answered here from memory instead:
+
+  * nearest — a grid of ``CELL_DEGREES`` cells (0.01° ≈ 1.1 km); a lookup
+    measures only the locations in the cells overlapping its search box.
+  * text — a trigram index over "name / subtitle / keywords", lower-cased.
+    A variant is looked up through its rarest trigram, and each candidate is
+    confirmed with a real substring test, so matches are exactly what
+    ``icontains`` matched. Variants under three characters have no trigram
+    and scan in order, stopping at ``limit``.
+
+Entries keep the database's (name, subtitle) order, so "the first N matches"
+and the nearest-tie winner are the rows the old queries returned.
+
+Staleness: a SearchableLocation save or delete drops this process's index at
+once and, after commit, bumps a generation number in the shared cache. Other
+processes check that number every ``RIDESHARE_LOCATION_INDEX_CHECK_SECONDS``
+(and rebuild after ``RIDESHARE_LOCATION_INDEX_MAX_AGE_SECONDS`` regardless,
+for queryset ``update()``s that send no signal).
+"""
+import logging
+import threading
+import time
+from array import array
+from math import cos, floor, radians
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from base.cache_counters import incr
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "rs:locidx:gen"
+CELL_DEGREES = 0.01
+KM_PER_DEGREE_LAT = 111.32
+GRAM = 3
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def enabled():
+    return bool(getattr(settings, "RIDESHARE_LOCATION_INDEX", True))
+
+
+def _check_seconds():
+    return float(getattr(settings, "RIDESHARE_LOCATION_INDEX_CHECK_SECONDS", 5))
+
+
+def _max_age_seconds():
+    return float(getattr(settings, "RIDESHARE_LOCATION_INDEX_MAX_AGE_SECONDS", 600))
+
+
+def _normalize(value):
+    return str(value or "").lower()
+
+
+def _cell(latitude, longitude):
+    return floor(latitude / CELL_DEGREES), floor(longitude / CELL_DEGREES)
+
+
+class IndexedLocation:
+    """The SearchableLocation fields search and reverse geocode read."""
+
+    __slots__ = ("pk", "name", "subtitle", "search_keywords", "latitude",
+                 "longitude", "priority")
+
+    def __init__(self, pk, name, subtitle, search_keywords, latitude, longitude, priority):
+        self.pk = pk
+        self.name = name
+        self.subtitle = subtitle
+        self.search_keywords = search_keywords
+        self.latitude = latitude
+        self.longitude = longitude
+        self.priority = priority
+
+
+class LocationIndex:
+    def __init__(self, locations, generation=None):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.locations = list(locations)
+        self._texts = []
+        self._cells = {}
+        self._grams = {}
+        for i, location in enumerate(self.locations):
+            text = "\n".join(
+                _normalize(part)
+                for part in (location.name, location.subtitle, location.search_keywords)
+            )
+            self._texts.append(text)
+            for gram in {text[j:j + GRAM] for j in range(len(text) - GRAM + 1)}:
+                posting = self._grams.get(gram)
+                if posting is None:
+                    posting = self._grams[gram] = array("i")
+                posting.append(i)
+            if location.latitude is not None and location.longitude is not None:
+                self._cells.setdefault(
+                    _cell(location.latitude, location.longitude), []
+                ).append(i)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def nearest(self, latitude, longitude, max_km):
+        """The closest location within ``max_km``, or None."""
+        from .services import RoutingService
+
+        lat_delta = max_km / KM_PER_DEGREE_LAT
+        lng_delta = max_km / (KM_PER_DEGREE_LAT * max(cos(radians(latitude)), 0.01))
+        row_lo, col_lo = _cell(latitude - lat_delta, longitude - lng_delta)
+        row_hi, col_hi = _cell(latitude + lat_delta, longitude + lng_delta)
+        candidates = []
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                candidates.extend(self._cells.get((row, col), ()))
+
+        best, best_km = None, None
+        for i in sorted(candidates):
+            location = self.locations[i]
+            distance_km = RoutingService._haversine_distance_km(
+                latitude, longitude, location.latitude, location.longitude,
+            )
+            if best_km is None or distance_km < best_km:
+                best, best_km = location, distance_km
+        if best is None or best_km > max_km:
+            return None
+        return best
+
+    def _matches(self, variant, limit):
+        needle = _normalize(variant)
+        if len(needle) < GRAM:
+            positions = range(len(self._texts))
+        else:
+            postings = []
+            for j in range(len(needle) - GRAM + 1):
+                posting = self._grams.get(needle[j:j + GRAM])
+                if posting is None:
+                    return []
+                postings.append(posting)
+            positions = min(postings, key=len)
+        found = []
+        for i in positions:
+            if needle in self._texts[i]:
+                found.append(i)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def search(self, variants, limit):
+        """The first ``limit`` locations (in index order) whose name, subtitle
+        or keywords contain any of ``variants``, case-insensitively."""
+        matched = set()
+        for variant in variants:
+            if variant:
+                matched.update(self._matches(variant, limit))
+        return [self.locations[i] for i in sorted(matched)[:limit]]
+
+
+def build(generation=None):
+    from .models import SearchableLocation
+
+    rows = (
+        SearchableLocation.objects.filter(is_active=True)
+        .order_by("name", "subtitle")
+        .values_list("pk", "name", "subtitle", "search_keywords",
+                     "latitude", "longitude", "priority")
+        .iterator(chunk_size=5000)
+    )
+    return LocationIndex(
+        (
+            IndexedLocation(
+                pk, name, subtitle, keywords,
+                None if lat is None else float(lat),
+                None if lng is None else float(lng),
+                priority,
+            )
+            for pk, name, subtitle, keywords, lat, lng, priority in rows
+        ),
+        generation=generation,
+    )
+
+
+def _shared_generation():
+    try:
+        return cache.get(GENERATION_KEY, 0)
+    except Exception:
+        logger.exception("location index generation check failed")
+        return None
+
+
+def get_index():
+    """This process's index, rebuilt first if it is missing or stale."""
+    global _index, _checked_at
+    now = time.monotonic()
+    index = _index
+    if index is not None and now - _checked_at < _check_seconds():
+        return index
+    with _lock:
+        index = _index
+        now = time.monotonic()
+        generation = _shared_generation()
+        fresh = (
+            index is not None
+            and (generation is None or generation == index.generation)
+            and now - index.built_at < _max_age_seconds()
+        )
+        if not fresh:
+            index = _index = build(generation)
+        _checked_at = now
+        return index
+
+
+def _bump_generation():
+    try:
+        incr(GENERATION_KEY)
+    except Exception:
+        # Other processes catch up at MAX_AGE; the save itself must not fail.
+        logger.exception("location index generation bump failed")
+
+
+def invalidate():
+    """A SearchableLocation changed: drop ours now, everyone's after commit."""
+    global _index
+    _index = None
+    transaction.on_commit(_bump_generation)
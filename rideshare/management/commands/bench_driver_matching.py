@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Benchmark nearby-driver matching against a growing synthetic fleet.
+
+Seeds online, approved drivers (with verified vehicles) at random points
+inside Bangladesh, then times three lookups at each fleet size:
+
+  * full scan — the old approach: load every eligible driver and measure each
+  * grid index — DriverLocationService.get_nearby_drivers
+  * dispatch — NearestDriverDispatch.get_sorted_drivers_for_ride
+
+With the grid index the per-lookup cost follows the number of drivers near the
+pickup, not the size of the fleet, so its latency should stay flat while the
+full scan grows linearly. Everything is rolled back at the end.
+
+    manage.py bench_driver_matching
+    manage.py bench_driver_matching --sizes 10000,25000,50000 --iterations 30
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.benchmarking import format_stats, measure, rolled_back, synthetic_users
+from rideshare import geo_index
+from rideshare.models import DriverProfile, Ride, Vehicle
+from rideshare.services import (
+    BANGLADESH_BOUNDS,
+    DRIVER_STALE_THRESHOLD_MINUTES,
+    DriverLocationService,
+    NearestDriverDispatch,
+    RoutingService,
+)
+
+
+class Command(BaseCommand):
+    help = 'Time nearby-driver lookups at growing fleet sizes (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='10000,25000,50000',
+            help='Comma-separated fleet sizes to measure at (default 10k,25k,50k).',
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--radius-km', type=float, default=5.0)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(',') if s.strip())
+        rng = random.Random(options['seed'])
+        radius_km = options['radius_km']
+
+        with rolled_back():
+            rider = synthetic_users(1, prefix='benchrider')[0]
+            seeded = 0
+            for size in sizes:
+                self._seed_drivers(size - seeded, seeded, rng)
+                seeded = size
+                self._report(size, rider, rng, radius_km, options['iterations'])
+
+        self.stdout.write(self.style.SUCCESS('Done — synthetic fleet rolled back.'))
+
+    def _seed_drivers(self, count, offset, rng):
+        if count <= 0:
+            return
+        users = synthetic_users(count, prefix='benchdriver')
+        now = timezone.now()
+        profiles = []
+        for user in users:
+            lat = rng.uniform(BANGLADESH_BOUNDS['min_lat'], BANGLADESH_BOUNDS['max_lat'])
+            lng = rng.uniform(BANGLADESH_BOUNDS['min_lng'], BANGLADESH_BOUNDS['max_lng'])
+            profiles.append(DriverProfile(
+                user=user,
+                approval_status='approved',
+                is_online=True,
+                is_available=True,
+                current_latitude=Decimal('%.6f' % lat),
+                current_longitude=Decimal('%.6f' % lng),
+                geo_cell=geo_index.cell_for(lat, lng),
+                last_location_at=now,
+                last_seen_at=now,
+            ))
+        profiles = DriverProfile.objects.bulk_create(profiles, batch_size=2000)
+        Vehicle.objects.bulk_create(
+            [
+                Vehicle(
+                    driver=profile,
+                    vehicle_type=rng.choice(['bike', 'car', 'cng']),
+                    registration_number='BENCH-%d' % (offset + i),
+                    is_active=True,
+                    is_default=True,
+                    is_verified=True,
+                )
+                for i, profile in enumerate(profiles)
+            ],
+            batch_size=2000,
+        )
+
+    def _report(self, size, rider, rng, radius_km, iterations):
+        # Pickups land in a few fixed urban spots so every size is measured
+        # against the same points.
+        pickups = [(23.7806, 90.4070), (22.3569, 91.7832), (24.8949, 91.8687)]
+
+        def pickup():
+            lat, lng = rng.choice(pickups)
+            return lat + rng.uniform(-0.02, 0.02), lng + rng.uniform(-0.02, 0.02)
+
+        def full_scan():
+            lat, lng = pickup()
+            stale = timezone.now() - timedelta(minutes=DRIVER_STALE_THRESHOLD_MINUTES)
+            drivers = DriverProfile.objects.filter(
+                approval_status='approved', is_online=True, is_available=True,
+                last_seen_at__gte=stale,
+                vehicles__is_active=True, vehicles__is_verified=True,
+                vehicles__vehicle_type='bike',
+            ).distinct()
+            found = []
+            for driver in drivers:
+                distance = RoutingService._haversine_distance_km(
+                    lat, lng, float(driver.current_latitude), float(driver.current_longitude))
+                if distance <= radius_km:
+                    found.append((distance, driver))
+            found.sort(key=lambda pair: pair[0])
+            return found[:10]
+
+        def grid_index():
+            lat, lng = pickup()
+            return DriverLocationService.get_nearby_drivers(
+                lat, lng, radius_km=radius_km, vehicle_type='bike', limit=10)
+
+        def dispatch():
+            lat, lng = pickup()
+            ride = Ride(
+                rider=rider,
+                requested_vehicle_type='bike',
+                pickup_latitude=Decimal('%.6f' % lat),
+                pickup_longitude=Decimal('%.6f' % lng),
+                distance_km=Decimal('5.00'),
+            )
+            return NearestDriverDispatch.get_sorted_drivers_for_ride(ride)
+
+        self.stdout.write('')
+        self.stdout.write('fleet size %d' % size)
+        self.stdout.write('  full scan ... %s' % format_stats(measure(full_scan, iterations)))
+        self.stdout.write('  grid index .. %s' % format_stats(measure(grid_index, iterations)))
+        self.stdout.write('  dispatch .... %s' % format_stats(measure(dispatch, iterations)))
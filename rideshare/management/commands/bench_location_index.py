@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Benchmark SearchableLocation lookups: in-memory index vs the old queries.
+
+Seeds synthetic SearchableLocations (admin-style names with a subtitle and a
+few keywords) at random points inside Bangladesh, then times:
+
+  * build — rideshare.location_index.build over every active row
+  * nearest, full scan (old) — load every active row, measure each one
+  * nearest, index — LocationIndex.nearest within 250 m
+  * search, icontains (old) — the OR of name/subtitle/keywords icontains
+  * search, index — LocationIndex.search for the same query variants
+
+The index lookups should stay well under a millisecond however many rows
+there are. Everything is rolled back at the end.
+
+    manage.py bench_location_index
+    manage.py bench_location_index --count 100000 --iterations 50
+"""
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from base.benchmarking import format_stats, measure, rolled_back
+from rideshare import location_index
+from rideshare.models import SearchableLocation
+from rideshare.services import BANGLADESH_BOUNDS, LocationService, RoutingService
+
+AREAS = ['Dhanmondi', 'Gulshan', 'Mirpur', 'Uttara', 'Banani', 'Motijheel',
+         'Mohakhali', 'Farmgate', 'Bashundhara', 'Badda', 'Agrabad', 'Zindabazar']
+KINDS = ['Bus Stand', 'Market', 'School', 'Hospital', 'Mosque', 'Chowrasta',
+         'Road', 'Bazar', 'College', 'Park']
+QUERIES = ['dhanmondi', 'gulshan 2', 'mirpur 10', 'uttara sector', 'bus stand',
+           'hospital', 'agrabad', 'bazar 17', 'farmgate', 'xyz']
+
+
+class Command(BaseCommand):
+    help = 'Time SearchableLocation search / nearest, index vs queries (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000,
+                            help='Synthetic locations to seed (default 100k).')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        iterations = options['iterations']
+
+        with rolled_back():
+            self._seed(options['count'], rng)
+            self._report(options['count'], rng, iterations)
+
+        location_index.invalidate()
+        self.stdout.write(self.style.SUCCESS('Done — synthetic locations rolled back.'))
+
+    def _seed(self, count, rng):
+        locations = []
+        for i in range(count):
+            area = rng.choice(AREAS)
+            lat = rng.uniform(BANGLADESH_BOUNDS['min_lat'], BANGLADESH_BOUNDS['max_lat'])
+            lng = rng.uniform(BANGLADESH_BOUNDS['min_lng'], BANGLADESH_BOUNDS['max_lng'])
+            locations.append(SearchableLocation(
+                name='%s %s %d' % (area, rng.choice(KINDS), i),
+                subtitle='%s, Sector %d' % (area, rng.randint(1, 20)),
+                search_keywords='%s, %s' % (area.lower(), rng.choice(KINDS).lower()),
+                latitude=Decimal('%.6f' % lat),
+                longitude=Decimal('%.6f' % lng),
+            ))
+        SearchableLocation.objects.bulk_create(locations, batch_size=5000)
+
+    def _report(self, count, rng, iterations):
+        def point():
+            lat = rng.uniform(BANGLADESH_BOUNDS['min_lat'], BANGLADESH_BOUNDS['max_lat'])
+            lng = rng.uniform(BANGLADESH_BOUNDS['min_lng'], BANGLADESH_BOUNDS['max_lng'])
+            return lat, lng
+
+        def variants():
+            return LocationService._build_query_variants(rng.choice(QUERIES))
+
+        def full_scan():
+            lat, lng = point()
+            best, best_km = None, None
+            for location in SearchableLocation.objects.filter(is_active=True).only(
+                    'name', 'subtitle', 'latitude', 'longitude', 'priority'):
+                distance_km = RoutingService._haversine_distance_km(
+                    lat, lng, float(location.latitude), float(location.longitude))
+                if best_km is None or distance_km < best_km:
+                    best, best_km = location, distance_km
+            return best if best_km is not None and best_km <= 0.25 else None
+
+        def icontains():
+            filters = Q()
+            for variant in variants():
+                filters |= Q(name__icontains=variant)
+                filters |= Q(subtitle__icontains=variant)
+                filters |= Q(search_keywords__icontains=variant)
+            return list(
+                SearchableLocation.objects.filter(is_active=True)
+                .filter(filters).order_by('name', 'subtitle')[:40])
+
+        self.stdout.write('')
+        self.stdout.write('%d locations' % count)
+        self.stdout.write('  build ................. %s' % format_stats(
+            measure(location_index.build, max(1, iterations // 10))))
+        index = location_index.build()
+
+        self.stdout.write('  nearest, full scan .... %s' % format_stats(
+            measure(full_scan, max(1, iterations // 10))))
+        self.stdout.write('  nearest, index ........ %s' % format_stats(
+            measure(lambda: index.nearest(*point(), 0.25), iterations * 50)))
+        self.stdout.write('  search, icontains ..... %s' % format_stats(
+            measure(icontains, iterations)))
+        self.stdout.write('  search, index ......... %s' % format_stats(
+            measure(lambda: index.search(variants(), 40), iterations * 50)))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""End-to-end place search and reverse geocode latency against stub providers.
+
+Starts local Photon / Nominatim stand-ins on 127.0.0.1 that answer after an
+injected delay (``--latency`` ms, ``--slow-latency`` for Nominatim, which is
+the one that lags in production), points the rideshare settings at them and
+times:
+
+  * search, serial (old) — every provider x query variant one after another
+  * search, concurrent, cold — rideshare.place_lookup with the cache off
+  * search, concurrent, warm — the same queries again with the cache on
+  * reverse geocode, cold and warm
+
+Google is switched off for the run (its URLs blanked), so nothing leaves the
+machine. Reports p50/p95/p99 per scenario; nothing is written to the database.
+
+    manage.py bench_place_search
+    manage.py bench_place_search --latency 150 --slow-latency 2500 --iterations 30
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from base.benchmarking import measure
+from rideshare import place_lookup
+from rideshare.services import LocationService
+
+QUERIES = ['dhanmondi', 'gulshan 2', 'mirpur 10', 'uttara sector 7', 'banani',
+           'motijheel', 'mohakhali', 'farmgate', 'bashundhara', 'badda']
+
+
+class _StubProviderHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path.startswith('/photon'):
+            time.sleep(self.server.latency)
+            body = {'features': [{
+                'geometry': {'coordinates': [90.40 + i / 100, 23.75 + i / 100]},
+                'properties': {'name': '%s %d' % (params.get('q', ''), i),
+                               'city': 'Dhaka', 'country': 'Bangladesh'},
+            } for i in range(5)]}
+        elif url.path.endswith('/reverse'):
+            time.sleep(self.server.slow_latency)
+            body = {'display_name': 'Road 1, Dhaka, Bangladesh',
+                    'lat': params.get('lat'), 'lon': params.get('lon'),
+                    'address': {'road': 'Road 1', 'city': 'Dhaka',
+                                'country': 'Bangladesh', 'country_code': 'bd'}}
+        else:
+            time.sleep(self.server.slow_latency)
+            body = [{'display_name': '%s, Dhaka, Bangladesh' % params.get('q', ''),
+                     'lat': '23.78', 'lon': '90.41',
+                     'address': {'city': 'Dhaka', 'country': 'Bangladesh',
+                                 'country_code': 'bd'}}]
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Place search / reverse geocode latency, serial vs concurrent + cached, on stub providers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=int, default=120,
+                            help='Photon delay per call, ms (default 120).')
+        parser.add_argument('--slow-latency', type=int, default=400,
+                            help='Nominatim delay per call, ms (default 400).')
+        parser.add_argument('--deadline', type=float, default=3.0,
+                            help='Lookup deadline, seconds (default 3.0).')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _StubProviderHandler)
+        server.daemon_threads = True
+        server.latency = options['latency'] / 1000
+        server.slow_latency = options['slow_latency'] / 1000
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = 'http://127.0.0.1:%d' % server.server_address[1]
+        rng = random.Random(options['seed'])
+        iterations = options['iterations']
+
+        stub = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'bench-place-search',
+            }},
+            RIDESHARE_LOCATION_PROVIDER='photon',
+            RIDESHARE_PHOTON_URL=base + '/photon',
+            RIDESHARE_NOMINATIM_URL=base + '/nominatim',
+            RIDESHARE_LOCATION_HTTP_TIMEOUT_SECONDS=10.0,
+            RIDESHARE_GOOGLE_PLACES_AUTOCOMPLETE_URL='',
+            RIDESHARE_GOOGLE_PLACES_TEXTSEARCH_URL='',
+            RIDESHARE_GOOGLE_PLACE_DETAILS_URL='',
+            RIDESHARE_GOOGLE_GEOCODE_URL='',
+            RIDESHARE_LOCATION_LOOKUP_DEADLINE_SECONDS=options['deadline'],
+        )
+        try:
+            with stub:
+                self._report(rng, iterations)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(self.style.SUCCESS('Done — stub providers stopped.'))
+
+    def _report(self, rng, iterations):
+        def point():
+            return 23.70 + rng.uniform(0, 0.1), 90.35 + rng.uniform(0, 0.1)
+
+        def serial_search():
+            # What _collect_ranked_search_results did before: one call at a time.
+            query = rng.choice(QUERIES)
+            for provider in ('photon', 'nominatim'):
+                search = LocationService._provider_search(provider)
+                for variant in LocationService._build_query_variants(query):
+                    search(variant, limit=10, focus_lat=23.78, focus_lng=90.41)
+
+        def search():
+            return LocationService.search_places(
+                rng.choice(QUERIES), focus_lat=23.78, focus_lng=90.41)
+
+        def reverse():
+            lat, lng = point()
+            return LocationService.reverse_geocode(lat, lng)
+
+        def line(label, stats):
+            self.stdout.write('  %s p50 %.2fms  p95 %.2fms  p99 %.2fms' % (
+                label, stats['p50'], stats['p95'], stats['p99']))
+
+        self.stdout.write('')
+        self.stdout.write('place search (%d query variants per search)'
+                          % len(LocationService._build_query_variants(QUERIES[0])))
+        line('serial (old) ......', measure(serial_search, iterations))
+        with override_settings(RIDESHARE_LOCATION_CACHE=False):
+            line('concurrent, cold ..', measure(search, iterations))
+        cache.clear()
+        for query in QUERIES:
+            LocationService.search_places(query, focus_lat=23.78, focus_lng=90.41)
+        line('concurrent, warm ..', measure(search, iterations))
+
+        self.stdout.write('')
+        self.stdout.write('reverse geocode')
+        with override_settings(RIDESHARE_LOCATION_CACHE=False):
+            line('cold ..............', measure(reverse, iterations))
+        rng.seed(1)
+        for _ in range(iterations):
+            reverse()
+        rng.seed(1)
+        line('warm ..............', measure(reverse, iterations))
+
+        self.stdout.write('')
+        for name, value in place_lookup.stats().items():
+            self.stdout.write('  %s: %s' % (name, value))
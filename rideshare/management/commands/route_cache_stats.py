@@ -0,0 +1,22 @@
+"""Show the route cache hit ratio and per-provider breaker state.
+
+RoutingService.get_route caches routes by snapped endpoints and skips a
+provider whose breaker is open (rideshare.route_cache). ``hit_ratio`` counts
+single-flight waits as hits; ``avg_ms`` is the mean provider call latency,
+timeouts included, and ``open`` whether the provider is being skipped now.
+
+    python manage.py route_cache_stats
+"""
+from django.core.management.base import BaseCommand
+
+from rideshare import route_cache
+
+
+class Command(BaseCommand):
+    help = "Report route cache hit ratio and routing provider latency/breaker state."
+
+    def handle(self, *args, **opts):
+        for name, value in route_cache.stats().items():
+            if isinstance(value, dict):
+                value = " ".join(f"{k}={v}" for k, v in value.items())
+            self.stdout.write(f"  {name}: {value}")
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+from rideshare.geo_index import cell_for
+
+
+def backfill_geo_cells(apps, schema_editor):
+    """Index every driver that already has a GPS fix, so nearby-driver
+    lookups find them before their next ping arrives."""
+    DriverProfile = apps.get_model("rideshare", "DriverProfile")
+    batch = []
+    drivers = DriverProfile.objects.filter(
+        current_latitude__isnull=False,
+        current_longitude__isnull=False,
+    ).only("id", "current_latitude", "current_longitude")
+    for driver in drivers.iterator(chunk_size=2000):
+        driver.geo_cell = cell_for(driver.current_latitude, driver.current_longitude)
+        batch.append(driver)
+        if len(batch) >= 2000:
+            DriverProfile.objects.bulk_update(batch, ["geo_cell"])
+            batch = []
+    if batch:
+        DriverProfile.objects.bulk_update(batch, ["geo_cell"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rideshare", "0018_vehicle_is_verified"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="driverprofile",
+            name="geo_cell",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Spatial grid cell of the current position (see rideshare.geo_index). Empty when the driver has no GPS fix.",
+                max_length=24,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="driverprofile",
+            index=models.Index(
+                fields=["geo_cell", "is_online", "is_available"],
+                name="rs_driver_geocell_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rideshare", "0019_driverprofile_geo_cell"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="driverlocation",
+            name="recorded_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
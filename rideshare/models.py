@@ -56,6 +56,13 @@ class DriverProfile(models.Model):
         max_digits=9, decimal_places=6, null=True, blank=True
     )
     last_location_at = models.DateTimeField(null=True, blank=True)
+    geo_cell = models.CharField(
+        max_length=24,
+        blank=True,
+        default="",
+        help_text="Spatial grid cell of the current position (see rideshare.geo_index). "
+                  "Empty when the driver has no GPS fix.",
+    )
     last_seen_at = models.DateTimeField(
         null=True,
         blank=True,
@@ -81,6 +88,12 @@ class DriverProfile(models.Model):
             ),
             models.Index(fields=["is_online", "is_available"], name="rs_driver_online_idx"),
             models.Index(fields=["-last_seen_at"], name="rs_driver_lastseen_idx"),
+            # Nearby-driver lookups read a few grid cells instead of every
+            # online driver (rideshare.geo_index).
+            models.Index(
+                fields=["geo_cell", "is_online", "is_available"],
+                name="rs_driver_geocell_idx",
+            ),
         ]
 
     def __str__(self):
@@ -623,7 +636,9 @@ class DriverLocation(models.Model):
     accuracy_meters = models.DecimalField(
         max_digits=10, decimal_places=2, null=True, blank=True
     )
-    recorded_at = models.DateTimeField(auto_now_add=True)
+    # default rather than auto_now_add: buffered pings are bulk-created after
+    # the fact and must keep the time the device actually sent them.
+    recorded_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-recorded_at"]
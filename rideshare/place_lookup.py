@@ -0,0 +1,251 @@
+"""Concurrent, cached provider lookups behind place search and reverse geocode.
+
+``LocationService.search_places`` asked Photon, Nominatim and then Google
+for every query variant (the query, its alias expansion, its Bangla/English
+translations, each again with ", Bangladesh") one HTTP call after another —
+a dozen serial round trips for one autocomplete keystroke, and the same
+calls again for the next rider typing the same area name.
+
+  * ``fan_out`` runs a set of provider calls at once on a shared thread pool
+    and returns whatever finished inside one overall deadline
+    (``RIDESHARE_LOCATION_LOOKUP_DEADLINE_SECONDS``). A slow provider costs
+    its own results, not the whole search. Calls not started by then are
+    cancelled, and at most ``RIDESHARE_LOCATION_LOOKUP_MAX_BACKLOG`` calls are
+    queued or running at once: past that a search skips its uncached calls
+    ("shed") rather than queueing behind a provider that has stopped
+    answering.
+  * ``first_of`` (reverse geocode) asks providers in preference order and
+    only moves on to the next when one fails, has nothing, or runs past the
+    deadline — the fallback is not asked while the preferred one answers.
+  * ``paced`` holds a provider to N calls a second across every process
+    (Nominatim's usage policy is 1/s): a call with no free slot returns
+    empty at once instead of being sent.
+  * Each call's result is cached under ``rs:place:<hash>`` — provider, the
+    normalised query text and the focus point snapped to a coarse
+    ``RIDESHARE_LOCATION_FOCUS_CELL_DEGREES`` cell (0.05° ≈ 5 km) — for
+    ``RIDESHARE_LOCATION_CACHE_SECONDS``. Reverse geocodes are keyed by the
+    point snapped to ``RIDESHARE_REVERSE_GEOCODE_SNAP_DEGREES``.
+
+Pool threads never touch the database: the callers read the Google key and
+settings on the request thread and pass them in, and each call closes any
+connection its thread did open.
+
+Empty answers are not cached: the provider helpers return [] / None for an
+error as well as for "nothing found", and an outage must not stick. Ranking
+still runs per request, against the caller's exact focus point.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from base.cache_counters import incr
+
+logger = logging.getLogger(__name__)
+
+PLACE_KEY = "rs:place:%s"
+STAT_KEY = "rs:placestat:%s"
+PACE_KEY = "rs:place:pace:%s:%d"
+STAT_NAMES = ("hits", "misses", "timeouts", "shed", "paced")
+
+_pool = None
+_pool_lock = threading.Lock()
+_backlog = 0
+_backlog_lock = threading.Lock()
+
+
+def enabled():
+    return bool(getattr(settings, "RIDESHARE_LOCATION_CACHE", True))
+
+
+def _deadline():
+    return float(getattr(settings, "RIDESHARE_LOCATION_LOOKUP_DEADLINE_SECONDS", 3.0))
+
+
+def _ttl():
+    return int(getattr(settings, "RIDESHARE_LOCATION_CACHE_SECONDS", 43200))
+
+
+def _focus_cell_degrees():
+    return float(getattr(settings, "RIDESHARE_LOCATION_FOCUS_CELL_DEGREES", 0.05))
+
+
+def _reverse_snap_degrees():
+    return float(getattr(settings, "RIDESHARE_REVERSE_GEOCODE_SNAP_DEGREES", 0.0003))
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=int(getattr(settings, "RIDESHARE_LOCATION_LOOKUP_WORKERS", 16)),
+                    thread_name_prefix="place-lookup",
+                )
+    return _pool
+
+
+def _max_backlog():
+    return int(getattr(settings, "RIDESHARE_LOCATION_LOOKUP_MAX_BACKLOG", 64))
+
+
+def _submit(cache_key, fn):
+    """Queue one provider call, or None when MAX_BACKLOG calls already are."""
+    global _backlog
+    with _backlog_lock:
+        if _backlog >= _max_backlog():
+            return None
+        _backlog += 1
+    future = _executor().submit(_run_and_cache, cache_key, fn)
+    future.add_done_callback(_release)   # also runs when cancelled
+    return future
+
+
+def _release(_future):
+    global _backlog
+    with _backlog_lock:
+        _backlog -= 1
+
+
+def _bump(name, amount=1):
+    incr(STAT_KEY % name, amount)
+
+
+def _snap(value, step):
+    return round(float(value) / step)
+
+
+def search_key(provider, text, limit, focus_lat, focus_lng, has_focus):
+    """Cache key for one provider search; ``text`` is already normalised."""
+    if has_focus:
+        step = _focus_cell_degrees()
+        focus = "%d,%d" % (_snap(focus_lat, step), _snap(focus_lng, step))
+    else:
+        focus = "-"
+    raw = "s|%s|%s|%d|%s" % (provider, text, limit, focus)
+    return PLACE_KEY % hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def reverse_key(provider, lat, lng):
+    step = _reverse_snap_degrees()
+    return PLACE_KEY % ("r:%s:%d,%d" % (provider, _snap(lat, step), _snap(lng, step)))
+
+
+def fan_out(calls, deadline=None):
+    """Run ``{key: (cache_key, fn)}`` concurrently; ``{key: result}`` back.
+
+    Cached results are used as they are. Calls still running at the deadline
+    are left out of the answer (their result is cached once they finish, for
+    the next caller) and calls not started yet are cancelled — so the answer
+    may be partial, never late.
+    """
+    results = {}
+    pending = {}
+    use_cache = enabled()
+    cached = cache.get_many([ck for ck, _fn in calls.values()]) if use_cache else {}
+    for key, (cache_key, fn) in calls.items():
+        if cache_key in cached:
+            results[key] = cached[cache_key]
+            _bump("hits")
+        else:
+            pending[key] = (cache_key, fn)
+    if not pending:
+        return results
+
+    _bump("misses", len(pending))
+    futures = {}
+    for key, (cache_key, fn) in pending.items():
+        future = _submit(cache_key if use_cache else None, fn)
+        if future is None:
+            _bump("shed")
+        else:
+            futures[future] = key
+    if not futures:
+        return results
+    done, not_done = wait(futures, timeout=_deadline() if deadline is None else deadline)
+    for future in not_done:
+        future.cancel()
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception:
+            logger.exception("place lookup %s failed", futures[future])
+    if not_done:
+        _bump("timeouts", len(not_done))
+    return results
+
+
+def first_of(calls, order, accept, deadline=None):
+    """The first result, in ``order``, that ``accept`` takes.
+
+    One call at a time: the next key is only asked once the one before it
+    failed, was not accepted, or ran past ``deadline`` (each call gets its
+    own). A call past its deadline is left to finish and cache its answer
+    for the next caller, or cancelled if it has not started.
+    """
+    use_cache = enabled()
+    cached = cache.get_many([calls[key][0] for key in order]) if use_cache else {}
+    for key in order:
+        cache_key, fn = calls[key]
+        if cache_key in cached:
+            _bump("hits")
+            value = cached[cache_key]
+        else:
+            _bump("misses")
+            future = _submit(cache_key if use_cache else None, fn)
+            if future is None:
+                _bump("shed")
+                continue
+            try:
+                value = future.result(timeout=_deadline() if deadline is None else deadline)
+            except FuturesTimeout:
+                future.cancel()
+                _bump("timeouts")
+                continue
+            except Exception:
+                logger.exception("place lookup %s failed", key)
+                continue
+        if accept(value):
+            return value
+    return None
+
+
+def paced(provider, per_second, fn, empty):
+    """``fn`` held to ``per_second`` calls a second for ``provider``, counted
+    in the cache so every process shares the budget. A call that finds the
+    current slot taken returns ``empty`` without being sent."""
+
+    def call(*args, **kwargs):
+        slot = int(time.time() * per_second)
+        if not cache.add(PACE_KEY % (provider, slot), 1, 10):
+            _bump("paced")
+            return empty
+        return fn(*args, **kwargs)
+
+    return call
+
+
+def _run_and_cache(cache_key, fn):
+    try:
+        result = fn()
+    finally:
+        # Should a provider helper have reached the ORM after all, do not
+        # leave its connection open on a long-lived pool thread.
+        connections.close_all()
+    if cache_key is not None and result:
+        cache.set(cache_key, result, _ttl())
+    return result
+
+
+def stats():
+    values = cache.get_many([STAT_KEY % name for name in STAT_NAMES])
+    result = {name: values.get(STAT_KEY % name, 0) for name in STAT_NAMES}
+    lookups = result["hits"] + result["misses"]
+    result["hit_ratio"] = round(result["hits"] / lookups, 3) if lookups else 0.0
+    return result
@@ -0,0 +1,200 @@
+"""Route cache and provider circuit breaker behind RoutingService.get_route.
+
+Every fare estimate, route preview and ride request asked OpenStreet/OSRM for
+a route over HTTP, and a rider nudging the pin or re-opening the estimate
+screen asked again for what is, to the road network, the same trip. And when a
+provider was down, every request still waited out its timeout before moving
+on to the next one.
+
+  * ``rs:route:<provider>:<cells>`` — a route keyed on pickup and drop snapped
+    to a ``RIDESHARE_ROUTE_SNAP_DEGREES`` grid (0.0005° ≈ 50 m), kept for
+    ``RIDESHARE_ROUTE_CACHE_SECONDS``. The haversine fallback is never cached,
+    so a provider that comes back is used on the next request.
+  * ``rs:route:lock:<cells>`` — single flight: the first request for a cell
+    pair fetches, identical requests arriving meanwhile wait for its result
+    (up to ``RIDESHARE_ROUTE_SINGLE_FLIGHT_WAIT_SECONDS``) instead of calling
+    the provider too.
+  * ``rs:route:cb:<provider>:*`` — per-provider breaker. After
+    ``RIDESHARE_ROUTE_BREAKER_FAILURES`` consecutive failures the provider is
+    skipped for ``RIDESHARE_ROUTE_BREAKER_COOLDOWN_SECONDS``. After that one
+    caller takes ``rs:route:cb:<provider>:probe`` and tries the provider while
+    the rest keep skipping it; a failure re-opens the breaker, a success
+    closes it.
+
+``stats()`` reports the hit ratio and, per provider, calls, failures, skips
+and mean latency. Only the Django cache API is used, so the same code runs on
+Redis in production and on LocMemCache in tests.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from base.cache_counters import incr
+
+logger = logging.getLogger(__name__)
+
+ROUTE_KEY = "rs:route:%s:%s"
+LOCK_KEY = "rs:route:lock:%s"
+FAILS_KEY = "rs:route:cb:%s:fails"
+OPEN_KEY = "rs:route:cb:%s:open"
+PROBE_KEY = "rs:route:cb:%s:probe"
+STAT_KEY = "rs:routestat:%s"
+
+STAT_NAMES = ("hits", "misses", "coalesced", "fallbacks")
+PROVIDER_STAT_NAMES = ("calls", "failures", "skipped", "ms")
+
+LOCK_SECONDS = 10
+# Longer than any provider call; frees the probe if its caller died mid-call.
+PROBE_SECONDS = 30
+WAIT_POLL_SECONDS = 0.05
+
+
+def enabled():
+    return bool(getattr(settings, "RIDESHARE_ROUTE_CACHE", True))
+
+
+def _snap_degrees():
+    return float(getattr(settings, "RIDESHARE_ROUTE_SNAP_DEGREES", 0.0005))
+
+
+def _ttl():
+    return int(getattr(settings, "RIDESHARE_ROUTE_CACHE_SECONDS", 1800))
+
+
+def _wait_seconds():
+    return float(getattr(settings, "RIDESHARE_ROUTE_SINGLE_FLIGHT_WAIT_SECONDS", 2.0))
+
+
+def _breaker_failures():
+    return int(getattr(settings, "RIDESHARE_ROUTE_BREAKER_FAILURES", 3))
+
+
+def _breaker_cooldown():
+    return int(getattr(settings, "RIDESHARE_ROUTE_BREAKER_COOLDOWN_SECONDS", 60))
+
+
+def _bump(name, amount=1):
+    incr(STAT_KEY % name, amount)
+
+
+def cell_key(pickup_lat, pickup_lng, drop_lat, drop_lng):
+    """Both endpoints snapped to the grid, as one cache-key fragment."""
+    step = _snap_degrees()
+    cells = (
+        round(float(value) / step)
+        for value in (pickup_lat, pickup_lng, drop_lat, drop_lng)
+    )
+    return "%d,%d;%d,%d" % tuple(cells)
+
+
+# ── circuit breaker ──────────────────────────────────────────────────────
+
+def is_open(provider):
+    return cache.get(OPEN_KEY % provider) is not None
+
+
+def allow(provider):
+    """Whether this caller may call ``provider``: not while the breaker is
+    open, and once the cool-down is over, only the caller holding the probe
+    until its result closes or re-opens the breaker."""
+    found = cache.get_many([OPEN_KEY % provider, FAILS_KEY % provider])
+    if OPEN_KEY % provider in found:
+        return False
+    if found.get(FAILS_KEY % provider, 0) < _breaker_failures():
+        return True
+    return cache.add(PROBE_KEY % provider, 1, PROBE_SECONDS)
+
+
+def record_call(provider, ok, elapsed):
+    """Account one provider call; open the breaker on too many failures."""
+    _bump(f"{provider}_calls")
+    _bump(f"{provider}_ms", int(elapsed * 1000))
+    if ok:
+        cache.delete_many([FAILS_KEY % provider, PROBE_KEY % provider])
+        return
+    _bump(f"{provider}_failures")
+    fails_key = FAILS_KEY % provider
+    # Kept well past the cool-down, so the probe that follows it still sees
+    # the count and one more failure re-opens the breaker.
+    fails = incr(fails_key, 1, _breaker_cooldown() * 10)
+    if fails >= _breaker_failures():
+        cache.set(OPEN_KEY % provider, fails, _breaker_cooldown())
+        logger.warning(
+            "Route provider %s failed %d times in a row; skipping it for %ds",
+            provider, fails, _breaker_cooldown(),
+        )
+    cache.delete(PROBE_KEY % provider)
+
+
+def record_skip(provider):
+    _bump(f"{provider}_skipped")
+
+
+# ── cache + single flight ────────────────────────────────────────────────
+
+def get_or_fetch(provider_key, pickup_lat, pickup_lng, drop_lat, drop_lng, fetch):
+    """The cached route for the snapped trip, else ``fetch()``'s result.
+
+    ``fetch`` returns ``(route, cacheable)``; only cacheable routes are kept.
+    """
+    if not enabled():
+        return fetch()[0]
+
+    cells = cell_key(pickup_lat, pickup_lng, drop_lat, drop_lng)
+    key = ROUTE_KEY % (provider_key, cells)
+    route = cache.get(key)
+    if route is not None:
+        _bump("hits")
+        return route
+
+    lock_key = LOCK_KEY % cells
+    if not cache.add(lock_key, 1, LOCK_SECONDS):
+        deadline = time.monotonic() + _wait_seconds()
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_POLL_SECONDS)
+            route = cache.get(key)
+            if route is not None:
+                _bump("coalesced")
+                return route
+            if cache.get(lock_key) is None:
+                break       # the leader gave up without a cacheable route
+        lock_key = None
+
+    _bump("misses")
+    try:
+        route, cacheable = fetch()
+        if cacheable:
+            cache.set(key, route, _ttl())
+        else:
+            _bump("fallbacks")
+        return route
+    finally:
+        if lock_key is not None:
+            cache.delete(lock_key)
+
+
+def stats(providers=("openstreet", "osrm")):
+    """Hit ratio plus per-provider calls, failures, skips and mean latency."""
+    keys = [STAT_KEY % name for name in STAT_NAMES]
+    keys += [
+        STAT_KEY % f"{provider}_{name}"
+        for provider in providers for name in PROVIDER_STAT_NAMES
+    ]
+    values = cache.get_many(keys)
+    result = {name: values.get(STAT_KEY % name, 0) for name in STAT_NAMES}
+    lookups = result["hits"] + result["coalesced"] + result["misses"]
+    result["hit_ratio"] = (
+        round((result["hits"] + result["coalesced"]) / lookups, 3) if lookups else 0.0
+    )
+    for provider in providers:
+        row = {
+            name: values.get(STAT_KEY % f"{provider}_{name}", 0)
+            for name in PROVIDER_STAT_NAMES
+        }
+        ms = row.pop("ms")
+        row["avg_ms"] = round(ms / row["calls"], 1) if row["calls"] else 0.0
+        row["open"] = is_open(provider)
+        result[provider] = row
+    return result
@@ -406,7 +406,9 @@ class RideSerializer(serializers.ModelSerializer):
         return expires.isoformat()
 
     def get_latest_driver_location(self, obj):
-        latest = obj.driver_locations.order_by("-recorded_at").first()
+        from .services import DriverLocationService
+
+        latest = DriverLocationService.latest_ride_location(obj)
         return DriverLocationSerializer(latest).data if latest else None
 
     def get_passenger_can_cancel(self, obj):
@@ -2,7 +2,9 @@ from decimal import Decimal, ROUND_HALF_UP
 from math import asin, cos, radians, sin, sqrt
 import logging
 from datetime import timedelta
+from functools import partial
 import re
+import time
 
 # How many minutes of silence from a driver's device before we consider it stale/offline.
 # A driver who has not sent any signal (location, heartbeat, or online toggle) for this
@@ -23,6 +25,7 @@ from channels.layers import get_channel_layer
 from base.models import Balance, FCMToken, User
 from base.fcm_service import send_fcm_notification_async
 
+from . import geo_index, location_buffer, location_index, place_lookup, route_cache
 from .models import (
     DriverLocation,
     DriverProfile,
@@ -384,8 +387,8 @@ class RoutingService:
 
         return None
 
-    @classmethod
-    def get_route(cls, pickup_lat, pickup_lng, drop_lat, drop_lng):
+    @staticmethod
+    def _route_providers():
         route_provider = (
             getattr(settings, "RIDESHARE_ROUTE_PROVIDER", "openstreet").strip().lower()
         )
@@ -394,20 +397,17 @@ class RoutingService:
             providers.append("openstreet")
         if route_provider != "osrm":
             providers.append("osrm")
+        # Without a URL and key the OpenStreet call is a no-op, not a failure
+        # for the breaker to count.
+        if not (
+            getattr(settings, "RIDESHARE_OPENSTREET_ROUTE_URL", "").strip()
+            and getattr(settings, "RIDESHARE_OPENSTREET_ROUTE_KEY", "").strip()
+        ):
+            providers = [p for p in providers if p != "openstreet"]
+        return providers
 
-        for provider in providers:
-            if provider == "openstreet":
-                route = cls._get_openstreet_route(
-                    pickup_lat, pickup_lng, drop_lat, drop_lng
-                )
-            elif provider == "osrm":
-                route = cls._get_osrm_route(pickup_lat, pickup_lng, drop_lat, drop_lng)
-            else:
-                route = None
-
-            if route:
-                return route
-
+    @classmethod
+    def _fallback_route(cls, pickup_lat, pickup_lng, drop_lat, drop_lng):
         distance_km = cls._haversine_distance_km(
             float(pickup_lat), float(pickup_lng), float(drop_lat), float(drop_lng)
         )
@@ -424,6 +424,41 @@ class RoutingService:
             "routing_source": "fallback",
         }
 
+    @classmethod
+    def _fetch_route(cls, providers, pickup_lat, pickup_lng, drop_lat, drop_lng):
+        """(route, cacheable): the first provider that answers, skipping any
+        whose breaker is open; the uncacheable haversine fallback otherwise."""
+        fetchers = {
+            "openstreet": cls._get_openstreet_route,
+            "osrm": cls._get_osrm_route,
+        }
+        for provider in providers:
+            fetch = fetchers.get(provider)
+            if fetch is None:
+                continue
+            if not route_cache.allow(provider):
+                route_cache.record_skip(provider)
+                continue
+            started = time.monotonic()
+            route = fetch(pickup_lat, pickup_lng, drop_lat, drop_lng)
+            route_cache.record_call(provider, bool(route), time.monotonic() - started)
+            if route:
+                return route, True
+
+        return cls._fallback_route(pickup_lat, pickup_lng, drop_lat, drop_lng), False
+
+    @classmethod
+    def get_route(cls, pickup_lat, pickup_lng, drop_lat, drop_lng):
+        """Road route between two points (see rideshare.route_cache)."""
+        providers = cls._route_providers()
+        return route_cache.get_or_fetch(
+            "-".join(providers) or "none",
+            pickup_lat, pickup_lng, drop_lat, drop_lng,
+            lambda: cls._fetch_route(
+                providers, pickup_lat, pickup_lng, drop_lat, drop_lng
+            ),
+        )
+
 
 class LocationService:
     @staticmethod
@@ -748,17 +783,22 @@ class LocationService:
         if not query_variants:
             return []
 
-        filters = Q()
-        for variant in query_variants:
-            filters |= Q(name__icontains=variant)
-            filters |= Q(subtitle__icontains=variant)
-            filters |= Q(search_keywords__icontains=variant)
-
-        locations = (
-            SearchableLocation.objects.filter(is_active=True)
-            .filter(filters)
-            .order_by("name", "subtitle")[: max(limit * 8, 30)]
-        )
+        if location_index.enabled():
+            locations = location_index.get_index().search(
+                query_variants, max(limit * 8, 30)
+            )
+        else:
+            filters = Q()
+            for variant in query_variants:
+                filters |= Q(name__icontains=variant)
+                filters |= Q(subtitle__icontains=variant)
+                filters |= Q(search_keywords__icontains=variant)
+
+            locations = (
+                SearchableLocation.objects.filter(is_active=True)
+                .filter(filters)
+                .order_by("name", "subtitle")[: max(limit * 8, 30)]
+            )
 
         ranked_results = []
         for location in locations:
@@ -852,6 +892,14 @@ class LocationService:
         if not cls._is_within_bangladesh(latitude, longitude):
             return None
 
+        if location_index.enabled():
+            best_match = location_index.get_index().nearest(
+                latitude, longitude, max_distance_meters / 1000
+            )
+            if best_match is None:
+                return None
+            return cls._normalize_place_item(cls._manual_location_to_item(best_match))
+
         best_match = None
         best_distance_km = None
         for location in SearchableLocation.objects.filter(is_active=True).only(
@@ -972,17 +1020,21 @@ class LocationService:
         }
 
     @classmethod
-    def _search_places_google(cls, query, limit=5, focus_lat=None, focus_lng=None):
+    def _search_places_google(cls, query, limit=5, focus_lat=None, focus_lng=None, api_key=None):
+        # ``api_key`` is passed in by callers on the place-lookup pool, whose
+        # threads must not open a database connection to read it.
+        if api_key is None:
+            api_key = get_google_maps_api_key()
         autocomplete_results = cls._search_places_google_autocomplete(
             query,
             limit=limit,
             focus_lat=focus_lat,
             focus_lng=focus_lng,
+            api_key=api_key,
         )
         if autocomplete_results:
             return autocomplete_results
 
-        api_key = get_google_maps_api_key()
         base_url = getattr(
             settings, "RIDESHARE_GOOGLE_PLACES_TEXTSEARCH_URL", ""
         ).strip()
@@ -1042,8 +1094,9 @@ class LocationService:
         return results
 
     @classmethod
-    def _search_places_google_autocomplete(cls, query, limit=5, focus_lat=None, focus_lng=None):
-        api_key = get_google_maps_api_key()
+    def _search_places_google_autocomplete(cls, query, limit=5, focus_lat=None, focus_lng=None, api_key=None):
+        if api_key is None:
+            api_key = get_google_maps_api_key()
         autocomplete_url = getattr(
             settings,
             "RIDESHARE_GOOGLE_PLACES_AUTOCOMPLETE_URL",
@@ -1142,6 +1195,70 @@ class LocationService:
 
         return hydrated_results
 
+    @staticmethod
+    def _paced_nominatim(fn, empty):
+        return place_lookup.paced(
+            "nominatim",
+            float(getattr(settings, "RIDESHARE_NOMINATIM_MAX_PER_SECOND", 1.0)),
+            fn,
+            empty,
+        )
+
+    @classmethod
+    def _provider_search(cls, current):
+        return {
+            "photon": cls._search_places_photon,
+            "nominatim": cls._search_places_nominatim,
+            "google": cls._search_places_google,
+        }.get(current)
+
+    @classmethod
+    def _fetch_provider_results(
+        cls, query, providers, *, limit=5, focus_lat=None, focus_lng=None, google_api_key=None,
+    ):
+        """{(provider, variant): raw results} for every provider x query
+        variant, fetched concurrently (see rideshare.place_lookup).
+
+        Nominatim gets the plain query only, paced to its usage policy; the
+        Google key is read here, on the request thread, not in the pool.
+        """
+        resolved_lat, resolved_lng, has_focus = cls._coerce_focus_coordinates(
+            focus_lat,
+            focus_lng,
+        )
+        fetch_limit = max(limit * 2, 8)
+        variants = cls._build_query_variants(query)
+        calls = {}
+        for current in providers:
+            search = cls._provider_search(current)
+            if search is None:
+                continue
+            if current == "google":
+                if google_api_key is None:
+                    google_api_key = get_google_maps_api_key()
+                search = partial(search, api_key=google_api_key)
+            elif current == "nominatim":
+                search = cls._paced_nominatim(search, [])
+            for search_query in variants[:1] if current == "nominatim" else variants:
+                calls[(current, search_query)] = (
+                    place_lookup.search_key(
+                        current,
+                        cls._normalize_search_text(search_query),
+                        fetch_limit,
+                        resolved_lat,
+                        resolved_lng,
+                        has_focus,
+                    ),
+                    partial(
+                        search,
+                        search_query,
+                        limit=fetch_limit,
+                        focus_lat=focus_lat,
+                        focus_lng=focus_lng,
+                    ),
+                )
+        return place_lookup.fan_out(calls)
+
     @classmethod
     def _collect_ranked_search_results(
         cls,
@@ -1151,35 +1268,24 @@ class LocationService:
         limit=5,
         focus_lat=None,
         focus_lng=None,
+        fetched=None,
     ):
         combined_results = []
         query_variants = cls._build_query_variants(query)
+        if fetched is None:
+            fetched = cls._fetch_provider_results(
+                query,
+                providers,
+                limit=limit,
+                focus_lat=focus_lat,
+                focus_lng=focus_lng,
+            )
 
+        # Ranked in provider/variant order whatever order the calls finished
+        # in, so dedupe keeps the same item it always did.
         for provider_index, current in enumerate(providers):
             for query_index, search_query in enumerate(query_variants):
-                if current == "photon":
-                    results = cls._search_places_photon(
-                        search_query,
-                        limit=max(limit * 2, 8),
-                        focus_lat=focus_lat,
-                        focus_lng=focus_lng,
-                    )
-                elif current == "nominatim":
-                    results = cls._search_places_nominatim(
-                        search_query,
-                        limit=max(limit * 2, 8),
-                        focus_lat=focus_lat,
-                        focus_lng=focus_lng,
-                    )
-                elif current == "google":
-                    results = cls._search_places_google(
-                        search_query,
-                        limit=max(limit * 2, 8),
-                        focus_lat=focus_lat,
-                        focus_lng=focus_lng,
-                    )
-                else:
-                    results = []
+                results = fetched.get((current, search_query)) or []
 
                 for result_index, item in enumerate(cls._filter_bangladesh_results(results)):
                     normalized_item = cls._normalize_place_item(item)
@@ -1374,15 +1480,28 @@ class LocationService:
             if candidate in {"photon", "nominatim"} and candidate not in free_providers:
                 free_providers.append(candidate)
 
+        google_api_key = get_google_maps_api_key()
+        google_enabled = bool(google_api_key)
+        # One concurrent round for the free providers and Google together —
+        # Google used to wait for every free call to finish first.
+        fetched = cls._fetch_provider_results(
+            query,
+            free_providers + (["google"] if google_enabled else []),
+            limit=limit,
+            focus_lat=focus_lat,
+            focus_lng=focus_lng,
+            google_api_key=google_api_key,
+        )
         free_ranked_results = cls._collect_ranked_search_results(
             query,
             free_providers,
             limit=limit,
             focus_lat=focus_lat,
             focus_lng=focus_lng,
+            fetched=fetched,
         )
 
-        if not cls._google_maps_enabled():
+        if not google_enabled:
             merged_ranked_results = cls._merge_ranked_results(
                 manual_ranked_results,
                 free_ranked_results,
@@ -1395,6 +1514,7 @@ class LocationService:
             limit=limit,
             focus_lat=focus_lat,
             focus_lng=focus_lng,
+            fetched=fetched,
         )
 
         if not google_ranked_results:
@@ -1412,8 +1532,9 @@ class LocationService:
         return cls._clean_ranked_search_results(merged_ranked_results, limit)
 
     @classmethod
-    def _reverse_geocode_google(cls, lat, lng):
-        api_key = get_google_maps_api_key()
+    def _reverse_geocode_google(cls, lat, lng, api_key=None):
+        if api_key is None:
+            api_key = get_google_maps_api_key()
         base_url = getattr(settings, "RIDESHARE_GOOGLE_GEOCODE_URL", "").strip()
         if not api_key or not base_url:
             return None
@@ -1451,8 +1572,8 @@ class LocationService:
             ),
         }
 
-    @staticmethod
-    def _reverse_geocode_nominatim(lat, lng):
+    @classmethod
+    def _reverse_geocode_nominatim(cls, lat, lng):
         nominatim_base_url = getattr(
             settings, "RIDESHARE_NOMINATIM_URL", "https://nominatim.openstreetmap.org"
         )
@@ -1490,22 +1611,34 @@ class LocationService:
         provider = (
             getattr(settings, "RIDESHARE_LOCATION_PROVIDER", "photon").strip().lower()
         )
+        google_api_key = get_google_maps_api_key()
         providers = []
-        if cls._google_maps_enabled():
+        if google_api_key:
             providers.append("google")
         for candidate in [provider, "nominatim"]:
             if candidate in {"google", "nominatim"} and candidate not in providers:
                 providers.append(candidate)
 
-        for current in providers:
-            if current == "google":
-                result = cls._reverse_geocode_google(lat, lng)
-            elif current == "nominatim":
-                result = cls._reverse_geocode_nominatim(lat, lng)
-            else:
-                result = None
-            if result and cls._is_bangladesh_result(result):
-                return cls._normalize_place_item(result)
+        fetchers = {
+            "google": partial(cls._reverse_geocode_google, api_key=google_api_key),
+            "nominatim": cls._paced_nominatim(cls._reverse_geocode_nominatim, None),
+        }
+        providers = [current for current in providers if current in fetchers]
+        # In preference order: a provider is only asked once the ones before
+        # it failed, had nothing, or ran out of time.
+        result = place_lookup.first_of(
+            {
+                current: (
+                    place_lookup.reverse_key(current, lat, lng),
+                    partial(fetchers[current], lat, lng),
+                )
+                for current in providers
+            },
+            providers,
+            lambda item: bool(item) and cls._is_bangladesh_result(item),
+        )
+        if result:
+            return cls._normalize_place_item(result)
         fallback_result = cls._build_reverse_geocode_fallback(lat, lng)
         if fallback_result:
             return cls._normalize_place_item(fallback_result)
@@ -2082,15 +2215,36 @@ class DriverLocationService:
         speed_kph=None,
         accuracy_meters=None,
     ):
+        if location_buffer.enabled():
+            try:
+                location = location_buffer.ingest(
+                    driver_profile,
+                    latitude,
+                    longitude,
+                    ride=ride,
+                    heading=heading,
+                    speed_kph=speed_kph,
+                    accuracy_meters=accuracy_meters,
+                )
+            except Exception:
+                # Cache unreachable — fall back to writing the ping directly.
+                logger.exception("location buffer ingest failed; writing ping to the DB")
+            else:
+                if ride:
+                    DispatchService.broadcast_driver_location(ride, location)
+                return location
+
         now = timezone.now()
         driver_profile.current_latitude = latitude
         driver_profile.current_longitude = longitude
+        driver_profile.geo_cell = geo_index.cell_for(latitude, longitude)
         driver_profile.last_location_at = now
         driver_profile.last_seen_at = now
         driver_profile.save(
             update_fields=[
                 "current_latitude",
                 "current_longitude",
+                "geo_cell",
                 "last_location_at",
                 "last_seen_at",
                 "updated_at",
@@ -2110,11 +2264,30 @@ class DriverLocationService:
             DispatchService.broadcast_driver_location(ride, location)
         return location
 
+    @staticmethod
+    def latest_ride_location(ride):
+        """The driver's most recent position on this ride, buffered or stored."""
+        try:
+            buffered = location_buffer.latest_ride_location(ride)
+        except Exception:
+            logger.exception("location buffer read failed for ride %s", ride.pk)
+            buffered = None
+        if buffered is not None:
+            return buffered
+        return ride.driver_locations.order_by("-recorded_at").first()
+
     @staticmethod
     def get_nearby_drivers(
         latitude, longitude, radius_km=5, vehicle_type=None, limit=10
     ):
-        """Get nearby online drivers within radius"""
+        """Get the ``limit`` nearest online drivers within ``radius_km``.
+
+        Reads the grid cells around the point in growing rings and stops as
+        soon as ``limit`` drivers are confirmed inside the ring just searched —
+        anyone nearer than them is necessarily in a cell already read.
+        """
+        latitude = float(latitude)
+        longitude = float(longitude)
         stale_threshold = timezone.now() - timedelta(minutes=DRIVER_STALE_THRESHOLD_MINUTES)
         query = DriverProfile.objects.filter(
             approval_status="approved",
@@ -2133,11 +2306,21 @@ class DriverLocationService:
             ).distinct()
 
         nearby_drivers = []
-        for driver in query[: limit * 3]:
-            if driver.current_latitude and driver.current_longitude:
+        searched_cells = set()
+        for ring_km in geo_index.search_rings(radius_km):
+            new_cells = [
+                cell
+                for cell in geo_index.cells_within(latitude, longitude, ring_km)
+                if cell not in searched_cells
+            ]
+            searched_cells.update(new_cells)
+            ring_drivers = location_buffer.apply_latest_positions(
+                list(query.filter(geo_cell__in=new_cells))
+            )
+            for driver in ring_drivers:
                 distance = RoutingService._haversine_distance_km(
-                    float(latitude),
-                    float(longitude),
+                    latitude,
+                    longitude,
                     float(driver.current_latitude),
                     float(driver.current_longitude),
                 )
@@ -2146,6 +2329,9 @@ class DriverLocationService:
                     driver.vehicle_type = vehicle_type or "bike"
                     nearby_drivers.append(driver)
 
+            if sum(1 for d in nearby_drivers if d.distance <= ring_km) >= limit:
+                break
+
         nearby_drivers.sort(key=lambda d: d.distance)
         return nearby_drivers[:limit]
 
@@ -2647,6 +2833,13 @@ class NearestDriverDispatch:
                 exclude_ids.add(eid)
 
         stale_threshold = timezone.now() - timedelta(minutes=DRIVER_STALE_THRESHOLD_MINUTES)
+        # Nobody beyond the passenger-side radius can match, so only the grid
+        # cells inside it are read. geo_cell="" keeps the no-GPS fallback
+        # drivers in the candidate set.
+        max_passenger_radius = get_max_passenger_search_radius_km()
+        pickup_cells = geo_index.cells_within(
+            ride.pickup_latitude, ride.pickup_longitude, max_passenger_radius
+        )
         candidates = list(
             DriverProfile.objects.filter(
                 approval_status="approved",
@@ -2660,6 +2853,7 @@ class NearestDriverDispatch:
                 # was deployed and hasn't sent any signal since — treat as stale.
                 last_seen_at__gte=stale_threshold,
             )
+            .filter(Q(geo_cell__in=pickup_cells) | Q(geo_cell=""))
             .exclude(user=ride.rider)
             .exclude(id__in=exclude_ids)
             .select_related("user")
@@ -2669,6 +2863,8 @@ class NearestDriverDispatch:
         if not candidates:
             return []
 
+        location_buffer.apply_latest_positions(candidates)
+
         # Calculate distance and sort
         drivers_with_distance = []
         no_gps_drivers = []
@@ -2693,7 +2889,6 @@ class NearestDriverDispatch:
                 continue
 
             # Check passenger-side max search radius (prevents rural ultra-long matches)
-            max_passenger_radius = get_max_passenger_search_radius_km()
             if distance > max_passenger_radius:
                 continue
 
@@ -3017,7 +3212,7 @@ class EarlyCompletionService:
         if latitude is not None and longitude is not None:
             return Decimal(str(latitude)), Decimal(str(longitude))
 
-        latest_location = ride.driver_locations.order_by("-recorded_at").first()
+        latest_location = DriverLocationService.latest_ride_location(ride)
         if latest_location:
             return latest_location.latitude, latest_location.longitude
 
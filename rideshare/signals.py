@@ -1,9 +1,10 @@
-"""Rideshare signals — driver application status emails."""
+"""Rideshare signals — driver application status emails, location index."""
 
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
 
-from .models import DriverProfile, Ride
+from . import location_index
+from .models import DriverProfile, Ride, SearchableLocation
 
 
 @receiver(pre_save, sender=DriverProfile)
@@ -62,3 +63,9 @@ def _email_ride_receipt(sender, instance, created, **kwargs):
             send_ride_receipt_email(instance)
         except Exception as e:
             print(f"Error sending ride receipt email: {e}")
+
+
+@receiver(post_save, sender=SearchableLocation)
+@receiver(post_delete, sender=SearchableLocation)
+def _invalidate_location_index(sender, instance, **kwargs):
+    location_index.invalidate()
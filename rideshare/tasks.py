@@ -1,6 +1,7 @@
 from celery import shared_task
 import logging
 
+from . import location_buffer
 from .services import NearestDriverDispatch, RideAutoCancel
 
 logger = logging.getLogger(__name__)
@@ -57,3 +58,22 @@ def mark_stale_drivers_offline():
     except Exception as e:
         logger.exception(f"Error in mark_stale_drivers_offline task: {e}")
         return 0
+
+
+@shared_task
+def flush_driver_locations():
+    """Drain buffered driver pings into DriverProfile and DriverLocation.
+
+    Runs every 10 seconds. A no-op unless RIDESHARE_LOCATION_WRITE_BEHIND is on
+    (it still drains whatever is left if the switch was just turned off).
+    """
+    try:
+        drained = location_buffer.flush()
+        if drained > 0:
+            logger.info(
+                f"Flushed {drained} buffered location ping(s); stats={location_buffer.stats()}"
+            )
+        return drained
+    except Exception as e:
+        logger.exception(f"Error in flush_driver_locations task: {e}")
+        return 0
@@ -1,10 +1,26 @@
+import json
+import threading
+import time
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from unittest import mock
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
 from base.models import Balance, User
-from rideshare.models import DriverProfile, Ride
-from rideshare.services import CustomLocationService, LocationService, WalletService
+from rideshare import geo_index, location_buffer, location_index, place_lookup, route_cache
+from rideshare.models import DriverLocation, DriverProfile, Ride, SearchableLocation, Vehicle
+from rideshare.services import (
+    CustomLocationService,
+    DriverLocationService,
+    LocationService,
+    NearestDriverDispatch,
+    RoutingService,
+    WalletService,
+)
 
 
 class WalletServiceRidePaymentTests(TestCase):
@@ -164,4 +180,551 @@ class UserCustomLocationTests(TestCase):
         )
 
         self.assertEqual(result["title"], "My Farm Gate")
-        self.assertEqual(result.get("badge"), "My Custom Location")
\ No newline at end of file
+        self.assertEqual(result.get("badge"), "My Custom Location")
+
+
+class DriverGeoIndexTests(TestCase):
+    def _driver(self, n, latitude, longitude, vehicle_type="bike"):
+        user = User.objects.create_user(
+            username=f"geo-driver-{n}",
+            email=f"geo-driver-{n}@example.com",
+            password="testpass123",
+            phone=f"0171000{n:04d}",
+        )
+        profile = DriverProfile.objects.create(
+            user=user,
+            approval_status="approved",
+            is_online=True,
+            is_available=True,
+            last_seen_at=timezone.now(),
+        )
+        Vehicle.objects.create(
+            driver=profile,
+            vehicle_type=vehicle_type,
+            registration_number=f"GEO-{n}",
+            is_verified=True,
+            is_default=True,
+        )
+        DriverLocationService.update_location(profile, latitude, longitude)
+        return profile
+
+    def test_update_location_stores_grid_cell(self):
+        driver = self._driver(1, Decimal("23.780000"), Decimal("90.410000"))
+        driver.refresh_from_db()
+        self.assertEqual(driver.geo_cell, geo_index.cell_for(23.78, 90.41))
+
+    def test_cells_within_covers_points_inside_radius(self):
+        cells = set(geo_index.cells_within(23.78, 90.41, 3))
+        # ~2.5 km north-east of the centre.
+        self.assertIn(geo_index.cell_for(23.796, 90.427), cells)
+        self.assertNotIn(geo_index.cell_for(24.78, 90.41), cells)
+
+    def test_nearby_drivers_finds_nearest_regardless_of_far_fleet(self):
+        # Far drivers used to crowd the near ones out of the limit*3 slice.
+        for n in range(10, 20):
+            self._driver(n, Decimal("22.356900"), Decimal("91.783200"))
+        near = self._driver(2, Decimal("23.781000"), Decimal("90.411000"))
+
+        drivers = DriverLocationService.get_nearby_drivers(
+            23.78, 90.41, radius_km=5, vehicle_type="bike", limit=1
+        )
+
+        self.assertEqual([d.id for d in drivers], [near.id])
+
+    def test_dispatch_candidates_exclude_drivers_outside_passenger_radius(self):
+        near = self._driver(3, Decimal("23.781000"), Decimal("90.411000"))
+        self._driver(4, Decimal("24.894900"), Decimal("91.868700"))
+        rider = User.objects.create_user(
+            username="geo-rider",
+            email="geo-rider@example.com",
+            password="testpass123",
+            phone="01710009999",
+        )
+        ride = Ride(
+            rider=rider,
+            requested_vehicle_type="bike",
+            pickup_latitude=Decimal("23.780000"),
+            pickup_longitude=Decimal("90.410000"),
+            distance_km=Decimal("4.00"),
+        )
+
+        drivers = NearestDriverDispatch.get_sorted_drivers_for_ride(ride)
+
+        self.assertEqual([d.id for d in drivers], [near.id])
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "rideshare-location-buffer-tests",
+        }
+    },
+    RIDESHARE_LOCATION_WRITE_BEHIND=True,
+    RIDESHARE_LOCATION_TRAIL_MIN_METERS=20,
+    RIDESHARE_LOCATION_TRAIL_MIN_SECONDS=60,
+)
+class DriverLocationWriteBehindTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(
+            username="buffered-driver",
+            email="buffered-driver@example.com",
+            password="testpass123",
+            phone="01720000001",
+        )
+        self.driver = DriverProfile.objects.create(
+            user=user,
+            approval_status="approved",
+            is_online=True,
+            is_available=True,
+        )
+
+    def test_pings_stay_in_cache_until_flushed(self):
+        DriverLocationService.update_location(self.driver, Decimal("23.780000"), Decimal("90.410000"))
+
+        self.assertEqual(DriverLocation.objects.count(), 0)
+        self.driver.refresh_from_db()
+        self.assertIsNone(self.driver.current_latitude)
+
+        location_buffer.flush()
+
+        self.driver.refresh_from_db()
+        self.assertEqual(DriverLocation.objects.count(), 1)
+        self.assertEqual(self.driver.current_latitude, Decimal("23.780000"))
+        self.assertEqual(self.driver.geo_cell, geo_index.cell_for(23.78, 90.41))
+
+    def test_nearby_pings_are_coalesced_into_one_breadcrumb(self):
+        # ~1 m apart, well inside the 20 m / 60 s trail threshold.
+        for offset in range(3):
+            DriverLocationService.update_location(
+                self.driver,
+                Decimal("23.780000") + Decimal("0.000010") * offset,
+                Decimal("90.410000"),
+            )
+
+        location_buffer.flush()
+
+        stats = location_buffer.stats()
+        self.assertEqual(stats["ingested"], 3)
+        self.assertEqual(stats["coalesced"], 2)
+        self.assertEqual(stats["flushed"], 1)
+        self.assertEqual(stats["backlog"], 0)
+        self.assertEqual(DriverLocation.objects.count(), 1)
+        # The profile still gets the newest position, not the kept one.
+        self.driver.refresh_from_db()
+        self.assertEqual(self.driver.current_latitude, Decimal("23.780020"))
+
+    def test_moving_driver_keeps_a_breadcrumb_per_hop(self):
+        for offset in range(3):
+            DriverLocationService.update_location(
+                self.driver,
+                Decimal("23.780000") + Decimal("0.001000") * offset,
+                Decimal("90.410000"),
+            )
+
+        location_buffer.flush()
+
+        self.assertEqual(DriverLocation.objects.count(), 3)
+
+    def test_dispatch_reads_position_from_buffer(self):
+        DriverLocationService.update_location(self.driver, Decimal("23.780000"), Decimal("90.410000"))
+        location_buffer.flush()
+        DriverLocationService.update_location(self.driver, Decimal("23.900000"), Decimal("90.410000"))
+
+        stale = DriverProfile.objects.get(pk=self.driver.pk)
+        location_buffer.apply_latest_positions([stale])
+
+        self.assertEqual(stale.current_latitude, Decimal("23.900000"))
+
+    def test_a_ping_still_being_written_does_not_hide_the_last_one(self):
+        DriverLocationService.update_location(self.driver, Decimal("23.780000"), Decimal("90.410000"))
+        # Another ping has taken the next version but not stored its position.
+        cache.incr(location_buffer.VERSION_KEY % self.driver.pk)
+
+        position = location_buffer.latest_positions([self.driver.pk])[self.driver.pk]
+        self.assertEqual(position["lat"], "23.780000")
+
+        # The ping after it finds no previous position and keeps a breadcrumb.
+        DriverLocationService.update_location(self.driver, Decimal("23.780010"), Decimal("90.410000"))
+        location_buffer.flush()
+        self.assertEqual(DriverLocation.objects.count(), 2)
+        self.assertEqual(location_buffer.stats()["coalesced"], 0)
+
+
+class _StubRouteHandler(BaseHTTPRequestHandler):
+    """OSRM-shaped answers; the server's ``mode`` makes it slow or down."""
+
+    def do_GET(self):
+        self.server.calls += 1
+        if self.server.mode == "slow":
+            time.sleep(self.server.delay)
+        if self.server.mode == "down":
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({
+            "code": "Ok",
+            "routes": [{
+                "distance": 4200,
+                "duration": 600,
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [[90.41, 23.78], [90.42, 23.79]],
+                },
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "rideshare-route-cache-tests",
+        }
+    },
+    RIDESHARE_ROUTE_PROVIDER="osrm",
+    RIDESHARE_OPENSTREET_ROUTE_KEY="",
+    RIDESHARE_OSRM_FALLBACK_URLS=[],
+    RIDESHARE_ROUTE_HTTP_TIMEOUT_SECONDS=1.0,
+    RIDESHARE_ROUTE_CACHE=True,
+    RIDESHARE_ROUTE_BREAKER_FAILURES=3,
+)
+class RouteCacheTests(TestCase):
+    """Against a local stub routing server, not the public OSRM."""
+
+    def setUp(self):
+        cache.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubRouteHandler)
+        self.server.daemon_threads = True
+        self.server.calls = 0
+        self.server.mode = "ok"
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        override = self.settings(
+            RIDESHARE_OSRM_URL="http://127.0.0.1:%d" % self.server.server_address[1]
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def route(self, pickup_lat=23.780000, pickup_lng=90.410000):
+        return RoutingService.get_route(
+            Decimal(str(pickup_lat)), Decimal(str(pickup_lng)),
+            Decimal("23.790000"), Decimal("90.420000"),
+        )
+
+    def test_a_nearby_pickup_is_served_from_the_cache(self):
+        first = self.route()
+        # ~10 m north: same 50 m cell.
+        second = self.route(pickup_lat=23.780090)
+
+        self.assertEqual(first["routing_source"], "osrm")
+        self.assertEqual(second["distance_km"], Decimal("4.20"))
+        self.assertEqual(self.server.calls, 1)
+        stats = route_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+        self.assertEqual(stats["osrm"]["calls"], 1)
+
+    def test_a_different_trip_is_fetched(self):
+        self.route()
+        self.route(pickup_lat=23.700000)
+        self.assertEqual(self.server.calls, 2)
+
+    def test_identical_lookups_in_flight_share_one_call(self):
+        self.server.mode = "slow"
+        self.server.delay = 0.3
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.route()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(
+            {r["routing_source"] for r in results}, {"osrm"})
+        self.assertEqual(route_cache.stats()["coalesced"], 3)
+
+    def test_a_failing_provider_is_skipped_once_the_breaker_opens(self):
+        self.server.mode = "down"
+        for offset in range(3):
+            route = self.route(pickup_lat=23.70 + offset * 0.01)
+            self.assertEqual(route["routing_source"], "fallback")
+        self.assertEqual(self.server.calls, 3)
+
+        self.route(pickup_lat=23.60)
+        self.assertEqual(self.server.calls, 3)      # not even tried
+        stats = route_cache.stats()
+        self.assertTrue(stats["osrm"]["open"])
+        self.assertEqual(stats["osrm"]["failures"], 3)
+        self.assertEqual(stats["osrm"]["skipped"], 1)
+
+        # Cool-down over (the open key expired): one caller probes, the
+        # others keep skipping until the probe closes the breaker again.
+        self.server.mode = "ok"
+        cache.delete(route_cache.OPEN_KEY % "osrm")
+        cache.add(route_cache.PROBE_KEY % "osrm", 1)      # another caller's probe
+        self.assertEqual(self.route(pickup_lat=23.60)["routing_source"], "fallback")
+        self.assertEqual(self.server.calls, 3)
+        cache.delete(route_cache.PROBE_KEY % "osrm")
+        self.assertEqual(self.route(pickup_lat=23.60)["routing_source"], "osrm")
+        self.assertFalse(route_cache.is_open("osrm"))
+        self.assertTrue(route_cache.allow("osrm"))
+
+    @override_settings(RIDESHARE_ROUTE_HTTP_TIMEOUT_SECONDS=0.2)
+    def test_a_timeout_counts_against_the_provider_and_is_not_cached(self):
+        self.server.mode = "slow"
+        self.server.delay = 0.5
+        route = self.route()
+        self.assertEqual(route["routing_source"], "fallback")
+        self.assertEqual(route_cache.stats()["osrm"]["failures"], 1)
+
+        self.server.mode = "ok"
+        self.assertEqual(self.route()["routing_source"], "osrm")
+
+
+class _StubPlaceHandler(BaseHTTPRequestHandler):
+    """Photon answers at once; Nominatim after ``server.nominatim_delay``."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.calls.append(url.path)
+        if url.path.startswith("/photon"):
+            body = {"features": [{
+                "geometry": {"coordinates": [90.41, 23.78]},
+                "properties": {"name": params.get("q", ""), "city": "Dhaka",
+                               "country": "Bangladesh"},
+            }]}
+        else:
+            time.sleep(self.server.nominatim_delay)
+            item = {"display_name": "Road 1, Dhaka, Bangladesh",
+                    "lat": "23.78", "lon": "90.41",
+                    "address": {"road": "Road 1", "city": "Dhaka",
+                                "country": "Bangladesh"}}
+            body = item if url.path.endswith("/reverse") else [item]
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "rideshare-place-lookup-tests",
+        }
+    },
+    RIDESHARE_LOCATION_PROVIDER="photon",
+    RIDESHARE_GOOGLE_MAPS_API_KEY="",
+    RIDESHARE_GOOGLE_GEOCODE_URL="",
+    RIDESHARE_LOCATION_CACHE=True,
+    RIDESHARE_LOCATION_LOOKUP_DEADLINE_SECONDS=0.5,
+)
+class PlaceLookupTests(TestCase):
+    """Against local stub Photon/Nominatim servers."""
+
+    def setUp(self):
+        cache.clear()
+        location_index.invalidate()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubPlaceHandler)
+        self.server.daemon_threads = True
+        self.server.calls = []
+        self.server.nominatim_delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base = "http://127.0.0.1:%d" % self.server.server_address[1]
+        override = self.settings(
+            RIDESHARE_PHOTON_URL=base + "/photon",
+            RIDESHARE_NOMINATIM_URL=base + "/nominatim",
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def search(self, query="dhanmondi"):
+        return LocationService.search_places(query, focus_lat=23.78, focus_lng=90.41)
+
+    def test_a_slow_provider_costs_its_results_not_the_search(self):
+        self.server.nominatim_delay = 2.0
+        started = time.monotonic()
+        results = self.search()
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1.5)
+        self.assertTrue(results)                        # Photon's answers
+        self.assertGreater(place_lookup.stats()["timeouts"], 0)
+
+    def test_a_full_backlog_sheds_calls_instead_of_queueing(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = {i: ("blocked%d" % i, lambda: release.wait(5) and ["late"]) for i in range(4)}
+
+        with self.settings(RIDESHARE_LOCATION_LOOKUP_MAX_BACKLOG=2):
+            self.assertEqual(place_lookup.fan_out(calls, deadline=0.1), {})
+            self.assertIsNone(place_lookup.first_of(calls, list(calls), bool, deadline=0.1))
+        stats = place_lookup.stats()
+        self.assertEqual((stats["timeouts"], stats["shed"]), (2, 6))
+
+        release.set()
+        waited = time.monotonic() + 2
+        while place_lookup._backlog and time.monotonic() < waited:
+            time.sleep(0.01)
+        self.assertEqual(place_lookup._backlog, 0)
+
+    def test_the_same_search_is_served_from_the_cache(self):
+        first = self.search()
+        calls = len(self.server.calls)
+        self.assertGreater(calls, 1)                    # variants x providers
+
+        # Same query, a focus point ~1 km away: same coarse cell.
+        again = LocationService.search_places(
+            "  Dhanmondi ", focus_lat=23.785, focus_lng=90.415)
+        self.assertEqual(len(self.server.calls), calls)
+        self.assertEqual(
+            [r["name"] for r in again], [r["name"] for r in first])
+
+    def test_reverse_geocode_uses_nominatim_and_caches_it(self):
+        result = LocationService.reverse_geocode(23.780001, 90.410001)
+        self.assertEqual(result["title"], "Road 1")
+
+        LocationService.reverse_geocode(23.780050, 90.410050)   # ~7 m away
+        reverse_calls = [p for p in self.server.calls if p.endswith("/reverse")]
+        self.assertEqual(len(reverse_calls), 1)
+
+    def test_nominatim_gets_one_paced_call_per_search(self):
+        with self.settings(RIDESHARE_NOMINATIM_MAX_PER_SECOND=0.01):   # one per 100 s
+            self.search("dhanmondi")
+            self.search("gulshan")
+        searches = [p for p in self.server.calls if p.startswith("/nominatim")]
+        self.assertEqual(len(searches), 1)
+        self.assertEqual(place_lookup.stats()["paced"], 1)
+
+    def test_the_fallback_is_only_asked_after_the_first_provider(self):
+        asked = []
+
+        def provider(name, value, delay=0):
+            def fetch():
+                asked.append(name)
+                time.sleep(delay)
+                return value
+            return fetch
+
+        calls = {"google": ("k:g1", provider("google", "answer")),
+                 "nominatim": ("k:n1", provider("nominatim", "fallback"))}
+        self.assertEqual(place_lookup.first_of(calls, list(calls), bool), "answer")
+        self.assertEqual(asked, ["google"])
+
+        calls = {"google": ("k:g2", provider("google", "late", delay=0.3)),
+                 "nominatim": ("k:n2", provider("nominatim", "fallback"))}
+        self.assertEqual(
+            place_lookup.first_of(calls, list(calls), bool, deadline=0.1), "fallback")
+        self.assertEqual(asked[1:], ["google", "nominatim"])
+
+    @override_settings(
+        RIDESHARE_GOOGLE_MAPS_API_KEY="test-key",
+        RIDESHARE_GOOGLE_PLACES_AUTOCOMPLETE_URL="http://127.0.0.1:9/none",
+        RIDESHARE_GOOGLE_PLACE_DETAILS_URL="http://127.0.0.1:9/none",
+        RIDESHARE_GOOGLE_GEOCODE_URL="http://127.0.0.1:9/none",
+    )
+    def test_pool_threads_do_not_read_the_google_key(self):
+        from rideshare import services
+
+        readers = []
+        read = services.get_google_maps_api_key
+
+        def spy():
+            readers.append(threading.current_thread().name)
+            return read()
+
+        with mock.patch.object(services, "get_google_maps_api_key", spy):
+            self.search()
+            LocationService.reverse_geocode(23.780001, 90.410001)
+        self.assertTrue(readers)
+        self.assertFalse([name for name in readers if name.startswith("place-lookup")])
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "rideshare-location-index-tests",
+        }
+    },
+    RIDESHARE_LOCATION_INDEX=True,
+)
+class SearchableLocationIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        location_index.invalidate()
+        self.addCleanup(location_index.invalidate)
+
+    def place(self, name, lat, lng, subtitle="", keywords=""):
+        return SearchableLocation.objects.create(
+            name=name, subtitle=subtitle, search_keywords=keywords,
+            latitude=Decimal(lat), longitude=Decimal(lng),
+        )
+
+    def test_search_matches_like_icontains_in_name_subtitle_and_keywords(self):
+        self.place("Dhanmondi Lake", "23.746000", "90.376000")
+        self.place("Shop", "23.750000", "90.380000", subtitle="Near DHANMONDI 27")
+        self.place("Bus Stand", "23.760000", "90.390000", keywords="ধানমন্ডি, stand")
+        self.place("Gulshan Circle", "23.780000", "90.416000")
+
+        index = location_index.get_index()
+        names = [loc.name for loc in index.search(["dhanmondi"], 10)]
+        self.assertEqual(names, ["Dhanmondi Lake", "Shop"])
+        self.assertEqual(
+            [loc.name for loc in index.search(["ধানমন্ডি"], 10)], ["Bus Stand"])
+        # Under three characters there is no trigram: an ordered scan.
+        self.assertEqual(len(index.search(["an"], 10)), 4)
+        self.assertEqual(index.search(["zzz"], 10), [])
+
+    def test_lookups_do_not_touch_the_database_once_built(self):
+        self.place("Farm Gate", "23.757000", "90.389000")
+        location_index.get_index()
+
+        with self.assertNumQueries(0):
+            results = LocationService._search_manual_locations("farm")
+            nearest = LocationService._find_nearest_manual_location(23.757100, 90.389100)
+
+        self.assertEqual(results[0]["title"], "Farm Gate")
+        self.assertEqual(nearest["title"], "Farm Gate")
+
+    def test_nearest_is_bounded_and_picks_the_closest(self):
+        self.place("Far", "23.760000", "90.389000")          # ~330 m north
+        self.place("Near", "23.757500", "90.389000")         # ~55 m north
+        index = location_index.get_index()
+
+        self.assertEqual(index.nearest(23.757, 90.389, 0.25).name, "Near")
+        self.assertIsNone(index.nearest(23.757, 90.389, 0.03))
+
+    def test_a_change_is_picked_up_on_the_next_lookup(self):
+        stop = self.place("Old Stop", "23.757000", "90.389000")
+        self.assertEqual(len(location_index.get_index()), 1)
+
+        stop.is_active = False
+        stop.save(update_fields=["is_active", "updated_at"])
+        self.assertEqual(len(location_index.get_index()), 0)
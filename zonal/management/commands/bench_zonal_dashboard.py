@@ -0,0 +1,137 @@
+"""Latency of the zonal dashboard over a year-long range, live vs rollup.
+
+Seeds one zone with ``--users`` registrations, ``--sales`` pro subscriptions
+and eShop orders spread over the last 365 days, ``--managers`` area managers,
+and a mid-day rate change every quarter for each rate history (so commission
+is split into several rate segments). Then times GET /api/zonal/dashboard/
+for the whole year:
+
+  * live — ZONAL_METRIC_ROLLUPS off, every figure from the sales tables
+  * rollup — after rollups.rebuild over the seeded year
+
+Reports p50/p99 latency and statements per request. Everything is rolled back.
+
+    python manage.py bench_zonal_dashboard
+    python manage.py bench_zonal_dashboard --users 50000 --sales 100000 --iterations 5
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models.expressions import RawSQL
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from base.benchmarking import count_queries, format_stats, measure, rolled_back, synthetic_users
+from base.models import Balance, Order, User
+from zonal import rollups
+from zonal.metrics import DHAKA, FEATURE_ORDER
+from zonal.models import AreaManager, AreaManagerRateChange, ZonalOffice, ZoneRateChange
+from zonal.views import zonal_dashboard
+
+BATCH = 5000
+CITY = "Benchpur"
+SPREAD = RawSQL("now() - random() * interval '365 days'", [])
+
+
+class Command(BaseCommand):
+    help = "Zonal dashboard latency over a year of data, live vs daily rollup (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20000)
+        parser.add_argument("--sales", type=int, default=40000, help="pro subscriptions + orders")
+        parser.add_argument("--managers", type=int, default=5)
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with rolled_back():
+            office = self._seed(options, rng)
+            today = timezone.now().astimezone(DHAKA).date()
+            d_from = today - timedelta(days=364)
+            factory = APIRequestFactory()
+
+            def call():
+                request = factory.get("/api/zonal/dashboard/", {
+                    "from": d_from.isoformat(), "to": today.isoformat()})
+                force_authenticate(request, user=office.user)
+                response = zonal_dashboard(request)
+                assert response.status_code == 200, response.data
+                return response.data
+
+            with override_settings(ZONAL_METRIC_ROLLUPS=False):
+                live = call()
+                self._line("live", call, options["iterations"])
+
+            started = time.perf_counter()
+            rows = rollups.rebuild(d_from, today)
+            self.stdout.write("  rebuild: %d rollup rows in %.1fs" % (
+                rows, time.perf_counter() - started))
+            rolled = call()
+            self._line("rollup", call, options["iterations"])
+
+            if live["totals"] != rolled["totals"]:
+                self.stdout.write(self.style.WARNING("  totals differ: %s vs %s" % (
+                    live["totals"], rolled["totals"])))
+        self.stdout.write(self.style.SUCCESS("Done — synthetic zone rolled back."))
+
+    def _seed(self, options, rng):
+        areas = ["Bench Area %d" % i for i in range(options["managers"] + 3)]
+        users = synthetic_users(options["users"], prefix="benchzone")
+        for u in users:
+            u.city, u.upazila = CITY, rng.choice(areas)
+        User.objects.bulk_update(users, ["city", "upazila"], batch_size=BATCH)
+        ids = [u.pk for u in users]
+        User.objects.filter(pk__in=ids).update(date_joined=SPREAD)
+
+        half = options["sales"] // 2
+        pro = Balance.objects.bulk_create([
+            Balance(user_id=rng.choice(ids), transaction_type="pro_subscription",
+                    transaction_number="BZ%d" % i, completed=True,
+                    amount=Decimal(rng.choice([199, 499, 999])))
+            for i in range(half)
+        ], batch_size=BATCH)
+        Balance.objects.filter(pk__in=[b.pk for b in pro]).update(created_at=SPREAD)
+        orders = Order.objects.bulk_create([
+            Order(user_id=rng.choice(ids), order_number="Z%09d" % i,
+                  total=Decimal(rng.randint(100, 5000)),
+                  order_status=rng.choice(["pending", "delivered", "cancelled"]))
+            for i in range(options["sales"] - half)
+        ], batch_size=BATCH)
+        Order.objects.filter(pk__in=[o.pk for o in orders]).update(created_at=SPREAD)
+
+        office = ZonalOffice.objects.create(user=users[0], name="Bench Zone", city=CITY)
+        managers = [AreaManager.objects.create(office=office, name=area, area=area)
+                    for area in areas[:options["managers"]]]
+        # A baseline plus a change every ~quarter, at 15:00 Dhaka — mid-day, so
+        # the rate segments don't fall on day boundaries.
+        now = timezone.now().astimezone(DHAKA)
+        effective = [datetime(2000, 1, 1, tzinfo=DHAKA)] + [
+            (now - timedelta(days=d)).replace(hour=15, minute=0, second=0, microsecond=0)
+            for d in (300, 210, 120, 30)
+        ]
+        zone, area = [], []
+        for feature, _label in FEATURE_ORDER:
+            for when in effective:
+                kind = "flat" if feature == "registration" else "percent"
+                zone.append(ZoneRateChange(
+                    office=office, feature=feature, commission_type=kind,
+                    value=Decimal(rng.randint(5, 15)), effective_from=when))
+                area.extend(AreaManagerRateChange(
+                    manager=m, feature=feature, commission_type=kind,
+                    value=Decimal(rng.randint(1, 4)), effective_from=when) for m in managers)
+        ZoneRateChange.objects.bulk_create(zone)
+        AreaManagerRateChange.objects.bulk_create(area, batch_size=BATCH)
+        self.stdout.write("%d users, %d sales, %d area managers, %d rate segments" % (
+            len(users), options["sales"], len(managers), len(effective)))
+        return office
+
+    def _line(self, label, fn, iterations):
+        with count_queries() as ctx:
+            fn()
+        self.stdout.write("  %-8s %s  %5d statements" % (
+            label, format_stats(measure(fn, iterations)), len(ctx)))
@@ -0,0 +1,44 @@
+"""Build / rebuild the zonal daily metric rollup (ZonalDailyMetric).
+
+    python manage.py rollup_zonal_metrics                     # trailing 35 days
+    python manage.py rollup_zonal_metrics --days 400          # backfill
+    python manage.py rollup_zonal_metrics --from 2025-01-01 --to 2025-12-31
+
+Safe to re-run: each day's rows are replaced. Today is never rolled up.
+The nightly refresh_zonal_rollups task does the trailing-days run.
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from zonal.metrics import DHAKA
+from zonal.rollups import REFRESH_DAYS, rebuild
+
+
+class Command(BaseCommand):
+    help = "Build/rebuild the zonal daily metric rollup for a range of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=REFRESH_DAYS,
+                            help="Trailing days ending yesterday (default %d)." % REFRESH_DAYS)
+        parser.add_argument("--from", dest="from_day", help="First day, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="to_day", help="Last day, YYYY-MM-DD (default yesterday).")
+
+    def handle(self, *args, **opts):
+        yesterday = timezone.now().astimezone(DHAKA).date() - timedelta(days=1)
+        try:
+            last = date.fromisoformat(opts["to_day"]) if opts.get("to_day") else yesterday
+            if opts.get("from_day"):
+                first = date.fromisoformat(opts["from_day"])
+            else:
+                first = last - timedelta(days=opts["days"] - 1)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if first > last:
+            raise CommandError("--from is after --to")
+
+        rows = rebuild(first, last)
+        self.stdout.write(
+            "ROLLUP %s..%s rows=%d" % (first.isoformat(), min(last, yesterday).isoformat(), rows)
+        )
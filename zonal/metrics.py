@@ -40,53 +40,65 @@ def _sum(qs, field):
     return float(qs.aggregate(s=Sum(field))["s"] or 0)
 
 
-def metric_querysets(city, start, end, upazila=None):
-    """All feature querysets scoped to the zone city (and optionally one
-    upazila) within [start, end)."""
+def feature_sources():
+    """{feature: (base queryset, user-scope prefix, date field, amount field)}
+    — what counts as one sale of each feature, before any zone/time scoping.
+    The live querysets and the daily rollup (zonal.rollups) both build on
+    this, so they can't drift apart."""
     from base.models import Balance, MicroGigPost, Order
     from business_network.models import GoldSponsor
     from mobile_recharge.models import Recharge
     from rideshare.models import Ride
 
-    def user_scope(prefix=""):
-        q = Q(**{f"{prefix}city__iexact": city})
-        if upazila:
-            q &= Q(**{f"{prefix}upazila__iexact": upazila})
-        return q
+    return {
+        "registration": (User.objects.all(), "", "date_joined", None),
+        "pro_subscription": (
+            Balance.objects.filter(transaction_type="pro_subscription", completed=True),
+            "user__", "created_at", "amount",
+        ),
+        "microgig_post": (
+            MicroGigPost.objects.exclude(gig_status="rejected"),
+            "user__", "created_at", "total_cost",
+        ),
+        "eshop_order": (
+            Order.objects.exclude(order_status="cancelled"),
+            "user__", "created_at", "total",
+        ),
+        "mobile_recharge": (
+            Recharge.objects.filter(status="completed"),
+            "user__", "created_at", "amount",
+        ),
+        "gold_sponsor": (
+            GoldSponsor.objects.filter(amount_paid__gt=0),
+            "user__", "created_at", "amount_paid",
+        ),
+        "rideshare_driver": (
+            Ride.objects.filter(status="completed"),
+            "assigned_driver__user__", "completed_at", "platform_fee_amount",
+        ),
+    }
 
-    regs = User.objects.filter(
-        user_scope(), date_joined__gte=start, date_joined__lt=end
-    )
-    pro = Balance.objects.filter(
-        user_scope("user__"), transaction_type="pro_subscription",
-        completed=True, created_at__gte=start, created_at__lt=end,
-    )
-    gigs = MicroGigPost.objects.filter(
-        user_scope("user__"), created_at__gte=start, created_at__lt=end
-    ).exclude(gig_status="rejected")
-    orders = Order.objects.filter(
-        user_scope("user__"), created_at__gte=start, created_at__lt=end
-    ).exclude(order_status="cancelled")
-    recharges = Recharge.objects.filter(
-        user_scope("user__"), status="completed",
-        created_at__gte=start, created_at__lt=end,
-    )
-    gold = GoldSponsor.objects.filter(
-        user_scope("user__"), amount_paid__gt=0,
-        created_at__gte=start, created_at__lt=end,
-    )
-    rides = Ride.objects.filter(
-        user_scope("assigned_driver__user__"), status="completed",
-        completed_at__gte=start, completed_at__lt=end,
-    )
+
+def _scoped(source, city, start, end, upazila=None):
+    qs, prefix, dt_field, amount_field = source
+    q = Q(**{f"{prefix}city__iexact": city})
+    if upazila:
+        q &= Q(**{f"{prefix}upazila__iexact": upazila})
+    return qs.filter(q, **{f"{dt_field}__gte": start, f"{dt_field}__lt": end}), amount_field
+
+
+def feature_queryset(feature, city, start, end, upazila=None):
+    """(queryset, amount field) of ONE feature scoped to the zone city (and
+    optionally one upazila) within [start, end)."""
+    return _scoped(feature_sources()[feature], city, start, end, upazila=upazila)
+
+
+def metric_querysets(city, start, end, upazila=None):
+    """All feature querysets scoped to the zone city (and optionally one
+    upazila) within [start, end)."""
     return {
-        "registration": (regs, None),
-        "pro_subscription": (pro, "amount"),
-        "microgig_post": (gigs, "total_cost"),
-        "eshop_order": (orders, "total"),
-        "mobile_recharge": (recharges, "amount"),
-        "gold_sponsor": (gold, "amount_paid"),
-        "rideshare_driver": (rides, "platform_fee_amount"),
+        feature: _scoped(source, city, start, end, upazila=upazila)
+        for feature, source in feature_sources().items()
     }
 
 
@@ -133,12 +145,6 @@ def commission_for(city, rates, start, end, upazila=None):
 
 # ---- effective-dated (rate-history aware) commission --------------------
 
-def _feature_count_amount(feature, city, start, end, upazila=None):
-    """(count, amount) for ONE feature within a sub-window."""
-    qs, field = metric_querysets(city, start, end, upazila=upazila)[feature]
-    return qs.count(), (_sum(qs, field) if field else 0.0)
-
-
 def _rate_at(changes, t):
     """The change effective at time t = latest change with effective_from<=t."""
     eff = None
@@ -162,12 +168,18 @@ def _segments(changes, start, end):
     return segs
 
 
-def commission_from_changes(city, changes_by_feature, start, end, upazila=None):
+def commission_from_changes(city, changes_by_feature, start, end, upazila=None,
+                            source=None):
     """Commission where each sale is credited at the rate effective WHEN it
     happened — so raising a rate today never re-prices past sales.
 
     changes_by_feature: {feature: [ZoneRateChange-like sorted by effective_from]}
+    source: a zonal.rollups.MetricSource for the same scope and window, to
+    share its rollup rows and live queries between calls (made if omitted).
     """
+    if source is None:
+        from .rollups import MetricSource
+        source = MetricSource(city, start, end, upazila=upazila)
     rows = []
     total = Decimal(0)
     for feature, label in FEATURE_ORDER:
@@ -176,7 +188,7 @@ def commission_from_changes(city, changes_by_feature, start, end, upazila=None):
         cnt_total, amt_total = 0, 0.0
         earned = Decimal(0)
         for s, e, eff in segs:
-            cnt, amt = _feature_count_amount(feature, city, s, e, upazila)
+            cnt, amt = source.count_amount(feature, s, e)
             cnt_total += cnt
             amt_total += amt
             if eff is None:
@@ -205,20 +217,21 @@ def _changes_by_feature(change_qs):
     return out
 
 
-def commission_for_office(office, start, end):
+def commission_for_office(office, start, end, source=None):
     return commission_from_changes(
-        office.city, _changes_by_feature(office.rate_changes.all()), start, end
+        office.city, _changes_by_feature(office.rate_changes.all()), start, end,
+        source=source,
     )
 
 
-def commission_for_manager(office, manager, start, end):
+def commission_for_manager(office, manager, start, end, source=None):
     return commission_from_changes(
         office.city, _changes_by_feature(manager.rate_changes.all()),
-        start, end, upazila=manager.area,
+        start, end, upazila=manager.area, source=source,
     )
 
 
-def zone_net_commission(office, start, end):
+def zone_net_commission(office, start, end, source=None):
     """Zone officer's NET commission: the zone's gross commission MINUS each
     area manager's share (the manager's cut is carved OUT of the zone's, not
     paid on top). Per area the deduction is capped at what the zone earned from
@@ -227,19 +240,25 @@ def zone_net_commission(office, start, end):
 
     Returns (rows, net_total, gross_total, deduction_total, managers_detail).
     Each row carries gross / area_manager_deduction / earned(=net) per feature.
+    ``source``: the zone-wide MetricSource, if the caller already has one.
     """
+    from .rollups import MetricSource
+
     zone_changes = _changes_by_feature(office.rate_changes.all())
-    gross_rows, gross_total = commission_from_changes(office.city, zone_changes, start, end)
+    gross_rows, gross_total = commission_from_changes(
+        office.city, zone_changes, start, end, source=source)
     gross_by_feature = {r["feature"]: Decimal(str(r["earned"])) for r in gross_rows}
 
     deduction_by_feature = {f: Decimal(0) for f, _ in FEATURE_ORDER}
     managers_detail = []
     for mgr in office.area_managers.filter(is_active=True):
-        mgr_rows, mgr_total = commission_for_manager(office, mgr, start, end)
+        # One source per area serves both the manager's and the zone's rates.
+        area = MetricSource(office.city, start, end, upazila=mgr.area)
+        mgr_rows, mgr_total = commission_for_manager(office, mgr, start, end, source=area)
         # What the zone earns from this manager's area at the ZONE's own rate —
         # the manager's cut can't exceed this.
         zone_area_rows, _zt = commission_from_changes(
-            office.city, zone_changes, start, end, upazila=mgr.area
+            office.city, zone_changes, start, end, upazila=mgr.area, source=area
         )
         zone_area_by_feature = {
             r["feature"]: Decimal(str(r["earned"])) for r in zone_area_rows
@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-18 11:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zonal', '0007_backfill_rate_baselines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZonalDailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('city', models.CharField(max_length=256)),
+                ('upazila', models.CharField(blank=True, default='', max_length=256)),
+                ('feature', models.CharField(choices=[('registration', 'User Registration (leads)'), ('pro_subscription', 'Pro Subscription'), ('microgig_post', 'MicroGig Post'), ('eshop_order', 'eShop Order'), ('mobile_recharge', 'Mobile Recharge'), ('gold_sponsor', 'Gold Sponsor'), ('rideshare_driver', 'Rideshare Driver Commission')], max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Zonal Daily Metric',
+                'verbose_name_plural': 'Zonal Daily Metrics (rollup)',
+                'indexes': [models.Index(fields=['city', 'date'], name='zonal_daily_city_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'city', 'upazila', 'feature'), name='zonal_daily_metric_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ZonalRollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+    ]
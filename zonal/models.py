@@ -345,3 +345,45 @@ class AreaManagerRateChange(_RateChangeBase):
 
     def __str__(self):
         return f"{self.manager.name} {self.feature} -> {self.value} @ {self.effective_from:%Y-%m-%d}"
+
+
+# --- Daily metric rollup ----------------------------------------------------
+# One row per (Dhaka day, city, upazila, feature) with that day's sale count
+# and amount, so commission windows sum a few hundred rows instead of scanning
+# the sales tables. City/upazila are stored upper-cased (matching the iexact
+# scoping of the live queries). Built by zonal.rollups; a ZonalRollupDay row
+# marks each day the rollup is complete for, and anything else is read live.
+
+class ZonalDailyMetric(models.Model):
+    date = models.DateField()
+    city = models.CharField(max_length=256)
+    upazila = models.CharField(max_length=256, blank=True, default="")
+    feature = models.CharField(max_length=32, choices=ZoneFeatureCommission.FEATURES)
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Zonal Daily Metric"
+        verbose_name_plural = "Zonal Daily Metrics (rollup)"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "city", "upazila", "feature"], name="zonal_daily_metric_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["city", "date"], name="zonal_daily_city_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.city}/{self.upazila or '-'} {self.feature}: {self.count}"
+
+
+class ZonalRollupDay(models.Model):
+    date = models.DateField(unique=True)
+    built_at = models.DateTimeField(default=timezone_now)
+
+    class Meta:
+        ordering = ["date"]
+
+    def __str__(self):
+        return f"{self.date} (rolled up {self.built_at:%Y-%m-%d %H:%M})"
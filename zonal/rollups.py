@@ -0,0 +1,208 @@
+"""Daily per-area metric rollup behind the zonal commission engine.
+
+Commission is rate-history aware, so ``commission_from_changes`` asks for a
+(count, amount) per feature per rate segment; ``zone_net_commission`` repeats
+that for the zone and twice for every area manager. Done live, each answer
+is a COUNT + SUM over a sales table with ``city__iexact`` filters — dozens
+of scans per dashboard load, each growing with the window.
+
+``rebuild`` folds each finished Dhaka day into ZonalDailyMetric rows keyed by
+(date, city, upazila, feature) with one grouped query per feature, and marks
+the day in ZonalRollupDay. ``refresh_zonal_rollups`` (nightly) rebuilds the
+trailing REFRESH_DAYS, so late changes — a cancelled order, a recharge that
+completes the next day — are picked up until the previous month is invoiced.
+
+``MetricSource`` answers for one scope and window: whole rolled-up days come
+from the rollup rows (loaded once), and everything else — today, days not
+rolled up yet, the part-days either side of a mid-day rate change — from the
+live tables, one aggregate query per stretch.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, Upper
+from django.utils import timezone
+
+from .metrics import DHAKA, feature_queryset, feature_sources
+
+REFRESH_DAYS = 35
+BUILD_CHUNK_DAYS = 31
+
+
+def _midnight(day):
+    return datetime.combine(day, time.min, tzinfo=DHAKA)
+
+
+def _today():
+    return timezone.now().astimezone(DHAKA).date()
+
+
+def _grouped(first_day, last_day):
+    """ZonalDailyMetric rows (unsaved) for Dhaka days [first_day, last_day]."""
+    from .models import ZonalDailyMetric
+
+    start, end = _midnight(first_day), _midnight(last_day + timedelta(days=1))
+    for feature, (qs, prefix, dt_field, amount_field) in feature_sources().items():
+        totals = {"n": Count("pk")}
+        if amount_field:
+            totals["s"] = Sum(amount_field)
+        rows = (
+            qs.filter(**{f"{dt_field}__gte": start, f"{dt_field}__lt": end})
+            .order_by()
+            .values(
+                rollup_day=TruncDate(dt_field, tzinfo=DHAKA),
+                rollup_city=Upper(f"{prefix}city"),
+                rollup_upazila=Coalesce(Upper(f"{prefix}upazila"), Value("")),
+            )
+            .annotate(**totals)
+        )
+        for r in rows.iterator():
+            if not r["rollup_city"]:
+                continue
+            yield ZonalDailyMetric(
+                date=r["rollup_day"], city=r["rollup_city"],
+                upazila=r["rollup_upazila"], feature=feature,
+                count=r["n"], amount=r.get("s") or 0,
+            )
+
+
+def rebuild(first_day, last_day):
+    """Recompute the rollup for Dhaka days [first_day, last_day] (never today
+    or later — those days aren't finished). Returns the rows written."""
+    from .models import ZonalDailyMetric, ZonalRollupDay
+
+    last_day = min(last_day, _today() - timedelta(days=1))
+    written = 0
+    day = first_day
+    while day <= last_day:
+        chunk_end = min(last_day, day + timedelta(days=BUILD_CHUNK_DAYS - 1))
+        rows = list(_grouped(day, chunk_end))
+        with transaction.atomic():
+            ZonalDailyMetric.objects.filter(date__gte=day, date__lte=chunk_end).delete()
+            ZonalDailyMetric.objects.bulk_create(rows, batch_size=2000)
+            ZonalRollupDay.objects.filter(date__gte=day, date__lte=chunk_end).delete()
+            ZonalRollupDay.objects.bulk_create([
+                ZonalRollupDay(date=day + timedelta(days=i))
+                for i in range((chunk_end - day).days + 1)
+            ])
+        written += len(rows)
+        day = chunk_end + timedelta(days=1)
+    return written
+
+
+def refresh(days=REFRESH_DAYS):
+    """Rebuild the trailing ``days`` finished days. Returns the rows written."""
+    yesterday = _today() - timedelta(days=1)
+    return rebuild(yesterday - timedelta(days=days - 1), yesterday)
+
+
+class MetricSource:
+    """(count, amount) per feature for any sub-window of [start, end) in one
+    scope (zone city, optionally one upazila)."""
+
+    def __init__(self, city, start, end, upazila=None):
+        from .models import ZonalDailyMetric, ZonalRollupDay
+
+        self.city, self.upazila = city, upazila
+        self.start, self.end = start, end
+        self._days = {}      # (feature, date) -> (count, amount)
+        self._live = {}      # (feature, start, end) -> (count, amount)
+        self._covered = set()
+        if not getattr(settings, "ZONAL_METRIC_ROLLUPS", True) or start >= end:
+            return
+        first = start.astimezone(DHAKA).date()
+        last = (end - timedelta(microseconds=1)).astimezone(DHAKA).date()
+        self._covered = set(
+            ZonalRollupDay.objects.filter(date__gte=first, date__lte=last)
+            .values_list("date", flat=True)
+        )
+        if not self._covered:
+            return
+        rows = ZonalDailyMetric.objects.filter(
+            city=Upper(Value(city)), date__gte=first, date__lte=last,
+        )
+        if upazila:
+            rows = rows.filter(upazila=Upper(Value(upazila)))
+        for feature, day, n, s in (
+            rows.order_by().values("feature", "date")
+            .annotate(n=Sum("count"), s=Sum("amount"))
+            .values_list("feature", "date", "n", "s")
+        ):
+            self._days[(feature, day)] = (n, s or Decimal(0))
+
+    def _pieces(self, start, end):
+        """[start, end) as (a, b, day) pieces: ``day`` is set for a whole
+        rolled-up Dhaka day, None for a stretch that has to be read live
+        (adjacent live stretches merged)."""
+        pieces = []
+        cursor = start
+        while cursor < end:
+            day = cursor.astimezone(DHAKA).date()
+            next_start = _midnight(day + timedelta(days=1))
+            if (cursor == _midnight(day) and next_start <= end
+                    and day in self._covered):
+                pieces.append((cursor, next_start, day))
+            else:
+                b = min(next_start, end)
+                if pieces and pieces[-1][2] is None:
+                    pieces[-1] = (pieces[-1][0], b, None)
+                else:
+                    pieces.append((cursor, b, None))
+            cursor = min(next_start, end)
+        return pieces
+
+    def _live_count_amount(self, feature, a, b):
+        key = (feature, a, b)
+        if key not in self._live:
+            qs, field = feature_queryset(feature, self.city, a, b, upazila=self.upazila)
+            totals = {"n": Count("pk")}
+            if field:
+                totals["s"] = Sum(field)
+            agg = qs.order_by().aggregate(**totals)
+            self._live[key] = (agg["n"], agg.get("s") or Decimal(0))
+        return self._live[key]
+
+    def count_amount(self, feature, start, end):
+        """(count, amount) of ``feature`` sales in [start, end)."""
+        count, amount = 0, Decimal(0)
+        for a, b, day in self._pieces(start, end):
+            if day is None:
+                n, s = self._live_count_amount(feature, a, b)
+            else:
+                n, s = self._days.get((feature, day), (0, 0))
+            count += n
+            amount += Decimal(s)
+        return count, float(amount)
+
+    def feature_data(self):
+        """The whole window, shaped like metrics.feature_data."""
+        data = {}
+        for feature in feature_sources():
+            count, amount = self.count_amount(feature, self.start, self.end)
+            data[feature] = {"count": count, "amount": amount}
+        return data
+
+    def daily(self, feature):
+        """{iso date: (count, amount)} over the window, days without sales
+        left out."""
+        out = {}
+        _qs, _prefix, dt_field, _field = feature_sources()[feature]
+        for a, b, day in self._pieces(self.start, self.end):
+            if day is not None:
+                n, s = self._days.get((feature, day), (0, 0))
+                if n:
+                    out[day.isoformat()] = (n, s)
+                continue
+            qs, field = feature_queryset(feature, self.city, a, b, upazila=self.upazila)
+            totals = {"n": Count("pk")}
+            if field:
+                totals["s"] = Sum(field)
+            for r in (qs.order_by().annotate(d=TruncDate(dt_field, tzinfo=DHAKA))
+                      .values("d").annotate(**totals)):
+                key = r["d"].isoformat()
+                n, s = out.get(key, (0, 0))
+                out[key] = (n + r["n"], s + (r.get("s") or 0))
+        return out
@@ -19,3 +19,12 @@ def refresh_current_zonal_invoices():
     balance API (shown as live accrual), so this never double counts."""
     call_command("generate_zonal_invoices", "--current")
     return "ok"
+
+
+@shared_task
+def refresh_zonal_rollups():
+    """Rebuild the trailing days of the daily metric rollup (zonal.rollups)
+    the dashboard and invoices read finished days from. Nightly, just after
+    the Dhaka day closes and before the 1st-of-month invoice run."""
+    from .rollups import refresh
+    return refresh()
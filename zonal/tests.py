@@ -1,3 +1,151 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from base.models import Balance, User
+from zonal import metrics, rollups
+from zonal.models import (
+    AreaManager,
+    AreaManagerRateChange,
+    ZonalOffice,
+    ZonalRollupDay,
+    ZoneRateChange,
+)
+from zonal.rollups import MetricSource
+from zonal.signals import EPOCH
+
+CITY = "Testpur"
+
+
+class MetricRollupTests(TestCase):
+    """Figures read through the daily rollup must equal the live ones, for
+    whole rolled-up days, part-days around a mid-day rate change and today's
+    live tail, zone-wide and for one area manager's upazila."""
+
+    def setUp(self):
+        self.today = rollups._today()
+        self.start = rollups._midnight(self.today - timedelta(days=7))
+        self.end = rollups._midnight(self.today + timedelta(days=1))
+        # Mid-day, so the rate segments don't fall on day boundaries.
+        self.change_at = rollups._midnight(self.today - timedelta(days=3)) + timedelta(hours=15)
+
+        n = 0
+        # (days ago, hour, city, upazila, pro subscription amount or None)
+        for days_ago, hour, city, upazila, amount in [
+            (9, 12, CITY, "North", "199.00"),        # before the window
+            (6, 0, CITY, "North", "499.00"),         # Dhaka midnight
+            (6, 10, "testpur", "north", "999.00"),   # other spelling, same area
+            (5, 23, CITY, "South", "199.00"),
+            (3, 9, CITY, "North", "499.00"),         # before the rate change
+            (3, 16, CITY, "North", "999.00"),        # after it
+            (3, 20, CITY, "South", None),
+            (1, 23, CITY, "", "199.00"),             # no upazila
+            (2, 11, "Elsewhere", "North", "499.00"),  # another zone
+            (0, 0, CITY, "North", "999.00"),         # today: read live
+        ]:
+            n += 1
+            at = rollups._midnight(self.today - timedelta(days=days_ago)) + timedelta(
+                hours=hour, minutes=20)
+            user = User.objects.create_user(
+                username="zone%d" % n, email="zone%d@example.com" % n,
+                password="testpass123", phone="0171100%04d" % n,
+                city=city, upazila=upazila)
+            User.objects.filter(pk=user.pk).update(date_joined=at)
+            if amount:
+                sale = Balance.objects.create(
+                    user=user, transaction_type="pro_subscription", completed=True,
+                    amount=Decimal(amount))
+                Balance.objects.filter(pk=sale.pk).update(created_at=at)
+
+        officer = User.objects.create_user(
+            username="officer", email="officer@example.com", password="testpass123",
+            phone="01711009999")
+        self.office = ZonalOffice.objects.create(user=officer, name="Test Zone", city=CITY)
+        self.manager = AreaManager.objects.create(office=self.office, name="North", area="north")
+        for feature, kind, before, after in [
+            ("registration", "flat", "10", "20"),
+            ("pro_subscription", "percent", "10", "15"),
+        ]:
+            for when, value in ((EPOCH, before), (self.change_at, after)):
+                ZoneRateChange.objects.create(
+                    office=self.office, feature=feature, commission_type=kind,
+                    value=Decimal(value), effective_from=when)
+                AreaManagerRateChange.objects.create(
+                    manager=self.manager, feature=feature, commission_type=kind,
+                    value=Decimal(value) / 2, effective_from=when)
+
+        rollups.rebuild(self.today - timedelta(days=10), self.today)
+
+    def both(self, fn):
+        """fn() with the rollup off and on → (live, rolled)."""
+        with override_settings(ZONAL_METRIC_ROLLUPS=False):
+            live = fn()
+        with override_settings(ZONAL_METRIC_ROLLUPS=True):
+            rolled = fn()
+        return live, rolled
+
+    def test_rebuild_stops_before_today(self):
+        days = set(ZonalRollupDay.objects.values_list("date", flat=True))
+        self.assertIn(self.today - timedelta(days=1), days)
+        self.assertNotIn(self.today, days)
+
+    def test_whole_rolled_up_days_need_no_query(self):
+        with override_settings(ZONAL_METRIC_ROLLUPS=True):
+            source = MetricSource(CITY, self.start, self.end)
+            a = rollups._midnight(self.today - timedelta(days=6))
+            b = rollups._midnight(self.today - timedelta(days=4))
+            with self.assertNumQueries(0):
+                self.assertEqual(
+                    source.count_amount("pro_subscription", a, b), (3, 1697.0))
+
+    def test_count_amount_matches_live(self):
+        windows = [
+            (self.start, self.end),
+            (self.start, self.change_at),                  # ends mid-day
+            (self.change_at, self.end),                    # starts mid-day
+            (rollups._midnight(self.today), self.end),     # today only
+            (self.change_at - timedelta(hours=8), self.change_at + timedelta(hours=3)),
+        ]
+        for upazila in (None, "NORTH"):
+            for feature in ("registration", "pro_subscription", "eshop_order"):
+                for a, b in windows:
+                    live, rolled = self.both(lambda: MetricSource(
+                        CITY, self.start, self.end, upazila=upazila,
+                    ).count_amount(feature, a, b))
+                    self.assertEqual(rolled, live, (upazila, feature, a, b))
+        self.assertEqual(
+            MetricSource(CITY, self.start, self.end).count_amount(
+                "pro_subscription", self.start, self.end),
+            (7, 4393.0))
+
+    def test_feature_data_matches_live(self):
+        for upazila in (None, "north"):
+            live = metrics.feature_data(
+                metrics.metric_querysets(CITY, self.start, self.end, upazila=upazila))
+            for data in self.both(
+                    lambda: MetricSource(CITY, self.start, self.end, upazila=upazila).feature_data()):
+                self.assertEqual(data, live)
+
+    def test_daily_matches_live(self):
+        for upazila in (None, "North"):
+            live, rolled = self.both(lambda: MetricSource(
+                CITY, self.start, self.end, upazila=upazila).daily("pro_subscription"))
+            self.assertEqual(
+                {d: (n, Decimal(s)) for d, (n, s) in rolled.items()},
+                {d: (n, Decimal(s)) for d, (n, s) in live.items()})
+        self.assertIn(self.today.isoformat(), rolled)
+
+    def test_zone_net_commission_matches_live(self):
+        live, rolled = self.both(
+            lambda: metrics.zone_net_commission(self.office, self.start, self.end))
+        self.assertEqual(rolled, live)
+        _rows, net, gross, deduction, managers = rolled
+        self.assertEqual(net, gross - deduction)
+        self.assertGreater(deduction, 0)
+        self.assertEqual(managers[0]["area"], "north")
+
+    def test_manager_commission_matches_live(self):
+        live, rolled = self.both(lambda: metrics.commission_for_manager(
+            self.office, self.manager, self.start, self.end))
+        self.assertEqual(rolled, live)
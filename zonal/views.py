@@ -15,19 +15,17 @@ from decimal import Decimal, InvalidOperation
 from zoneinfo import ZoneInfo
 
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q, Sum
-from django.db.models.functions import TruncDate
+from django.db.models import Count, Q
 from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from . import metrics
+from . import rollups as metrics_rollups
 from .metrics import (
     DHAKA,
     FEATURE_ORDER,
-    feature_data as _feature_data,
-    metric_querysets as _metric_querysets,
     subscription_analysis as _subscription_analysis,
 )
 from .models import (
@@ -110,11 +108,12 @@ def zonal_dashboard(request):
     city = office.city
 
     zone_users = User.objects.filter(city__iexact=city)
-    querysets = _metric_querysets(city, start, end)
-    data = _feature_data(querysets)
+    # Finished days come from the daily rollup, the rest live (zonal.rollups).
+    source = metrics_rollups.MetricSource(city, start, end)
+    data = source.feature_data()
 
     # Per-area registration breakdown
-    regs = querysets["registration"][0]
+    regs, _f = metrics.feature_queryset("registration", city, start, end)
     reg_count = data["registration"]["count"]
     by_area = list(
         regs.exclude(upazila="")
@@ -127,32 +126,24 @@ def zonal_dashboard(request):
     # Rate-history aware AND net of area-manager cuts (each manager's share is
     # carved out of the zone's commission, not paid on top).
     commissions, net_total, gross_total, ded_total, mgr_detail = (
-        metrics.zone_net_commission(office, start, end)
+        metrics.zone_net_commission(office, start, end, source=source)
     )
     total_commission = float(net_total)
 
     # Daily series
-    def _daily(qs, dt_field, amount_field):
-        rows = (
-            qs.annotate(d=TruncDate(dt_field, tzinfo=DHAKA))
-            .values("d")
-            .annotate(n=Count("id"), s=Sum(amount_field) if amount_field else Count("id"))
-        )
-        out = {}
-        for r in rows:
-            out[r["d"].isoformat()] = {
-                "n": r["n"],
-                "s": float(r["s"] or 0) if amount_field else 0.0,
-            }
-        return out
+    def _daily(feature, with_amount=True):
+        return {
+            key: {"n": n, "s": float(s or 0) if with_amount else 0.0}
+            for key, (n, s) in source.daily(feature).items()
+        }
 
-    reg_daily = _daily(querysets["registration"][0], "date_joined", None)
-    pro_daily = _daily(querysets["pro_subscription"][0], "created_at", "amount")
-    gig_daily = _daily(querysets["microgig_post"][0], "created_at", "total_cost")
-    order_daily = _daily(querysets["eshop_order"][0], "created_at", "total")
-    rec_daily = _daily(querysets["mobile_recharge"][0], "created_at", "amount")
-    gold_daily = _daily(querysets["gold_sponsor"][0], "created_at", "amount_paid")
-    ride_daily = _daily(querysets["rideshare_driver"][0], "completed_at", "platform_fee_amount")
+    reg_daily = _daily("registration", with_amount=False)
+    pro_daily = _daily("pro_subscription")
+    gig_daily = _daily("microgig_post")
+    order_daily = _daily("eshop_order")
+    rec_daily = _daily("mobile_recharge")
+    gold_daily = _daily("gold_sponsor")
+    ride_daily = _daily("rideshare_driver")
 
     days = []
     d = d_to
@@ -520,12 +511,12 @@ def zonal_manager_report(request, manager_id):
         return Response({"detail": "ম্যানেজার পাওয়া যায়নি।"}, status=404)
 
     d_from, d_to, start, end = _parse_range(request)
-    querysets = _metric_querysets(office.city, start, end, upazila=manager.area)
-    data = _feature_data(querysets)
+    source = metrics_rollups.MetricSource(office.city, start, end, upazila=manager.area)
+    data = source.feature_data()
 
     # Rate-history aware (scoped to the manager's area).
     commissions, total_commission = metrics.commission_for_manager(
-        office, manager, start, end
+        office, manager, start, end, source=source
     )
     total_commission = float(total_commission)
 